@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+benchmark_chunk_serialization.py [iterations]
+
+Compares the size and load speed of the compact diff chunk format against
+the pickled format previously stored in the cache, using the files in
+reviewboard/diffviewer/testdata. Chunks are generated between each pair of
+"-old" and "-new" files in the corpus.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import timeit
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+def setup_django():
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..', '..'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault(b'DJANGO_SETTINGS_MODULE', b'reviewboard.settings')
+
+    return os.path.join(root_dir, 'reviewboard', 'diffviewer', 'testdata')
+
+
+def load_corpus(testdata_dir):
+    corpus = []
+
+    for dirpath, dirnames, filenames in os.walk(testdata_dir):
+        for filename in sorted(filenames):
+            if '-old.' not in filename:
+                continue
+
+            old_path = os.path.join(dirpath, filename)
+            new_path = os.path.join(dirpath,
+                                    filename.replace('-old.', '-new.'))
+
+            if not os.path.exists(new_path):
+                continue
+
+            with open(old_path, 'rb') as f:
+                old = f.read()
+
+            with open(new_path, 'rb') as f:
+                new = f.read()
+
+            corpus.append((filename, old, new))
+
+    return corpus
+
+
+def pickle_chunks(chunks):
+    # This matches what cache_memoize(large_data=True) stores.
+    return zlib.compress(pickle.dumps(chunks, protocol=0))
+
+
+def unpickle_chunks(data):
+    return pickle.loads(zlib.decompress(data))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2:
+        iterations = int(sys.argv[1])
+    else:
+        iterations = 100
+
+    testdata_dir = setup_django()
+
+    from django.conf import settings
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        },
+    }
+
+    from reviewboard.diffviewer.chunk_generator import RawDiffChunkGenerator
+    from reviewboard.diffviewer.chunk_serializer import (
+        deserialize_chunks, get_available_compressions, serialize_chunks)
+
+    for filename, old, new in load_corpus(testdata_dir):
+        generator = RawDiffChunkGenerator(old, new, filename, filename)
+        chunks = list(generator.get_chunks())
+
+        print('%s (%d chunks, %d iterations)'
+              % (filename, len(chunks), iterations))
+
+        pickled = pickle_chunks(chunks)
+        assert unpickle_chunks(pickled) == chunks
+
+        load_time = timeit.timeit(lambda: unpickle_chunks(pickled),
+                                  number=iterations)
+        print('    %-12s %8d bytes, %7.2fms/load'
+              % ('pickle+zlib', len(pickled),
+                 load_time * 1000 / iterations))
+
+        for compression in get_available_compressions():
+            data = serialize_chunks(chunks, compression)
+            assert deserialize_chunks(data) == chunks
+
+            load_time = timeit.timeit(lambda: deserialize_chunks(data),
+                                      number=iterations)
+            print('    %-12s %8d bytes, %7.2fms/load'
+                  % ('compact+%s' % compression, len(data),
+                     load_time * 1000 / iterations))
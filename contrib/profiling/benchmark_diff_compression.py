@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+benchmark_diff_compression.py [--limit=N] [diff_file ...]
+
+Compares the compression methods available for stored diffs (the
+diffviewer_diff_compression setting), showing the compression ratio and the
+compression and decompression throughput for each.
+
+If diff files are given, those are used as the corpus. Otherwise, up to
+--limit (default 1000) of the file diffs stored in the database are used,
+which requires a configured database.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+
+def setup_django():
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..', '..'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault(b'DJANGO_SETTINGS_MODULE', b'reviewboard.settings')
+
+
+def load_corpus(filenames, limit):
+    if filenames:
+        corpus = []
+
+        for filename in filenames:
+            with open(filename, 'rb') as fp:
+                corpus.append(fp.read())
+
+        return corpus
+
+    from reviewboard.diffviewer.models import RawFileDiffData
+
+    return [
+        raw_diff_data.content
+        for raw_diff_data in RawFileDiffData.objects.order_by('-pk')[:limit]
+    ]
+
+
+def time_func(func, items, min_time=1.0):
+    """Return the number of seconds to run func once over all the items."""
+    num_runs = 0
+    start = time.time()
+
+    while True:
+        for item in items:
+            func(item)
+
+        num_runs += 1
+        elapsed = time.time() - start
+
+        if elapsed >= min_time:
+            return elapsed / num_runs
+
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [--limit=N] [diff_file ...]')
+    parser.add_option('--limit', type='int', default=1000,
+                      help='the number of stored diffs to use')
+    options, args = parser.parse_args()
+
+    setup_django()
+
+    from reviewboard.diffviewer.compression import (compress_diff_data,
+                                                    decompress_diff_data,
+                                                    get_available_compressions)
+
+    corpus = load_corpus(args, options.limit)
+    total_size = sum(len(data) for data in corpus)
+
+    if not total_size:
+        sys.stderr.write('There are no diffs to test with.\n')
+        sys.exit(1)
+
+    print('%d diffs, %d bytes' % (len(corpus), total_size))
+    print()
+    print('%-8s %8s %14s %16s'
+          % ('Method', 'Ratio', 'Compress MB/s', 'Decompress MB/s'))
+
+    mb = total_size / (1024 * 1024)
+
+    for compression in get_available_compressions():
+        compressed = [
+            compress_diff_data(data, compression)
+            for data in corpus
+        ]
+        compressed_size = sum(len(data) for data, code in compressed)
+
+        compress_secs = time_func(
+            lambda data: compress_diff_data(data, compression),
+            corpus)
+        decompress_secs = time_func(
+            lambda item: decompress_diff_data(*item),
+            compressed)
+
+        print('%-8s %7.1f%% %14.1f %16.1f'
+              % (compression,
+                 100 * compressed_size / total_size,
+                 mb / compress_secs,
+                 mb / decompress_secs))
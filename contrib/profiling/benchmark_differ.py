@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+benchmark_differ.py [num_lines ...]
+
+Compares the throughput of MyersDiffer and FastMyersDiffer on synthetic
+files of the given sizes (10000, 50000 and 100000 lines by default), with
+varying amounts of changes. The opcodes from both differs are checked to be
+identical.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import random
+import sys
+import time
+
+
+WORDS = ['self', 'return', 'if', 'else', 'for', 'in', '=', '+', '(', ')',
+         'foo', 'bar', 'baz', 'value', 'data', 'x', 'y', 'None']
+
+
+def setup_django():
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..', '..'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault(b'DJANGO_SETTINGS_MODULE', b'reviewboard.settings')
+
+
+def make_files(num_lines, change_ratio, seed=0):
+    rng = random.Random(seed)
+
+    def make_line():
+        if rng.random() < 0.1:
+            return ''
+
+        return '%s%s' % ('    ' * rng.randint(0, 3),
+                         ' '.join(rng.choice(WORDS)
+                                  for i in range(rng.randint(1, 8))))
+
+    old = [make_line() for i in range(num_lines)]
+    new = list(old)
+
+    for i in range(int(num_lines * change_ratio)):
+        op = rng.random()
+        i = rng.randrange(len(new))
+
+        if op < 0.4:
+            new[i] = make_line()
+        elif op < 0.7:
+            new.insert(i, make_line())
+        else:
+            del new[i]
+
+    return old, new
+
+
+def time_differ(cls, old, new, compat_version):
+    start = time.time()
+    opcodes = list(cls(old, new, compat_version=compat_version).get_opcodes())
+
+    return time.time() - start, opcodes
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 50000, 100000]
+
+    setup_django()
+
+    from reviewboard.diffviewer.differ import DiffCompatVersion
+    from reviewboard.diffviewer.myersdiff import FastMyersDiffer, MyersDiffer
+
+    for num_lines in sizes:
+        for change_ratio in (0.01, 0.1, 0.3):
+            old, new = make_files(num_lines, change_ratio)
+
+            old_time, old_opcodes = time_differ(
+                MyersDiffer, old, new, DiffCompatVersion.MYERS_SMS_COST_BAIL)
+            new_time, new_opcodes = time_differ(
+                FastMyersDiffer, old, new, DiffCompatVersion.MYERS_FAST)
+
+            assert old_opcodes == new_opcodes
+
+            print('%d lines, %d%% changed (%d opcodes)'
+                  % (num_lines, change_ratio * 100, len(new_opcodes)))
+            print('    MyersDiffer:     %.3fs (%d lines/s)'
+                  % (old_time, num_lines / old_time))
+            print('    FastMyersDiffer: %.3fs (%d lines/s)'
+                  % (new_time, num_lines / new_time))
+            print('    speedup:         %.2fx' % (old_time / new_time))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+benchmark_move_detection.py [num_functions ...]
+
+Times move detection in DiffOpcodeGenerator on generated "big refactor"
+diffs, where a third of the functions in a file are moved around and some
+lines in the functions are changed. Functions share a number of common
+lines (closing braces, "return result;", etc.), which is what makes move
+detection expensive.
+
+Each diff is processed with the default MOVE_MAX_CANDIDATES (as used for
+DiffCompatVersion.MYERS_FAST_MOVE_LIMIT), and with no limit (which matches
+older diff compatibility versions). The
+time taken and the number of lines detected as moved are shown for both.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import random
+import sys
+import time
+
+
+COMMON_LINES = ['}', '', 'return result;', 'break;', '} else {',
+                'result = null;', '// TODO']
+
+
+def setup_django():
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..', '..'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault(b'DJANGO_SETTINGS_MODULE', b'reviewboard.settings')
+
+
+def make_function(rng, n):
+    lines = ['function func_%d(a, b) {' % n]
+
+    for i in range(rng.randint(5, 30)):
+        if rng.random() < 0.3:
+            lines.append('    %s' % rng.choice(COMMON_LINES))
+        else:
+            lines.append('    var v%d = compute_%d(a, b, %d);'
+                         % (i, n, rng.randrange(1000)))
+
+    lines += ['}', '']
+
+    return lines
+
+
+def make_refactor(num_functions, seed=0):
+    rng = random.Random(seed)
+    old_functions = [
+        make_function(rng, n)
+        for n in range(num_functions)
+    ]
+    new_functions = [
+        list(lines)
+        for lines in old_functions
+    ]
+
+    for i in range(num_functions // 3):
+        lines = new_functions.pop(rng.randrange(len(new_functions)))
+        new_functions.insert(rng.randrange(len(new_functions)), lines)
+
+    for lines in new_functions:
+        if rng.random() < 0.3:
+            lines[rng.randrange(1, len(lines) - 2)] = '    changed();'
+
+    return ([line for lines in old_functions for line in lines],
+            [line for lines in new_functions for line in lines])
+
+
+def detect_moves(generator_cls, differ, opcodes):
+    differ.get_opcodes = lambda: iter(opcodes)
+
+    start = time.time()
+    moved_from = {}
+
+    for group in generator_cls(differ):
+        moved_from.update(group[-1].get('moved-from', {}))
+
+    return time.time() - start, moved_from
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 300, 1000, 2000]
+
+    setup_django()
+
+    from reviewboard.diffviewer.differ import DiffCompatVersion
+    from reviewboard.diffviewer.myersdiff import MyersDiffer
+    from reviewboard.diffviewer.opcode_generator import DiffOpcodeGenerator
+
+    class UnlimitedDiffOpcodeGenerator(DiffOpcodeGenerator):
+        MOVE_MAX_CANDIDATES = None
+
+    for num_functions in sizes:
+        old, new = make_refactor(num_functions)
+        differ = MyersDiffer(
+            old, new,
+            compat_version=DiffCompatVersion.MYERS_FAST_MOVE_LIMIT)
+        opcodes = list(differ.get_opcodes())
+
+        limited_time, limited_moves = detect_moves(DiffOpcodeGenerator,
+                                                   differ, opcodes)
+        unlimited_time, unlimited_moves = detect_moves(
+            UnlimitedDiffOpcodeGenerator, differ, opcodes)
+
+        print('%d functions, %d lines' % (num_functions, len(old)))
+        print('    no limit:            %.3fs, %d moved lines'
+              % (unlimited_time, len(unlimited_moves)))
+        print('    MOVE_MAX_CANDIDATES: %.3fs, %d moved lines '
+              '(%d in common)'
+              % (limited_time, len(limited_moves),
+                 len(set(limited_moves.items()) &
+                     set(unlimited_moves.items()))))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+benchmark_partial_highlighting.py [num_lines ...]
+
+Times a cold (uncached) render of the chunks for generated Python files with
+a few small edits, with syntax highlighting of the entire files and with
+only the displayed lines highlighted (the
+diffviewer_partial_highlighting_threshold setting).
+
+The time taken to later highlight every collapsed chunk (as if the user
+expanded all of them) is also shown for partial highlighting, along with
+the number of lines whose highlighting differs from full highlighting.
+
+This requires a configured database, in order to load the site
+configuration. Settings changes made here are not saved.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import random
+import sys
+import time
+
+
+def setup_django():
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..', '..'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault(b'DJANGO_SETTINGS_MODULE', b'reviewboard.settings')
+
+
+def make_file(num_lines, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    n = 0
+
+    while len(lines) < num_lines:
+        lines += [
+            'def func_%d(a, b):' % n,
+            '    """Compute a value for func_%d.' % n,
+            '',
+            '    This is "documentation" for the function.',
+            '    """',
+        ]
+
+        for i in range(rng.randint(3, 20)):
+            lines.append('    v%d = compute(a, b, %d)  # step %d'
+                         % (i, rng.randrange(1000), i))
+
+        lines += ['    return "%d" %% v0' % n, '', '']
+        n += 1
+
+    return lines
+
+
+def make_edits(lines, num_edits, seed=0):
+    rng = random.Random(seed)
+    new_lines = list(lines)
+
+    for i in range(num_edits):
+        i = rng.randrange(len(new_lines))
+        new_lines.insert(i, '    changed(%d)' % i)
+
+    return new_lines
+
+
+def render(cls, old, new):
+    start = time.time()
+    chunks = list(cls(old, new, 'test.py', 'test.py').get_chunks_uncached())
+
+    return time.time() - start, chunks
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [2000, 10000, 50000]
+
+    setup_django()
+
+    from djblets.siteconfig.models import SiteConfiguration
+
+    from reviewboard.diffviewer.chunk_generator import (RawDiffChunkGenerator,
+                                                        get_highlighted_chunk)
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    siteconfig.set('diffviewer_syntax_highlighting_threshold', 0)
+
+    class BenchmarkChunkGenerator(RawDiffChunkGenerator):
+        STYLED_MAX_LIMIT_BYTES = sys.maxsize
+
+    for num_lines in sizes:
+        old_lines = make_file(num_lines)
+        old = '\n'.join(old_lines) + '\n'
+        new = '\n'.join(make_edits(old_lines, 5)) + '\n'
+
+        siteconfig.set('diffviewer_partial_highlighting_threshold', 0)
+        full_time, full_chunks = render(BenchmarkChunkGenerator, old, new)
+
+        siteconfig.set('diffviewer_partial_highlighting_threshold', 1)
+        partial_time, partial_chunks = render(BenchmarkChunkGenerator,
+                                              old, new)
+
+        start = time.time()
+        expanded_chunks = [
+            get_highlighted_chunk(chunk)
+            for chunk in partial_chunks
+        ]
+        expand_time = time.time() - start
+
+        num_different = sum(
+            1
+            for full_chunk, expanded_chunk in zip(full_chunks,
+                                                  expanded_chunks)
+            for full_line, expanded_line in zip(full_chunk['lines'],
+                                                expanded_chunk['lines'])
+            if (full_line[2] != expanded_line[2] or
+                full_line[5] != expanded_line[5])
+        )
+
+        print('%d lines, 5 edits' % len(old_lines))
+        print('    full highlighting:    %.3fs' % full_time)
+        print('    partial highlighting: %.3fs' % partial_time)
+        print('    expanding all chunks: %.3fs, %d lines differ'
+              % (expand_time, num_different))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+benchmark_patch.py [iterations]
+
+Compares the in-process patcher against the patch binary, using the files in
+reviewboard/diffviewer/testdata. Diffs are generated between each pair of
+"-old" and "-new" files in the corpus.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import difflib
+import os
+import sys
+import timeit
+
+
+def setup_django():
+    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..', '..'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault(b'DJANGO_SETTINGS_MODULE', b'reviewboard.settings')
+
+    return os.path.join(root_dir, 'reviewboard', 'diffviewer', 'testdata')
+
+
+def load_corpus(testdata_dir):
+    corpus = []
+
+    for dirpath, dirnames, filenames in os.walk(testdata_dir):
+        for filename in sorted(filenames):
+            if '-old.' not in filename:
+                continue
+
+            old_path = os.path.join(dirpath, filename)
+            new_path = os.path.join(dirpath,
+                                    filename.replace('-old.', '-new.'))
+
+            if not os.path.exists(new_path):
+                continue
+
+            with open(old_path, 'rb') as f:
+                old = f.read()
+
+            with open(new_path, 'rb') as f:
+                new = f.read()
+
+            diff = b''.join(difflib.unified_diff(
+                old.splitlines(True), new.splitlines(True),
+                filename, filename))
+            corpus.append((filename, old, new, diff))
+
+    return corpus
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2:
+        iterations = int(sys.argv[1])
+    else:
+        iterations = 100
+
+    testdata_dir = setup_django()
+
+    from reviewboard.diffviewer.diffutils import _patch_with_subprocess
+    from reviewboard.diffviewer.patcher import apply_patch
+
+    for filename, old, new, diff in load_corpus(testdata_dir):
+        assert apply_patch(diff, old, filename) == new
+        assert _patch_with_subprocess(diff, old, filename) == new
+
+        inprocess = timeit.timeit(lambda: apply_patch(diff, old, filename),
+                                  number=iterations)
+        subproc = timeit.timeit(
+            lambda: _patch_with_subprocess(diff, old, filename),
+            number=iterations)
+
+        print('%s (%d iterations)' % (filename, iterations))
+        print('    in-process: %.2fms/file' % (inprocess * 1000 / iterations))
+        print('    subprocess: %.2fms/file' % (subproc * 1000 / iterations))
+        print('    speedup:    %.1fx' % (subproc / inprocess))
@@ -6,6 +6,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserChangeForm, UserCreationForm
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
+from djblets.db.fields import CounterField
 
 from reviewboard.accounts.models import (ReviewRequestVisit, Profile,
                                          LocalSiteProfile)
@@ -148,6 +149,39 @@ def fix_review_counts():
     Group.objects.update(incoming_request_count=None)
 
 
+def reconcile_review_counts():
+    """Recompute the review counts, fixing any that are incorrect.
+
+    Unlike :py:func:`fix_review_counts`, this recomputes every counter right
+    away and reports which ones had drifted from their correct values.
+
+    Returns:
+        dict:
+        A dictionary mapping each counter (as ``Model.field_name``) to the
+        number of objects on which it was incorrect. Counters that were all
+        correct are not included.
+    """
+    fixed = {}
+
+    for model in (LocalSiteProfile, Group):
+        counter_fields = [
+            field
+            for field in model._meta.fields
+            if isinstance(field, CounterField)
+        ]
+
+        for obj in model.objects.iterator():
+            for field in counter_fields:
+                old_value = getattr(obj, field.attname)
+                getattr(obj, 'reinit_%s' % field.name)()
+
+                if getattr(obj, field.attname) != old_value:
+                    key = '%s.%s' % (model.__name__, field.name)
+                    fixed[key] = fixed.get(key, 0) + 1
+
+    return fixed
+
+
 # Get rid of the old User admin model, and replace it with our own.
 admin.site.unregister(User)
 admin.site.register(User, RBUserAdmin)
@@ -55,6 +55,7 @@ from reviewboard.admin.checks import (get_can_use_amazon_s3,
 from reviewboard.admin.siteconfig import load_site_config
 from reviewboard.admin.support import get_install_key
 from reviewboard.avatars import avatar_services
+from reviewboard.diffviewer.chunk_serializer import get_available_compressions
 from reviewboard.search import search_backend_registry
 from reviewboard.ssh.client import SSHClient
 
@@ -157,6 +158,63 @@ class GeneralSettingsForm(SiteSettingsForm):
             'required': 'A valid cache host must be provided.'
         })
 
+    cache_local_max_size_mb = forms.IntegerField(
+        label=_('Local Cache Size (MB)'),
+        help_text=_('The maximum amount of memory used by each server '
+                    'process for its own cache of data that never changes '
+                    '(such as files from repositories), in front of the '
+                    'main cache. Enter 0 to disable the local cache.'),
+        min_value=0,
+        required=True,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    webhooks_dispatch_workers = forms.IntegerField(
+        label=_('WebHook Workers'),
+        help_text=_('The number of background threads in each server '
+                    'process used to send WebHook requests. Enter 0 to send '
+                    'them while publishing, which makes publishing wait '
+                    'for every WebHook.'),
+        min_value=0,
+        required=True,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    webhooks_timeout = forms.IntegerField(
+        label=_('WebHook Timeout'),
+        help_text=_('The number of seconds to wait for a WebHook server to '
+                    'respond.'),
+        min_value=1,
+        required=True,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    webhooks_max_retries = forms.IntegerField(
+        label=_('WebHook Retries'),
+        help_text=_('The number of times to retry a WebHook request that '
+                    'fails due to a connection or server error, waiting '
+                    'longer before each retry. Retries require WebHook '
+                    'workers. Pending retries are kept in memory, and are '
+                    'lost if the server process exits or is restarted.'),
+        min_value=0,
+        required=True,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    hosting_service_http_timeout = forms.IntegerField(
+        label=_('Hosting Service Timeout'),
+        help_text=_('The number of seconds to wait for a hosting service or '
+                    'repository web server to respond.'),
+        min_value=1,
+        required=True,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    dashboard_inbox_enabled = forms.BooleanField(
+        label=_('Use materialized dashboard inboxes'),
+        help_text=_('Keeps a table of the review requests assigned to each '
+                    'user, making the incoming views of the dashboard '
+                    'faster for users in many groups, at the cost of extra '
+                    'work when review requests and groups change. After '
+                    'enabling this, run "rb-site manage /path/to/site '
+                    'rebuildinbox" to add existing review requests.'),
+        required=False)
+
     def load(self):
         """Load the form."""
         domain_method = self.siteconfig.get("site_domain_method")
@@ -368,7 +426,24 @@ class GeneralSettingsForm(SiteSettingsForm):
             {
                 'classes': ('wide',),
                 'title': _('Cache Settings'),
-                'fields': ('cache_type', 'cache_path', 'cache_host'),
+                'fields': ('cache_type', 'cache_path', 'cache_host',
+                           'cache_local_max_size_mb'),
+            },
+            {
+                'classes': ('wide',),
+                'title': _('WebHook Settings'),
+                'fields': ('webhooks_dispatch_workers', 'webhooks_timeout',
+                           'webhooks_max_retries'),
+            },
+            {
+                'classes': ('wide',),
+                'title': _('Hosting Service Settings'),
+                'fields': ('hosting_service_http_timeout',),
+            },
+            {
+                'classes': ('wide',),
+                'title': _('Dashboard Settings'),
+                'fields': ('dashboard_inbox_enabled',),
             },
         )
 
@@ -747,6 +822,15 @@ class DiffSettingsForm(SiteSettingsForm):
         required=False,
         widget=forms.TextInput(attrs={'size': '5'}))
 
+    diffviewer_partial_highlighting_threshold = forms.IntegerField(
+        label=_("Partial syntax highlighting threshold"),
+        help_text=_("Files with lines greater than this number will only "
+                    "have the lines being displayed syntax-highlighted. "
+                    "Collapsed lines will be highlighted when expanded. "
+                    "Enter 0 to always highlight entire files."),
+        required=False,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
     diffviewer_show_trailing_whitespace = forms.BooleanField(
         label=_("Show trailing whitespace"),
         help_text=_("Show excess trailing whitespace as red blocks. This "
@@ -789,12 +873,93 @@ class DiffSettingsForm(SiteSettingsForm):
                     'to disable size restrictions.'),
         widget=forms.TextInput(attrs={'size': '15'}))
 
+    diffviewer_chunk_generator_workers = forms.IntegerField(
+        label=_('Diff generation workers'),
+        help_text=_('The number of worker processes, kept running in each '
+                    'web server process, used to generate diffs for '
+                    'multiple files at once. Enter 1 to generate diffs one '
+                    'file at a time.'),
+        min_value=1,
+        initial=1,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_prerender_workers = forms.IntegerField(
+        label=_('Diff pre-rendering workers'),
+        help_text=_('The number of background threads used to render new '
+                    'diffs when they are uploaded or published, so they '
+                    'are ready before anyone views them. Enter 0 to '
+                    'disable pre-rendering.'),
+        min_value=0,
+        initial=0,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_chunk_cache_compression = forms.ChoiceField(
+        label=_('Diff cache compression'),
+        choices=(
+            ('none', _('None')),
+            ('zlib', _('zlib')),
+            ('lz4', _('lz4 (requires the lz4 module)')),
+        ),
+        help_text=_('How rendered diffs are compressed in the cache. lz4 '
+                    'is faster to load, but uses more cache space.'),
+        required=True)
+
+    diffviewer_diff_compression = forms.ChoiceField(
+        label=_('Diff storage compression'),
+        choices=(
+            ('bzip2', _('bzip2 (smallest, slowest to load)')),
+            ('zlib-1', _('zlib, fastest compression')),
+            ('zlib-6', _('zlib, balanced')),
+            ('zlib-9', _('zlib, best compression')),
+            ('lz4', _('lz4 (requires the lz4 module)')),
+            ('zstd', _('zstd (requires the zstandard module)')),
+        ),
+        help_text=_('How newly uploaded diffs are compressed in the '
+                    'database. Existing diffs can be converted using the '
+                    'recompressdiffs management command.'),
+        required=True)
+
+    diffviewer_file_blob_store = forms.ChoiceField(
+        label=_('File storage'),
+        choices=(
+            ('', _('Disabled')),
+            ('local', _('Local data directory')),
+            ('database', _('Database')),
+        ),
+        help_text=_('Where to keep copies of original and patched files '
+                    'once they have been fetched from the repository. '
+                    'This avoids fetching and patching them again when '
+                    'diffs are re-rendered. Stored files are never removed, '
+                    'so make sure there is room for a copy of every file '
+                    'that is viewed in a diff.'),
+        required=False)
+
+    diffviewer_file_blob_store_path = forms.CharField(
+        label=_('File storage path'),
+        help_text=_('The directory used for local file storage. Defaults to '
+                    'the "file-blobs" directory in the site\'s data '
+                    'directory.'),
+        required=False,
+        widget=forms.TextInput(attrs={'size': '60'}))
+
     def load(self):
         """Load the form."""
         super(DiffSettingsForm, self).load()
         self.fields['include_space_patterns'].initial = \
             ', '.join(self.siteconfig.get('diffviewer_include_space_patterns'))
 
+    def clean_diffviewer_chunk_cache_compression(self):
+        """Validate that the selected compression method is available."""
+        compression = self.cleaned_data['diffviewer_chunk_cache_compression']
+
+        if compression not in get_available_compressions():
+            raise ValidationError(
+                ugettext('The "%s" compression method requires a module '
+                         'that is not installed.')
+                % compression)
+
+        return compression
+
     def save(self):
         """Save the form."""
         self.siteconfig.set(
@@ -811,6 +976,7 @@ class DiffSettingsForm(SiteSettingsForm):
                 'classes': ('wide',),
                 'fields': ('diffviewer_syntax_highlighting',
                            'diffviewer_syntax_highlighting_threshold',
+                           'diffviewer_partial_highlighting_threshold',
                            'diffviewer_show_trailing_whitespace',
                            'include_space_patterns'),
             },
@@ -825,7 +991,13 @@ class DiffSettingsForm(SiteSettingsForm):
                 'fields': ('diffviewer_max_diff_size',
                            'diffviewer_context_num_lines',
                            'diffviewer_paginate_by',
-                           'diffviewer_paginate_orphans')
+                           'diffviewer_paginate_orphans',
+                           'diffviewer_chunk_generator_workers',
+                           'diffviewer_prerender_workers',
+                           'diffviewer_chunk_cache_compression',
+                           'diffviewer_diff_compression',
+                           'diffviewer_file_blob_store',
+                           'diffviewer_file_blob_store_path')
             }
         )
 
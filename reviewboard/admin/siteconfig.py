@@ -140,16 +140,26 @@ defaults.update({
     'auth_x509_username_field': 'SSL_CLIENT_S_DN_CN',
     'auth_x509_username_regex': '',
     'auth_x509_autocreate_users': False,
+    'cache_local_max_size_mb': 32,
     'company': '',
+    'dashboard_inbox_enabled': False,
     'default_use_rich_text': True,
+    'diffviewer_chunk_cache_compression': 'zlib',
+    'diffviewer_chunk_generator_workers': 1,
     'diffviewer_context_num_lines': 5,
+    'diffviewer_diff_compression': 'zlib-6',
+    'diffviewer_file_blob_store': '',
+    'diffviewer_file_blob_store_path': '',
     'diffviewer_include_space_patterns': [],
     'diffviewer_max_diff_size': 0,
     'diffviewer_paginate_by': 20,
     'diffviewer_paginate_orphans': 10,
+    'diffviewer_prerender_workers': 0,
     'diffviewer_syntax_highlighting': True,
     'diffviewer_syntax_highlighting_threshold': 0,
+    'diffviewer_partial_highlighting_threshold': 0,
     'diffviewer_show_trailing_whitespace': True,
+    'hosting_service_http_timeout': 60,
     'integration_gravatars': True,
     'mail_send_review_mail': False,
     'mail_send_new_user_mail': False,
@@ -158,6 +168,9 @@ defaults.update({
     'search_enable': False,
     'send_support_usage_stats': True,
     'site_domain_method': 'http',
+    'webhooks_dispatch_workers': 4,
+    'webhooks_max_retries': 3,
+    'webhooks_timeout': 10,
 
     'search_results_per_page': 20,
     'search_backend_id': WhooshBackend.search_backend_id,
@@ -24,6 +24,7 @@ from reviewboard.admin.support import get_support_url, serialize_support_data
 from reviewboard.admin.widgets import (dynamic_activity_data,
                                        primary_widgets,
                                        secondary_widgets)
+from reviewboard.cache.local import get_local_cache
 from reviewboard.ssh.client import SSHClient
 from reviewboard.ssh.utils import humanize_key
 
@@ -110,10 +111,17 @@ def cache_stats(request, template_name="admin/cache_stats.html"):
     """
     cache_stats = get_cache_stats()
     cache_info = settings.CACHES[DEFAULT_FORWARD_CACHE_ALIAS]
+    local_cache = get_local_cache()
+
+    if local_cache is None:
+        local_cache_stats = None
+    else:
+        local_cache_stats = local_cache.get_stats()
 
     return render_to_response(template_name, RequestContext(request, {
         'cache_hosts': cache_stats,
         'cache_backend': cache_info['BACKEND'],
+        'local_cache_stats': local_cache_stats,
         'title': _("Server Cache"),
         'root_path': settings.SITE_ROOT + "admin/db/"
     }))
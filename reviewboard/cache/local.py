@@ -0,0 +1,263 @@
+"""An in-process cache for values that never change.
+
+Some values, such as files fetched from repositories and decompressed diffs,
+are used many times per page and across pages, but never change once they've
+been computed. Fetching them from the cache server every time still costs a
+round trip (and often decompression).
+
+:py:class:`LocalLRUCache` keeps a bounded amount of such values in the
+memory of each process, in front of the main cache, evicting the
+least-recently-used values when full. The size is set by the
+``cache_local_max_size_mb`` setting. The cache is disabled when this is 0.
+
+Only values that never change for a key may be stored here, since entries
+can't be invalidated in other processes.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+import threading
+from collections import OrderedDict
+
+from django.utils import six
+from djblets.siteconfig.models import SiteConfiguration
+
+
+_NO_VALUE = object()
+
+
+class LocalLRUCache(object):
+    """A thread-safe, least-recently-used cache bounded by size in bytes.
+
+    The size of each value is estimated when it's stored, using
+    :py:func:`get_value_size`.
+
+    Attributes:
+        hits (int):
+            The number of lookups that found a value.
+
+        misses (int):
+            The number of lookups that didn't find a value.
+
+        evictions (int):
+            The number of values removed to make room for others.
+
+        max_size (int):
+            The maximum total size of values, in bytes.
+
+        size (int):
+            The current total size of values, in bytes.
+    """
+
+    def __init__(self, max_size):
+        """Initialize the cache.
+
+        Args:
+            max_size (int):
+                The maximum total size of values, in bytes.
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return a value from the cache.
+
+        Args:
+            key (unicode):
+                The key for the value.
+
+            default (object, optional):
+                The value to return if the key is not in the cache.
+
+        Returns:
+            object:
+            The value, or ``default``.
+        """
+        with self._lock:
+            try:
+                item = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+
+                return default
+
+            # Re-insert the item to mark it as the most recently used.
+            self._items[key] = item
+            self.hits += 1
+
+            return item[0]
+
+    def set(self, key, value):
+        """Store a value in the cache.
+
+        Values larger than the maximum size of the cache are not stored.
+
+        Args:
+            key (unicode):
+                The key for the value.
+
+            value (object):
+                The value to store.
+        """
+        size = get_value_size(value)
+
+        with self._lock:
+            old_item = self._items.pop(key, None)
+
+            if old_item is not None:
+                self.size -= old_item[1]
+
+            if size <= self.max_size:
+                self._items[key] = (value, size)
+                self.size += size
+                self._trim()
+
+    def resize(self, max_size):
+        """Change the maximum size of the cache.
+
+        Args:
+            max_size (int):
+                The new maximum total size of values, in bytes.
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._trim()
+
+    def clear(self):
+        """Remove all values from the cache."""
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def get_stats(self):
+        """Return statistics on the cache.
+
+        Returns:
+            dict:
+            A dictionary containing the ``hits``, ``misses``, ``evictions``,
+            ``num_items``, ``size``, ``max_size``, and ``hit_rate`` (as a
+            percentage) for the cache.
+        """
+        with self._lock:
+            num_lookups = self.hits + self.misses
+
+            if num_lookups:
+                hit_rate = 100 * self.hits // num_lookups
+            else:
+                hit_rate = 0
+
+            return {
+                'evictions': self.evictions,
+                'hit_rate': hit_rate,
+                'hits': self.hits,
+                'max_size': self.max_size,
+                'misses': self.misses,
+                'num_items': len(self._items),
+                'size': self.size,
+            }
+
+    def _trim(self):
+        """Evict the least-recently-used values until the cache fits.
+
+        This must be called with the lock held.
+        """
+        while self.size > self.max_size:
+            key, (value, size) = self._items.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+
+def get_value_size(value):
+    """Return the approximate size of a value in memory.
+
+    This includes the contents of lists, tuples, and dictionaries.
+
+    Args:
+        value (object):
+            The value.
+
+    Returns:
+        int:
+        The approximate size of the value, in bytes.
+    """
+    size = sys.getsizeof(value)
+
+    if isinstance(value, (list, tuple)):
+        size += sum(get_value_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(get_value_size(key) + get_value_size(item)
+                    for key, item in six.iteritems(value))
+
+    return size
+
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+
+def get_local_cache():
+    """Return the in-process cache.
+
+    Returns:
+        LocalLRUCache:
+        The cache, or ``None`` if it's disabled.
+    """
+    global _local_cache
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    max_size = siteconfig.get('cache_local_max_size_mb') * 1024 * 1024
+
+    with _local_cache_lock:
+        if not max_size:
+            _local_cache = None
+        elif _local_cache is None:
+            _local_cache = LocalLRUCache(max_size)
+        elif _local_cache.max_size != max_size:
+            _local_cache.resize(max_size)
+
+        return _local_cache
+
+
+def local_cache_memoize(key, lookup_callable, force_overwrite=False):
+    """Return a value from the in-process cache, computing it if missing.
+
+    If the in-process cache is disabled, the value is always computed.
+
+    Args:
+        key (unicode):
+            The key for the value. This must uniquely identify the value
+            across all sites and versions of the data.
+
+        lookup_callable (callable):
+            The function used to compute the value.
+
+        force_overwrite (bool, optional):
+            Whether to compute and store the value even if it's already in
+            the cache.
+
+    Returns:
+        object:
+        The value from the cache or from ``lookup_callable``.
+    """
+    local_cache = get_local_cache()
+
+    if local_cache is None:
+        return lookup_callable()
+
+    if not force_overwrite:
+        value = local_cache.get(key, _NO_VALUE)
+
+        if value is not _NO_VALUE:
+            return value
+
+    value = lookup_callable()
+    local_cache.set(key, value)
+
+    return value
@@ -0,0 +1,798 @@
+"""Memoization of expensive values, with protection against cache stampedes.
+
+When a popular value falls out of the cache, every request that needs it
+will try to compute it at the same time. For diff chunks and repository
+files, that means many identical diffs being generated, or many identical
+fetches from the repository, all at once.
+
+:py:func:`cache_memoize_once` works like
+:py:func:`djblets.cache.backend.cache_memoize`, but only lets one caller
+compute a missing value. Threads in a process wait on a lock for the key,
+and processes coordinate through a short-lived lease stored in the cache.
+Callers that find the value being computed elsewhere wait for that to
+finish, and then use the result from the cache. If computing the value
+fails, the error is kept in the cache briefly and raised to those callers,
+rather than each of them trying again.
+
+Values that never change can also be kept in an in-process cache in front of
+the main cache (see :py:mod:`reviewboard.cache.local`).
+
+:py:func:`cache_memoize_many_once` does the same for several values at once,
+loading the cached values in as few round trips to the cache server as
+possible, and computing the missing values together.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import six
+from django.utils.six.moves import cPickle as pickle
+from django.utils.six.moves import cStringIO as StringIO
+from djblets.cache.backend import (DEFAULT_EXPIRATION_TIME, cache_memoize,
+                                   make_cache_key)
+
+from reviewboard.cache.local import get_local_cache, local_cache_memoize
+
+
+#: The default number of seconds a lease for computing a value is held for.
+#:
+#: If the process holding a lease dies, other processes can compute the
+#: value once this much time has passed.
+DEFAULT_LEASE_TIMEOUT = 60
+
+#: The default number of seconds to wait for a value computed elsewhere.
+#:
+#: Once this much time has passed, the caller will compute the value itself.
+DEFAULT_WAIT_TIMEOUT = 30
+
+#: The initial number of seconds between checks for a value computed by
+#: another process. This doubles after each check.
+POLL_INTERVAL_SECS = 0.1
+
+#: The maximum number of seconds between checks for a value computed by
+#: another process.
+MAX_POLL_INTERVAL_SECS = 1.0
+
+#: The number of seconds an error from computing a value is kept for.
+#:
+#: During this time, callers looking up the value will receive the error
+#: instead of computing the value again.
+FAILURE_EXPIRATION = 10
+
+
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+_NO_VALUE = object()
+
+
+class _CacheMiss(Exception):
+    """Raised when a value being looked up is not in the cache."""
+
+
+def _raise_cache_miss():
+    """Raise _CacheMiss.
+
+    This is passed to :py:func:`~djblets.cache.backend.cache_memoize` in
+    order to fetch a value from the cache without computing it.
+
+    Raises:
+        _CacheMiss:
+            Always raised.
+    """
+    raise _CacheMiss()
+
+
+def cache_memoize_once(key, lookup_callable, refresh_after=None,
+                       immutable=False,
+                       lease_timeout=DEFAULT_LEASE_TIMEOUT,
+                       wait_timeout=DEFAULT_WAIT_TIMEOUT, **kwargs):
+    """Return a value from the cache, computing it only once if missing.
+
+    If the value is in the cache, this behaves the same as
+    :py:func:`~djblets.cache.backend.cache_memoize`. If it's not, then only
+    one caller (across all threads and processes sharing the cache) will call
+    ``lookup_callable`` to compute it. Any other callers will wait for that
+    to finish and then return the stored value.
+
+    If ``lookup_callable`` raises an exception, the exception's class and
+    message are stored in the cache for :py:data:`FAILURE_EXPIRATION`
+    seconds. Any callers waiting on the value, or looking it up during that
+    time, will have an equivalent exception raised instead of computing the
+    value again. Exceptions that can't be rebuilt from their message alone
+    (such as those taking other arguments) aren't shared, and those callers
+    will compute the value themselves.
+
+    Values that never change for a key can be kept from expiring by passing
+    ``refresh_after``. Once a value has been in the cache for that many
+    seconds, the next caller to fetch it extends its lifetime in the cache
+    while any other callers continue to use it as-is. This prevents a
+    frequently-used value from ever being recomputed, without making any
+    caller wait.
+
+    Values that never change for a key can also be marked as ``immutable``.
+    These are kept in an in-process cache (see
+    :py:mod:`reviewboard.cache.local`), avoiding round trips to the cache
+    server when they're used again.
+
+    Args:
+        key (unicode):
+            The key for the value in the cache.
+
+        lookup_callable (callable):
+            The function used to compute the value.
+
+        refresh_after (int, optional):
+            The number of seconds after which an existing value is stored in
+            the cache again. This must be less than the expiration time of
+            the value, and should only be used for values that never change.
+
+        immutable (bool, optional):
+            Whether the value never changes for the key. If set, the value
+            will be kept in the in-process cache.
+
+        lease_timeout (int, optional):
+            The maximum number of seconds that a process can hold the right
+            to compute the value.
+
+        wait_timeout (int, optional):
+            The maximum number of seconds to wait for another process to
+            compute the value, after which it will be computed here.
+
+        **kwargs (dict):
+            Additional keyword arguments to pass to
+            :py:func:`~djblets.cache.backend.cache_memoize`. If
+            ``force_overwrite`` is set, the value is computed and stored
+            without waiting on any other callers.
+
+    Returns:
+        object:
+        The value from the cache or from ``lookup_callable``.
+
+    Raises:
+        Exception:
+            The exception raised by ``lookup_callable``, either here or for
+            another caller.
+    """
+    if immutable:
+        return local_cache_memoize(
+            make_cache_key(key),
+            lambda: cache_memoize_once(key, lookup_callable,
+                                       refresh_after=refresh_after,
+                                       lease_timeout=lease_timeout,
+                                       wait_timeout=wait_timeout,
+                                       **kwargs),
+            force_overwrite=kwargs.get('force_overwrite', False))
+
+    if kwargs.get('force_overwrite'):
+        result = cache_memoize(key, lookup_callable, **kwargs)
+
+        if refresh_after:
+            cache.set(_make_fresh_key(key), True, refresh_after)
+
+        return result
+
+    try:
+        result = cache_memoize(key, _raise_cache_miss, **kwargs)
+    except _CacheMiss:
+        pass
+    else:
+        if refresh_after:
+            _refresh_if_stale(key, result, refresh_after, lease_timeout,
+                              kwargs)
+
+        return result
+
+    with _lock_key(key):
+        # Another thread in this process may have computed the value while
+        # we were waiting for the lock.
+        try:
+            return cache_memoize(key, _raise_cache_miss, **kwargs)
+        except _CacheMiss:
+            pass
+
+        _raise_failure(key)
+
+        lease_key = _make_lease_key(key)
+        has_lease = _wait_for_lease(key, lease_key, lease_timeout,
+                                    wait_timeout)
+        computed = []
+
+        def _compute():
+            computed.append(True)
+
+            return lookup_callable()
+
+        try:
+            # If whoever held the lease failed to compute the value, use
+            # their error.
+            _raise_failure(key)
+
+            # If another process stored the value while we waited, this will
+            # return it. Otherwise, it'll be computed and stored here.
+            result = cache_memoize(key, _compute, **kwargs)
+
+            if computed and refresh_after:
+                cache.set(_make_fresh_key(key), True, refresh_after)
+        except Exception as e:
+            if computed:
+                _store_failure(key, e)
+
+            raise
+        finally:
+            if has_lease:
+                cache.delete(lease_key)
+
+        return result
+
+
+def cache_memoize_many_once(keys, lookup_callable, lookup_many_callable,
+                            refresh_after=None, immutable=False,
+                            lease_timeout=DEFAULT_LEASE_TIMEOUT,
+                            wait_timeout=DEFAULT_WAIT_TIMEOUT, **kwargs):
+    """Return several values from the cache, computing missing ones once.
+
+    This works like :py:func:`cache_memoize_once`, but for many keys at once.
+    The cached values (including those stored with ``large_data``) are
+    loaded in a couple of requests to the cache server, rather than a few
+    requests per key.
+
+    The leases for the missing values are then taken, and the values whose
+    leases were acquired are computed together through
+    ``lookup_many_callable``. Values already being computed elsewhere are
+    waited on through :py:func:`cache_memoize_once`, computing them through
+    ``lookup_callable`` if that times out.
+
+    Any exceptions returned by ``lookup_many_callable`` or raised by
+    ``lookup_callable`` are returned in place of the value. As with
+    :py:func:`cache_memoize_once`, these are kept in the cache for
+    :py:data:`FAILURE_EXPIRATION` seconds, and returned for those keys
+    until then, if they can be rebuilt from their messages.
+
+    Args:
+        keys (list of unicode):
+            The keys for the values in the cache. These may contain
+            duplicates.
+
+        lookup_callable (callable):
+            The function used to compute a single value. This takes the key
+            as an argument.
+
+        lookup_many_callable (callable):
+            The function used to compute several values. This takes a list
+            of keys, and returns a list with a value or exception for each.
+
+        refresh_after (int, optional):
+            The number of seconds after which an existing value is stored in
+            the cache again. See :py:func:`cache_memoize_once`.
+
+        immutable (bool, optional):
+            Whether the values never change for their keys. If set, the
+            values will be kept in the in-process cache.
+
+        lease_timeout (int, optional):
+            The maximum number of seconds that a process can hold the right
+            to compute a value.
+
+        wait_timeout (int, optional):
+            The maximum number of seconds to wait for another process to
+            compute a value, after which it will be computed here.
+
+        **kwargs (dict):
+            Additional keyword arguments to pass to
+            :py:func:`~djblets.cache.backend.cache_memoize`.
+
+    Returns:
+        list:
+        The value or exception for each key, in order.
+    """
+    results = {}
+    unique_keys = []
+
+    for key in keys:
+        if key not in results:
+            results[key] = _NO_VALUE
+            unique_keys.append(key)
+
+    if immutable:
+        local_cache = get_local_cache()
+    else:
+        local_cache = None
+
+    if local_cache is not None:
+        for key in unique_keys:
+            results[key] = local_cache.get(make_cache_key(key), _NO_VALUE)
+
+    cached = _cache_get_many(
+        [
+            key
+            for key in unique_keys
+            if results[key] is _NO_VALUE
+        ],
+        large_data=kwargs.get('large_data', False),
+        compress_large_data=kwargs.get('compress_large_data', True))
+
+    if cached and refresh_after:
+        fresh = cache.get_many([
+            _make_fresh_key(key)
+            for key in cached
+        ])
+
+        for key, value in six.iteritems(cached):
+            if _make_fresh_key(key) not in fresh:
+                _refresh_if_stale(key, value, refresh_after, lease_timeout,
+                                  kwargs)
+
+    for key, value in six.iteritems(cached):
+        results[key] = value
+
+        if local_cache is not None:
+            local_cache.set(make_cache_key(key), value)
+
+    missing_keys = [
+        key
+        for key in unique_keys
+        if results[key] is _NO_VALUE
+    ]
+
+    if missing_keys:
+        failures = cache.get_many([
+            _make_failure_key(key)
+            for key in missing_keys
+        ])
+
+        if failures:
+            for key in missing_keys:
+                failure = failures.get(_make_failure_key(key))
+
+                if failure is not None:
+                    error = _load_failure(failure)
+
+                    if error is not None:
+                        results[key] = error
+
+            missing_keys = [
+                key
+                for key in missing_keys
+                if results[key] is _NO_VALUE
+            ]
+
+    if missing_keys:
+        leased_keys = [
+            key
+            for key in missing_keys
+            if cache.add(_make_lease_key(key), True, lease_timeout)
+        ]
+
+        if leased_keys:
+            try:
+                values = lookup_many_callable(leased_keys)
+
+                for key, value in zip(leased_keys, values):
+                    if isinstance(value, Exception):
+                        _store_failure(key, value)
+                    else:
+                        cache_memoize(key, lambda: value,
+                                      **dict(kwargs, force_overwrite=True))
+
+                        if refresh_after:
+                            cache.set(_make_fresh_key(key), True,
+                                      refresh_after)
+
+                        if local_cache is not None:
+                            local_cache.set(make_cache_key(key), value)
+
+                    results[key] = value
+            finally:
+                cache.delete_many([
+                    _make_lease_key(key)
+                    for key in leased_keys
+                ])
+
+        # The rest are being computed elsewhere.
+        for key in missing_keys:
+            if results[key] is _NO_VALUE:
+                try:
+                    results[key] = cache_memoize_once(
+                        key,
+                        lambda: lookup_callable(key),
+                        refresh_after=refresh_after,
+                        immutable=immutable,
+                        lease_timeout=lease_timeout,
+                        wait_timeout=wait_timeout,
+                        **kwargs)
+                except Exception as e:
+                    results[key] = e
+
+    return [
+        results[key]
+        for key in keys
+    ]
+
+
+def _cache_get_many(keys, large_data=False, compress_large_data=True):
+    """Return the values stored in the cache for several keys.
+
+    Values stored with ``large_data`` are split across several cache entries
+    by :py:func:`~djblets.cache.backend.cache_memoize`: a main entry holding
+    the number of chunks, and an entry for each chunk of the pickled (and
+    possibly compressed) value. The main entries for all the keys are loaded
+    together, followed by all of their chunks.
+
+    Args:
+        keys (list of unicode):
+            The keys for the values.
+
+        large_data (bool, optional):
+            Whether the values were stored with ``large_data``.
+
+        compress_large_data (bool, optional):
+            Whether the large data values were compressed.
+
+    Returns:
+        dict:
+        A dictionary mapping the keys found in the cache to their values.
+    """
+    if not keys:
+        return {}
+
+    full_keys = dict(
+        (key, make_cache_key(key))
+        for key in keys
+    )
+    entries = cache.get_many(list(six.itervalues(full_keys)))
+
+    if not large_data:
+        return dict(
+            (key, entries[full_key])
+            for key, full_key in six.iteritems(full_keys)
+            if full_key in entries
+        )
+
+    chunk_keys = {}
+
+    for key, full_key in six.iteritems(full_keys):
+        try:
+            chunk_count = int(entries[full_key])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+        chunk_keys[key] = [
+            make_cache_key('%s-%d' % (key, i))
+            for i in range(chunk_count)
+        ]
+
+    chunks = cache.get_many([
+        chunk_key
+        for key_chunk_keys in six.itervalues(chunk_keys)
+        for chunk_key in key_chunk_keys
+    ])
+    results = {}
+
+    for key, key_chunk_keys in six.iteritems(chunk_keys):
+        if not all(chunk_key in chunks for chunk_key in key_chunk_keys):
+            continue
+
+        try:
+            data = b''.join(
+                chunks[chunk_key][0]
+                for chunk_key in key_chunk_keys
+            )
+
+            if compress_large_data:
+                data = zlib.decompress(data)
+
+            results[key] = pickle.load(StringIO(data))
+        except Exception as e:
+            logging.warning('Unable to load large data from the cache for '
+                            'key "%s": %s',
+                            key, e)
+
+    return results
+
+
+@contextmanager
+def _lock_key(key):
+    """Hold a lock for a key within this process.
+
+    Args:
+        key (unicode):
+            The cache key to lock.
+    """
+    with _key_locks_lock:
+        entry = _key_locks.get(key)
+
+        if entry is None:
+            entry = [threading.Lock(), 0]
+            _key_locks[key] = entry
+
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_lock:
+            entry[1] -= 1
+
+            if entry[1] == 0:
+                del _key_locks[key]
+
+
+def _wait_for_lease(key, lease_key, lease_timeout, wait_timeout):
+    """Acquire the lease for computing a value.
+
+    This waits until either the lease is acquired, the value (or an error
+    computing it) is stored in the cache by whoever holds the lease, or the
+    wait times out.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+        lease_key (unicode):
+            The full cache key for the lease.
+
+        lease_timeout (int):
+            The maximum number of seconds to hold the lease for.
+
+        wait_timeout (int):
+            The maximum number of seconds to wait.
+
+    Returns:
+        bool:
+        Whether the lease was acquired.
+    """
+    full_key = make_cache_key(key)
+    end_time = time.time() + wait_timeout
+    interval = POLL_INTERVAL_SECS
+
+    failure_key = _make_failure_key(key)
+
+    while not cache.add(lease_key, True, lease_timeout):
+        remaining = end_time - time.time()
+
+        if remaining <= 0:
+            logging.warning('Timed out waiting for another process to '
+                            'compute cache key "%s". Computing it here.',
+                            key)
+            return False
+
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, MAX_POLL_INTERVAL_SECS)
+
+        if cache.get_many([full_key, failure_key]):
+            return False
+
+    return True
+
+
+def _refresh_if_stale(key, value, refresh_after, lease_timeout, kwargs):
+    """Extend the lifetime of a value in the cache if it's due to be
+    refreshed.
+
+    The value's entries in the cache are touched, giving them a new
+    expiration time without sending the value to the cache server again.
+    If the cache backend can't do this, the value is stored again instead.
+
+    Only one caller refreshes the value. Any others that find it stale while
+    that happens will continue on without waiting.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+        value (object):
+            The value loaded from the cache.
+
+        refresh_after (int):
+            The number of seconds until the value should next be refreshed.
+
+        lease_timeout (int):
+            The maximum number of seconds to hold the lease for.
+
+        kwargs (dict):
+            The keyword arguments for
+            :py:func:`~djblets.cache.backend.cache_memoize`.
+    """
+    fresh_key = _make_fresh_key(key)
+
+    if cache.get(fresh_key) is not None:
+        return
+
+    lease_key = _make_lease_key(key)
+
+    if cache.add(lease_key, True, lease_timeout):
+        try:
+            if not _touch_value(key, kwargs):
+                cache_memoize(key, lambda: value,
+                              **dict(kwargs, force_overwrite=True))
+
+            cache.set(fresh_key, True, refresh_after)
+        finally:
+            cache.delete(lease_key)
+
+
+def _touch_value(key, kwargs):
+    """Give a value in the cache a new expiration time.
+
+    This requires a cache backend that supports ``touch()``, or a memcached
+    backend whose client does.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+        kwargs (dict):
+            The keyword arguments for
+            :py:func:`~djblets.cache.backend.cache_memoize`.
+
+    Returns:
+        bool:
+        Whether all of the value's entries in the cache were touched.
+    """
+    touch = getattr(cache, 'touch', None)
+
+    if touch is None:
+        # Older versions of Django don't support touch(), but the memcached
+        # clients do.
+        client_touch = getattr(getattr(cache, '_cache', None), 'touch', None)
+
+        if client_touch is None:
+            return False
+
+        def touch(full_key, timeout):
+            return client_touch(cache.make_key(full_key),
+                                cache._get_memcache_timeout(timeout))
+
+    expiration = kwargs.get(
+        'expiration',
+        getattr(settings, 'CACHE_EXPIRATION_TIME', DEFAULT_EXPIRATION_TIME))
+    full_key = make_cache_key(key)
+    full_keys = [full_key]
+
+    if kwargs.get('large_data'):
+        try:
+            chunk_count = int(cache.get(full_key))
+        except (TypeError, ValueError):
+            return False
+
+        full_keys += [
+            make_cache_key('%s-%d' % (key, i))
+            for i in range(chunk_count)
+        ]
+
+    return all(
+        touch(full_key, expiration)
+        for full_key in full_keys
+    )
+
+
+def _store_failure(key, error):
+    """Store an error from computing a value in the cache.
+
+    The exception itself isn't stored, since many exceptions can't be
+    unpickled (any that take arguments other than a message), and would
+    break loading from the cache. Instead, the class and message are
+    stored, for :py:func:`_load_failure` to rebuild the exception from.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+        error (Exception):
+            The error from computing the value.
+    """
+    error_cls = type(error)
+
+    try:
+        failure = ('%s.%s' % (error_cls.__module__, error_cls.__name__),
+                   six.text_type(error))
+        cache.set(_make_failure_key(key), failure, FAILURE_EXPIRATION)
+    except Exception as e:
+        logging.warning('Unable to store the error computing cache key '
+                        '"%s": %s',
+                        key, e)
+
+
+def _load_failure(failure):
+    """Rebuild an error stored by :py:func:`_store_failure`.
+
+    The error is only rebuilt if its class can be constructed from the
+    message alone, producing the same message. Otherwise, information would
+    be lost, so the caller should compute the value itself instead.
+
+    Args:
+        failure (tuple):
+            The class path and message of the error.
+
+    Returns:
+        Exception:
+        The rebuilt error, or ``None`` if it couldn't be rebuilt.
+    """
+    try:
+        class_path, message = failure
+        module_name, class_name = class_path.rsplit('.', 1)
+        error_cls = getattr(import_module(module_name), class_name)
+
+        if (isinstance(error_cls, type) and
+            issubclass(error_cls, Exception)):
+            error = error_cls(message)
+
+            if six.text_type(error) == message:
+                return error
+    except Exception:
+        pass
+
+    return None
+
+
+def _raise_failure(key):
+    """Raise a stored error from computing a value, if any.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+    Raises:
+        Exception:
+            The error stored by :py:func:`_store_failure`, if it could be
+            rebuilt.
+    """
+    failure = cache.get(_make_failure_key(key))
+
+    if failure is not None:
+        error = _load_failure(failure)
+
+        if error is not None:
+            raise error
+
+
+def _make_lease_key(key):
+    """Return the full cache key for the lease for computing a value.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+    Returns:
+        unicode:
+        The full cache key for the lease.
+    """
+    return make_cache_key('%s-lease' % key)
+
+
+def _make_failure_key(key):
+    """Return the full cache key for an error from computing a value.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+    Returns:
+        unicode:
+        The full cache key for the error.
+    """
+    return make_cache_key('%s-failure' % key)
+
+
+def _make_fresh_key(key):
+    """Return the full cache key marking a value as fresh.
+
+    Args:
+        key (unicode):
+            The cache key for the value.
+
+    Returns:
+        unicode:
+        The full cache key for the marker.
+    """
+    return make_cache_key('%s-fresh' % key)
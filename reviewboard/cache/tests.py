@@ -0,0 +1,503 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils import six
+from djblets.cache.backend import cache_memoize, make_cache_key
+
+from reviewboard.cache.local import LocalLRUCache, get_value_size
+from reviewboard.cache.memoize import (_store_failure,
+                                       cache_memoize_many_once,
+                                       cache_memoize_once)
+from reviewboard.diffviewer.errors import PatchError
+from reviewboard.scmtools.errors import FileNotFoundError, SCMError
+from reviewboard.testing import TestCase
+
+
+class CacheMemoizeOnceTests(TestCase):
+    """Unit tests for reviewboard.cache.memoize.cache_memoize_once."""
+
+    def setUp(self):
+        super(CacheMemoizeOnceTests, self).setUp()
+
+        self.num_calls = 0
+
+    def tearDown(self):
+        super(CacheMemoizeOnceTests, self).tearDown()
+
+        cache.clear()
+
+    def _lookup(self):
+        self.num_calls += 1
+
+        return 'value'
+
+    def test_caches_value(self):
+        """Testing cache_memoize_once caches the value"""
+        self.assertEqual(cache_memoize_once('test-key', self._lookup),
+                         'value')
+        self.assertEqual(cache_memoize_once('test-key', self._lookup),
+                         'value')
+        self.assertEqual(self.num_calls, 1)
+        self.assertEqual(cache.get(make_cache_key('test-key')), 'value')
+
+    def test_with_concurrent_threads(self):
+        """Testing cache_memoize_once with concurrent threads only computes
+        the value once
+        """
+        results = []
+
+        def _lookup():
+            time.sleep(0.1)
+
+            return self._lookup()
+
+        def _run():
+            results.append(cache_memoize_once('test-key', _lookup))
+
+        threads = [
+            threading.Thread(target=_run)
+            for i in range(5)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(self.num_calls, 1)
+
+    def test_with_lease_held(self):
+        """Testing cache_memoize_once waits for the value when another
+        process is computing it
+        """
+        cache.add(make_cache_key('test-key-lease'), True)
+
+        def _store():
+            time.sleep(0.2)
+            cache_memoize('test-key', lambda: 'other-value')
+
+        thread = threading.Thread(target=_store)
+        thread.start()
+
+        self.assertEqual(cache_memoize_once('test-key', self._lookup),
+                         'other-value')
+        self.assertEqual(self.num_calls, 0)
+
+        thread.join()
+
+    def test_with_lease_held_and_timeout(self):
+        """Testing cache_memoize_once computes the value when the wait for
+        another process times out
+        """
+        cache.add(make_cache_key('test-key-lease'), True)
+
+        self.assertEqual(
+            cache_memoize_once('test-key', self._lookup, wait_timeout=0.2),
+            'value')
+        self.assertEqual(self.num_calls, 1)
+
+    def test_releases_lease(self):
+        """Testing cache_memoize_once releases the lease after computing the
+        value
+        """
+        def _lookup():
+            raise ValueError('Oh no')
+
+        with self.assertRaises(ValueError):
+            cache_memoize_once('test-key', _lookup)
+
+        self.assertNotIn(make_cache_key('test-key-lease'), cache)
+
+    def test_with_concurrent_threads_and_error(self):
+        """Testing cache_memoize_once with concurrent threads only computes
+        the value once when computing it fails
+        """
+        errors = []
+
+        def _lookup():
+            self.num_calls += 1
+            time.sleep(0.1)
+
+            raise ValueError('Oh no')
+
+        def _run():
+            try:
+                cache_memoize_once('test-key', _lookup)
+            except ValueError as e:
+                errors.append(six.text_type(e))
+
+        threads = [
+            threading.Thread(target=_run)
+            for i in range(5)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, ['Oh no'] * 5)
+        self.assertEqual(self.num_calls, 1)
+        self.assertNotIn(make_cache_key('test-key'), cache)
+
+    def test_with_lease_held_and_error(self):
+        """Testing cache_memoize_once raises the error when another process
+        fails to compute the value
+        """
+        cache.add(make_cache_key('test-key-lease'), True)
+
+        def _fail():
+            time.sleep(0.2)
+            _store_failure('test-key', ValueError('Oh no'))
+            cache.delete(make_cache_key('test-key-lease'))
+
+        thread = threading.Thread(target=_fail)
+        thread.start()
+
+        with self.assertRaisesRegexp(ValueError, 'Oh no'):
+            cache_memoize_once('test-key', self._lookup)
+
+        self.assertEqual(self.num_calls, 0)
+
+        thread.join()
+
+    def test_with_shared_scm_error(self):
+        """Testing cache_memoize_once raises a stored SCMError"""
+        _store_failure('test-key', SCMError('Oh no'))
+
+        with self.assertRaisesRegexp(SCMError, 'Oh no'):
+            cache_memoize_once('test-key', self._lookup)
+
+        self.assertEqual(self.num_calls, 0)
+
+    def test_with_shared_patch_error(self):
+        """Testing cache_memoize_once computes the value itself when the
+        stored error is a PatchError
+        """
+        def _lookup():
+            self.num_calls += 1
+
+            raise PatchError('foo.c', 'error output', b'orig', b'new',
+                             b'diff', b'rejects')
+
+        _store_failure('test-key',
+                       PatchError('foo.c', '', b'', b'', b'', b''))
+
+        # The stored error can be loaded, but not rebuilt, so the caller's
+        # own error is raised with all its information.
+        self.assertIsNotNone(cache.get(make_cache_key('test-key-failure')))
+
+        with self.assertRaises(PatchError) as cm:
+            cache_memoize_once('test-key', _lookup)
+
+        self.assertEqual(self.num_calls, 1)
+        self.assertEqual(cm.exception.filename, 'foo.c')
+        self.assertEqual(cm.exception.error_output, 'error output')
+        self.assertEqual(cm.exception.rejects, b'rejects')
+
+    def test_with_shared_file_not_found_error(self):
+        """Testing cache_memoize_once computes the value itself when the
+        stored error is a FileNotFoundError
+        """
+        error = FileNotFoundError('/foo.c', '123')
+
+        def _lookup():
+            self.num_calls += 1
+
+            raise FileNotFoundError('/foo.c', '123')
+
+        _store_failure('test-key', error)
+
+        with self.assertRaises(FileNotFoundError) as cm:
+            cache_memoize_once('test-key', _lookup)
+
+        self.assertEqual(self.num_calls, 1)
+        self.assertEqual(six.text_type(cm.exception), six.text_type(error))
+        self.assertEqual(cm.exception.path, '/foo.c')
+        self.assertEqual(cm.exception.revision, '123')
+
+    def test_with_force_overwrite(self):
+        """Testing cache_memoize_once with force_overwrite=True"""
+        cache_memoize('test-key', lambda: 'old-value')
+
+        self.assertEqual(
+            cache_memoize_once('test-key', self._lookup,
+                               force_overwrite=True),
+            'value')
+        self.assertEqual(self.num_calls, 1)
+        self.assertEqual(cache.get(make_cache_key('test-key')), 'value')
+
+    def test_with_refresh_after(self):
+        """Testing cache_memoize_once with refresh_after stores stale values
+        again
+        """
+        fresh_key = make_cache_key('test-key-fresh')
+
+        cache_memoize_once('test-key', self._lookup, refresh_after=60)
+        self.assertIn(fresh_key, cache)
+
+        # Simulate the value becoming stale.
+        cache.delete(fresh_key)
+        cache.set(make_cache_key('test-key'), 'stale-value')
+
+        self.assertEqual(
+            cache_memoize_once('test-key', self._lookup, refresh_after=60),
+            'stale-value')
+        self.assertEqual(self.num_calls, 1)
+        self.assertIn(fresh_key, cache)
+
+    def test_with_refresh_after_and_touch(self):
+        """Testing cache_memoize_once with refresh_after touches stale values
+        when supported by the cache backend
+        """
+        touched_keys = []
+
+        def _touch(key, timeout):
+            touched_keys.append(key)
+
+            return True
+
+        fresh_key = make_cache_key('test-key-fresh')
+
+        cache_memoize_once('test-key', self._lookup, refresh_after=60,
+                           large_data=True)
+
+        # Simulate the value becoming stale.
+        cache.delete(fresh_key)
+        cache.touch = _touch
+
+        try:
+            self.assertEqual(
+                cache_memoize_once('test-key', self._lookup,
+                                   refresh_after=60, large_data=True),
+                'value')
+        finally:
+            del cache.touch
+
+        self.assertEqual(self.num_calls, 1)
+        self.assertEqual(touched_keys,
+                         [make_cache_key('test-key'),
+                          make_cache_key('test-key-0')])
+        self.assertIn(fresh_key, cache)
+
+    def test_with_immutable(self):
+        """Testing cache_memoize_once with immutable=True keeps the value in
+        the local cache
+        """
+        cache_memoize_once('test-key', self._lookup, immutable=True)
+
+        # The value should be found without going to the main cache.
+        cache.clear()
+
+        self.assertEqual(
+            cache_memoize_once('test-key', self._lookup, immutable=True),
+            'value')
+        self.assertEqual(self.num_calls, 1)
+
+
+class CacheMemoizeManyOnceTests(TestCase):
+    """Unit tests for reviewboard.cache.memoize.cache_memoize_many_once."""
+
+    def setUp(self):
+        super(CacheMemoizeManyOnceTests, self).setUp()
+
+        self.looked_up = []
+
+    def tearDown(self):
+        super(CacheMemoizeManyOnceTests, self).tearDown()
+
+        cache.clear()
+
+    def _lookup(self, key):
+        self.looked_up.append([key])
+
+        return 'value for %s' % key
+
+    def _lookup_many(self, keys):
+        self.looked_up.append(keys)
+
+        return [
+            'value for %s' % key
+            for key in keys
+        ]
+
+    def test_caches_values(self):
+        """Testing cache_memoize_many_once caches the values and computes
+        missing values together
+        """
+        self.assertEqual(
+            cache_memoize_many_once(['key1', 'key2', 'key1'], self._lookup,
+                                    self._lookup_many),
+            ['value for key1', 'value for key2', 'value for key1'])
+        self.assertEqual(
+            cache_memoize_many_once(['key2', 'key3', 'key1'], self._lookup,
+                                    self._lookup_many),
+            ['value for key2', 'value for key3', 'value for key1'])
+        self.assertEqual(self.looked_up, [['key1', 'key2'], ['key3']])
+        self.assertEqual(cache.get(make_cache_key('key3')), 'value for key3')
+
+    def test_with_large_data(self):
+        """Testing cache_memoize_many_once with large_data loads values
+        stored by cache_memoize
+        """
+        cache_memoize('key1', lambda: ['stored value'], large_data=True)
+
+        self.assertEqual(
+            cache_memoize_many_once(['key1', 'key2'], self._lookup,
+                                    self._lookup_many, large_data=True),
+            [['stored value'], 'value for key2'])
+        self.assertEqual(self.looked_up, [['key2']])
+        self.assertEqual(
+            cache_memoize('key2', lambda: None, large_data=True),
+            'value for key2')
+
+    def test_with_errors(self):
+        """Testing cache_memoize_many_once doesn't cache errors as values"""
+        error = ValueError('Oh no')
+
+        self.assertEqual(
+            cache_memoize_many_once(['key1', 'key2'], self._lookup,
+                                    lambda keys: [error, 'value']),
+            [error, 'value'])
+        self.assertNotIn(make_cache_key('key1'), cache)
+        self.assertNotIn(make_cache_key('key1-lease'), cache)
+        self.assertNotIn(make_cache_key('key2-lease'), cache)
+
+        # The error is kept briefly, so that it's not computed again.
+        results = cache_memoize_many_once(['key1', 'key2'], self._lookup,
+                                          self._lookup_many)
+
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(results[1], 'value')
+        self.assertEqual(self.looked_up, [])
+
+    def test_with_patch_error(self):
+        """Testing cache_memoize_many_once computes values again when the
+        stored error is a PatchError
+        """
+        error = PatchError('foo.c', '', b'', b'', b'', b'')
+
+        self.assertEqual(
+            cache_memoize_many_once(['key1', 'key2'], self._lookup,
+                                    lambda keys: [error, 'value']),
+            [error, 'value'])
+
+        self.assertEqual(
+            cache_memoize_many_once(['key1', 'key2'], self._lookup,
+                                    self._lookup_many),
+            ['value for key1', 'value'])
+        self.assertEqual(self.looked_up, [['key1']])
+
+    def test_with_lease_held(self):
+        """Testing cache_memoize_many_once waits for values being computed
+        by another process
+        """
+        cache.add(make_cache_key('key2-lease'), True)
+
+        def _store():
+            time.sleep(0.2)
+            cache_memoize('key2', lambda: 'other value')
+
+        thread = threading.Thread(target=_store)
+        thread.start()
+
+        self.assertEqual(
+            cache_memoize_many_once(['key1', 'key2'], self._lookup,
+                                    self._lookup_many),
+            ['value for key1', 'other value'])
+        self.assertEqual(self.looked_up, [['key1']])
+
+        thread.join()
+
+
+class LocalLRUCacheTests(TestCase):
+    """Unit tests for reviewboard.cache.local.LocalLRUCache."""
+
+    def test_get(self):
+        """Testing LocalLRUCache.get"""
+        local_cache = LocalLRUCache(1024)
+        local_cache.set('key1', 'value1')
+
+        self.assertEqual(local_cache.get('key1'), 'value1')
+        self.assertIsNone(local_cache.get('key2'))
+        self.assertEqual(local_cache.get('key2', 'default'), 'default')
+        self.assertEqual(local_cache.hits, 1)
+        self.assertEqual(local_cache.misses, 2)
+
+    def test_set_evicts_least_recently_used(self):
+        """Testing LocalLRUCache.set evicts the least recently used values"""
+        value_size = get_value_size(b'x' * 100)
+        local_cache = LocalLRUCache(value_size * 3)
+
+        local_cache.set('key1', b'1' * 100)
+        local_cache.set('key2', b'2' * 100)
+        local_cache.set('key3', b'3' * 100)
+        local_cache.get('key1')
+        local_cache.set('key4', b'4' * 100)
+
+        self.assertIsNone(local_cache.get('key2'))
+        self.assertEqual(local_cache.get('key1'), b'1' * 100)
+        self.assertEqual(local_cache.get('key3'), b'3' * 100)
+        self.assertEqual(local_cache.get('key4'), b'4' * 100)
+        self.assertEqual(local_cache.evictions, 1)
+        self.assertEqual(local_cache.size, value_size * 3)
+
+    def test_set_with_existing_key(self):
+        """Testing LocalLRUCache.set with an existing key"""
+        local_cache = LocalLRUCache(1024)
+        local_cache.set('key1', b'1' * 100)
+        local_cache.set('key1', b'2' * 10)
+
+        self.assertEqual(local_cache.get('key1'), b'2' * 10)
+        self.assertEqual(local_cache.size, get_value_size(b'2' * 10))
+
+    def test_set_with_large_value(self):
+        """Testing LocalLRUCache.set with a value larger than the cache"""
+        local_cache = LocalLRUCache(100)
+        local_cache.set('key1', b'x' * 1000)
+
+        self.assertIsNone(local_cache.get('key1'))
+        self.assertEqual(local_cache.size, 0)
+
+    def test_resize(self):
+        """Testing LocalLRUCache.resize evicts values that no longer fit"""
+        value_size = get_value_size(b'x' * 100)
+        local_cache = LocalLRUCache(value_size * 2)
+        local_cache.set('key1', b'1' * 100)
+        local_cache.set('key2', b'2' * 100)
+        local_cache.resize(value_size)
+
+        self.assertIsNone(local_cache.get('key1'))
+        self.assertEqual(local_cache.get('key2'), b'2' * 100)
+
+    def test_get_stats(self):
+        """Testing LocalLRUCache.get_stats"""
+        local_cache = LocalLRUCache(1024)
+        local_cache.set('key1', 'value1')
+        local_cache.get('key1')
+        local_cache.get('key1')
+        local_cache.get('key1')
+        local_cache.get('key2')
+
+        self.assertEqual(
+            local_cache.get_stats(),
+            {
+                'evictions': 0,
+                'hit_rate': 75,
+                'hits': 3,
+                'max_size': 1024,
+                'misses': 1,
+                'num_items': 1,
+                'size': get_value_size('value1'),
+            })
+
+    def test_get_value_size(self):
+        """Testing get_value_size includes the contents of containers"""
+        self.assertGreater(get_value_size([b'x' * 1000]), 1000)
+        self.assertGreater(get_value_size({'key': [b'x' * 1000]}), 1000)
@@ -41,7 +41,9 @@ from reviewboard.datagrids.builtin_items import (IncomingSection,
                                                  OutgoingSection,
                                                  UserGroupsItem,
                                                  UserProfileItem)
-from reviewboard.reviews.models import Group, ReviewRequest, Review
+from reviewboard.reviews.inbox import is_inbox_enabled
+from reviewboard.reviews.models import (Group, InboxEntry, ReviewRequest,
+                                        Review)
 from reviewboard.site.urlresolvers import local_site_reverse
 
 
@@ -328,6 +330,7 @@ class DashboardDataGrid(DataGridSidebarMixin, ReviewRequestDataGrid):
         group_name = self.request.GET.get('group', '')
         view = self.request.GET.get('view', self.default_view)
         user = self.request.user
+        use_inbox = is_inbox_enabled()
 
         if view == 'outgoing':
             self.queryset = ReviewRequest.objects.from_user(
@@ -338,8 +341,16 @@ class DashboardDataGrid(DataGridSidebarMixin, ReviewRequestDataGrid):
                 user, user, None, local_site=self.local_site)
             self.title = _('All My Review Requests')
         elif view == 'to-me':
-            self.queryset = ReviewRequest.objects.to_user_directly(
-                user, user, local_site=self.local_site)
+            if use_inbox:
+                self.queryset = ReviewRequest.objects.inbox(
+                    user,
+                    reasons=[InboxEntry.REASON_DIRECT,
+                             InboxEntry.REASON_STARRED],
+                    local_site=self.local_site)
+            else:
+                self.queryset = ReviewRequest.objects.to_user_directly(
+                    user, user, local_site=self.local_site)
+
             self.title = _('Incoming Review Requests to Me')
         elif view in ('to-group', 'to-watched-group'):
             if group_name:
@@ -359,16 +370,37 @@ class DashboardDataGrid(DataGridSidebarMixin, ReviewRequestDataGrid):
                     group_name, self.local_site, user)
                 self.title = _('Incoming Review Requests to %s') % group_name
             else:
-                self.queryset = ReviewRequest.objects.to_user_groups(
-                    user, user, local_site=self.local_site)
+                if use_inbox:
+                    self.queryset = ReviewRequest.objects.inbox(
+                        user,
+                        reasons=[InboxEntry.REASON_GROUP],
+                        local_site=self.local_site)
+                else:
+                    self.queryset = ReviewRequest.objects.to_user_groups(
+                        user, user, local_site=self.local_site)
+
                 self.title = _('All Incoming Review Requests to My Groups')
         elif view == 'starred':
-            self.queryset = self.profile.starred_review_requests.public(
-                user=user, local_site=self.local_site, status=None)
+            if use_inbox:
+                self.queryset = ReviewRequest.objects.inbox(
+                    user,
+                    reasons=[InboxEntry.REASON_STARRED],
+                    local_site=self.local_site,
+                    status=None,
+                    accessible_only=True)
+            else:
+                self.queryset = self.profile.starred_review_requests.public(
+                    user=user, local_site=self.local_site, status=None)
+
             self.title = _('Starred Review Requests')
         elif view == 'incoming':
-            self.queryset = ReviewRequest.objects.to_user(
-                user, user, local_site=self.local_site)
+            if use_inbox:
+                self.queryset = ReviewRequest.objects.inbox(
+                    user, local_site=self.local_site)
+            else:
+                self.queryset = ReviewRequest.objects.to_user(
+                    user, user, local_site=self.local_site)
+
             self.title = _('All Incoming Review Requests')
         else:
             raise Http404
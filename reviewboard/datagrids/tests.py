@@ -276,6 +276,50 @@ class DashboardViewTests(BaseViewTestCase):
         self.assertEqual(datagrid.rows[0]['object'].summary, 'Test 2')
         self.assertEqual(datagrid.rows[1]['object'].summary, 'Test 1')
 
+    @add_fixtures(['test_users'])
+    def test_incoming_with_inbox(self):
+        """Testing dashboard view (incoming) with dashboard inboxes enabled"""
+        self.siteconfig.set('dashboard_inbox_enabled', True)
+        self.siteconfig.save()
+
+        try:
+            self.client.login(username='doc', password='doc')
+
+            user = User.objects.get(username='doc')
+
+            group = self.create_review_group()
+            group.users.add(user)
+
+            review_request = self.create_review_request(summary='Test 1',
+                                                        publish=True)
+            review_request.target_people.add(user)
+
+            review_request = self.create_review_request(summary='Test 2',
+                                                        publish=True)
+            review_request.target_groups.add(group)
+
+            self.create_review_request(summary='Test 3', publish=True)
+
+            response = self.client.get('/dashboard/', {'view': 'incoming'})
+            self.assertEqual(response.status_code, 200)
+
+            datagrid = self._get_context_var(response, 'datagrid')
+            self.assertTrue(datagrid)
+            self.assertEqual(len(datagrid.rows), 2)
+            self.assertEqual(datagrid.rows[0]['object'].summary, 'Test 2')
+            self.assertEqual(datagrid.rows[1]['object'].summary, 'Test 1')
+
+            response = self.client.get('/dashboard/', {'view': 'to-me'})
+            self.assertEqual(response.status_code, 200)
+
+            datagrid = self._get_context_var(response, 'datagrid')
+            self.assertTrue(datagrid)
+            self.assertEqual(len(datagrid.rows), 1)
+            self.assertEqual(datagrid.rows[0]['object'].summary, 'Test 1')
+        finally:
+            self.siteconfig.set('dashboard_inbox_enabled', False)
+            self.siteconfig.save()
+
     @add_fixtures(['test_users'])
     def test_to_group_with_joined_groups(self):
         """Testing dashboard view with to-group and joined groups"""
@@ -0,0 +1,283 @@
+"""Persistent, content-addressed storage for original and patched files.
+
+Generating diff chunks requires the original and patched versions of each
+file. Fetching the original from the repository and patching it is
+expensive, and needs to happen again whenever the chunks fall out of the
+cache (and once per cache key variation).
+
+The stores here keep those files around, keyed by the SHA1 of their content
+(which is what we already record in a
+:py:class:`~reviewboard.diffviewer.models.FileDiff`'s ``orig_sha1`` and
+``patched_sha1``). As the content can't change for a given key, entries never
+need to be invalidated.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError
+from djblets.siteconfig.models import SiteConfiguration
+
+
+class BaseFileBlobStore(object):
+    """Base class for a store of file content keyed by SHA1.
+
+    Subclasses must implement :py:meth:`has`, :py:meth:`get_compressed`, and
+    :py:meth:`put_compressed`. Content is zlib-compressed before being handed
+    to the subclass, and is verified against its SHA1 when read back.
+    """
+
+    #: The ID of the store, used in the site configuration.
+    store_id = None
+
+    #: The compression level used for stored content.
+    compression_level = 6
+
+    def get(self, sha1):
+        """Return the content for a SHA1.
+
+        Args:
+            sha1 (unicode):
+                The SHA1 of the content.
+
+        Returns:
+            bytes:
+            The stored content, or ``None`` if it's not in the store.
+        """
+        try:
+            data = self.get_compressed(sha1)
+
+            if data is None:
+                return None
+
+            data = zlib.decompress(data)
+        except Exception as e:
+            logging.exception('Unable to read file blob %s from %r: %s',
+                              sha1, self, e)
+            return None
+
+        if get_sha1(data) != sha1:
+            logging.error('File blob %s in %r does not match its checksum. '
+                          'Ignoring it.',
+                          sha1, self)
+            return None
+
+        return data
+
+    def has(self, sha1):
+        """Return whether content for a SHA1 is in the store.
+
+        Args:
+            sha1 (unicode):
+                The SHA1 of the content.
+
+        Returns:
+            bool:
+            Whether the content is in the store.
+        """
+        raise NotImplementedError
+
+    def put(self, data):
+        """Store content.
+
+        Any errors are logged and otherwise ignored, as the store only ever
+        saves work.
+
+        Args:
+            data (bytes):
+                The content to store.
+
+        Returns:
+            unicode:
+            The SHA1 of the content.
+        """
+        sha1 = get_sha1(data)
+
+        try:
+            self.put_compressed(sha1,
+                                zlib.compress(data, self.compression_level))
+        except Exception as e:
+            logging.exception('Unable to store file blob %s in %r: %s',
+                              sha1, self, e)
+
+        return sha1
+
+    def get_compressed(self, sha1):
+        """Return the compressed content for a SHA1.
+
+        Args:
+            sha1 (unicode):
+                The SHA1 of the content.
+
+        Returns:
+            bytes:
+            The compressed content, or ``None`` if it's not in the store.
+        """
+        raise NotImplementedError
+
+    def put_compressed(self, sha1, data):
+        """Store compressed content.
+
+        Args:
+            sha1 (unicode):
+                The SHA1 of the uncompressed content.
+
+            data (bytes):
+                The compressed content.
+        """
+        raise NotImplementedError
+
+
+class DatabaseFileBlobStore(BaseFileBlobStore):
+    """Stores file content in the database.
+
+    This is useful for multi-server installs that don't share a data
+    directory.
+    """
+
+    store_id = 'database'
+
+    def has(self, sha1):
+        from reviewboard.diffviewer.models import FileBlob
+
+        return FileBlob.objects.filter(sha1=sha1).exists()
+
+    def get_compressed(self, sha1):
+        from reviewboard.diffviewer.models import FileBlob
+
+        try:
+            return bytes(FileBlob.objects.get(sha1=sha1).data)
+        except FileBlob.DoesNotExist:
+            return None
+
+    def put_compressed(self, sha1, data):
+        from reviewboard.diffviewer.models import FileBlob
+
+        try:
+            FileBlob.objects.get_or_create(sha1=sha1,
+                                           defaults={'data': data})
+        except IntegrityError:
+            # Another process stored it first.
+            pass
+
+    def __repr__(self):
+        return '<DatabaseFileBlobStore>'
+
+
+class LocalFileBlobStore(BaseFileBlobStore):
+    """Stores file content in a directory on the local filesystem.
+
+    Files are stored as :file:`{path}/{sha1[:2]}/{sha1[2:]}`.
+    """
+
+    store_id = 'local'
+
+    def __init__(self, path):
+        """Initialize the store.
+
+        Args:
+            path (unicode):
+                The directory to store files in.
+        """
+        self.path = path
+
+    def has(self, sha1):
+        return os.path.exists(self._get_blob_path(sha1))
+
+    def get_compressed(self, sha1):
+        try:
+            with open(self._get_blob_path(sha1), 'rb') as fp:
+                return fp.read()
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+
+            raise
+
+    def put_compressed(self, sha1, data):
+        blob_path = self._get_blob_path(sha1)
+
+        if os.path.exists(blob_path):
+            return
+
+        blob_dir = os.path.dirname(blob_path)
+
+        try:
+            os.makedirs(blob_dir, 0o755)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # Write to a temporary file and move it into place, so that readers
+        # never see a partially-written file.
+        fd, temp_path = tempfile.mkstemp(dir=blob_dir)
+
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(data)
+
+            os.rename(temp_path, blob_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def _get_blob_path(self, sha1):
+        """Return the path to the file for a SHA1.
+
+        Args:
+            sha1 (unicode):
+                The SHA1 of the content.
+
+        Returns:
+            unicode:
+            The path to the file.
+        """
+        return os.path.join(self.path, sha1[:2], sha1[2:])
+
+    def __repr__(self):
+        return '<LocalFileBlobStore(%r)>' % self.path
+
+
+def get_sha1(data):
+    """Return the SHA1 of content, as stored in a FileDiff.
+
+    Args:
+        data (bytes):
+            The content to checksum.
+
+    Returns:
+        unicode:
+        The hex digest of the content.
+    """
+    return hashlib.sha1(data).hexdigest()
+
+
+def get_file_blob_store():
+    """Return the configured file blob store.
+
+    This is controlled by the ``diffviewer_file_blob_store`` and
+    ``diffviewer_file_blob_store_path`` site configuration settings.
+
+    Returns:
+        BaseFileBlobStore:
+        The store, or ``None`` if storing files is disabled.
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+    store_id = siteconfig.get('diffviewer_file_blob_store')
+
+    if store_id == DatabaseFileBlobStore.store_id:
+        return DatabaseFileBlobStore()
+    elif store_id == LocalFileBlobStore.store_id:
+        path = (siteconfig.get('diffviewer_file_blob_store_path') or
+                os.path.join(settings.SITE_DATA_DIR, 'file-blobs'))
+
+        return LocalFileBlobStore(path)
+    else:
+        return None
@@ -2,21 +2,28 @@ from __future__ import unicode_literals
 
 import fnmatch
 import functools
-import hashlib
+import logging
+import multiprocessing
 import re
 
+from django.core.cache import cache
 from django.utils import six
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.utils.six.moves import range
-from django.utils.translation import get_language
 from djblets.log import log_timed
-from djblets.cache.backend import cache_memoize
+from djblets.cache.backend import make_cache_key
 from djblets.siteconfig.models import SiteConfiguration
 from pygments import highlight
-from pygments.lexers import guess_lexer_for_filename
+from pygments.lexers import get_lexer_by_name, guess_lexer_for_filename
 from pygments.formatters import HtmlFormatter
+from pygments.util import ClassNotFound
 
+from reviewboard.cache.memoize import cache_memoize_once
+from reviewboard.diffviewer.blobstore import get_file_blob_store, get_sha1
+from reviewboard.diffviewer.chunk_serializer import (ChunkFormatError,
+                                                     deserialize_chunks,
+                                                     serialize_chunks)
 from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
 from reviewboard.diffviewer.diffutils import (get_line_changed_regions,
                                               get_original_file,
@@ -27,6 +34,13 @@ from reviewboard.diffviewer.opcode_generator import (DiffOpcodeGenerator,
                                                      get_diff_opcode_generator)
 
 
+#: The number of seconds to wait for chunks from a worker process.
+#:
+#: If a worker process dies while generating chunks, the results will never
+#: arrive. After this long, the chunks are generated in the calling process.
+CHUNK_PROCESS_TIMEOUT = 60
+
+
 class NoWrapperHtmlFormatter(HtmlFormatter):
     """An HTML Formatter for Pygments that doesn't wrap items in a div."""
     def __init__(self, *args, **kwargs):
@@ -73,6 +87,11 @@ class RawDiffChunkGenerator(object):
     # Default tab size used in browsers.
     TAB_SIZE = DiffOpcodeGenerator.TAB_SIZE
 
+    # The maximum number of lines before and after a region that will be
+    # lexed in order to bring the lexer's state in sync, when only
+    # highlighting part of a file.
+    HIGHLIGHTING_SYNC_MAX_LINES = 100
+
     def __init__(self, old, new, orig_filename, modified_filename,
                  enable_syntax_highlighting=True, encoding_list=None,
                  diff_compat=DiffCompatVersion.DEFAULT):
@@ -86,6 +105,7 @@ class RawDiffChunkGenerator(object):
         self.differ = None
 
         # Chunk processing state.
+        self._partial_lexers = [None, None]
         self._last_header = [None, None]
         self._last_header_index = [0, 0]
         self._chunk_index = 0
@@ -102,15 +122,66 @@ class RawDiffChunkGenerator(object):
         stored in cache (given a cache key), and yielded.
         """
         if cache_key:
-            chunks = cache_memoize(cache_key,
-                                   lambda: list(self.get_chunks_uncached()),
-                                   large_data=True)
+            chunks = self._get_cached_chunks(cache_key)
         else:
             chunks = self.get_chunks_uncached()
 
         for chunk in chunks:
             yield chunk
 
+    def _get_cached_chunks(self, cache_key, force_overwrite=False):
+        """Return the chunks from the cache, generating them if needed.
+
+        Chunks are stored in the cache in the compact format provided by
+        :py:mod:`reviewboard.diffviewer.chunk_serializer`. Freshly-generated
+        chunks are returned directly, without being loaded back from that
+        format.
+
+        If the chunks are already being generated by another thread or
+        process, this will wait for them rather than generating them again.
+
+        Args:
+            cache_key (unicode):
+                The cache key for the chunks.
+
+            force_overwrite (bool, optional):
+                Whether to regenerate the chunks even if they're in the
+                cache.
+
+        Returns:
+            list of dict:
+            The list of chunks.
+        """
+        generated_chunks = []
+
+        def _generate_chunks():
+            generated_chunks.extend(self.get_chunks_uncached())
+            siteconfig = SiteConfiguration.objects.get_current()
+
+            return serialize_chunks(
+                generated_chunks,
+                siteconfig.get('diffviewer_chunk_cache_compression'))
+
+        # The serialized data is already compressed (if enabled), so there's
+        # no point in having the cache compress it again.
+        data = cache_memoize_once(cache_key,
+                                  _generate_chunks,
+                                  large_data=True,
+                                  compress_large_data=False,
+                                  force_overwrite=force_overwrite)
+
+        if generated_chunks or force_overwrite:
+            return generated_chunks
+
+        try:
+            return deserialize_chunks(data)
+        except ChunkFormatError as e:
+            logging.warning('Unable to load cached diff chunks for key '
+                            '"%s": %s. Regenerating them.',
+                            cache_key, e)
+
+            return self._get_cached_chunks(cache_key, force_overwrite=True)
+
     def get_chunks_uncached(self):
         """Yield the list of chunks, bypassing the cache."""
         for chunk in self.generate_chunks(self.old, self.new):
@@ -148,6 +219,12 @@ class RawDiffChunkGenerator(object):
         a_num_lines = len(a)
         b_num_lines = len(b)
 
+        siteconfig = SiteConfiguration.objects.get_current()
+
+        # The lexers for each file, if only the displayed lines are going to
+        # be syntax-highlighted.
+        partial_lexers = [None, None]
+
         if is_lists:
             markup_a = a
             markup_b = b
@@ -160,15 +237,32 @@ class RawDiffChunkGenerator(object):
                     self.normalize_path_for_display(self.orig_filename)
                 dest_file = \
                     self.normalize_path_for_display(self.modified_filename)
+                partial_threshold = \
+                    siteconfig.get('diffviewer_partial_highlighting_threshold')
+                use_partial = (partial_threshold and
+                               max(a_num_lines, b_num_lines) >
+                               partial_threshold)
 
                 try:
                     # TODO: Try to figure out the right lexer for these files
                     #       once instead of twice.
                     if not source_file.endswith(self.STYLED_EXT_BLACKLIST):
-                        markup_a = self._apply_pygments(old or '', source_file)
+                        if use_partial:
+                            partial_lexers[0] = self._get_partial_lexer(
+                                old or '', source_file)
+
+                        if partial_lexers[0] is None:
+                            markup_a = self._apply_pygments(old or '',
+                                                            source_file)
 
                     if not dest_file.endswith(self.STYLED_EXT_BLACKLIST):
-                        markup_b = self._apply_pygments(new or '', dest_file)
+                        if use_partial:
+                            partial_lexers[1] = self._get_partial_lexer(
+                                new or '', dest_file)
+
+                        if partial_lexers[1] is None:
+                            markup_b = self._apply_pygments(new or '',
+                                                            dest_file)
                 except:
                     pass
 
@@ -178,7 +272,6 @@ class RawDiffChunkGenerator(object):
             if not markup_b:
                 markup_b = self.NEWLINES_RE.split(escape(new))
 
-        siteconfig = SiteConfiguration.objects.get_current()
         ignore_space = True
 
         for pattern in siteconfig.get('diffviewer_include_space_patterns'):
@@ -196,6 +289,16 @@ class RawDiffChunkGenerator(object):
         line_num = 1
         opcodes_generator = self.get_opcode_generator()
 
+        if partial_lexers[0] or partial_lexers[1]:
+            # Only the lines that will be displayed are highlighted, which
+            # depends on the opcodes.
+            opcodes_generator = list(opcodes_generator)
+            self._apply_partial_pygments(
+                opcodes_generator, partial_lexers, a, b, markup_a, markup_b,
+                context_num_lines, collapse_threshold)
+
+        self._partial_lexers = partial_lexers
+
         counts = {
             'equal': 0,
             'replace': 0,
@@ -219,17 +322,23 @@ class RawDiffChunkGenerator(object):
                 last_range_start = num_lines - context_num_lines
 
                 if line_num == 1:
-                    yield self._new_chunk(lines, 0, last_range_start, True)
+                    yield self._new_collapsed_chunk(lines, 0,
+                                                    last_range_start,
+                                                    i1, j1, a, b, meta)
                     yield self._new_chunk(lines, last_range_start, num_lines)
                 else:
                     yield self._new_chunk(lines, 0, context_num_lines)
 
                     if i2 == a_num_lines and j2 == b_num_lines:
-                        yield self._new_chunk(lines, context_num_lines,
-                                              num_lines, True)
+                        yield self._new_collapsed_chunk(lines,
+                                                        context_num_lines,
+                                                        num_lines,
+                                                        i1, j1, a, b, meta)
                     else:
-                        yield self._new_chunk(lines, context_num_lines,
-                                              last_range_start, True)
+                        yield self._new_collapsed_chunk(lines,
+                                                        context_num_lines,
+                                                        last_range_start,
+                                                        i1, j1, a, b, meta)
                         yield self._new_chunk(lines, last_range_start,
                                               num_lines)
             else:
@@ -616,6 +725,75 @@ class RawDiffChunkGenerator(object):
 
         return chunk
 
+    def _new_collapsed_chunk(self, all_lines, start, end, i1, j1, a, b,
+                             opcode_meta):
+        """Create a collapsed chunk for part of an equal region.
+
+        If only the displayed lines in the file are being syntax-highlighted,
+        the lines in the chunk won't be highlighted yet. Information needed to
+        highlight them later (when the chunk is expanded) is stored in the
+        chunk's ``pending_highlighting`` metadata. See
+        :py:func:`get_chunk_lines`.
+
+        Args:
+            all_lines (list):
+                All the lines in the equal region.
+
+            start (int):
+                The index of the first line for the chunk in ``all_lines``.
+
+            end (int):
+                The index after the last line for the chunk in ``all_lines``.
+
+            i1 (int):
+                The index of the start of the region in the original file.
+
+            j1 (int):
+                The index of the start of the region in the modified file.
+
+            a (list of unicode):
+                The lines of the original file.
+
+            b (list of unicode):
+                The lines of the modified file.
+
+            opcode_meta (dict):
+                The metadata for the opcode of the equal region.
+
+        Returns:
+            dict:
+            The new chunk.
+        """
+        chunk = self._new_chunk(all_lines, start, end, True)
+
+        if 'indentation_changes' in opcode_meta:
+            # These lines were highlighted up-front, so that the indentation
+            # markup isn't lost.
+            return chunk
+
+        # For each side, this stores the name of the lexer along with the
+        # lines around the chunk that are needed to lex it.
+        pending = {}
+        max_lines = self.HIGHLIGHTING_SYNC_MAX_LINES
+
+        for side, lexer, source_lines, first_line in (
+                ('left', self._partial_lexers[0], a, i1 + start),
+                ('right', self._partial_lexers[1], b, j1 + start)):
+            if lexer is not None:
+                sync_line = find_highlighting_sync_line(
+                    source_lines, first_line, max_lines)
+                last_line = first_line + end - start
+                pending[side] = [
+                    lexer.aliases[0],
+                    source_lines[sync_line:first_line],
+                    source_lines[last_line:last_line + max_lines],
+                ]
+
+        if pending:
+            chunk['meta']['pending_highlighting'] = pending
+
+        return chunk
+
     def _get_interesting_headers(self, lines, start, end, is_modified_file):
         """Returns all headers for a region of a diff.
 
@@ -669,6 +847,115 @@ class RawDiffChunkGenerator(object):
         return split_line_endings(
             highlight(data, lexer, NoWrapperHtmlFormatter()))
 
+    def _get_partial_lexer(self, data, filename):
+        """Return a lexer for highlighting only parts of a file.
+
+        Args:
+            data (unicode):
+                The contents of the file.
+
+            filename (unicode):
+                The name of the file.
+
+        Returns:
+            pygments.lexer.Lexer:
+            The lexer for the file, or ``None`` if the file can't be
+            highlighted in parts. In that case, it should be highlighted in
+            full.
+        """
+        lexer = guess_lexer_for_filename(filename,
+                                         data,
+                                         stripnl=False,
+                                         encoding='utf-8')
+
+        if not lexer.aliases:
+            # The lexer couldn't be found again later, when highlighting
+            # collapsed chunks.
+            return None
+
+        return lexer
+
+    def _apply_partial_pygments(self, opcodes, lexers, a, b, markup_a,
+                                markup_b, context_num_lines,
+                                collapse_threshold):
+        """Syntax-highlight only the lines that will be displayed.
+
+        Lines in regions that will be collapsed are left as plain text. They
+        will be highlighted when they're expanded.
+
+        Args:
+            opcodes (list of tuple):
+                The opcodes for the diff.
+
+            lexers (list of pygments.lexer.Lexer):
+                The lexers for the original and modified files. A side with
+                a lexer of ``None`` won't be highlighted.
+
+            a (list of unicode):
+                The lines of the original file.
+
+            b (list of unicode):
+                The lines of the modified file.
+
+            markup_a (list of unicode):
+                The markup for the lines of the original file. This will be
+                updated in-place.
+
+            markup_b (list of unicode):
+                The markup for the lines of the modified file. This will be
+                updated in-place.
+
+            context_num_lines (int):
+                The number of lines of context shown around changes.
+
+            collapse_threshold (int):
+                The minimum number of lines in an equal region for it to be
+                collapsed.
+        """
+        a_num_lines = len(a)
+        b_num_lines = len(b)
+        ranges_a = []
+        ranges_b = []
+        is_first = True
+
+        # This must mirror how generate_chunks splits equal regions into
+        # collapsed chunks.
+        for tag, i1, i2, j1, j2, meta in opcodes:
+            num_lines = max(i2 - i1, j2 - j1)
+
+            if (tag == 'equal' and num_lines > collapse_threshold and
+                'indentation_changes' not in meta):
+                if not is_first:
+                    ranges_a.append((i1, i1 + context_num_lines))
+                    ranges_b.append((j1, j1 + context_num_lines))
+
+                if is_first or i2 != a_num_lines or j2 != b_num_lines:
+                    ranges_a.append((i2 - context_num_lines, i2))
+                    ranges_b.append((j2 - context_num_lines, j2))
+            else:
+                ranges_a.append((i1, i2))
+                ranges_b.append((j1, j2))
+
+            if num_lines > 0:
+                is_first = False
+
+        for lexer, lines, markup, ranges in ((lexers[0], a, markup_a,
+                                              ranges_a),
+                                             (lexers[1], b, markup_b,
+                                              ranges_b)):
+            if lexer is None:
+                continue
+
+            lexer.add_filter('codetagify')
+
+            for start, end in _merge_line_ranges(ranges):
+                highlighted = highlight_lines(
+                    lines, start, end, lexer,
+                    self.HIGHLIGHTING_SYNC_MAX_LINES)
+
+                if highlighted is not None:
+                    markup[start:end] = highlighted
+
 
 class DiffChunkGenerator(RawDiffChunkGenerator):
     """A generator for chunks for a FileDiff that can be used for rendering.
@@ -721,6 +1008,9 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         self.repository = self.diffset.repository
         self.tool = self.repository.get_scmtool()
 
+        self._file_contents = None
+        self._pending_result = None
+
         super(DiffChunkGenerator, self).__init__(
             old=None,
             new=None,
@@ -731,7 +1021,14 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
             diff_compat=filediff.diffset.diffcompat)
 
     def make_cache_key(self):
-        """Create a cache key for any generated chunks."""
+        """Create a cache key for any generated chunks.
+
+        Chunks don't contain any localized content (localization happens
+        when rendering them, in
+        :py:class:`~reviewboard.diffviewer.renderers.DiffRenderer`), so the
+        key doesn't depend on the active language. This allows one copy of
+        the chunks to be shared by all users, regardless of their locale.
+        """
         key = 'diff-sidebyside-'
 
         if self.enable_syntax_highlighting:
@@ -745,8 +1042,6 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         else:
             key += 'interdiff-%s-none' % self.filediff.pk
 
-        key += '-%s' % get_language()
-
         return key
 
     def get_opcode_generator(self):
@@ -771,51 +1066,184 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         yielded. Otherwise, new chunks will be generated, stored in cache,
         and yielded.
         """
+        if not self.can_generate_chunks():
+            raise StopIteration
+
+        cache_key = self.make_cache_key()
+
+        for chunk in super(DiffChunkGenerator, self).get_chunks(cache_key):
+            yield chunk
+
+    def can_generate_chunks(self):
+        """Return whether there are any chunks to generate for the file.
+
+        There are no chunks if the file is binary or is an added or deleted
+        0-length file, or if the file has moved with no additional changes.
+
+        Returns:
+            bool:
+            Whether chunks can be generated.
+        """
         counts = self.filediff.get_line_counts()
 
-        if (self.filediff.binary or
+        return not (
+            self.filediff.binary or
             self.filediff.source_revision == '' or
             ((self.filediff.is_new or self.filediff.deleted or
               self.filediff.moved or self.filediff.copied) and
              counts['raw_insert_count'] == 0 and
-             counts['raw_delete_count'] == 0)):
-            raise StopIteration
+             counts['raw_delete_count'] == 0))
 
-        cache_key = self.make_cache_key()
+    def has_cached_chunks(self):
+        """Return whether the chunks for the file are already in the cache.
 
-        for chunk in super(DiffChunkGenerator, self).get_chunks(cache_key):
-            yield chunk
+        Returns:
+            bool:
+            Whether the chunks are cached.
+        """
+        return make_cache_key(self.make_cache_key()) in cache
 
-    def get_chunks_uncached(self):
-        """Yield the list of chunks, bypassing the cache."""
-        old = get_original_file(self.filediff, self.request,
-                                self.encoding_list)
-        new = get_patched_file(old, self.filediff, self.request)
+    def get_files_to_prefetch(self):
+        """Return the files needed from the repository to generate chunks.
 
-        if self.filediff.orig_sha1 is None:
-            self.filediff.extra_data.update({
-                'orig_sha1': self._get_checksum(old),
-                'patched_sha1': self._get_checksum(new),
-            })
-            self.filediff.save(update_fields=['extra_data'])
+        Files that are already in the file blob store are not included.
 
-        if self.interfilediff:
-            old = new
-            interdiff_orig = get_original_file(self.interfilediff,
-                                               self.request,
-                                               self.encoding_list)
-            new = get_patched_file(interdiff_orig, self.interfilediff,
-                                   self.request)
-
-            if self.interfilediff.orig_sha1 is None:
-                self.interfilediff.extra_data.update({
-                    'orig_sha1': self._get_checksum(interdiff_orig),
+        This must be called from the thread that owns the generator, but the
+        resulting files can be fetched through :py:attr:`repository` from
+        other threads, as that doesn't require database access.
+
+        Returns:
+            list of tuple:
+            A list of ``(path, revision, base_commit_id)`` tuples for
+            :py:meth:`Repository.get_file()
+            <reviewboard.scmtools.models.Repository.get_file>`.
+        """
+        store = get_file_blob_store()
+        files = []
+
+        for filediff in (self.filediff, self.interfilediff):
+            if (filediff is None or
+                filediff.is_new or
+                (store is not None and
+                 filediff.orig_sha1 and
+                 store.has(filediff.orig_sha1))):
+                continue
+
+            files.append((filediff.source_file,
+                          filediff.source_revision,
+                          filediff.diffset.base_commit_id))
+
+        return files
+
+    def start_generating_chunks(self, process_pool):
+        """Begin generating chunks in a process pool.
+
+        The original and modified files are fetched and patched in the
+        current process, and then the diffing and syntax highlighting work is
+        handed off to the pool. The next call to :py:meth:`get_chunks` will
+        wait for and use the result.
+
+        Args:
+            process_pool (multiprocessing.pool.Pool):
+                The process pool used to generate the chunks.
+        """
+        old, new = self.get_file_contents()
+
+        self._pending_result = process_pool.apply_async(
+            _generate_chunks_in_subprocess,
+            [{
+                'old': old,
+                'new': new,
+                'orig_filename': self.orig_filename,
+                'modified_filename': self.modified_filename,
+                'enable_syntax_highlighting': self.enable_syntax_highlighting,
+                'encoding_list': self.encoding_list,
+                'diff_compat': self.diff_compat,
+                'diff': self.filediff.diff,
+                'interdiff': (self.interfilediff and
+                              self.interfilediff.diff),
+                'display_filenames': {
+                    filename: self.normalize_path_for_display(filename)
+                    for filename in (self.orig_filename,
+                                     self.modified_filename)
+                },
+            }])
+
+    def get_file_contents(self):
+        """Return the original and modified file contents to diff.
+
+        The contents are only computed once per generator.
+
+        Returns:
+            tuple:
+            A 2-tuple of ``(old, new)`` file contents, as bytes.
+        """
+        if self._file_contents is None:
+            old = get_original_file(self.filediff, self.request,
+                                    self.encoding_list)
+            new = get_patched_file(old, self.filediff, self.request)
+
+            if self.filediff.orig_sha1 is None:
+                self.filediff.extra_data.update({
+                    'orig_sha1': self._get_checksum(old),
                     'patched_sha1': self._get_checksum(new),
                 })
-                self.interfilediff.save(update_fields=['extra_data'])
-        elif self.force_interdiff:
-            # Basically, revert the change.
-            old, new = new, old
+                self.filediff.save(update_fields=['extra_data'])
+
+            if self.interfilediff:
+                old = new
+                interdiff_orig = get_original_file(self.interfilediff,
+                                                   self.request,
+                                                   self.encoding_list)
+                new = get_patched_file(interdiff_orig, self.interfilediff,
+                                       self.request)
+
+                if self.interfilediff.orig_sha1 is None:
+                    self.interfilediff.extra_data.update({
+                        'orig_sha1': self._get_checksum(interdiff_orig),
+                        'patched_sha1': self._get_checksum(new),
+                    })
+                    self.interfilediff.save(update_fields=['extra_data'])
+            elif self.force_interdiff:
+                # Basically, revert the change.
+                old, new = new, old
+
+            self._file_contents = (old, new)
+
+        return self._file_contents
+
+    def generate_chunks(self, old, new):
+        """Generate chunks for the difference between two strings.
+
+        If chunk generation was started in a process pool through
+        :py:meth:`start_generating_chunks`, this will wait for and yield
+        those results instead of generating them in this process.
+        """
+        chunks = None
+
+        if self._pending_result is not None:
+            result = self._pending_result
+            self._pending_result = None
+
+            try:
+                chunks, self.counts = result.get(CHUNK_PROCESS_TIMEOUT)
+            except multiprocessing.TimeoutError:
+                # The worker process may have died. Generate the chunks here
+                # instead.
+                logging.warning('Timed out waiting for a worker process to '
+                                'generate chunks for %r. Generating them in '
+                                'this process.',
+                                self.filediff, request=self.request)
+
+        if chunks is None:
+            chunks = super(DiffChunkGenerator, self).generate_chunks(old, new)
+
+        for chunk in chunks:
+            yield chunk
+
+    def get_chunks_uncached(self):
+        """Yield the list of chunks, bypassing the cache."""
+        old, new = self.get_file_contents()
 
         if self.interfilediff:
             log_timer = log_timed(
@@ -852,9 +1280,49 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         return self.tool.normalize_path_for_display(filename)
 
     def _get_checksum(self, content):
-        hasher = hashlib.sha1()
-        hasher.update(content)
-        return hasher.hexdigest()
+        return get_sha1(content)
+
+
+class _SubprocessDiffChunkGenerator(RawDiffChunkGenerator):
+    """Generates chunks for a DiffChunkGenerator in a worker process.
+
+    This is given everything :py:class:`DiffChunkGenerator` would otherwise
+    look up from the FileDiffs, so that it never needs to access the
+    database.
+    """
+
+    def __init__(self, diff, interdiff, display_filenames, **kwargs):
+        super(_SubprocessDiffChunkGenerator, self).__init__(**kwargs)
+
+        self.diff = diff
+        self.interdiff = interdiff
+        self.display_filenames = display_filenames
+
+    def get_opcode_generator(self):
+        return get_diff_opcode_generator(self.differ, self.diff,
+                                         self.interdiff)
+
+    def normalize_path_for_display(self, filename):
+        return self.display_filenames.get(filename, filename)
+
+
+def _generate_chunks_in_subprocess(state):
+    """Generate chunks in a worker process.
+
+    This is called by :py:meth:`DiffChunkGenerator.start_generating_chunks`.
+
+    Args:
+        state (dict):
+            Keyword arguments for :py:class:`_SubprocessDiffChunkGenerator`.
+
+    Returns:
+        tuple:
+        A 2-tuple of the list of chunks and the line counts.
+    """
+    generator = _SubprocessDiffChunkGenerator(**state)
+    chunks = list(generator.get_chunks_uncached())
+
+    return chunks, generator.counts
 
 
 def compute_chunk_last_header(lines, numlines, meta, last_header=None):
@@ -886,6 +1354,245 @@ def compute_chunk_last_header(lines, numlines, meta, last_header=None):
     return last_header
 
 
+def find_highlighting_sync_line(lines, line, max_lines):
+    """Return a line to start lexing from in order to highlight a line.
+
+    Highlighting a part of a file requires lexing from a point where the
+    lexer's state is known, since a line's highlighting can depend on what
+    comes before it (such as an open string or comment). This looks for the
+    closest line at or before the given line that is likely to be the start
+    of a statement or block: one that follows a blank line, preferring the
+    least indented of those.
+
+    Args:
+        lines (list of unicode):
+            The lines of the file.
+
+        line (int):
+            The index of the line that needs to be highlighted.
+
+        max_lines (int):
+            The maximum number of lines before ``line`` to search.
+
+    Returns:
+        int:
+        The index of the line to start lexing from. If no suitable line was
+        found, this will be the furthest line searched.
+    """
+    first_line = max(line - max_lines, 0)
+    best_line = first_line
+    best_indent = None
+
+    for i in range(min(line, len(lines) - 1), first_line, -1):
+        text = lines[i]
+
+        if text.strip() and not lines[i - 1].strip():
+            indent = len(text) - len(text.lstrip())
+
+            if indent == 0:
+                return i
+            elif (first_line > 0 and
+                  (best_indent is None or indent < best_indent)):
+                # Lexing from the very start is always preferable, if the
+                # start is within range.
+                best_line = i
+                best_indent = indent
+
+    return best_line
+
+
+def highlight_lines(lines, start, end, lexer, max_sync_lines):
+    """Syntax-highlight a range of lines in a file.
+
+    Lexing will begin from a line before the range, as determined by
+    :py:func:`find_highlighting_sync_line`, and continue for some lines past
+    the range. Some tokens can only be identified by what follows them (such
+    as Python docstrings, which must be closed).
+
+    Args:
+        lines (list of unicode):
+            The lines of the file.
+
+        start (int):
+            The index of the first line to highlight.
+
+        end (int):
+            The index after the last line to highlight.
+
+        lexer (pygments.lexer.Lexer):
+            The lexer to use.
+
+        max_sync_lines (int):
+            The maximum number of lines before ``start`` and after ``end`` to
+            lex.
+
+    Returns:
+        list of unicode:
+        The highlighted HTML for each line in the range, or ``None`` if the
+        highlighted result didn't line up with the original lines.
+    """
+    sync_line = find_highlighting_sync_line(lines, start, max_sync_lines)
+    lex_end = min(end + max_sync_lines, len(lines))
+    markup = split_line_endings(highlight(
+        '\n'.join(lines[sync_line:lex_end]) + '\n',
+        lexer,
+        NoWrapperHtmlFormatter()))
+
+    if len(markup) != lex_end - sync_line:
+        return None
+
+    return markup[start - sync_line:end - sync_line]
+
+
+def get_chunk_lines(chunk, start=0, end=None):
+    """Return the lines in a chunk for display.
+
+    Collapsed chunks generated when only the displayed parts of a file were
+    syntax-highlighted (see the ``diffviewer_partial_highlighting_threshold``
+    setting) contain plain lines. When lines from those chunks are going to be
+    shown, this will highlight them.
+
+    The chunk itself is never modified. For chunks that need highlighting,
+    new lines are returned.
+
+    Args:
+        chunk (dict):
+            The chunk containing the lines.
+
+        start (int, optional):
+            The index of the first line in the chunk to return.
+
+        end (int, optional):
+            The index after the last line in the chunk to return. If not
+            provided, all lines through the end of the chunk are returned.
+
+    Returns:
+        list:
+        The lines in the range.
+    """
+    all_lines = chunk['lines']
+
+    if end is None:
+        end = len(all_lines)
+
+    lines = all_lines[start:end]
+    pending = chunk['meta'].get('pending_highlighting')
+
+    if not pending or not lines:
+        return lines
+
+    lines = [list(line) for line in lines]
+
+    for side, markup_index in (('left', 2), ('right', 5)):
+        if side not in pending:
+            continue
+
+        lexer_name, prefix, suffix = pending[side]
+
+        try:
+            lexer = get_lexer_by_name(lexer_name,
+                                      stripnl=False,
+                                      encoding='utf-8')
+        except ClassNotFound:
+            continue
+
+        lexer.add_filter('codetagify')
+
+        source_lines = list(prefix)
+        source_lines += [
+            _unescape_markup(line[markup_index])
+            for line in all_lines
+        ]
+        source_lines += suffix
+
+        markup = highlight_lines(
+            source_lines, len(prefix) + start, len(prefix) + end, lexer,
+            RawDiffChunkGenerator.HIGHLIGHTING_SYNC_MAX_LINES)
+
+        if markup is not None:
+            for line, line_markup in zip(lines, markup):
+                line[markup_index] = mark_safe(line_markup)
+
+    return lines
+
+
+def get_highlighted_chunk(chunk):
+    """Return a chunk with all of its lines syntax-highlighted.
+
+    If the chunk has lines that haven't been highlighted yet (see
+    :py:func:`get_chunk_lines`), a new chunk with the highlighted lines is
+    returned. Otherwise, the chunk is returned as-is.
+
+    Args:
+        chunk (dict):
+            The chunk to highlight.
+
+    Returns:
+        dict:
+        The highlighted chunk.
+    """
+    if 'pending_highlighting' not in chunk['meta']:
+        return chunk
+
+    new_chunk = dict(chunk)
+    new_chunk['lines'] = get_chunk_lines(chunk)
+    new_chunk['meta'] = dict(chunk['meta'])
+    del new_chunk['meta']['pending_highlighting']
+
+    return new_chunk
+
+
+def _merge_line_ranges(ranges):
+    """Merge overlapping and adjacent ranges of lines.
+
+    Args:
+        ranges (list of tuple):
+            The ``(start, end)`` line index ranges.
+
+    Returns:
+        list of tuple:
+        The merged ranges, in order. Empty ranges are removed.
+    """
+    merged = []
+
+    for start, end in sorted(ranges):
+        if start >= end:
+            continue
+
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def _unescape_markup(markup):
+    """Return the original text for HTML-escaped markup.
+
+    This reverses :py:func:`django.utils.html.escape`.
+
+    Args:
+        markup (unicode):
+            The escaped markup for a line.
+
+    Returns:
+        unicode:
+        The original text of the line.
+    """
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPE_MAP[m.group(0)], markup)
+
+
+_UNESCAPE_MAP = {
+    '&amp;': '&',
+    '&lt;': '<',
+    '&gt;': '>',
+    '&quot;': '"',
+    '&#39;': "'",
+}
+
+_UNESCAPE_RE = re.compile('|'.join(sorted(_UNESCAPE_MAP)))
+
 _generator = DiffChunkGenerator
 
 
@@ -0,0 +1,299 @@
+"""Line indexes for diff chunks.
+
+Rendering fragments of a diff (such as for comments on a review) involves
+looking up which chunks contain a range of lines and which function/class
+headers precede a line. Doing that by walking the file's chunks for every
+lookup gets expensive when there are many comments on large files.
+
+A :py:class:`DiffChunkIndex` records where each chunk starts and where the
+headers are in a file's chunks, so those lookups are binary searches. Indexes
+are small, and are stored in the cache alongside the chunks themselves.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import marshal
+from bisect import bisect_left, bisect_right
+
+from django.utils import six
+from djblets.cache.backend import cache_memoize
+
+
+#: The current version of the serialized index format.
+CHUNK_INDEX_VERSION = 1
+
+#: The marshal format version used for encoding.
+MARSHAL_VERSION = 2
+
+
+class DiffChunkIndex(object):
+    """An index of line positions within a file's diff chunks.
+
+    Lines are referenced by virtual line number (the line number in the
+    union of the original and modified files, as shown in the diff viewer).
+    """
+
+    #: The sides of the diff that headers are indexed for.
+    #:
+    #: This maps each side to the index of its line number in a chunk's
+    #: lines and the key for its headers in the chunk's metadata.
+    SIDES = {
+        'left': (1, 'left_headers'),
+        'right': (4, 'right_headers'),
+    }
+
+    def __init__(self, first_lines, headers):
+        """Initialize the index.
+
+        Args:
+            first_lines (list of int):
+                The virtual line number of the first line in each chunk.
+
+            headers (dict):
+                A dictionary mapping each side (``left`` or ``right``) to a
+                tuple of lists of the virtual line numbers, header text, and
+                chunk position of each header, in chunk order.
+        """
+        self.first_lines = first_lines
+        self.headers = headers
+
+        self._headers_sorted = {}
+
+        for side, (header_lines, header_texts, header_chunks) in \
+                six.iteritems(headers):
+            self._headers_sorted[side] = all(
+                header_lines[i] <= header_lines[i + 1]
+                for i in range(len(header_lines) - 1)
+            )
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Build an index for a list of chunks.
+
+        Args:
+            chunks (list of dict):
+                The chunks generated for the file. See
+                :py:func:`~reviewboard.diffviewer.diffutils.
+                get_chunks_in_range` for a description of their contents.
+
+        Returns:
+            DiffChunkIndex:
+            The index for the chunks.
+        """
+        first_lines = []
+        headers = dict(
+            (side, ([], [], []))
+            for side in six.iterkeys(cls.SIDES)
+        )
+
+        for chunk_pos, chunk in enumerate(chunks):
+            lines = chunk['lines']
+            meta = chunk['meta']
+            virtual_first_line = lines[0][0]
+
+            first_lines.append(virtual_first_line)
+
+            for side, (line_num_index, meta_key) in six.iteritems(cls.SIDES):
+                if meta_key not in meta or not lines[0][line_num_index]:
+                    continue
+
+                # Header line numbers are real line numbers in the original
+                # or patched file, so they have to be offset to get virtual
+                # line numbers.
+                offset = virtual_first_line - lines[0][line_num_index]
+
+                # In the case of interdiffs, it is possible that there will
+                # be headers in the chunk that don't belong to it, but were
+                # put there due to chunks being merged together. Only headers
+                # up to the last line in the chunk are indexed.
+                #
+                # The last line number isn't always on the last line, when
+                # dealing with interdiffs that have filtered out opcodes.
+                last_line_num = None
+
+                for line in reversed(lines):
+                    if line[line_num_index]:
+                        last_line_num = line[line_num_index]
+                        break
+
+                end_line = last_line_num + offset
+                header_lines, header_texts, header_chunks = headers[side]
+
+                for header in meta[meta_key]:
+                    virtual_line = header[0] + offset
+
+                    if virtual_line < end_line:
+                        header_lines.append(virtual_line)
+                        header_texts.append(six.text_type(header[1]))
+                        header_chunks.append(chunk_pos)
+
+        return cls(first_lines, headers)
+
+    @classmethod
+    def deserialize(cls, data):
+        """Load an index from serialized data.
+
+        Args:
+            data (bytes):
+                The data from :py:meth:`serialize`.
+
+        Returns:
+            DiffChunkIndex:
+            The loaded index.
+
+        Raises:
+            ValueError:
+                The data was not a valid serialized index, or was in an
+                unsupported version of the format.
+        """
+        try:
+            version, first_lines, headers = marshal.loads(data)
+        except (EOFError, TypeError, ValueError) as e:
+            raise ValueError('Invalid diff chunk index: %s' % e)
+
+        if version != CHUNK_INDEX_VERSION:
+            raise ValueError('Unsupported diff chunk index version %r'
+                             % version)
+
+        return cls(first_lines, headers)
+
+    def serialize(self):
+        """Serialize the index for storage.
+
+        Returns:
+            bytes:
+            The serialized index.
+        """
+        return marshal.dumps((CHUNK_INDEX_VERSION, self.first_lines,
+                              self.headers),
+                             MARSHAL_VERSION)
+
+    def get_chunk_for_line(self, line):
+        """Return the position of the chunk containing a line.
+
+        Args:
+            line (int):
+                The virtual line number.
+
+        Returns:
+            int:
+            The position of the chunk in the list of chunks. If the line comes
+            before the first chunk, this will be 0.
+        """
+        return max(bisect_right(self.first_lines, line) - 1, 0)
+
+    def get_last_header_before_line(self, target_line):
+        """Return the last headers that occur before the given line.
+
+        This is equivalent to (and returns the same results as)
+        :py:func:`~reviewboard.diffviewer.diffutils.
+        _get_last_header_in_chunks_before_line`.
+
+        Args:
+            target_line (int):
+                The virtual line number.
+
+        Returns:
+            dict:
+            A dictionary with ``left`` and ``right`` keys. Each is either
+            ``None`` or a dictionary containing the virtual ``line`` number
+            and ``text`` of the header.
+        """
+        # Only chunks starting before the target line are considered.
+        num_chunks = bisect_left(self.first_lines, target_line)
+
+        return dict(
+            (side, self._find_header(side, target_line, num_chunks))
+            for side in six.iterkeys(self.SIDES)
+        )
+
+    def _find_header(self, side, target_line, num_chunks):
+        """Return the last header on a side that occurs before a line.
+
+        Args:
+            side (unicode):
+                The side of the diff (``left`` or ``right``).
+
+            target_line (int):
+                The virtual line number.
+
+            num_chunks (int):
+                The number of chunks (from the start of the file) to look for
+                headers in.
+
+        Returns:
+            dict:
+            The ``line`` and ``text`` of the header, or ``None``.
+        """
+        header_lines, header_texts, header_chunks = self.headers[side]
+        end = bisect_left(header_chunks, num_chunks)
+
+        if self._headers_sorted[side]:
+            i = bisect_left(header_lines, target_line, 0, end) - 1
+        else:
+            # Headers from merged interdiff chunks may be out of order. Fall
+            # back on finding the last matching header.
+            i = end - 1
+
+            while i >= 0 and header_lines[i] >= target_line:
+                i -= 1
+
+        if i < 0:
+            return None
+
+        return {
+            'line': header_lines[i],
+            'text': header_texts[i],
+        }
+
+
+def get_diff_chunk_index(chunks, cache_key=None):
+    """Return the index for a file's chunks.
+
+    If a cache key for the chunks is provided, the index is stored in the
+    cache alongside them, and loaded from there on later calls.
+
+    Args:
+        chunks (list of dict):
+            The chunks for the file.
+
+        cache_key (unicode, optional):
+            The cache key the chunks are stored under.
+
+    Returns:
+        DiffChunkIndex:
+        The index for the chunks.
+    """
+    if not cache_key:
+        return DiffChunkIndex.from_chunks(chunks)
+
+    index_cache_key = '%s-index' % cache_key
+    built_index = []
+
+    def _build_index():
+        built_index.append(DiffChunkIndex.from_chunks(chunks))
+
+        return built_index[0].serialize()
+
+    data = cache_memoize(index_cache_key, _build_index)
+
+    if built_index:
+        return built_index[0]
+
+    try:
+        index = DiffChunkIndex.deserialize(data)
+    except ValueError as e:
+        logging.warning('Unable to load cached diff chunk index for key '
+                        '"%s": %s. Rebuilding it.',
+                        index_cache_key, e)
+        index = None
+
+    if (index is None or
+        index.first_lines != [chunk['lines'][0][0] for chunk in chunks]):
+        # The index doesn't match the chunks (which may have been
+        # regenerated since it was stored), so it has to be rebuilt.
+        index = DiffChunkIndex.from_chunks(chunks)
+        cache_memoize(index_cache_key, index.serialize, force_overwrite=True)
+
+    return index
@@ -0,0 +1,316 @@
+"""Compact serialization for cached diff chunks.
+
+Diff chunks are lists of dictionaries, each containing a list of lines, with
+each line being a list of line numbers, HTML markup, changed regions, and
+other metadata. Pickling that structure as-is is slow to load and produces
+very large cache entries, which then get split across several cache keys.
+
+This module stores chunks in a versioned format that is much faster to load
+and smaller in the cache:
+
+* Each chunk's lines are stored as columns (all old line numbers, all new
+  markup, etc.), which compresses far better than row-based data.
+* Line metadata that is usually empty (whitespace flags and move
+  information) is stored sparsely.
+* Meta dictionaries shared between chunks are stored once.
+* Everything is encoded with :py:mod:`marshal`, which only needs to handle
+  simple built-in types, and then compressed with zlib or lz4 (if
+  installed).
+"""
+
+from __future__ import unicode_literals
+
+import marshal
+import struct
+import zlib
+
+from django.utils import six
+from django.utils.safestring import SafeText
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+#: The current version of the serialized chunk format.
+CHUNK_FORMAT_VERSION = 1
+
+#: The marshal format version used for encoding.
+MARSHAL_VERSION = 2
+
+#: The header prefixing all serialized chunks.
+CHUNK_FORMAT_MAGIC = b'RBDC'
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZLIB = 'zlib'
+COMPRESSION_LZ4 = 'lz4'
+
+_COMPRESSION_CODES = {
+    COMPRESSION_NONE: b'N',
+    COMPRESSION_ZLIB: b'Z',
+    COMPRESSION_LZ4: b'L',
+}
+
+_COMPRESSION_NAMES = dict(
+    (code, name)
+    for name, code in six.iteritems(_COMPRESSION_CODES)
+)
+
+_HEADER = struct.Struct(b'!4sBc')
+
+
+class ChunkFormatError(ValueError):
+    """Serialized chunks could not be loaded."""
+
+
+def get_available_compressions():
+    """Return the compression methods that can be used on this system.
+
+    Returns:
+        list of unicode:
+        The list of available compression methods.
+    """
+    compressions = [COMPRESSION_NONE, COMPRESSION_ZLIB]
+
+    if lz4_frame is not None:
+        compressions.append(COMPRESSION_LZ4)
+
+    return compressions
+
+
+def serialize_chunks(chunks, compression=COMPRESSION_ZLIB):
+    """Serialize a list of diff chunks.
+
+    Args:
+        chunks (list of dict):
+            The chunks to serialize, as generated by
+            :py:class:`~reviewboard.diffviewer.chunk_generator.
+            RawDiffChunkGenerator`.
+
+        compression (unicode, optional):
+            The compression method to use. If lz4 is requested but not
+            installed, zlib will be used instead.
+
+    Returns:
+        bytes:
+        The serialized chunks.
+
+    Raises:
+        ValueError:
+            The compression method is unknown.
+    """
+    if compression not in _COMPRESSION_CODES:
+        raise ValueError('Unknown chunk compression method %r'
+                         % compression)
+
+    if compression == COMPRESSION_LZ4 and lz4_frame is None:
+        compression = COMPRESSION_ZLIB
+
+    metas = []
+    meta_indexes = {}
+    encoded_chunks = []
+
+    for chunk in chunks:
+        meta = chunk['meta']
+        meta_id = id(meta)
+
+        # Chunks split from a single opcode share the same meta dictionary.
+        # Preserve that, instead of storing a copy for each chunk.
+        try:
+            meta_index = meta_indexes[meta_id]
+        except KeyError:
+            meta_index = len(metas)
+            meta_indexes[meta_id] = meta_index
+            metas.append(_normalize_value(meta))
+
+        encoded_chunks.append(
+            (chunk['index'], chunk['numlines'], chunk['change'],
+             chunk['collapsable'], meta_index) +
+            _encode_lines(chunk['lines']))
+
+    data = marshal.dumps((metas, encoded_chunks), MARSHAL_VERSION)
+
+    if compression == COMPRESSION_ZLIB:
+        data = zlib.compress(data, 1)
+    elif compression == COMPRESSION_LZ4:
+        data = lz4_frame.compress(data)
+
+    return _HEADER.pack(CHUNK_FORMAT_MAGIC, CHUNK_FORMAT_VERSION,
+                        _COMPRESSION_CODES[compression]) + data
+
+
+def deserialize_chunks(data):
+    """Deserialize a list of diff chunks.
+
+    A list of chunks that's already been deserialized is returned as-is.
+
+    Chunks cached by older versions were stored by the cache itself, which
+    compressed the pickled list. Those entries don't have a valid header and
+    raise :py:exc:`ChunkFormatError`, so callers are expected to regenerate
+    the chunks.
+
+    Args:
+        data (bytes or list):
+            The serialized chunks.
+
+    Returns:
+        list of dict:
+        The list of chunks.
+
+    Raises:
+        ChunkFormatError:
+            The data was not in a supported format.
+    """
+    if isinstance(data, list):
+        return data
+
+    if (not isinstance(data, six.binary_type) or
+        len(data) < _HEADER.size):
+        raise ChunkFormatError('Serialized chunks are missing a header')
+
+    magic, version, compression_code = _HEADER.unpack_from(data)
+
+    if magic != CHUNK_FORMAT_MAGIC:
+        raise ChunkFormatError('Serialized chunks have an invalid header')
+
+    if version != CHUNK_FORMAT_VERSION:
+        raise ChunkFormatError('Unsupported chunk format version %s'
+                               % version)
+
+    try:
+        compression = _COMPRESSION_NAMES[compression_code]
+    except KeyError:
+        raise ChunkFormatError('Unknown chunk compression method %r'
+                               % compression_code)
+
+    data = data[_HEADER.size:]
+
+    try:
+        if compression == COMPRESSION_ZLIB:
+            data = zlib.decompress(data)
+        elif compression == COMPRESSION_LZ4:
+            if lz4_frame is None:
+                raise ChunkFormatError('lz4 is not installed')
+
+            data = lz4_frame.decompress(data)
+
+        metas, encoded_chunks = marshal.loads(data)
+    except ChunkFormatError:
+        raise
+    except Exception as e:
+        raise ChunkFormatError('Unable to load serialized chunks: %s' % e)
+
+    return [
+        {
+            'index': encoded[0],
+            'numlines': encoded[1],
+            'change': encoded[2],
+            'collapsable': encoded[3],
+            'meta': metas[encoded[4]],
+            'lines': _decode_lines(encoded[5:]),
+        }
+        for encoded in encoded_chunks
+    ]
+
+
+def _encode_lines(lines):
+    """Encode the lines of a chunk into columns.
+
+    Args:
+        lines (list of list):
+            The lines of the chunk.
+
+    Returns:
+        tuple:
+        The columns for the lines.
+    """
+    if lines:
+        (vlinenums, old_linenums, old_markups, old_regions, new_linenums,
+         new_markups, new_regions, whitespace) = \
+            zip(*[line[:8] for line in lines])
+    else:
+        vlinenums = old_linenums = old_markups = old_regions = \
+            new_linenums = new_markups = new_regions = whitespace = ()
+
+    return (
+        list(vlinenums),
+        list(old_linenums),
+        [six.text_type(markup) for markup in old_markups],
+        _normalize_value(list(old_regions)),
+        list(new_linenums),
+        [six.text_type(markup) for markup in new_markups],
+        _normalize_value(list(new_regions)),
+        [i for i, is_whitespace in enumerate(whitespace) if is_whitespace],
+        {
+            i: _normalize_value(line[8])
+            for i, line in enumerate(lines)
+            if len(line) > 8
+        },
+    )
+
+
+def _decode_lines(columns):
+    """Decode the lines of a chunk from columns.
+
+    Args:
+        columns (tuple):
+            The columns for the lines.
+
+    Returns:
+        list of list:
+        The lines of the chunk.
+    """
+    (vlinenums, old_linenums, old_markups, old_regions, new_linenums,
+     new_markups, new_regions, whitespace_indexes, moved) = columns
+
+    whitespace = [False] * len(vlinenums)
+
+    for i in whitespace_indexes:
+        whitespace[i] = True
+
+    # This is the hot path when loading chunks from the cache, so avoid
+    # per-line function calls where possible. SafeText is constructed
+    # directly, which is equivalent to mark_safe() for text.
+    lines = list(map(list, zip(vlinenums, old_linenums,
+                               map(SafeText, old_markups), old_regions,
+                               new_linenums, map(SafeText, new_markups),
+                               new_regions, whitespace)))
+
+    for i, moved_info in six.iteritems(moved):
+        lines[i].append(moved_info)
+
+    return lines
+
+
+def _normalize_value(value):
+    """Normalize a value so that it can be encoded with marshal.
+
+    marshal only supports the exact built-in types, so subclasses (such as
+    safe strings) are converted to their base types.
+
+    Args:
+        value (object):
+            The value to normalize.
+
+    Returns:
+        object:
+        The normalized value.
+    """
+    if isinstance(value, six.text_type):
+        return six.text_type(value)
+    elif isinstance(value, six.binary_type):
+        return six.binary_type(value)
+    elif isinstance(value, dict):
+        return {
+            _normalize_value(key): _normalize_value(item)
+            for key, item in six.iteritems(value)
+        }
+    elif isinstance(value, list):
+        return [_normalize_value(item) for item in value]
+    elif isinstance(value, tuple):
+        return tuple(_normalize_value(item) for item in value)
+    elif isinstance(value, (set, frozenset)):
+        return type(value)(_normalize_value(item) for item in value)
+    else:
+        return value
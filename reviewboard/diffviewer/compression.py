@@ -0,0 +1,197 @@
+"""Compression of stored diff data.
+
+The diff for each file is stored in a
+:py:class:`~reviewboard.diffviewer.models.RawFileDiffData`, compressed using
+one of several methods, and decompressed every time it's used. Older diffs
+were always compressed with bzip2, which compresses text well but is very
+slow to decompress. Newer diffs can use zlib, lz4 (if the ``lz4`` package
+is installed), or zstd (if the ``zstandard`` package is installed), as
+chosen by the ``diffviewer_diff_compression`` setting.
+
+Each method has a name used in the site configuration, and a one-character
+code stored with the data. The code only identifies the format, so several
+methods (such as the zlib compression levels) can share one.
+"""
+
+from __future__ import unicode_literals
+
+import bz2
+import zlib
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+#: The code for bzip2-compressed data.
+CODE_BZIP2 = 'B'
+
+#: The code for zlib-compressed data.
+CODE_ZLIB = 'Z'
+
+#: The code for lz4-compressed data (in the lz4 frame format).
+CODE_LZ4 = 'L'
+
+#: The code for zstd-compressed data.
+CODE_ZSTD = 'S'
+
+
+#: The compression method used if the configured one isn't available.
+DEFAULT_COMPRESSION = 'zlib-6'
+
+#: The compression level used for zstd.
+ZSTD_LEVEL = 3
+
+
+def _compress_zstd(data):
+    """Compress data with zstd.
+
+    Args:
+        data (bytes):
+            The data to compress.
+
+    Returns:
+        bytes:
+        The compressed data.
+    """
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def _decompress_zstd(data):
+    """Decompress zstd-compressed data.
+
+    Args:
+        data (bytes):
+            The data to decompress.
+
+    Returns:
+        bytes:
+        The decompressed data.
+    """
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+#: The compression methods, mapping each name to its code and function.
+_COMPRESSORS = {
+    'bzip2': (CODE_BZIP2, lambda data: bz2.compress(data, 9)),
+    'zlib-1': (CODE_ZLIB, lambda data: zlib.compress(data, 1)),
+    'zlib-6': (CODE_ZLIB, lambda data: zlib.compress(data, 6)),
+    'zlib-9': (CODE_ZLIB, lambda data: zlib.compress(data, 9)),
+    'lz4': (CODE_LZ4, lambda data: lz4_frame.compress(data)),
+    'zstd': (CODE_ZSTD, _compress_zstd),
+}
+
+#: The decompression functions for each code, and the required module.
+_DECOMPRESSORS = {
+    CODE_BZIP2: (bz2.decompress, bz2),
+    CODE_ZLIB: (zlib.decompress, zlib),
+    CODE_LZ4: (lambda data: lz4_frame.decompress(data), lz4_frame),
+    CODE_ZSTD: (_decompress_zstd, zstandard),
+}
+
+
+def get_available_compressions():
+    """Return the names of the compression methods that can be used.
+
+    Methods for optional packages that aren't installed are not included.
+
+    Returns:
+        list of unicode:
+        The available compression method names.
+    """
+    return [
+        name
+        for name in ('bzip2', 'zlib-1', 'zlib-6', 'zlib-9', 'lz4', 'zstd')
+        if _DECOMPRESSORS[_COMPRESSORS[name][0]][1] is not None
+    ]
+
+
+def compress_diff_data(data, compression):
+    """Compress diff data.
+
+    Args:
+        data (bytes):
+            The data to compress.
+
+        compression (unicode):
+            The name of the compression method. If it requires a package
+            that isn't installed, :py:data:`DEFAULT_COMPRESSION` is used
+            instead.
+
+    Returns:
+        tuple:
+        A 2-tuple containing:
+
+        1. The compressed data (:py:class:`bytes`).
+        2. The code for the compression method (:py:class:`unicode`).
+
+    Raises:
+        ValueError:
+            The compression method is unknown.
+    """
+    if compression not in _COMPRESSORS:
+        raise ValueError('Unknown diff compression method %r' % compression)
+
+    if compression not in get_available_compressions():
+        compression = DEFAULT_COMPRESSION
+
+    code, compress_func = _COMPRESSORS[compression]
+
+    return compress_func(data), code
+
+
+def decompress_diff_data(data, code):
+    """Decompress diff data.
+
+    Args:
+        data (bytes):
+            The compressed data.
+
+        code (unicode):
+            The code for the compression method.
+
+    Returns:
+        bytes:
+        The decompressed data.
+
+    Raises:
+        NotImplementedError:
+            The compression method is unknown, or requires a package that
+            isn't installed.
+    """
+    try:
+        decompress_func, module = _DECOMPRESSORS[code]
+    except KeyError:
+        raise NotImplementedError('Unsupported compression method %s'
+                                  % code)
+
+    if module is None:
+        raise NotImplementedError(
+            'The package needed for compression method %s is not installed'
+            % code)
+
+    return decompress_func(data)
+
+
+def get_compression_code(compression):
+    """Return the code stored for data compressed with a method.
+
+    Args:
+        compression (unicode):
+            The name of the compression method.
+
+    Returns:
+        unicode:
+        The code for the compression method.
+
+    Raises:
+        KeyError:
+            The compression method is unknown.
+    """
+    return _COMPRESSORS[compression][0]
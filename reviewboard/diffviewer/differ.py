@@ -20,9 +20,19 @@ class DiffCompatVersion(object):
     # (prevents very long diff times for certain files)
     MYERS_SMS_COST_BAIL = 2
 
-    DEFAULT = MYERS_SMS_COST_BAIL
+    # Faster implementation of the Myers differ, generating the same
+    # opcodes as MYERS_SMS_COST_BAIL.
+    MYERS_FAST = 3
 
-    MYERS_VERSIONS = (MYERS, MYERS_SMS_COST_BAIL)
+    # MYERS_FAST, with move detection limiting the number of removed lines
+    # considered for lines that are common throughout the file (see
+    # DiffOpcodeGenerator.MOVE_MAX_CANDIDATES).
+    MYERS_FAST_MOVE_LIMIT = 4
+
+    DEFAULT = MYERS_FAST_MOVE_LIMIT
+
+    MYERS_VERSIONS = (MYERS, MYERS_SMS_COST_BAIL, MYERS_FAST,
+                      MYERS_FAST_MOVE_LIMIT)
 
 
 class Differ(object):
@@ -88,13 +98,17 @@ def get_differ(a, b, ignore_space=False,
                compat_version=DiffCompatVersion.DEFAULT):
     """Returns a differ for with the given settings.
 
-    By default, this will return the MyersDiffer. Older differs can be used
+    By default, this will return the FastMyersDiffer. Older differs can be used
     by specifying a compat_version, but this is only for *really* ancient
     diffs, currently.
     """
     cls = None
 
-    if compat_version in DiffCompatVersion.MYERS_VERSIONS:
+    if compat_version in (DiffCompatVersion.MYERS_FAST,
+                          DiffCompatVersion.MYERS_FAST_MOVE_LIMIT):
+        from reviewboard.diffviewer.myersdiff import FastMyersDiffer
+        cls = FastMyersDiffer
+    elif compat_version in DiffCompatVersion.MYERS_VERSIONS:
         from reviewboard.diffviewer.myersdiff import MyersDiffer
         cls = MyersDiffer
     elif compat_version == DiffCompatVersion.SMDIFFER:
@@ -1,21 +1,27 @@
 from __future__ import unicode_literals
 
 import logging
+import multiprocessing
 import os
 import re
 import shutil
 import subprocess
 import tempfile
+import threading
 from difflib import SequenceMatcher
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import six
+from django.utils.six.moves import range
 from django.utils.translation import ugettext as _
 from djblets.log import log_timed
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.contextmanagers import controlled_subprocess
 
+from reviewboard.diffviewer.blobstore import get_file_blob_store
+from reviewboard.diffviewer.chunk_index import get_diff_chunk_index
 from reviewboard.diffviewer.errors import PatchError
+from reviewboard.diffviewer.patcher import UnsupportedPatchError, apply_patch
 from reviewboard.scmtools.core import PRE_CREATION, HEAD
 
 
@@ -26,6 +32,10 @@ ALPHANUM_RE = re.compile(r'\w')
 WHITESPACE_RE = re.compile(r'\s')
 
 
+_chunk_process_pool = None
+_chunk_process_pool_lock = threading.Lock()
+
+
 def convert_to_unicode(s, encoding_list):
     """Returns the passed string as a unicode object.
 
@@ -122,8 +132,13 @@ def split_line_endings(data):
 def patch(diff, orig_file, filename, request=None):
     """Apply a diff to a file.
 
-    This delegates out to ``patch`` because noone except Larry Wall knows how
-    to patch.
+    The diff is applied in-process by
+    :py:func:`reviewboard.diffviewer.patcher.apply_patch`, which avoids
+    spawning a process and creating temporary files for every file in a diff.
+
+    If the in-process patcher can't handle the diff, or rejects any hunks, we
+    fall back on delegating to ``patch``, because noone except Larry Wall
+    knows how to patch. Any error from ``patch`` is then what's reported.
 
     Args:
         diff (bytes):
@@ -148,17 +163,72 @@ def patch(diff, orig_file, filename, request=None):
     """
     log_timer = log_timed('Patching file %s' % filename, request=request)
 
-    if not diff.strip():
-        # Someone uploaded an unchanged file. Return the one we're patching.
-        return orig_file
+    try:
+        if not diff.strip():
+            # Someone uploaded an unchanged file. Return the one we're
+            # patching.
+            return orig_file
+
+        orig_file = convert_line_endings(orig_file)
+        diff = convert_line_endings(diff)
+
+        try:
+            return apply_patch(diff, orig_file, filename)
+        except UnsupportedPatchError as e:
+            logging.debug('Falling back on patch for %s: %s',
+                          filename, e, request=request)
+        except PatchError as e:
+            logging.debug('In-process patching failed for %s. Falling back '
+                          'on patch: %s',
+                          filename, e.error_output, request=request)
+            inprocess_error = e
+        else:
+            inprocess_error = None
+
+        try:
+            return _patch_with_subprocess(diff, orig_file, filename)
+        except OSError as e:
+            # The patch binary isn't available. Report the in-process
+            # failure, if we have one.
+            logging.error('Unable to run patch for %s: %s',
+                          filename, e, request=request)
+
+            if inprocess_error is not None:
+                raise inprocess_error
+
+            raise
+    finally:
+        log_timer.done()
+
+
+def _patch_with_subprocess(diff, orig_file, filename):
+    """Apply a diff to a file using the patch binary.
+
+    Args:
+        diff (bytes):
+            The contents of the diff to apply, with normalized line endings.
+
+        orig_file (bytes):
+            The contents of the original file, with normalized line endings.
+
+        filename (unicode):
+            The name of the file being patched.
+
+    Returns:
+        bytes:
+        The contents of the patched file.
 
+    Raises:
+        OSError:
+            The patch binary could not be run.
+
+        reviewboard.diffutils.errors.PatchError:
+            An error occurred when trying to apply the patch.
+    """
     # Prepare the temporary directory if none is available
     tempdir = tempfile.mkdtemp(prefix='reviewboard.')
 
     try:
-        orig_file = convert_line_endings(orig_file)
-        diff = convert_line_endings(diff)
-
         (fd, oldfile) = tempfile.mkstemp(dir=tempdir)
         f = os.fdopen(fd, 'w+b')
         f.write(orig_file)
@@ -206,7 +276,6 @@ def patch(diff, orig_file, filename, request=None):
         return new_file
     finally:
         shutil.rmtree(tempdir)
-        log_timer.done()
 
 
 def get_original_file(filediff, request, encoding_list):
@@ -214,8 +283,19 @@ def get_original_file(filediff, request, encoding_list):
     Get a file either from the cache or the SCM, applying the parent diff if
     it exists.
 
+    If the file blob store is enabled, the result is stored there and
+    reused for later calls, keyed by the FileDiff's ``orig_sha1``.
+
     SCM exceptions are passed back to the caller.
     """
+    store = get_file_blob_store()
+
+    if store is not None and filediff.orig_sha1:
+        data = store.get(filediff.orig_sha1)
+
+        if data is not None:
+            return data
+
     data = b""
 
     if not filediff.is_new:
@@ -251,14 +331,53 @@ def get_original_file(filediff, request, encoding_list):
         data = patch(filediff.parent_diff, data, filediff.source_file,
                      request)
 
+    if store is not None and data:
+        store.put(data)
+
     return data
 
 
 def get_patched_file(buffer, filediff, request):
+    """Return the patched version of a file.
+
+    If the file blob store is enabled, the result is stored there and
+    reused for later calls, keyed by the FileDiff's ``patched_sha1``.
+
+    Args:
+        buffer (bytes):
+            The original file, as returned by :py:func:`get_original_file`.
+
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff to apply.
+
+        request (django.http.HttpRequest):
+            The HTTP request, for use in logging.
+
+    Returns:
+        bytes:
+        The contents of the patched file.
+
+    Raises:
+        reviewboard.diffutils.errors.PatchError:
+            An error occurred when trying to apply the patch.
+    """
+    store = get_file_blob_store()
+
+    if store is not None and filediff.patched_sha1:
+        data = store.get(filediff.patched_sha1)
+
+        if data is not None:
+            return data
+
     tool = filediff.diffset.repository.get_scmtool()
     diff = tool.normalize_patch(filediff.diff, filediff.source_file,
                                 filediff.source_revision)
-    return patch(diff, buffer, filediff.dest_file, request)
+    data = patch(diff, buffer, filediff.dest_file, request)
+
+    if store is not None and data:
+        store.put(data)
+
+    return data
 
 
 def get_revision_str(revision):
@@ -679,25 +798,87 @@ def get_diff_files(diffset, filediff=None, interdiffset=None,
 
 
 def populate_diff_chunks(files, enable_syntax_highlighting=True,
-                         request=None):
+                         request=None, max_workers=None):
     """Populates a list of diff files with chunk data.
 
     This accepts a list of files (generated by get_diff_files) and generates
     diff chunk data for each file in the list. The chunk data is stored in
     the file state.
+
+    When populating more than one file, the files needed from the
+    repository for any uncached chunks are fetched up-front in a batch
+    through :py:meth:`Repository.get_files()
+    <reviewboard.scmtools.models.Repository.get_files>`.
+
+    Files queued to be pre-rendered in the background (see
+    :py:mod:`reviewboard.diffviewer.prerender`) that haven't started yet are
+    removed from the queue and rendered here.
+
+    If more than one worker is allowed (through ``max_workers`` or the
+    ``diffviewer_chunk_generator_workers`` setting), files that aren't
+    already cached are generated concurrently. The diffing and syntax
+    highlighting are performed in a long-lived pool of worker processes,
+    shared by all requests in this process. The results are the same as when
+    generating sequentially, in the same order.
+
+    Args:
+        files (list of dict):
+            The list of files from :py:func:`get_diff_files`.
+
+        enable_syntax_highlighting (bool, optional):
+            Whether to syntax-highlight the chunks.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client.
+
+        max_workers (int, optional):
+            The number of worker processes to use for generating chunks.
+            This defaults to the ``diffviewer_chunk_generator_workers``
+            setting.
     """
-    from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
-
-    for diff_file in files:
-        generator = get_diff_chunk_generator(request,
-                                             diff_file['filediff'],
-                                             diff_file['interfilediff'],
-                                             diff_file['force_interdiff'],
-                                             enable_syntax_highlighting)
+    from reviewboard.diffviewer.chunk_generator import (
+        DiffChunkGenerator,
+        get_diff_chunk_generator)
+    from reviewboard.diffviewer.prerender import claim_prerender_jobs
+
+    if max_workers is None:
+        siteconfig = SiteConfiguration.objects.get_current()
+        max_workers = siteconfig.get('diffviewer_chunk_generator_workers')
+
+    generators = [
+        get_diff_chunk_generator(request,
+                                 diff_file['filediff'],
+                                 diff_file['interfilediff'],
+                                 diff_file['force_interdiff'],
+                                 enable_syntax_highlighting)
+        for diff_file in files
+    ]
+
+    # Any of these files that are queued to be pre-rendered in the
+    # background will be rendered here instead, rather than waiting on the
+    # queue.
+    claim_prerender_jobs(generators)
+
+    if len(generators) > 1:
+        pending = get_pending_diff_chunk_generators(generators)
+
+        if pending:
+            prefetch_diff_files(pending, request)
+
+            if max_workers > 1:
+                _start_generating_diff_chunks(pending, max_workers, request)
+
+    for diff_file, generator in zip(files, generators):
         chunks = list(generator.get_chunks())
 
+        if isinstance(generator, DiffChunkGenerator):
+            chunks_cache_key = generator.make_cache_key()
+        else:
+            chunks_cache_key = None
+
         diff_file.update({
             'chunks': chunks,
+            'chunks_cache_key': chunks_cache_key,
             'num_chunks': len(chunks),
             'changed_chunk_indexes': [],
             'whitespace_only': len(chunks) > 0,
@@ -719,6 +900,195 @@ def populate_diff_chunks(files, enable_syntax_highlighting=True,
         })
 
 
+def get_pending_diff_chunk_generators(generators):
+    """Return the generators that need to generate chunks.
+
+    Args:
+        generators (list of
+                    reviewboard.diffviewer.chunk_generator.DiffChunkGenerator):
+            The generators for the files.
+
+    Returns:
+        list of reviewboard.diffviewer.chunk_generator.DiffChunkGenerator:
+        The generators that support generating chunks ahead of time and don't
+        already have their chunks cached.
+    """
+    from reviewboard.diffviewer.chunk_generator import DiffChunkGenerator
+
+    return [
+        generator
+        for generator in generators
+        if (isinstance(generator, DiffChunkGenerator) and
+            generator.can_generate_chunks() and
+            not generator.has_cached_chunks())
+    ]
+
+
+def prefetch_diff_files(generators, request):
+    """Fetch the files needed by the generators from their repositories.
+
+    The files for each repository are fetched together through
+    :py:meth:`Repository.get_files()
+    <reviewboard.scmtools.models.Repository.get_files>`, populating the file
+    cache. Errors are ignored, as they'll be reported when generating the
+    chunks for the files.
+
+    Args:
+        generators (list of
+                    reviewboard.diffviewer.chunk_generator.DiffChunkGenerator):
+            The generators needing their chunks generated.
+
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+    """
+    repositories = {}
+    files_by_repository = {}
+
+    for generator in generators:
+        repository = generator.repository
+        files = generator.get_files_to_prefetch()
+
+        if files:
+            repositories[repository.pk] = repository
+            files_by_repository.setdefault(repository.pk, []).extend(files)
+
+    for repository_id, files in six.iteritems(files_by_repository):
+        repository = repositories[repository_id]
+
+        try:
+            results = repository.get_files(files, request=request)
+        except Exception as e:
+            logging.debug('Unable to prefetch files from %s: %s',
+                          repository, e, request=request)
+            continue
+
+        for (path, revision, base_commit_id), result in zip(files, results):
+            if isinstance(result, Exception):
+                logging.debug('Unable to prefetch file %s (%s) from %s: %s',
+                              path, revision, repository, result,
+                              request=request)
+
+
+def _start_generating_diff_chunks(generators, max_workers, request):
+    """Begin concurrently generating chunks for uncached files.
+
+    Generators that need their chunks computed are handed the shared pool of
+    worker processes to generate them in (see
+    :py:func:`_get_chunk_process_pool`). The files they need should already
+    have been fetched through :py:func:`prefetch_diff_files`.
+
+    All database access happens in the calling thread.
+
+    Args:
+        generators (list of
+                    reviewboard.diffviewer.chunk_generator.DiffChunkGenerator):
+            The generators needing their chunks generated.
+
+        max_workers (int):
+            The maximum number of processes to use.
+
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+    """
+    from reviewboard.diffviewer.chunk_generator import DiffChunkGenerator
+
+    # Only the stock generator is known to be safe to run in another process.
+    # Subclasses may depend on state that can't be passed along, and will
+    # generate their chunks in this process as usual.
+    pending = [
+        generator
+        for generator in generators
+        if type(generator) is DiffChunkGenerator
+    ]
+
+    if not pending:
+        return
+
+    process_pool = _get_chunk_process_pool(max_workers)
+
+    for generator in pending:
+        try:
+            generator.start_generating_chunks(process_pool)
+        except Exception as e:
+            # The error will be raised again (and reported) when generating
+            # the chunks for the file normally.
+            logging.debug('Unable to generate chunks for %r in a worker '
+                          'process: %s',
+                          generator.filediff, e, request=request)
+
+
+def _get_chunk_process_pool(max_workers):
+    """Return the pool of processes used for generating chunks.
+
+    The pool is created the first time it's needed and then kept around for
+    the lifetime of the process, rather than forking new processes for every
+    request. It's replaced if the number of workers changes, or if this
+    process has been forked since the pool was created (in which case the
+    pool's processes belong to the parent).
+
+    Args:
+        max_workers (int):
+            The number of worker processes the pool should have.
+
+    Returns:
+        multiprocessing.pool.Pool:
+        The process pool.
+    """
+    global _chunk_process_pool
+
+    with _chunk_process_pool_lock:
+        if _chunk_process_pool is not None:
+            pid, num_workers, process_pool = _chunk_process_pool
+
+            if pid == os.getpid() and num_workers == max_workers:
+                return process_pool
+
+            if pid == os.getpid():
+                # Let any chunks still being generated for other requests
+                # finish before the old processes exit.
+                process_pool.close()
+
+        process_pool = multiprocessing.Pool(max_workers,
+                                            initializer=_init_chunk_process)
+        _chunk_process_pool = (os.getpid(), max_workers, process_pool)
+
+        return process_pool
+
+
+def _init_chunk_process():
+    """Prepare a new worker process for generating chunks.
+
+    Worker processes are forked from a web server process, and inherit its
+    database and cache connections. Using those from both processes would
+    mix up their traffic, so the worker closes them and opens its own when
+    needed. The site configuration is also reloaded, in case it's changed
+    since the web server process loaded it.
+    """
+    from django.core.cache import cache
+    from django.db import connection
+
+    if connection.connection is not None:
+        # Closing the connection normally would tell the database server to
+        # end the session, which is still in use by the parent process.
+        # Closing the socket first prevents that.
+        try:
+            os.close(connection.connection.fileno())
+        except (AttributeError, OSError, TypeError):
+            pass
+
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+    try:
+        cache.close()
+    except Exception:
+        pass
+
+    SiteConfiguration.objects.clear_cache()
+
+
 def get_file_from_filediff(context, filediff, interfilediff):
     """Return the files that corresponds to the filediff/interfilediff.
 
@@ -729,26 +1099,13 @@ def get_file_from_filediff(context, filediff, interfilediff):
 
     This function returns either exactly one file or ``None``.
     """
-    interdiffset = None
-
-    key = "_diff_files_%s_%s" % (filediff.diffset.id, filediff.id)
-
-    if interfilediff:
-        key += "_%s" % (interfilediff.id)
-        interdiffset = interfilediff.diffset
+    key = _get_filediff_context_key(filediff, interfilediff)
 
     if key in context:
         files = context[key]
     else:
-        assert 'user' in context
-
-        request = context.get('request', None)
-        files = get_diff_files(filediff.diffset, filediff, interdiffset,
-                               interfilediff=interfilediff,
-                               request=request)
-        populate_diff_chunks(files, get_enable_highlighting(context['user']),
-                             request=request)
-        context[key] = files
+        populate_files_from_filediffs(context, [(filediff, interfilediff)])
+        files = context[key]
 
     if not files:
         return None
@@ -757,6 +1114,118 @@ def get_file_from_filediff(context, filediff, interfilediff):
     return files[0]
 
 
+def populate_files_from_filediffs(context, filediff_pairs):
+    """Populate the files for several filediff/interfilediff pairs at once.
+
+    This looks up the files for each pair that isn't already cached in the
+    context and populates their chunks in one call to
+    :py:func:`populate_diff_chunks`, so that the files needed from the
+    repository are fetched together and the chunks can be generated
+    concurrently. The results are cached in the context for
+    :py:func:`get_file_from_filediff`.
+
+    Args:
+        context (django.template.Context):
+            The template context, which must contain the user.
+
+        filediff_pairs (list of tuple):
+            A list of ``(filediff, interfilediff)`` pairs. ``interfilediff``
+            may be ``None``.
+    """
+    assert 'user' in context
+
+    request = context.get('request', None)
+    files_by_key = {}
+
+    for filediff, interfilediff in filediff_pairs:
+        key = _get_filediff_context_key(filediff, interfilediff)
+
+        if key in context or key in files_by_key:
+            continue
+
+        if interfilediff:
+            interdiffset = interfilediff.diffset
+        else:
+            interdiffset = None
+
+        files_by_key[key] = get_diff_files(filediff.diffset, filediff,
+                                           interdiffset,
+                                           interfilediff=interfilediff,
+                                           request=request)
+
+    if files_by_key:
+        populate_diff_chunks(
+            [
+                f
+                for files in six.itervalues(files_by_key)
+                for f in files
+            ],
+            get_enable_highlighting(context['user']),
+            request=request)
+
+        for key, files in six.iteritems(files_by_key):
+            context[key] = files
+
+
+def _get_filediff_context_key(filediff, interfilediff):
+    """Return the context key used to cache the files for a filediff.
+
+    Args:
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The filediff.
+
+        interfilediff (reviewboard.diffviewer.models.FileDiff):
+            The interfilediff, if any.
+
+    Returns:
+        unicode:
+        The key used to store the files in the context.
+    """
+    key = '_diff_files_%s_%s' % (filediff.diffset.id, filediff.id)
+
+    if interfilediff:
+        key += '_%s' % interfilediff.id
+
+    return key
+
+
+def get_file_chunk_index(context, filediff, interfilediff):
+    """Return the chunk index for the filediff/interfilediff.
+
+    The index is used to look up lines and headers in the file's chunks
+    without walking through all of them. It's stored in the cache alongside
+    the chunks, and in the file information cached in the context.
+
+    Args:
+        context (dict):
+            The template context, used for looking up the user and caching
+            file lists. See :py:func:`get_file_from_filediff`.
+
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff for the file.
+
+        interfilediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff in the interdiff range, if any.
+
+    Returns:
+        reviewboard.diffviewer.chunk_index.DiffChunkIndex:
+        The index for the file's chunks, or ``None`` if there's no file to
+        index.
+    """
+    f = get_file_from_filediff(context, filediff, interfilediff)
+
+    if not f:
+        return None
+
+    try:
+        return f['chunk_index']
+    except KeyError:
+        index = get_diff_chunk_index(f['chunks'], f.get('chunks_cache_key'))
+        f['chunk_index'] = index
+
+        return index
+
+
 def get_last_line_number_in_diff(context, filediff, interfilediff):
     """Determine the last virtual line number in the filediff/interfilediff.
 
@@ -874,9 +1343,9 @@ def get_last_header_before_line(context, filediff, interfilediff, target_line):
     ``text`` The header text
     ======== ==============================================================
     """
-    f = get_file_from_filediff(context, filediff, interfilediff)
+    index = get_file_chunk_index(context, filediff, interfilediff)
 
-    return _get_last_header_in_chunks_before_line(f['chunks'], target_line)
+    return index.get_last_header_before_line(target_line)
 
 
 def get_file_chunks_in_range(context, filediff, interfilediff,
@@ -894,12 +1363,15 @@ def get_file_chunks_in_range(context, filediff, interfilediff,
     f = get_file_from_filediff(context, filediff, interfilediff)
 
     if f:
-        return get_chunks_in_range(f['chunks'], first_line, num_lines)
+        return get_chunks_in_range(
+            f['chunks'], first_line, num_lines,
+            chunk_index=get_file_chunk_index(context, filediff,
+                                             interfilediff))
     else:
         return []
 
 
-def get_chunks_in_range(chunks, first_line, num_lines):
+def get_chunks_in_range(chunks, first_line, num_lines, chunk_index=None):
     """Generate the chunks within a range of lines of a larger list of chunks.
 
     This takes a list of chunks, computes a subset of those chunks from the
@@ -931,8 +1403,27 @@ def get_chunks_in_range(chunks, first_line, num_lines):
     6        Changed regions of the patched line (for "replace" chunks)
     7        True if line consists of only whitespace changes
     ======== =============================================================
+
+    If a :py:class:`~reviewboard.diffviewer.chunk_index.DiffChunkIndex` for
+    the chunks is provided, the chunks before the range are skipped over
+    instead of being searched. ``chunks`` must be a list in this case.
+
+    Lines from collapsed chunks that haven't been syntax-highlighted yet will
+    be highlighted in the returned chunks.
     """
-    for i, chunk in enumerate(chunks):
+    from reviewboard.diffviewer.chunk_generator import get_chunk_lines
+
+    if chunk_index is not None:
+        start = chunk_index.get_chunk_for_line(first_line)
+        all_chunks = chunks
+        chunks = (
+            all_chunks[i]
+            for i in range(start, len(all_chunks))
+        )
+    else:
+        start = 0
+
+    for i, chunk in enumerate(chunks, start):
         lines = chunk['lines']
 
         if lines[-1][0] >= first_line >= lines[0][0]:
@@ -943,12 +1434,19 @@ def get_chunks_in_range(chunks, first_line, num_lines):
             else:
                 last_index = len(lines)
 
+            meta = chunk.get('meta', {})
+
+            if 'pending_highlighting' in meta:
+                # The lines are highlighted below, so this no longer applies.
+                meta = dict(meta)
+                del meta['pending_highlighting']
+
             new_chunk = {
                 'index': i,
-                'lines': chunk['lines'][start_index:last_index],
+                'lines': get_chunk_lines(chunk, start_index, last_index),
                 'numlines': last_index - start_index,
                 'change': chunk['change'],
-                'meta': chunk.get('meta', {}),
+                'meta': meta,
             }
 
             yield new_chunk
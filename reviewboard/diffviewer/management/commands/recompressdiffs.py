@@ -0,0 +1,84 @@
+from __future__ import unicode_literals, division
+
+from datetime import datetime
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.core.management.base import CommandError, NoArgsCommand
+from django.utils.translation import ugettext as _
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard.diffviewer.compression import get_available_compressions
+from reviewboard.diffviewer.management.commands.condensediffs import \
+    Command as CondenseDiffsCommand
+from reviewboard.diffviewer.models import RawFileDiffData
+
+
+class Command(CondenseDiffsCommand):
+    help = ('Re-compresses the diffs stored in the database using the '
+            'configured compression method, making them faster to load')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--compression',
+                    dest='compression',
+                    default=None,
+                    help='The compression method to use (one of %s). '
+                         'Defaults to the method set in the diff viewer '
+                         'settings.'
+                         % ', '.join(get_available_compressions())),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=100,
+                    help='The number of diffs to process at once.'),
+    )
+
+    def handle_noargs(self, **options):
+        compression = options.get('compression')
+
+        if compression is None:
+            siteconfig = SiteConfiguration.objects.get_current()
+            compression = siteconfig.get('diffviewer_diff_compression')
+
+        if compression not in get_available_compressions():
+            raise CommandError(
+                _('"%s" is not an available compression method.')
+                % compression)
+
+        self.stdout.write(
+            _('Re-compressing stored diffs...\n'
+              '\n'
+              'This may take a while. It is safe to continue using '
+              'Review Board while this is\n'
+              'processing, but it may temporarily run slower.\n'
+              '\n'))
+
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        self.start_time = datetime.now()
+        self.prev_prefix_len = 0
+        self.prev_time_remaining_s = ''
+        self.show_remaining = False
+
+        info = RawFileDiffData.objects.recompress_all(
+            compression=compression,
+            batch_done_cb=self._on_batch_done,
+            batch_size=options['batch_size'])
+
+        if info['diffs_recompressed'] == 0:
+            self.stdout.write(_('All diffs are already using this '
+                                'compression method.\n'))
+            return
+
+        self.stdout.write(
+            _('\n'
+              '\n'
+              'Re-compressed %(count)d diffs from %(old_size)s bytes to '
+              '%(new_size)s bytes\n')
+            % {
+                'count': info['diffs_recompressed'],
+                'old_size': intcomma(info['old_diff_size']),
+                'new_size': intcomma(info['new_diff_size']),
+            })
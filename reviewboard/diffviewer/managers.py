@@ -1,8 +1,8 @@
 from __future__ import unicode_literals
 
-import bz2
 import gc
 import hashlib
+import logging
 import os
 import warnings
 
@@ -15,6 +15,9 @@ from django.utils.six.moves import range
 from django.utils.translation import ugettext as _
 from djblets.siteconfig.models import SiteConfiguration
 
+from reviewboard.diffviewer.compression import (compress_diff_data,
+                                                get_available_compressions,
+                                                get_compression_code)
 from reviewboard.diffviewer.differ import DiffCompatVersion
 from reviewboard.diffviewer.errors import DiffTooBigError, EmptyDiffError
 from reviewboard.scmtools.core import PRE_CREATION, UNKNOWN, FileNotFoundError
@@ -336,20 +339,127 @@ class RawFileDiffDataManager(models.Manager):
     This provides conveniences for creating an entry based on a
     LegacyFileDiffData object.
     """
-    def process_diff_data(self, data):
+    def process_diff_data(self, data, compression=None):
         """Processes a diff, returning the resulting content and compression.
 
         If the content would benefit from being compressed, this will
         return the compressed content and the value for the compression
         flag. Otherwise, it will return the raw content.
+
+        Args:
+            data (bytes):
+                The diff content.
+
+            compression (unicode, optional):
+                The name of the compression method to use (see
+                :py:mod:`reviewboard.diffviewer.compression`). This defaults
+                to the ``diffviewer_diff_compression`` setting.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the content to store and the compression
+            code (or ``None``, if uncompressed).
         """
-        compressed_data = bz2.compress(data, 9)
+        if compression is None:
+            siteconfig = SiteConfiguration.objects.get_current()
+            compression = siteconfig.get('diffviewer_diff_compression')
+
+        compressed_data, code = compress_diff_data(data, compression)
 
         if len(compressed_data) < len(data):
-            return compressed_data, self.model.COMPRESSION_BZIP2
+            return compressed_data, code
         else:
             return data, None
 
+    def recompress_all(self, compression=None, batch_done_cb=None,
+                       batch_size=100):
+        """Re-compress stored diffs using a new compression method.
+
+        Diffs that are stored uncompressed, or are already compressed in the
+        same format, are left alone. This is safe to run while the server is
+        in use.
+
+        If the compression method requires a package that isn't installed,
+        nothing is re-compressed.
+
+        Args:
+            compression (unicode, optional):
+                The name of the compression method to use. This defaults to
+                the ``diffviewer_diff_compression`` setting.
+
+            batch_done_cb (callable, optional):
+                A function to call after each batch of diffs is processed.
+                This takes the number of diffs processed so far and the
+                total number of diffs to process.
+
+            batch_size (int, optional):
+                The number of diffs to load and process at once.
+
+        Returns:
+            dict:
+            A dictionary containing the number of ``diffs_recompressed``, and
+            the ``old_diff_size`` and ``new_diff_size`` of those diffs.
+        """
+        if compression is None:
+            siteconfig = SiteConfiguration.objects.get_current()
+            compression = siteconfig.get('diffviewer_diff_compression')
+
+        info = {
+            'diffs_recompressed': 0,
+            'old_diff_size': 0,
+            'new_diff_size': 0,
+        }
+
+        if compression not in get_available_compressions():
+            # Diffs would be compressed using a fallback method instead, and
+            # would be re-compressed again on every run.
+            logging.warning('Unable to re-compress diffs using "%s", as the '
+                            'package it requires is not installed.',
+                            compression)
+            return info
+
+        code = get_compression_code(compression)
+        queryset = (
+            self.filter(compression__isnull=False)
+            .exclude(compression=code)
+            .order_by('pk')
+        )
+        total_count = queryset.count()
+        processed_count = 0
+        last_pk = 0
+
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+
+            if not batch:
+                break
+
+            for item in batch:
+                new_data, new_code = self.process_diff_data(
+                    item._decompress_content(), compression)
+
+                # Only update the diff if it wasn't already changed by
+                # something else in the meantime.
+                updated = (
+                    self.filter(pk=item.pk, compression=item.compression)
+                    .update(binary=new_data, compression=new_code)
+                )
+
+                if updated:
+                    info['diffs_recompressed'] += 1
+                    info['old_diff_size'] += len(item.binary)
+                    info['new_diff_size'] += len(new_data)
+
+            processed_count += len(batch)
+            last_pk = batch[-1].pk
+
+            if callable(batch_done_cb):
+                batch_done_cb(processed_count, total_count)
+
+            reset_queries()
+
+        return info
+
     def get_or_create_from_data(self, data):
         binary_hash = self._hash_hexdigest(data)
         processed_data, compression = self.process_diff_data(data)
@@ -392,6 +502,11 @@ class DiffSetManager(models.Manager):
     HEADER_EXTENSIONS = ["h", "H", "hh", "hpp", "hxx", "h++"]
     IMPL_EXTENSIONS = ["c", "C", "cc", "cpp", "cxx", "c++", "m", "mm", "M"]
 
+    # The number of FileDiffs stored at a time when creating a DiffSet. Each
+    # one holds onto its diff data until it's stored, so they're stored in
+    # batches rather than all at once.
+    FILEDIFF_BATCH_SIZE = 50
+
     def create_from_upload(self, repository, diff_file, parent_diff_file=None,
                            diffset_history=None, basedir=None, request=None,
                            base_commit_id=None, validate_only=False, **kwargs):
@@ -593,6 +708,7 @@ class DiffSetManager(models.Manager):
         """
         from reviewboard.diffviewer.diffutils import convert_to_unicode
         from reviewboard.diffviewer.models import FileDiff
+        from reviewboard.diffviewer.prerender import prerender_diffset
 
         if 'save' in kwargs:
             warnings.warn('The save parameter to '
@@ -658,6 +774,7 @@ class DiffSetManager(models.Manager):
 
         encoding_list = repository.get_encoding_list()
         filediffs = []
+        has_filediffs = False
 
         for f in files:
             parent_file = None
@@ -708,6 +825,11 @@ class DiffSetManager(models.Manager):
             if not validate_only:
                 # This state all requires making modifications to the database.
                 # We only want to do this if we're saving.
+                #
+                # The parsed files only reference ranges of the uploaded diff,
+                # so each file's diff data is built here, one file at a time.
+                # The FileDiffs are stored in batches, and the data for each
+                # batch is released once it's been stored.
                 filediff.diff = f.data
                 filediff.parent_diff = parent_content
 
@@ -716,11 +838,22 @@ class DiffSetManager(models.Manager):
 
                 filediffs.append(filediff)
 
+                if len(filediffs) >= self.FILEDIFF_BATCH_SIZE:
+                    FileDiff.objects.bulk_create(filediffs)
+                    filediffs = []
+                    has_filediffs = True
+
         if validate_only:
             return None
 
         if filediffs:
             FileDiff.objects.bulk_create(filediffs)
+            has_filediffs = True
+
+        if has_filediffs:
+            # Start rendering the diff in the background, so it's ready for
+            # whoever views it first.
+            prerender_diffset(diffset)
 
         return diffset
 
@@ -1,6 +1,5 @@
 from __future__ import unicode_literals
 
-import bz2
 import logging
 
 from django.db import models
@@ -10,6 +9,12 @@ from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import Base64Field, JSONField
 
+from reviewboard.cache.local import local_cache_memoize
+from reviewboard.diffviewer.compression import (CODE_BZIP2,
+                                                CODE_LZ4,
+                                                CODE_ZLIB,
+                                                CODE_ZSTD,
+                                                decompress_diff_data)
 from reviewboard.diffviewer.errors import DiffParserError
 from reviewboard.diffviewer.managers import (RawFileDiffDataManager,
                                              FileDiffManager,
@@ -40,13 +45,20 @@ class RawFileDiffData(models.Model):
 
     This is the class used in Review Board 2.5+ to store diff content.
     Unlike in previous versions, the content is not base64-encoded. Instead,
-    it is stored either as bzip2-compressed data (if the resulting
-    compressed data is smaller than the raw data), or as the raw data itself.
+    it is stored either as compressed data (if the resulting compressed data
+    is smaller than the raw data), or as the raw data itself. See
+    :py:mod:`reviewboard.diffviewer.compression` for the compression methods.
     """
-    COMPRESSION_BZIP2 = 'B'
+    COMPRESSION_BZIP2 = CODE_BZIP2
+    COMPRESSION_ZLIB = CODE_ZLIB
+    COMPRESSION_LZ4 = CODE_LZ4
+    COMPRESSION_ZSTD = CODE_ZSTD
 
     COMPRESSION_CHOICES = (
         (COMPRESSION_BZIP2, _('BZip2-compressed')),
+        (COMPRESSION_ZLIB, _('zlib-compressed')),
+        (COMPRESSION_LZ4, _('LZ4-compressed')),
+        (COMPRESSION_ZSTD, _('Zstandard-compressed')),
     )
 
     binary_hash = models.CharField(_("hash"), max_length=40, unique=True)
@@ -63,15 +75,36 @@ class RawFileDiffData(models.Model):
 
         The content will be uncompressed (if necessary) and returned as the
         raw set of bytes originally uploaded.
+
+        Uncompressed content is kept in the in-process cache (see
+        :py:mod:`reviewboard.cache.local`), keyed by the hash of the content,
+        so that it doesn't have to be decompressed on every access.
         """
-        if self.compression == self.COMPRESSION_BZIP2:
-            return bz2.decompress(self.binary)
-        elif self.compression is None:
+        if self.compression is None:
             return bytes(self.binary)
+        elif self.binary_hash:
+            return local_cache_memoize(
+                'raw-file-diff-data:%s' % self.binary_hash,
+                self._decompress_content)
         else:
-            raise NotImplementedError(
-                'Unsupported compression method %s for RawFileDiffData %s'
-                % (self.compression, self.pk))
+            return self._decompress_content()
+
+    def _decompress_content(self):
+        """Return the uncompressed content of the diff.
+
+        Returns:
+            bytes:
+            The uncompressed content.
+
+        Raises:
+            NotImplementedError:
+                The compression method is not supported.
+        """
+        try:
+            return decompress_diff_data(self.binary, self.compression)
+        except NotImplementedError as e:
+            raise NotImplementedError('%s for RawFileDiffData %s'
+                                      % (e, self.pk))
 
     @property
     def insert_count(self):
@@ -123,6 +156,22 @@ class RawFileDiffData(models.Model):
         verbose_name_plural = _('Raw File Diff Data Blobs')
 
 
+class FileBlob(models.Model):
+    """Stores the content of an original or patched file.
+
+    This is used by the database-backed file blob store (see
+    :py:mod:`reviewboard.diffviewer.blobstore`). The content is
+    zlib-compressed and keyed by the SHA1 of the uncompressed content.
+    """
+    sha1 = models.CharField(_('SHA1'), max_length=40, unique=True)
+    data = models.BinaryField()
+
+    class Meta:
+        db_table = 'diffviewer_fileblob'
+        verbose_name = _('File Blob')
+        verbose_name_plural = _('File Blobs')
+
+
 @python_2_unicode_compatible
 class FileDiff(models.Model):
     """
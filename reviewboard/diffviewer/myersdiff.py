@@ -710,3 +710,412 @@ class MyersDiffer(Differ):
             result *= 2
 
         return result
+
+
+class FastMyersDiffer(MyersDiffer):
+    """A faster implementation of MyersDiffer.
+
+    This generates exactly the same opcodes as :py:class:`MyersDiffer`, but
+    the hot loops (finding the shortest middle snake, the LCS recursion,
+    generating line codes, and building opcodes) keep their state in local
+    variables rather than looking up attributes on every iteration, bound
+    each snake search by a single comparison, and consume runs of equal lines
+    in one step.
+
+    This is used for :py:attr:`DiffCompatVersion.MYERS_FAST` and newer.
+    """
+
+    def get_opcodes(self):
+        """
+        Generator that returns opcodes representing the contents of the
+        diff.
+
+        The resulting opcodes are in the format of
+        (tag, i1, i2, j1, j2)
+        """
+        self._gen_diff_data()
+
+        a_length = self.a_data.length
+        b_length = self.b_data.length
+        a_modified = self.a_data.modified
+        b_modified = self.b_data.modified
+
+        if a_length == 0 and b_length == 0:
+            # There's nothing to process or yield. Bail.
+            return
+
+        a_line = b_line = 0
+        last_group = None
+
+        # Go through the entire set of lines on both the old and new files
+        while a_line < a_length or b_line < b_length:
+            a_start = a_line
+            b_start = b_line
+
+            if (a_line < a_length and not a_modified.get(a_line, False) and
+                b_line < b_length and not b_modified.get(b_line, False)):
+                # Equal. Consume the whole run of equal lines at once.
+                tag = 'equal'
+                a_line += 1
+                b_line += 1
+
+                while (a_line < a_length and b_line < b_length and
+                       not a_modified.get(a_line, False) and
+                       not b_modified.get(b_line, False)):
+                    a_line += 1
+                    b_line += 1
+
+                a_changed = b_changed = a_line - a_start
+            else:
+                # Deleted, inserted or replaced
+
+                # Count every old line that's been modified, and the
+                # remainder of old lines if we've reached the end of the new
+                # file.
+                while (a_line < a_length and
+                       (b_line >= b_length or
+                        a_modified.get(a_line, False))):
+                    a_line += 1
+
+                # Count every new line that's been modified, and the
+                # remainder of new lines if we've reached the end of the old
+                # file.
+                while (b_line < b_length and
+                       (a_line >= a_length or
+                        b_modified.get(b_line, False))):
+                    b_line += 1
+
+                a_changed = a_line - a_start
+                b_changed = b_line - b_start
+
+                if a_changed == 0:
+                    tag = 'insert'
+                elif b_changed == 0:
+                    tag = 'delete'
+                else:
+                    tag = 'replace'
+
+                    if a_changed > b_changed:
+                        a_line -= a_changed - b_changed
+                        a_changed = b_changed
+                    elif a_changed < b_changed:
+                        b_line -= b_changed - a_changed
+                        b_changed = a_changed
+
+            if last_group and last_group[0] == tag:
+                last_group = (tag,
+                              last_group[1], last_group[2] + a_changed,
+                              last_group[3], last_group[4] + b_changed)
+            else:
+                if last_group:
+                    yield last_group
+
+                last_group = (tag, a_start, a_start + a_changed,
+                              b_start, b_start + b_changed)
+
+        if not last_group:
+            last_group = ('equal', 0, a_length, 0, b_length)
+
+        yield last_group
+
+    def _gen_diff_codes(self, lines, is_modified_file):
+        """
+        Converts all unique lines of text into unique numbers. Comparing
+        lists of numbers is faster than comparing lists of strings.
+        """
+        codes = []
+        append_code = codes.append
+        code_table = self.code_table
+        interesting_line_table = self.interesting_line_table
+        interesting_line_regexes = self.interesting_line_regexes
+        ignore_space = self.ignore_space
+
+        if is_modified_file:
+            interesting_lines = self.interesting_lines[1]
+        else:
+            interesting_lines = self.interesting_lines[0]
+
+        for linenum, raw_line in enumerate(lines):
+            line = raw_line
+
+            # Stripping is only needed when ignoring whitespace or checking
+            # new lines for interesting line regexes, so it's skipped for
+            # the common case of lines already in the code table.
+            if ignore_space:
+                stripped_line = raw_line.lstrip()
+
+                # We still want to show lines that contain only whitespace.
+                if stripped_line:
+                    line = stripped_line
+            else:
+                stripped_line = None
+
+            code = code_table.get(line)
+
+            if code is None:
+                if stripped_line is None:
+                    stripped_line = raw_line.lstrip()
+
+                # This is a new, unrecorded line, so mark it and store it.
+                self.last_code += 1
+                code = self.last_code
+                code_table[line] = code
+                interesting_line_name = None
+
+                # Check to see if this is an interesting line that the caller
+                # wants recorded.
+                if stripped_line:
+                    for name, regex in interesting_line_regexes:
+                        if regex.match(raw_line):
+                            interesting_line_name = name
+                            interesting_line_table[code] = name
+                            break
+            else:
+                interesting_line_name = interesting_line_table.get(code)
+
+            if interesting_line_name:
+                interesting_lines[interesting_line_name].append((linenum,
+                                                                 raw_line))
+
+            append_code(code)
+
+        return codes
+
+    def _find_sms(self, a_lower, a_upper, b_lower, b_upper, find_minimal):
+        """
+        Finds the Shortest Middle Snake.
+        """
+        down_vector = self.fdiag  # The vector for the (0, 0) to (x, y) search
+        up_vector = self.bdiag    # The vector for the (u, v) to (N, M) search
+        downoff = self.downoff
+        upoff = self.upoff
+        a_undiscarded = self.a_data.undiscarded
+        b_undiscarded = self.b_data.undiscarded
+        max_lines = self.max_lines
+        snake_limit = self.SNAKE_LIMIT
+
+        down_k = a_lower - b_lower  # The k-line to start the forward search
+        up_k = a_upper - b_upper    # The k-line to start the reverse search
+        odd_delta = (down_k - up_k) % 2 != 0
+
+        down_vector[downoff + down_k] = a_lower
+        up_vector[upoff + up_k] = a_upper
+
+        dmin = a_lower - b_upper
+        dmax = a_upper - b_lower
+
+        down_min = down_max = down_k
+        up_min = up_max = up_k
+
+        cost = 0
+        max_cost = max(256, self._very_approx_sqrt(max_lines * 4))
+        can_bail = (self.compat_version >=
+                    DiffCompatVersion.MYERS_SMS_COST_BAIL)
+
+        while True:
+            cost += 1
+            big_snake = False
+
+            if down_min > dmin:
+                down_min -= 1
+                down_vector[downoff + down_min - 1] = -1
+            else:
+                down_min += 1
+
+            if down_max < dmax:
+                down_max += 1
+                down_vector[downoff + down_max + 1] = -1
+            else:
+                down_max -= 1
+
+            # Extend the forward path
+            for k in range(down_max, down_min - 1, -2):
+                i = downoff + k
+                tlo = down_vector[i - 1]
+                thi = down_vector[i + 1]
+
+                if tlo >= thi:
+                    x = tlo + 1
+                else:
+                    x = thi
+
+                old_x = x
+
+                # Find the end of the furthest reaching forward D-path in
+                # diagonal k. Both x < a_upper and y < b_upper are checked
+                # through x_end, as y is always x - k.
+                x_end = b_upper + k
+
+                if x_end > a_upper:
+                    x_end = a_upper
+
+                while x < x_end and a_undiscarded[x] == b_undiscarded[x - k]:
+                    x += 1
+
+                if (odd_delta and up_min <= k <= up_max and
+                    up_vector[upoff + k] <= x):
+                    return x, x - k, True, True
+
+                if x - old_x > snake_limit:
+                    big_snake = True
+
+                down_vector[i] = x
+
+            # Extend the reverse path
+            if up_min > dmin:
+                up_min -= 1
+                up_vector[upoff + up_min - 1] = max_lines
+            else:
+                up_min += 1
+
+            if up_max < dmax:
+                up_max += 1
+                up_vector[upoff + up_max + 1] = max_lines
+            else:
+                up_max -= 1
+
+            for k in range(up_max, up_min - 1, -2):
+                i = upoff + k
+                tlo = up_vector[i - 1]
+                thi = up_vector[i + 1]
+
+                if tlo < thi:
+                    x = tlo
+                else:
+                    x = thi - 1
+
+                old_x = x
+
+                # As above, this checks both x > a_lower and y > b_lower.
+                x_start = b_lower + k
+
+                if x_start < a_lower:
+                    x_start = a_lower
+
+                while (x > x_start and
+                       a_undiscarded[x - 1] == b_undiscarded[x - 1 - k]):
+                    x -= 1
+
+                if (not odd_delta and down_min <= k <= down_max and
+                        x <= down_vector[downoff + k]):
+                    return x, x - k, True, True
+
+                if old_x - x > snake_limit:
+                    big_snake = True
+
+                up_vector[i] = x
+
+            if find_minimal:
+                continue
+
+            # Heuristics courtesy of GNU diff. See MyersDiffer._find_sms.
+            if cost > 200 and big_snake:
+                ret_x, ret_y, best = self._find_diagonal(
+                    down_min, down_max, down_k, 0,
+                    downoff, down_vector,
+                    lambda x: x - a_lower,
+                    lambda x: a_lower + snake_limit <= x < a_upper,
+                    lambda y: b_lower + snake_limit <= y < b_upper,
+                    lambda i, k: i - k,
+                    1, cost)
+
+                if best > 0:
+                    return ret_x, ret_y, True, False
+
+                ret_x, ret_y, best = self._find_diagonal(
+                    up_min, up_max, up_k, best, upoff,
+                    up_vector,
+                    lambda x: a_upper - x,
+                    lambda x: a_lower < x <= a_upper - snake_limit,
+                    lambda y: b_lower < y <= b_upper - snake_limit,
+                    lambda i, k: i + k,
+                    0, cost)
+
+                if best > 0:
+                    return ret_x, ret_y, False, True
+
+            if cost >= max_cost and can_bail:
+                # We've reached or gone past the max cost. Just give up now
+                # and report the halfway point between our best results.
+                fx_best = bx_best = 0
+
+                # Find the forward diagonal that maximized x + y
+                fxy_best = -1
+                for d in range(down_max, down_min - 1, -2):
+                    x = min(down_vector[downoff + d], a_upper)
+                    y = x - d
+
+                    if b_upper < y:
+                        x = b_upper + d
+                        y = b_upper
+
+                    if fxy_best < x + y:
+                        fxy_best = x + y
+                        fx_best = x
+
+                # Find the backward diagonal that minimizes x + y
+                bxy_best = max_lines
+                for d in range(up_max, up_min - 1, -2):
+                    x = max(a_lower, up_vector[upoff + d])
+                    y = x - d
+
+                    if y < b_lower:
+                        x = b_lower + d
+                        y = b_lower
+
+                    if x + y < bxy_best:
+                        bxy_best = x + y
+                        bx_best = x
+
+                # Use the better of the two diagonals
+                if a_upper + b_upper - bxy_best < \
+                   fxy_best - (a_lower + b_lower):
+                    return fx_best, fxy_best - fx_best, True, False
+                else:
+                    return bx_best, bxy_best - bx_best, False, True
+
+        raise Exception("The function should not have reached here.")
+
+    def _lcs(self, a_lower, a_upper, b_lower, b_upper, find_minimal):
+        """
+        The divide-and-conquer implementation of the Longest Common
+        Subsequence (LCS) algorithm.
+        """
+        a_data = self.a_data
+        b_data = self.b_data
+        a_undiscarded = a_data.undiscarded
+        b_undiscarded = b_data.undiscarded
+
+        # Fast walkthrough equal lines at the start
+        while (a_lower < a_upper and b_lower < b_upper and
+               a_undiscarded[a_lower] == b_undiscarded[b_lower]):
+            a_lower += 1
+            b_lower += 1
+
+        while (a_upper > a_lower and b_upper > b_lower and
+               a_undiscarded[a_upper - 1] == b_undiscarded[b_upper - 1]):
+            a_upper -= 1
+            b_upper -= 1
+
+        if a_lower == a_upper:
+            # Inserted lines.
+            modified = b_data.modified
+            real_indexes = b_data.real_indexes
+
+            for i in range(b_lower, b_upper):
+                modified[real_indexes[i]] = True
+        elif b_lower == b_upper:
+            # Deleted lines
+            modified = a_data.modified
+            real_indexes = a_data.real_indexes
+
+            for i in range(a_lower, a_upper):
+                modified[real_indexes[i]] = True
+        else:
+            # Find the middle snake and length of an optimal path for A and B
+            x, y, low_minimal, high_minimal = \
+                self._find_sms(a_lower, a_upper, b_lower, b_upper,
+                               find_minimal)
+
+            self._lcs(a_lower, x, b_lower, y, low_minimal)
+            self._lcs(x, a_upper, y, b_upper, high_minimal)
@@ -6,6 +6,7 @@ import re
 from django.utils import six
 from django.utils.six.moves import range
 
+from reviewboard.diffviewer.differ import DiffCompatVersion
 from reviewboard.diffviewer.processors import (filter_interdiff_opcodes,
                                                post_process_filtered_equals)
 
@@ -40,6 +41,20 @@ class DiffOpcodeGenerator(object):
     MOVE_PREFERRED_MIN_LINES = 2
     MOVE_MIN_LINE_LENGTH = 20
 
+    # The maximum number of removed lines matching an inserted line that
+    # will be considered as the start of a new move range. Lines matching
+    # more removed lines than this (closing braces, common statements, etc.)
+    # are narrowed down to the removed lines that are also followed by the
+    # next inserted line. If there are still too many, they can only extend
+    # move ranges that have already been found. This keeps move detection
+    # close to linear on large refactors. Set to None to consider every
+    # matching line.
+    #
+    # This changes which moves are found, so it's only applied to diffs with
+    # a compatibility version of DiffCompatVersion.MYERS_FAST_MOVE_LIMIT or
+    # higher.
+    MOVE_MAX_CANDIDATES = 100
+
     TAB_SIZE = 8
 
     def __init__(self, differ, diff=None, interdiff=None):
@@ -59,6 +74,8 @@ class DiffOpcodeGenerator(object):
         """
         self.groups = []
         self.removes = {}
+        self.removes_by_index = {}
+        self.removes_by_next_line = {}
         self.inserts = []
 
         # Run the opcodes through the chain.
@@ -158,8 +175,9 @@ class DiffOpcodeGenerator(object):
                     line = self.differ.a[i].strip()
 
                     if line:
-                        self.removes.setdefault(line, []).append(
-                            (i, group, group_index))
+                        remove_info = (i, group, group_index)
+                        self.removes.setdefault(line, []).append(remove_info)
+                        self.removes_by_index[i] = remove_info
 
             if tag in ('insert', 'replace'):
                 self.inserts.append(group)
@@ -322,6 +340,12 @@ class DiffOpcodeGenerator(object):
 
         is_replace = (itag == 'replace')
 
+        compat_version = self.differ.compat_version
+        limit_candidates = (
+            self.MOVE_MAX_CANDIDATES is not None and
+            compat_version is not None and
+            compat_version >= DiffCompatVersion.MYERS_FAST_MOVE_LIMIT)
+
         # Loop through every location from ij1 through ij2 - 1 until we've
         # reached the end.
         while i_move_cur < ij2:
@@ -348,7 +372,19 @@ class DiffOpcodeGenerator(object):
                 #
                 # If there isn't any move information for this line, we'll
                 # simply add it to the move ranges.
-                for ri, rgroup, rgroup_index in self.removes[iline]:
+                #
+                # If this line matches too many removed lines, only the ones
+                # that would extend an existing move range are considered.
+                # Otherwise, every occurrence of common lines would be
+                # checked (and start a new range) for every inserted line.
+                candidates = self.removes[iline]
+
+                if (limit_candidates and
+                    len(candidates) > self.MOVE_MAX_CANDIDATES):
+                    candidates = self._get_common_line_move_candidates(
+                        iline, i_move_cur, ij2, r_move_ranges)
+
+                for ri, rgroup, rgroup_index in candidates:
                     # Ignore any lines that have already been processed as
                     # part of a move, so we don't end up with incorrect blocks
                     # of lines being matched.
@@ -501,6 +537,75 @@ class DiffOpcodeGenerator(object):
                 i_move_range = MoveRange(i_move_cur, i_move_cur)
                 r_move_ranges = {}
 
+    def _get_common_line_move_candidates(self, line, j, ij2, r_move_ranges):
+        """Return the removed lines to consider for a common inserted line.
+
+        This is used in place of :py:attr:`removes` for lines matching more
+        than :py:attr:`MOVE_MAX_CANDIDATES` removed lines. Rather than
+        considering every one of them, this considers the removed lines
+        immediately following an existing move range (which would extend
+        it), and the removed lines followed by the same line as the inserted
+        line (which could start a new move range of more than one line).
+
+        Args:
+            line (unicode):
+                The stripped inserted line.
+
+            j (int):
+                The index of the inserted line.
+
+            ij2 (int):
+                The end of the insert group containing the line.
+
+            r_move_ranges (dict):
+                The move ranges currently being built.
+
+        Returns:
+            list of tuple:
+            The removed lines to consider, in the same form (and order) as
+            the values in :py:attr:`removes`.
+        """
+        candidates = {}
+
+        for r_move_range in six.itervalues(r_move_ranges):
+            ri = r_move_range.end + 1
+            remove_info = self.removes_by_index.get(ri)
+
+            if (remove_info is not None and
+                self.differ.a[ri].strip() == line):
+                candidates[ri] = remove_info
+
+        if j + 1 < ij2:
+            try:
+                removes_by_next_line = self.removes_by_next_line[line]
+            except KeyError:
+                # Index the removed lines matching this line by the line that
+                # follows them. This is only done once for each common line.
+                removes_by_next_line = {}
+                num_lines = len(self.differ.a)
+
+                for remove_info in self.removes[line]:
+                    next_ri = remove_info[0] + 1
+
+                    if next_ri < num_lines:
+                        next_line = self.differ.a[next_ri].strip()
+                        removes_by_next_line.setdefault(next_line, []).append(
+                            remove_info)
+
+                self.removes_by_next_line[line] = removes_by_next_line
+
+            starts = removes_by_next_line.get(self.differ.b[j + 1].strip(),
+                                              [])
+
+            if len(starts) <= self.MOVE_MAX_CANDIDATES:
+                for remove_info in starts:
+                    candidates[remove_info[0]] = remove_info
+
+        return [
+            candidates[ri]
+            for ri in sorted(six.iterkeys(candidates))
+        ]
+
     def _find_longest_move_range(self, r_move_ranges):
         # Go through every range of lines we've found and find the longest.
         #
@@ -2,13 +2,166 @@ from __future__ import unicode_literals
 
 import logging
 import re
+from array import array
 
 from django.utils import six
-from django.utils.six.moves import cStringIO as StringIO
+from django.utils.six.moves import range
 
 from reviewboard.diffviewer.errors import DiffParserError
 
 
+class DiffLines(object):
+    """The lines in a diff.
+
+    This is a read-only sequence providing the same lines that
+    :py:func:`~reviewboard.diffviewer.diffutils.split_line_endings` would
+    return for the diff. Rather than storing a string for every line, only
+    the offsets of each line within the diff data are stored, and lines are
+    sliced out of the data as they're accessed. This keeps the memory needed
+    for parsing large diffs close to the size of the diff itself.
+    """
+
+    def __init__(self, data):
+        """Initialize the lines.
+
+        Args:
+            data (bytes):
+                The contents of the diff.
+        """
+        from reviewboard.diffviewer.diffutils import NEWLINE_RE
+
+        self.data = data
+
+        # The offset of the start of each line, and of the line ending
+        # following it (or the end of the data, for an unterminated last
+        # line).
+        self._starts = array(b'l')
+        self._ends = array(b'l')
+
+        start = 0
+
+        for m in NEWLINE_RE.finditer(data):
+            self._starts.append(start)
+            self._ends.append(m.start())
+            start = m.end()
+
+        if start < len(data):
+            self._starts.append(start)
+            self._ends.append(len(data))
+
+    def get_data_ranges(self, start, end):
+        """Return the ranges of diff data covering a range of lines.
+
+        Each line in the resulting ranges is followed by a ``\\n``. Lines
+        ending in ``\\r\\n`` or ``\\r\\r\\n`` are split up so that only
+        the ``\\n`` is included. Lines ending in ``\\r``, and an unterminated
+        last line, have no ``\\n`` in the data, so they're followed by a
+        ``None`` range instead. This matches the normalized lines that would
+        be built by joining the lines with ``\\n``.
+
+        Args:
+            start (int):
+                The index of the first line.
+
+            end (int):
+                The index after the last line.
+
+        Returns:
+            list of tuple:
+            A list of ``(start, end)`` offsets within :py:attr:`data`, or
+            ``None`` where a ``\\n`` must be added.
+        """
+        data = self.data
+        data_len = len(data)
+        starts = self._starts
+        ends = self._ends
+        num_lines = len(starts)
+        ranges = []
+        range_start = None
+
+        for i in range(start, end):
+            line_start = starts[i]
+            line_end = ends[i]
+
+            if range_start is None:
+                range_start = line_start
+            elif line_start != range_end:
+                ranges.append((range_start, range_end))
+                range_start = line_start
+
+            if i + 1 < num_lines:
+                newline_end = starts[i + 1]
+            else:
+                newline_end = data_len
+
+            if (newline_end > line_end and
+                data[newline_end - 1:newline_end] == b'\n'):
+                if newline_end - line_end > 1:
+                    # The line ends with \r\n or \r\r\n. Skip the \r
+                    # characters.
+                    if range_start < line_end:
+                        ranges.append((range_start, line_end))
+
+                    range_start = newline_end - 1
+
+                range_end = newline_end
+            else:
+                if range_start < line_end:
+                    ranges.append((range_start, line_end))
+
+                ranges.append(None)
+                range_start = None
+
+        if range_start is not None:
+            ranges.append((range_start, range_end))
+
+        return ranges
+
+    def __len__(self):
+        """Return the number of lines.
+
+        Returns:
+            int:
+            The number of lines in the diff.
+        """
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        """Return a line or a list of lines.
+
+        Args:
+            index (int or slice):
+                The index of the line, or a slice of lines.
+
+        Returns:
+            bytes or list of bytes:
+            The line (without its line ending), or a list of lines.
+
+        Raises:
+            IndexError:
+                The index was out of range.
+        """
+        try:
+            return self.data[self._starts[index]:self._ends[index]]
+        except TypeError:
+            # This is a slice. Indexing the offset arrays gave us arrays,
+            # which can't be used to slice the data.
+            return [
+                self[i]
+                for i in range(*index.indices(len(self)))
+            ]
+
+    def __iter__(self):
+        """Iterate through the lines.
+
+        Yields:
+            bytes:
+            Each line in the diff, without its line ending.
+        """
+        for i in range(len(self)):
+            yield self[i]
+
+
 class ParsedDiffFile(object):
     """A parsed file from a diff.
 
@@ -37,29 +190,51 @@ class ParsedDiffFile(object):
         self.insert_count = 0
         self.delete_count = 0
 
-        self._data_io = StringIO()
-        self._data = None
+        # The contents of the diff are stored as a list of byte strings and
+        # [start, end] ranges of lines from the diff being parsed (_lines).
+        # They're only turned into data when accessing data. _chunks_end is
+        # the end of the last chunk, if it's a range of lines.
+        self._chunks = []
+        self._chunks_end = None
+        self._lines = None
+        self._finalized = False
 
     @property
     def data(self):
         """The data for this diff.
 
         This must be accessed after :py:meth:`finalize` has been called.
+
+        The data is built from the parsed diff each time this is accessed,
+        so callers should hold onto the result rather than accessing this
+        repeatedly.
         """
-        if self._data is None:
+        if not self._finalized:
             raise ValueError('ParsedDiffFile.data cannot be accessed until '
                              'finalize() is called.')
 
-        return self._data
+        data = []
+
+        for chunk in self._chunks:
+            if isinstance(chunk, six.binary_type):
+                data.append(chunk)
+            else:
+                source_data = self._lines.data
+
+                for data_range in self._lines.get_data_ranges(*chunk):
+                    if data_range is None:
+                        data.append(b'\n')
+                    else:
+                        data.append(source_data[data_range[0]:data_range[1]])
+
+        return b''.join(data)
 
     def finalize(self):
         """Finalize the parsed diff.
 
-        This makes the diff data available to consumers and closes the buffer
-        for writing.
+        This makes the diff data available to consumers.
         """
-        self._data = self._data_io.getvalue()
-        self._data_io.close()
+        self._finalized = True
 
     def prepend_data(self, data):
         """Prepend data to the buffer.
@@ -69,12 +244,10 @@ class ParsedDiffFile(object):
                 The data to prepend.
         """
         if data:
-            new_data_io = StringIO()
-            new_data_io.write(data)
-            new_data_io.write(self._data_io.getvalue())
+            self._chunks.insert(0, data)
 
-            self._data_io.close()
-            self._data_io = new_data_io
+            if len(self._chunks) == 1:
+                self._chunks_end = None
 
     def append_data(self, data):
         """Append data to the buffer.
@@ -84,7 +257,59 @@ class ParsedDiffFile(object):
                 The data to append.
         """
         if data:
-            self._data_io.write(data)
+            self._chunks.append(data)
+            self._chunks_end = None
+
+    def prepend_lines(self, lines, start, end):
+        """Prepend lines from the diff to the buffer.
+
+        Each line will be followed by a newline.
+
+        Args:
+            lines (DiffLines):
+                The lines of the diff being parsed.
+
+            start (int):
+                The index of the first line to prepend.
+
+            end (int):
+                The index after the last line to prepend.
+        """
+        if start < end:
+            self._lines = lines
+            self._chunks.insert(0, [start, end])
+
+            if len(self._chunks) == 1:
+                self._chunks_end = end
+
+    def append_lines(self, lines, start, end):
+        """Append lines from the diff to the buffer.
+
+        Each line will be followed by a newline. Rather than copying the
+        lines, this stores the range of lines, which is turned into data
+        when accessing :py:attr:`data`. All lines added to a file must come
+        from the same :py:class:`DiffLines`.
+
+        Args:
+            lines (DiffLines):
+                The lines of the diff being parsed.
+
+            start (int):
+                The index of the first line to append.
+
+            end (int):
+                The index after the last line to append.
+        """
+        if start < end:
+            self._lines = lines
+
+            if start == self._chunks_end:
+                # This follows on from the last range, so extend it.
+                self._chunks[-1][1] = end
+            else:
+                self._chunks.append([start, end])
+
+            self._chunks_end = end
 
 
 class DiffParser(object):
@@ -96,12 +321,10 @@ class DiffParser(object):
     INDEX_SEP = b"=" * 67
 
     def __init__(self, data):
-        from reviewboard.diffviewer.diffutils import split_line_endings
-
         self.base_commit_id = None
         self.new_commit_id = None
         self.data = data
-        self.lines = split_line_endings(data)
+        self.lines = DiffLines(data)
 
     def parse(self):
         """
@@ -111,13 +334,13 @@ class DiffParser(object):
         logging.debug("DiffParser.parse: Beginning parse of diff, size = %s",
                       len(self.data))
 
-        preamble = StringIO()
         self.files = []
         parsed_file = None
+        num_lines = len(self.lines)
         i = 0
 
         # Go through each line in the diff, looking for diff headers.
-        while i < len(self.lines):
+        while i < num_lines:
             next_linenum, new_file = self.parse_change_header(i)
 
             if new_file:
@@ -126,30 +349,23 @@ class DiffParser(object):
                 # First, finalize the last one.
                 if self.files:
                     self.files[-1].finalize()
+                else:
+                    # We need to prepend the preamble (everything before
+                    # the first file), if we have one.
+                    new_file.prepend_lines(self.lines, 0, i)
 
                 parsed_file = new_file
-
-                # We need to prepend the preamble, if we have one.
-                parsed_file.prepend_data(preamble.getvalue())
-
-                preamble.close()
-                preamble = StringIO()
-
                 self.files.append(parsed_file)
                 i = next_linenum
+            elif parsed_file:
+                i = self.parse_diff_line(i, parsed_file)
             else:
-                if parsed_file:
-                    i = self.parse_diff_line(i, parsed_file)
-                else:
-                    preamble.write(self.lines[i])
-                    preamble.write(b'\n')
-                    i += 1
+                # This is part of the preamble.
+                i += 1
 
         if self.files:
             self.files[-1].finalize()
 
-        preamble.close()
-
         logging.debug("DiffParser.parse: Finished parsing diff.")
 
         return self.files
@@ -163,8 +379,7 @@ class DiffParser(object):
             elif line.startswith(b'+'):
                 info.insert_count += 1
 
-        info.append_data(line)
-        info.append_data(b'\n')
+        info.append_lines(self.lines, linenum, linenum + 1)
 
         return linenum + 1
 
@@ -217,11 +432,7 @@ class DiffParser(object):
 
             # The header is part of the diff, so make sure it gets in the
             # diff content.
-            lines = self.lines[start:linenum]
-
-            for line in lines:
-                parsed_file.append_data(line)
-                parsed_file.append_data(b'\n')
+            parsed_file.append_lines(self.lines, start, linenum)
 
         return linenum, parsed_file
 
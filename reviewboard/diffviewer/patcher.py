@@ -0,0 +1,642 @@
+"""An in-process applier for unified diffs.
+
+This is used by :py:func:`reviewboard.diffviewer.diffutils.patch` to apply
+diffs without having to spawn :command:`patch` and juggle temporary files for
+every file in a diff. It understands the subset of :command:`patch` behavior
+that matters for Review Board: unified diff hunks, offset searching, a fuzz
+factor for mismatched context, ``\\ No newline at end of file`` markers, and
+reporting of rejected hunks in the same form that :command:`patch` reports
+them.
+
+Anything it doesn't understand (such as context diffs), or can't be sure to
+apply exactly as :command:`patch` would, results in a
+:py:class:`UnsupportedPatchError`, allowing the caller to fall back on the
+:command:`patch` binary.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import re
+
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.errors import PatchError
+
+
+HUNK_HEADER_RE = re.compile(
+    br'^@@ -(?P<orig_start>\d+)(?:,(?P<orig_len>\d+))? '
+    br'\+(?P<new_start>\d+)(?:,(?P<new_len>\d+))? @@')
+
+#: The default maximum fuzz factor, matching the default of GNU patch.
+DEFAULT_MAX_FUZZ = 2
+
+
+class UnsupportedPatchError(Exception):
+    """The diff is in a format that the in-process patcher can't apply."""
+
+
+class Hunk(object):
+    """A hunk parsed from a unified diff.
+
+    Attributes:
+        number (int):
+            The 1-based index of the hunk within the diff.
+
+        orig_start (int):
+            The starting line number of the hunk in the original file.
+
+        orig_len (int):
+            The number of lines from the original file in the hunk.
+
+        new_start (int):
+            The starting line number of the hunk in the new file.
+
+        new_len (int):
+            The number of lines from the new file in the hunk.
+
+        lines (list of tuple):
+            The lines of the hunk, each as a tuple of
+            ``(prefix, line_data)``, where ``prefix`` is one of ``b' '``,
+            ``b'-'``, or ``b'+'``. Line data includes the trailing newline,
+            unless marked as missing one.
+
+        text (bytes):
+            The raw text of the hunk, used when generating rejects.
+    """
+
+    # The prefix of each line in the hunk when the hunk is reversed.
+    _REVERSED_PREFIXES = {
+        b' ': b' ',
+        b'-': b'+',
+        b'+': b'-',
+    }
+
+    def __init__(self, number, orig_start, orig_len, new_start, new_len):
+        """Initialize the hunk.
+
+        Args:
+            number (int):
+                The 1-based index of the hunk within the diff.
+
+            orig_start (int):
+                The starting line number in the original file.
+
+            orig_len (int):
+                The number of lines from the original file.
+
+            new_start (int):
+                The starting line number in the new file.
+
+            new_len (int):
+                The number of lines from the new file.
+        """
+        self.number = number
+        self.orig_start = orig_start
+        self.orig_len = orig_len
+        self.new_start = new_start
+        self.new_len = new_len
+        self.lines = []
+        self.text = b''
+
+    @property
+    def prefix_context(self):
+        """The number of context lines at the start of the hunk."""
+        count = 0
+
+        for prefix, line in self.lines:
+            if prefix != b' ':
+                break
+
+            count += 1
+
+        return count
+
+    @property
+    def suffix_context(self):
+        """The number of context lines at the end of the hunk."""
+        count = 0
+
+        for prefix, line in reversed(self.lines):
+            if prefix != b' ':
+                break
+
+            count += 1
+
+        return count
+
+    @property
+    def first(self):
+        """The 1-based line in the original file where the hunk begins.
+
+        A hunk without any lines from the original file refers to the line
+        it comes after, so this is the line following that one, as in
+        :command:`patch`.
+        """
+        if self.orig_len == 0:
+            return self.orig_start + 1
+
+        return self.orig_start
+
+    def reverse(self):
+        """Return a copy of the hunk with its changes reversed.
+
+        Returns:
+            Hunk:
+            The reversed hunk.
+        """
+        hunk = Hunk(number=self.number,
+                    orig_start=self.new_start,
+                    orig_len=self.new_len,
+                    new_start=self.orig_start,
+                    new_len=self.orig_len)
+        hunk.lines = [
+            (self._REVERSED_PREFIXES[prefix], line)
+            for prefix, line in self.lines
+        ]
+        hunk.text = self.text
+
+        return hunk
+
+    def __repr__(self):
+        return '<Hunk(%d, -%d,%d +%d,%d)>' % (
+            self.number, self.orig_start, self.orig_len, self.new_start,
+            self.new_len)
+
+
+def split_lines(data):
+    """Split file or diff content into lines, retaining line endings.
+
+    Content passed to the patcher has already had its line endings
+    normalized to ``\\n``, so this only needs to split on that.
+
+    Args:
+        data (bytes):
+            The data to split.
+
+    Returns:
+        list of bytes:
+        The lines, each including its trailing newline (except possibly the
+        last line).
+    """
+    lines = data.split(b'\n')
+
+    if lines[-1]:
+        last_line = lines.pop()
+    else:
+        last_line = None
+        lines.pop()
+
+    lines = [line + b'\n' for line in lines]
+
+    if last_line is not None:
+        lines.append(last_line)
+
+    return lines
+
+
+def parse_hunks(diff):
+    """Parse the hunks out of a unified diff.
+
+    Anything outside of a hunk (such as file headers or ``Index:`` lines) is
+    skipped, as :command:`patch` would do.
+
+    Args:
+        diff (bytes):
+            The diff content, with normalized line endings.
+
+    Returns:
+        tuple:
+        A tuple of ``(header, hunks)``, where ``header`` is the ``---`` and
+        ``+++`` lines (or ``None``, if not found), and ``hunks`` is a list of
+        :py:class:`Hunk`.
+
+    Raises:
+        UnsupportedPatchError:
+            The diff isn't a unified diff, or a hunk is malformed.
+    """
+    lines = split_lines(diff)
+    num_lines = len(lines)
+    hunks = []
+    header = None
+    in_hunks = False
+    i = 0
+
+    while i < num_lines:
+        line = lines[i]
+
+        if line.startswith(b'*** ') or line == b'***************\n':
+            raise UnsupportedPatchError('Context diffs are not supported')
+        elif (line.startswith(b'--- ') and i + 1 < num_lines and
+              lines[i + 1].startswith(b'+++ ')):
+            if header is None:
+                header = line + lines[i + 1]
+
+            in_hunks = False
+            i += 2
+            continue
+
+        m = HUNK_HEADER_RE.match(line)
+
+        if not m:
+            in_hunks = False
+            i += 1
+            continue
+
+        if hunks and not in_hunks:
+            # patch treats anything between hunks as the end of one patch
+            # and the start of another, which is applied separately.
+            raise UnsupportedPatchError('Unexpected content before hunk #%d'
+                                        % (len(hunks) + 1))
+
+        in_hunks = True
+
+        orig_len = m.group('orig_len')
+        new_len = m.group('new_len')
+
+        hunk = Hunk(number=len(hunks) + 1,
+                    orig_start=int(m.group('orig_start')),
+                    orig_len=int(orig_len) if orig_len is not None else 1,
+                    new_start=int(m.group('new_start')),
+                    new_len=int(new_len) if new_len is not None else 1)
+        hunk_start = i
+        orig_remaining = hunk.orig_len
+        new_remaining = hunk.new_len
+        i += 1
+
+        while (orig_remaining > 0 or new_remaining > 0) and i < num_lines:
+            line = lines[i]
+            prefix = line[:1]
+
+            if prefix == b' ' or line == b'\n':
+                # Some tools (and mail clients) strip the space from empty
+                # context lines. patch treats these as context, so we do too.
+                hunk.lines.append((b' ', line[1:] or b'\n'))
+                orig_remaining -= 1
+                new_remaining -= 1
+            elif prefix == b'-':
+                hunk.lines.append((b'-', line[1:]))
+                orig_remaining -= 1
+            elif prefix == b'+':
+                hunk.lines.append((b'+', line[1:]))
+                new_remaining -= 1
+            elif prefix == b'\\':
+                _strip_last_newline(hunk)
+            else:
+                break
+
+            i += 1
+
+        if orig_remaining != 0 or new_remaining != 0:
+            raise UnsupportedPatchError('Malformed hunk #%d'
+                                        % hunk.number)
+
+        # A "\ No newline at end of file" marker may follow the last line
+        # of the hunk.
+        if i < num_lines and lines[i].startswith(b'\\'):
+            _strip_last_newline(hunk)
+            i += 1
+
+        hunk.text = b''.join(lines[hunk_start:i])
+        hunks.append(hunk)
+
+    return header, hunks
+
+
+def apply_patch(diff, orig_file, filename, max_fuzz=DEFAULT_MAX_FUZZ):
+    """Apply a unified diff to a file in-process.
+
+    Hunks are located the same way :command:`patch` locates them. Each hunk
+    is first searched for at its expected position (adjusted by the offset
+    of previously-applied hunks), then at increasing distances from that
+    position. If no exact match is found, up to ``max_fuzz`` lines of
+    context are ignored and the search is repeated. As in :command:`patch`,
+    a hunk with less leading context than trailing context can only apply
+    at the start of the file if it was made there, and a hunk with less
+    trailing context than leading context can only apply at the end of the
+    file.
+
+    Hunks that can't be applied are rejected, and the resulting error
+    contains the partially-patched file and the rejects, as
+    :command:`patch` would provide.
+
+    Any case where the result may differ from what :command:`patch` would
+    produce (such as a line without a trailing newline ending up in the
+    middle of the file) results in a :py:class:`UnsupportedPatchError`, so
+    that the caller can fall back on :command:`patch`.
+
+    Args:
+        diff (bytes):
+            The contents of the diff, with normalized line endings.
+
+        orig_file (bytes):
+            The contents of the original file, with normalized line endings.
+
+        filename (unicode):
+            The name of the file being patched.
+
+        max_fuzz (int, optional):
+            The maximum number of context lines to ignore when searching
+            for the location of a hunk.
+
+    Returns:
+        bytes:
+        The contents of the patched file.
+
+    Raises:
+        UnsupportedPatchError:
+            The diff can't be reliably applied in-process.
+
+        reviewboard.diffviewer.errors.PatchError:
+            One or more hunks failed to apply.
+    """
+    header, hunks = parse_hunks(diff)
+
+    if not hunks:
+        raise UnsupportedPatchError('No unified diff hunks were found')
+
+    orig_lines = split_lines(orig_file)
+    new_lines = []
+    messages = []
+    rejected = []
+
+    # The offset of the last located hunk from where the diff said it would
+    # be, and the number of lines from the original file that have been
+    # copied or removed so far.
+    offset = 0
+    orig_pos = 0
+
+    for hunk in hunks:
+        if not any(prefix != b' ' for prefix, line in hunk.lines):
+            raise UnsupportedPatchError('Hunk #%d has no changes'
+                                        % hunk.number)
+
+        hunk_max_fuzz = min(max_fuzz,
+                            max(hunk.prefix_context, hunk.suffix_context))
+        where = None
+
+        for fuzz in range(hunk_max_fuzz + 1):
+            where = _locate_hunk(hunk, orig_lines, orig_pos, offset, fuzz)
+
+            if where is not None:
+                break
+
+            if (hunk.number == 1 and
+                _locate_hunk(hunk.reverse(), orig_lines, orig_pos, offset,
+                             fuzz) is not None):
+                # patch would ask whether to reverse the diff, and skip it
+                # without a terminal to ask on.
+                raise UnsupportedPatchError(
+                    'The diff appears to be reversed or already applied')
+
+        if where is None:
+            rejected.append(hunk)
+            messages.append('Hunk #%d FAILED at %d.'
+                            % (hunk.number, hunk.orig_start + offset))
+            continue
+
+        offset = where - hunk.first
+
+        if where - 1 < orig_pos or where - 1 > len(orig_lines):
+            # This can only happen for hunks without any lines from the
+            # original file. patch gives up on the whole diff here.
+            raise UnsupportedPatchError('Hunk #%d is out of order'
+                                        % hunk.number)
+
+        # Apply the hunk the way patch does. Lines from the original file
+        # are only copied up to the last line that's removed or that has
+        # lines added before it, so trailing context may still be matched
+        # by the next hunk. Context is copied from the file rather than the
+        # hunk, in case they differ by fuzz.
+        pos = where - 1
+
+        for prefix, line in hunk.lines:
+            if prefix == b' ':
+                pos += 1
+            elif prefix == b'-':
+                new_lines.extend(orig_lines[orig_pos:pos])
+                pos += 1
+                orig_pos = pos
+            else:
+                new_lines.extend(orig_lines[orig_pos:pos])
+                new_lines.append(line)
+                orig_pos = pos
+
+        if fuzz or offset:
+            message = 'Hunk #%d succeeded at %d' % (hunk.number,
+                                                     hunk.new_start + offset)
+
+            if fuzz:
+                message += ' with fuzz %d' % fuzz
+
+            if offset:
+                message += ' (offset %d line%s)' % (
+                    offset, '' if abs(offset) == 1 else 's')
+
+            messages.append(message + '.')
+
+    new_lines.extend(orig_lines[orig_pos:])
+
+    if any(not line.endswith(b'\n') for line in new_lines[:-1]):
+        # A line without a trailing newline has ended up somewhere other
+        # than the end of the file. patch has its own ideas on how to handle
+        # this.
+        raise UnsupportedPatchError(
+            'A line without a trailing newline was placed before the end of '
+            'the file')
+
+    new_file = b''.join(new_lines)
+
+    if rejected:
+        base_filename = os.path.basename(filename)
+
+        if header is None:
+            header = ('--- %s\n+++ %s\n'
+                      % (base_filename, base_filename)).encode('utf-8')
+
+        messages.insert(0, 'patching file %s' % base_filename)
+        messages.append('%d out of %d hunk%s FAILED -- saving rejects to '
+                        'file %s.rej'
+                        % (len(rejected), len(hunks),
+                           '' if len(hunks) == 1 else 's',
+                           base_filename))
+
+        raise PatchError(filename=filename,
+                         error_output='\n'.join(messages),
+                         orig_file=orig_file,
+                         new_file=new_file,
+                         diff=diff,
+                         rejects=header + b''.join(
+                             hunk.text
+                             for hunk in rejected))
+
+    return new_file
+
+
+def _strip_last_newline(hunk):
+    """Strip the trailing newline from the last line in a hunk.
+
+    This handles ``\\ No newline at end of file`` markers.
+
+    Args:
+        hunk (Hunk):
+            The hunk being parsed.
+    """
+    if hunk.lines:
+        prefix, line = hunk.lines[-1]
+
+        if line.endswith(b'\n'):
+            hunk.lines[-1] = (prefix, line[:-1])
+
+
+def _locate_hunk(hunk, orig_lines, orig_pos, offset, fuzz):
+    """Locate the position in the original file to apply a hunk.
+
+    This follows the rules :command:`patch` uses, so that a hunk is found
+    at the same position. Fuzz is taken from whichever end of the hunk has
+    more context first, and a hunk with less context at one end than the
+    other is anchored to that end of the file.
+
+    Args:
+        hunk (Hunk):
+            The hunk to locate.
+
+        orig_lines (list of bytes):
+            The lines of the original file.
+
+        orig_pos (int):
+            The number of lines from the original file that have already
+            been copied or removed. The hunk can't begin before this.
+
+        offset (int):
+            The offset of the last located hunk.
+
+        fuzz (int):
+            The fuzz factor to apply.
+
+    Returns:
+        int:
+        The 1-based line in the original file where the (untrimmed) hunk
+        begins, or ``None`` if the hunk could not be located.
+
+    Raises:
+        UnsupportedPatchError:
+            The hunk may or may not match, depending on how trailing
+            newlines are compared.
+    """
+    old_lines = [
+        line
+        for prefix, line in hunk.lines
+        if prefix != b'+'
+    ]
+    num_old_lines = len(old_lines)
+    num_orig_lines = len(orig_lines)
+    prefix_context = hunk.prefix_context
+    suffix_context = hunk.suffix_context
+    context = max(prefix_context, suffix_context)
+    prefix_fuzz = fuzz + prefix_context - context
+    suffix_fuzz = fuzz + suffix_context - context
+    first_guess = hunk.first + offset
+
+    if not old_lines:
+        return first_guess
+
+    min_where = max(orig_pos + 1, 1)
+
+    if prefix_fuzz < 0 and hunk.first <= 1:
+        # The hunk was made against the start of the file, and can only
+        # apply there.
+        if orig_pos > 0:
+            raise UnsupportedPatchError('Hunk #%d must apply at the start '
+                                        'of the file after other hunks'
+                                        % hunk.number)
+
+        if suffix_fuzz < 0 and num_old_lines != num_orig_lines:
+            # It can only match the entire file.
+            return None
+
+        suffix_fuzz = max(suffix_fuzz, 0)
+
+        if (num_old_lines - suffix_fuzz <= num_orig_lines and
+            _matches_at(orig_lines, 1, old_lines, 0, suffix_fuzz)):
+            return 1
+
+        return None
+
+    prefix_fuzz = max(prefix_fuzz, 0)
+
+    if suffix_fuzz < 0:
+        # The hunk was made against the end of the file, and can only
+        # apply there.
+        where = num_orig_lines - num_old_lines + 1
+
+        if (where >= min_where and
+            _matches_at(orig_lines, where, old_lines, prefix_fuzz, 0)):
+            return where
+
+        return None
+
+    # Search outward from the expected position, alternating between later
+    # and earlier positions, as patch does.
+    max_where = num_orig_lines - (num_old_lines - suffix_fuzz) + 1
+    max_pos_offset = max_where - first_guess
+    max_neg_offset = min(first_guess - min_where, first_guess - 1)
+
+    for distance in range(max(max_pos_offset, max_neg_offset) + 1):
+        if (distance <= max_pos_offset and
+            _matches_at(orig_lines, first_guess + distance, old_lines,
+                        prefix_fuzz, suffix_fuzz)):
+            return first_guess + distance
+
+        if (0 < distance <= max_neg_offset and
+            first_guess - distance <= max_where and
+            _matches_at(orig_lines, first_guess - distance, old_lines,
+                        prefix_fuzz, suffix_fuzz)):
+            return first_guess - distance
+
+    return None
+
+
+def _matches_at(orig_lines, where, old_lines, prefix_fuzz, suffix_fuzz):
+    """Return whether a hunk's original lines match the file at a position.
+
+    Lines must match exactly, including their trailing newlines.
+
+    Args:
+        orig_lines (list of bytes):
+            The lines of the original file.
+
+        where (int):
+            The 1-based line where the untrimmed hunk would begin.
+
+        old_lines (list of bytes):
+            The hunk's lines from the original file.
+
+        prefix_fuzz (int):
+            The number of leading lines to skip.
+
+        suffix_fuzz (int):
+            The number of trailing lines to skip.
+
+    Returns:
+        bool:
+        Whether the lines match.
+
+    Raises:
+        UnsupportedPatchError:
+            A line only differs by a trailing newline.
+    """
+    pos = where - 1
+
+    for i in range(prefix_fuzz, len(old_lines) - suffix_fuzz):
+        orig_line = orig_lines[pos + i]
+        line = old_lines[i]
+
+        if orig_line != line:
+            if orig_line.rstrip(b'\n') == line.rstrip(b'\n'):
+                raise UnsupportedPatchError(
+                    'Lines differ only by a trailing newline')
+
+            return False
+
+    return True
@@ -0,0 +1,383 @@
+"""Background pre-rendering of diffs.
+
+The first person to view a new diff normally pays the full cost of
+generating it: fetching the original files from the repository, patching,
+diffing, and syntax highlighting. To avoid this, new diffs can be rendered
+ahead of time, when they're uploaded or published, so that the chunks are
+already in the cache when they're viewed.
+
+Pre-rendering happens in a small pool of worker threads in the current
+process, configured through the ``diffviewer_prerender_workers`` setting. It
+is disabled when this is 0 (the default).
+
+Jobs are de-duplicated while they're queued or running. Requests rendering a
+diff themselves remove any queued jobs for the same files (see
+:py:func:`claim_prerender_jobs`), so they never wait on the queue.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import deque
+
+from django.db import connection
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard.diffviewer.chunk_generator import (DiffChunkGenerator,
+                                                    get_diff_chunk_generator)
+from reviewboard.diffviewer.diffutils import (
+    get_diff_files,
+    get_pending_diff_chunk_generators,
+    prefetch_diff_files)
+
+
+class DiffPrerenderQueue(object):
+    """A queue of diff pre-rendering jobs, run by a pool of worker threads.
+
+    Each job has a key. A job won't be added if a job with the same key is
+    already queued or running.
+
+    Worker threads are started as needed, up to :py:attr:`max_workers`, and
+    exit once they've been idle for :py:attr:`IDLE_TIMEOUT_SECS`.
+    """
+
+    #: The number of seconds a worker thread will wait for a new job.
+    IDLE_TIMEOUT_SECS = 30
+
+    def __init__(self, max_workers):
+        """Initialize the queue.
+
+        Args:
+            max_workers (int):
+                The maximum number of worker threads.
+        """
+        self.max_workers = max_workers
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._jobs = {}
+        self._num_workers = 0
+        self._num_idle_workers = 0
+
+    def add(self, key, func, *args):
+        """Add a job to the queue.
+
+        Args:
+            key (unicode):
+                The key identifying the job.
+
+            func (callable):
+                The function to call in a worker thread.
+
+            *args (tuple):
+                The positional arguments to pass to the function.
+
+        Returns:
+            bool:
+            ``True`` if the job was added. ``False`` if a job with the same
+            key was already queued or running.
+        """
+        with self._cond:
+            if key in self._jobs:
+                return False
+
+            job = (key, func, args)
+            self._jobs[key] = job
+            self._queue.append(job)
+
+            if (len(self._queue) > self._num_idle_workers and
+                self._num_workers < self.max_workers):
+                self._num_workers += 1
+
+                thread = threading.Thread(target=self._run_worker,
+                                          name='DiffPrerenderWorker')
+                thread.daemon = True
+                thread.start()
+            else:
+                self._cond.notify_all()
+
+        return True
+
+    def claim(self, key):
+        """Remove a job from the queue, if it hasn't started yet.
+
+        This is used by callers that are about to do the work themselves.
+
+        Args:
+            key (unicode):
+                The key identifying the job.
+
+        Returns:
+            bool:
+            ``True`` if a queued job was removed.
+        """
+        with self._cond:
+            job = self._jobs.get(key)
+
+            if job is None:
+                return False
+
+            try:
+                self._queue.remove(job)
+            except ValueError:
+                # The job is already running.
+                return False
+
+            del self._jobs[key]
+            self._cond.notify_all()
+
+        return True
+
+    def is_pending(self, key):
+        """Return whether a job is queued or running.
+
+        Args:
+            key (unicode):
+                The key identifying the job.
+
+        Returns:
+            bool:
+            Whether the job is queued or running.
+        """
+        with self._cond:
+            return key in self._jobs
+
+    def wait(self, timeout=None):
+        """Wait for all queued and running jobs to finish.
+
+        Args:
+            timeout (float, optional):
+                The maximum number of seconds to wait.
+
+        Returns:
+            bool:
+            ``True`` if all jobs finished, or ``False`` if the timeout was
+            reached.
+        """
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        with self._cond:
+            while self._jobs:
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    remaining = end_time - time.time()
+
+                    if remaining <= 0:
+                        return False
+
+                    self._cond.wait(remaining)
+
+            return True
+
+    def _run_worker(self):
+        """Run jobs from the queue until idle."""
+        while True:
+            with self._cond:
+                end_time = time.time() + self.IDLE_TIMEOUT_SECS
+                self._num_idle_workers += 1
+
+                while (not self._queue and
+                       self._num_workers <= self.max_workers):
+                    remaining = end_time - time.time()
+
+                    if remaining <= 0:
+                        break
+
+                    self._cond.wait(remaining)
+
+                self._num_idle_workers -= 1
+
+                if not self._queue or self._num_workers > self.max_workers:
+                    self._num_workers -= 1
+                    return
+
+                key, func, args = self._queue.popleft()
+
+            try:
+                func(*args)
+            except Exception as e:
+                logging.exception('Unable to pre-render diff (%s): %s',
+                                  key, e)
+            finally:
+                # Each worker thread has its own database connection, which
+                # would otherwise be left open.
+                connection.close()
+
+                with self._cond:
+                    del self._jobs[key]
+                    self._cond.notify_all()
+
+
+_prerender_queue = None
+_prerender_queue_lock = threading.Lock()
+
+
+def get_prerender_queue():
+    """Return the queue used for pre-rendering diffs.
+
+    Returns:
+        DiffPrerenderQueue:
+        The queue, or ``None`` if pre-rendering is disabled.
+    """
+    global _prerender_queue
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    max_workers = siteconfig.get('diffviewer_prerender_workers')
+
+    if not max_workers:
+        return None
+
+    with _prerender_queue_lock:
+        if _prerender_queue is None:
+            _prerender_queue = DiffPrerenderQueue(max_workers)
+        else:
+            _prerender_queue.max_workers = max_workers
+
+        return _prerender_queue
+
+
+def prerender_diffset(diffset, interdiffset=None):
+    """Queue a diff to be rendered in the background.
+
+    The chunks for each file in the diff will be generated and stored in the
+    cache, if they aren't already there.
+
+    Args:
+        diffset (reviewboard.diffviewer.models.DiffSet):
+            The diffset to render.
+
+        interdiffset (reviewboard.diffviewer.models.DiffSet, optional):
+            A newer diffset to render an interdiff against.
+
+    Returns:
+        bool:
+        Whether the diff was queued.
+    """
+    queue = get_prerender_queue()
+
+    if queue is None:
+        return False
+
+    if interdiffset is None:
+        key = 'diffset-%s' % diffset.pk
+        interdiffset_id = None
+    else:
+        key = 'interdiffset-%s-%s' % (diffset.pk, interdiffset.pk)
+        interdiffset_id = interdiffset.pk
+
+    return queue.add(key, _prerender_diff_files, diffset.pk, interdiffset_id)
+
+
+def prerender_diffset_history(diffset_history):
+    """Queue the latest diff in a history to be rendered in the background.
+
+    The latest diff is rendered, along with the interdiff between it and
+    the previous diff, if any.
+
+    Args:
+        diffset_history (reviewboard.diffviewer.models.DiffSetHistory):
+            The history containing the diffs.
+    """
+    if get_prerender_queue() is None:
+        return
+
+    diffsets = list(diffset_history.diffsets.order_by('-revision')[:2])
+
+    if diffsets:
+        prerender_diffset(diffsets[0])
+
+        if len(diffsets) > 1:
+            prerender_diffset(diffsets[1], diffsets[0])
+
+
+def claim_prerender_jobs(generators):
+    """Remove queued pre-rendering jobs for files about to be rendered.
+
+    This is called when rendering files in a request, so that the files
+    aren't rendered twice. Jobs that are already running are left alone.
+
+    Args:
+        generators (list of
+                    reviewboard.diffviewer.chunk_generator.DiffChunkGenerator):
+            The generators for the files being rendered.
+    """
+    queue = get_prerender_queue()
+
+    if queue is not None:
+        for generator in generators:
+            if isinstance(generator, DiffChunkGenerator):
+                queue.claim(generator.make_cache_key())
+
+
+def _prerender_diff_files(diffset_id, interdiffset_id):
+    """Queue jobs to render each file in a diff.
+
+    This runs in a worker thread. The files needed from the repository are
+    fetched together, and then each file that isn't already cached is queued
+    to be rendered.
+
+    Args:
+        diffset_id (int):
+            The ID of the diffset to render.
+
+        interdiffset_id (int):
+            The ID of a newer diffset to render an interdiff against, or
+            ``None``.
+    """
+    from reviewboard.diffviewer.models import DiffSet
+
+    try:
+        diffset = DiffSet.objects.get(pk=diffset_id)
+
+        if interdiffset_id is None:
+            interdiffset = None
+        else:
+            interdiffset = DiffSet.objects.get(pk=interdiffset_id)
+    except DiffSet.DoesNotExist:
+        # The diff was deleted (or its creation was rolled back).
+        return
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    enable_syntax_highlighting = \
+        siteconfig.get('diffviewer_syntax_highlighting')
+
+    generators = get_pending_diff_chunk_generators([
+        get_diff_chunk_generator(None,
+                                 diff_file['filediff'],
+                                 diff_file['interfilediff'],
+                                 diff_file['force_interdiff'],
+                                 enable_syntax_highlighting)
+        for diff_file in get_diff_files(diffset=diffset,
+                                        interdiffset=interdiffset)
+    ])
+
+    if not generators:
+        return
+
+    prefetch_diff_files(generators, None)
+
+    queue = get_prerender_queue()
+
+    for generator in generators:
+        if queue is None:
+            _prerender_file(generator)
+        else:
+            queue.add(generator.make_cache_key(), _prerender_file, generator)
+
+
+def _prerender_file(generator):
+    """Render a file, storing its chunks in the cache.
+
+    This runs in a worker thread.
+
+    Args:
+        generator (reviewboard.diffviewer.chunk_generator.DiffChunkGenerator):
+            The generator for the file.
+    """
+    if not generator.has_cached_chunks():
+        for chunk in generator.get_chunks():
+            pass
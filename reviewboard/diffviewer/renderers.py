@@ -8,7 +8,9 @@ from django.utils import six
 from django.utils.translation import ugettext as _, get_language
 from djblets.cache.backend import cache_memoize
 
-from reviewboard.diffviewer.chunk_generator import compute_chunk_last_header
+from reviewboard.diffviewer.chunk_generator import (compute_chunk_last_header,
+                                                    get_chunk_lines,
+                                                    get_highlighted_chunk)
 from reviewboard.diffviewer.diffutils import populate_diff_chunks
 from reviewboard.diffviewer.errors import UserVisibleError
 
@@ -186,13 +188,17 @@ class DiffRenderer(object):
                             'change': chunk['change'],
                             'collapsable': False,
                             'index': self.chunk_index,
-                            'lines': lines[:collapse_i],
+                            'lines': get_chunk_lines(chunk, 0, collapse_i),
                             'meta': meta,
                             'numlines': collapse_i,
                         })
 
                     # The header contents
-                    new_lines += lines[collapse_i:chunk2_i]
+                    if self.collapse_all:
+                        new_lines += lines[collapse_i:chunk2_i]
+                    else:
+                        new_lines += get_chunk_lines(chunk, collapse_i,
+                                                     chunk2_i)
 
                     if (self.chunk_index < self.num_chunks - 1 and
                             chunk2_i + self.lines_of_context[1] <= num_lines):
@@ -201,11 +207,15 @@ class DiffRenderer(object):
                             'change': chunk['change'],
                             'collapsable': False,
                             'index': self.chunk_index,
-                            'lines': lines[chunk2_i:],
+                            'lines': get_chunk_lines(chunk, chunk2_i),
                             'meta': meta,
                             'numlines': num_lines - chunk2_i,
                         })
 
+                    # Any lines that will be shown have been highlighted.
+                    # The header contents are collapsed, and won't be shown.
+                    meta.pop('pending_highlighting', None)
+
                     if new_lines:
                         num_lines = len(new_lines)
 
@@ -230,6 +240,14 @@ class DiffRenderer(object):
                     else:
                         self.diff_file['chunks'].remove(chunk)
 
+        if not self.collapse_all:
+            # Collapsed chunks that are being expanded may still need to be
+            # syntax-highlighted.
+            self.diff_file['chunks'] = [
+                get_highlighted_chunk(chunk)
+                for chunk in self.diff_file['chunks']
+            ]
+
         equal_lines = 0
 
         for chunk in self.diff_file['chunks']:
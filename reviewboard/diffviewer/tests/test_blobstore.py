@@ -0,0 +1,166 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from djblets.siteconfig.models import SiteConfiguration
+from kgb import SpyAgency
+
+from reviewboard.diffviewer.blobstore import (DatabaseFileBlobStore,
+                                              LocalFileBlobStore,
+                                              get_file_blob_store,
+                                              get_sha1)
+from reviewboard.diffviewer.diffutils import (get_original_file,
+                                              get_patched_file)
+from reviewboard.diffviewer.models import FileBlob
+from reviewboard.scmtools.models import Repository
+from reviewboard.testing import TestCase
+
+
+class LocalFileBlobStoreTests(TestCase):
+    """Unit tests for reviewboard.diffviewer.blobstore.LocalFileBlobStore."""
+
+    def setUp(self):
+        super(LocalFileBlobStoreTests, self).setUp()
+
+        self.path = tempfile.mkdtemp(prefix='rb-tests-')
+        self.store = LocalFileBlobStore(self.path)
+
+    def tearDown(self):
+        super(LocalFileBlobStoreTests, self).tearDown()
+
+        shutil.rmtree(self.path)
+
+    def test_put_and_get(self):
+        """Testing LocalFileBlobStore.put and get"""
+        sha1 = self.store.put(b'Hello, world!\n')
+
+        self.assertEqual(sha1, get_sha1(b'Hello, world!\n'))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.path, sha1[:2], sha1[2:])))
+        self.assertEqual(self.store.get(sha1), b'Hello, world!\n')
+
+    def test_get_with_missing(self):
+        """Testing LocalFileBlobStore.get with content not in the store"""
+        self.assertIsNone(self.store.get(get_sha1(b'Hello, world!\n')))
+
+    def test_get_with_bad_checksum(self):
+        """Testing LocalFileBlobStore.get with content not matching its
+        checksum
+        """
+        sha1 = self.store.put(b'Hello, world!\n')
+        self.store.put_compressed(get_sha1(b'Goodbye\n'),
+                                  self.store.get_compressed(sha1))
+
+        self.assertIsNone(self.store.get(get_sha1(b'Goodbye\n')))
+
+
+class DatabaseFileBlobStoreTests(TestCase):
+    """Unit tests for
+    reviewboard.diffviewer.blobstore.DatabaseFileBlobStore.
+    """
+
+    def test_put_and_get(self):
+        """Testing DatabaseFileBlobStore.put and get"""
+        store = DatabaseFileBlobStore()
+        sha1 = store.put(b'Hello, world!\n')
+
+        self.assertEqual(FileBlob.objects.filter(sha1=sha1).count(), 1)
+        self.assertEqual(store.get(sha1), b'Hello, world!\n')
+
+        # Storing it again shouldn't create a new entry.
+        store.put(b'Hello, world!\n')
+        self.assertEqual(FileBlob.objects.filter(sha1=sha1).count(), 1)
+
+    def test_get_with_missing(self):
+        """Testing DatabaseFileBlobStore.get with content not in the store"""
+        store = DatabaseFileBlobStore()
+
+        self.assertIsNone(store.get(get_sha1(b'Hello, world!\n')))
+
+
+class FileBlobStoreDiffUtilsTests(SpyAgency, TestCase):
+    """Unit tests for using the file blob store when fetching files."""
+
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(FileBlobStoreDiffUtilsTests, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+        self.siteconfig.set('diffviewer_file_blob_store',
+                            DatabaseFileBlobStore.store_id)
+        self.siteconfig.save()
+
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        self.filediff = self.create_filediff(
+            diffset=diffset,
+            diff=(b'--- README\n'
+                  b'+++ README\n'
+                  b'@@ -1,1 +1,1 @@\n'
+                  b'-Hello, world!\n'
+                  b'+Hello, everybody!\n'))
+
+    def tearDown(self):
+        super(FileBlobStoreDiffUtilsTests, self).tearDown()
+
+        self.siteconfig.set('diffviewer_file_blob_store', '')
+        self.siteconfig.set('diffviewer_file_blob_store_path', '')
+        self.siteconfig.save()
+
+    def test_get_file_blob_store(self):
+        """Testing get_file_blob_store"""
+        self.assertIsInstance(get_file_blob_store(), DatabaseFileBlobStore)
+
+        self.siteconfig.set('diffviewer_file_blob_store', '')
+        self.siteconfig.save()
+        self.assertIsNone(get_file_blob_store())
+
+    def test_get_file_blob_store_with_local(self):
+        """Testing get_file_blob_store with local storage"""
+        path = tempfile.mkdtemp(prefix='rb-tests-')
+
+        try:
+            self.siteconfig.set('diffviewer_file_blob_store',
+                                LocalFileBlobStore.store_id)
+            self.siteconfig.set('diffviewer_file_blob_store_path', path)
+            self.siteconfig.save()
+
+            store = get_file_blob_store()
+            self.assertIsInstance(store, LocalFileBlobStore)
+            self.assertEqual(store.path, path)
+
+            orig = get_original_file(self.filediff, None, ['ascii'])
+            self.assertTrue(store.has(get_sha1(orig)))
+        finally:
+            shutil.rmtree(path)
+
+    def test_get_original_file(self):
+        """Testing get_original_file with a known orig_sha1 uses the store"""
+        self.spy_on(Repository.get_file)
+
+        orig = get_original_file(self.filediff, None, ['ascii'])
+        self.assertEqual(orig, b'Hello, world!\n')
+        self.assertEqual(len(Repository.get_file.calls), 1)
+
+        self.filediff.extra_data['orig_sha1'] = get_sha1(orig)
+
+        self.assertEqual(get_original_file(self.filediff, None, ['ascii']),
+                         orig)
+        self.assertEqual(len(Repository.get_file.calls), 1)
+
+    def test_get_patched_file(self):
+        """Testing get_patched_file with a known patched_sha1 uses the
+        store
+        """
+        patched = get_patched_file(b'Hello, world!\n', self.filediff, None)
+        self.assertEqual(patched, b'Hello, everybody!\n')
+
+        self.filediff.extra_data['patched_sha1'] = get_sha1(patched)
+        self.filediff.diff = b''
+
+        self.assertEqual(
+            get_patched_file(b'Hello, world!\n', self.filediff, None),
+            patched)
@@ -0,0 +1,136 @@
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from djblets.cache.backend import cache_memoize
+from kgb import SpyAgency
+
+from reviewboard.diffviewer.chunk_generator import RawDiffChunkGenerator
+from reviewboard.diffviewer.chunk_index import (DiffChunkIndex,
+                                                get_diff_chunk_index)
+from reviewboard.diffviewer.diffutils import (
+    get_chunks_in_range,
+    _get_last_header_in_chunks_before_line)
+from reviewboard.testing import TestCase
+
+
+class DiffChunkIndexTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.chunk_index."""
+
+    old = b''.join(
+        b'def func%d():\n'
+        b'    return %d\n'
+        b'\n'
+        % (i, i)
+        for i in range(20)
+    )
+
+    new = b''.join(
+        b'def func%d():\n'
+        b'    return %d\n'
+        b'\n'
+        % (i, i * (i % 4 != 0))
+        for i in range(20)
+    )
+
+    def setUp(self):
+        super(DiffChunkIndexTests, self).setUp()
+
+        generator = RawDiffChunkGenerator(self.old, self.new,
+                                          'foo.py', 'foo.py')
+        self.chunks = list(generator.get_chunks())
+        self.last_line = self.chunks[-1]['lines'][-1][0]
+
+    def tearDown(self):
+        super(DiffChunkIndexTests, self).tearDown()
+
+        cache.clear()
+
+    def test_get_last_header_before_line(self):
+        """Testing DiffChunkIndex.get_last_header_before_line matches
+        scanning the chunks
+        """
+        index = DiffChunkIndex.from_chunks(self.chunks)
+
+        for line in range(1, self.last_line + 1):
+            self.assertEqual(
+                index.get_last_header_before_line(line),
+                _get_last_header_in_chunks_before_line(self.chunks, line))
+
+    def test_get_last_header_before_line_with_unsorted_headers(self):
+        """Testing DiffChunkIndex.get_last_header_before_line with headers
+        out of order
+        """
+        # See DiffExpansionHeaderTests in test_diffutils for a description
+        # of this structure.
+        chunks = [
+            {
+                'meta': {
+                    'left_headers': [(3, 'baz'), (1, 'foo')],
+                },
+                'lines': [
+                    {0: 1, 1: 1, 4: 1},
+                    {0: 2, 1: 2, 4: 2},
+                    {0: 3, 1: 3, 4: 3},
+                    {0: 4, 1: 4, 4: 4},
+                ]
+            },
+        ]
+
+        index = DiffChunkIndex.from_chunks(chunks)
+
+        for line in range(1, 6):
+            self.assertEqual(
+                index.get_last_header_before_line(line),
+                _get_last_header_in_chunks_before_line(chunks, line))
+
+    def test_get_chunks_in_range(self):
+        """Testing get_chunks_in_range with a DiffChunkIndex"""
+        index = DiffChunkIndex.from_chunks(self.chunks)
+
+        for first_line in range(1, self.last_line + 1):
+            for num_lines in (1, 5, self.last_line - first_line + 1):
+                self.assertEqual(
+                    list(get_chunks_in_range(self.chunks, first_line,
+                                             num_lines, chunk_index=index)),
+                    list(get_chunks_in_range(self.chunks, first_line,
+                                             num_lines)))
+
+    def test_serialize(self):
+        """Testing DiffChunkIndex.serialize and deserialize round-trip"""
+        index = DiffChunkIndex.from_chunks(self.chunks)
+        new_index = DiffChunkIndex.deserialize(index.serialize())
+
+        self.assertEqual(new_index.first_lines, index.first_lines)
+        self.assertEqual(new_index.get_last_header_before_line(20),
+                         index.get_last_header_before_line(20))
+
+    def test_deserialize_with_invalid_data(self):
+        """Testing DiffChunkIndex.deserialize with invalid data"""
+        with self.assertRaises(ValueError):
+            DiffChunkIndex.deserialize(b'invalid')
+
+    def test_get_diff_chunk_index_caching(self):
+        """Testing get_diff_chunk_index caches the index"""
+        self.spy_on(DiffChunkIndex.from_chunks)
+
+        index1 = get_diff_chunk_index(self.chunks, 'test-chunks')
+        index2 = get_diff_chunk_index(self.chunks, 'test-chunks')
+
+        self.assertEqual(len(DiffChunkIndex.from_chunks.calls), 1)
+        self.assertEqual(index1.first_lines, index2.first_lines)
+
+    def test_get_diff_chunk_index_with_mismatched_chunks(self):
+        """Testing get_diff_chunk_index rebuilds an index that doesn't match
+        the chunks
+        """
+        get_diff_chunk_index(self.chunks[:1], 'test-chunks')
+        index = get_diff_chunk_index(self.chunks, 'test-chunks')
+
+        self.assertEqual(len(index.first_lines), len(self.chunks))
+
+    def test_get_diff_chunk_index_with_invalid_cached_data(self):
+        """Testing get_diff_chunk_index with invalid cached data"""
+        cache_memoize('test-chunks-index', lambda: b'invalid')
+        index = get_diff_chunk_index(self.chunks, 'test-chunks')
+
+        self.assertEqual(len(index.first_lines), len(self.chunks))
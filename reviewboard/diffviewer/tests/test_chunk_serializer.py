@@ -0,0 +1,153 @@
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from django.utils.safestring import SafeText
+from djblets.cache.backend import cache_memoize
+from kgb import SpyAgency
+
+from reviewboard.diffviewer.chunk_generator import RawDiffChunkGenerator
+from reviewboard.diffviewer.chunk_serializer import (ChunkFormatError,
+                                                     deserialize_chunks,
+                                                     serialize_chunks)
+from reviewboard.testing import TestCase
+
+
+class ChunkSerializerTests(TestCase):
+    """Unit tests for reviewboard.diffviewer.chunk_serializer."""
+
+    old = (
+        b'def foo():\n'
+        b'    return 1\n'
+        b'\n'
+        b'def bar():\n'
+        b'    return 2\n'
+        b'\n'
+        b'def baz():\n'
+        b'    pass\n'
+    )
+
+    new = (
+        b'def baz():\n'
+        b'    pass\n'
+        b'\n'
+        b'def foo():\n'
+        b'    return 1  \n'
+        b'\n'
+        b'def bar():\n'
+        b'    return 3\n'
+    )
+
+    def setUp(self):
+        super(ChunkSerializerTests, self).setUp()
+
+        generator = RawDiffChunkGenerator(self.old, self.new,
+                                          'foo.py', 'foo.py')
+        self.chunks = list(generator.get_chunks())
+
+    def test_round_trip(self):
+        """Testing serialize_chunks and deserialize_chunks round-trip"""
+        for compression in ('none', 'zlib'):
+            chunks = deserialize_chunks(
+                serialize_chunks(self.chunks, compression))
+
+            self.assertEqual(chunks, self.chunks)
+
+            for chunk in chunks:
+                for line in chunk['lines']:
+                    self.assertIsInstance(line[2], SafeText)
+                    self.assertIsInstance(line[5], SafeText)
+
+    def test_round_trip_with_moved_lines(self):
+        """Testing serialize_chunks and deserialize_chunks with moved lines"""
+        self.assertTrue(any(
+            len(line) > 8
+            for chunk in self.chunks
+            for line in chunk['lines']
+        ))
+
+        self.assertEqual(deserialize_chunks(serialize_chunks(self.chunks)),
+                         self.chunks)
+
+    def test_round_trip_with_shared_meta(self):
+        """Testing serialize_chunks and deserialize_chunks with meta shared
+        between chunks
+        """
+        meta = {
+            'whitespace_chunk': False,
+            'whitespace_lines': [],
+        }
+        chunks = [
+            {
+                'index': i,
+                'lines': [[i + 1, i + 1, 'a', [], i + 1, 'a', [], False]],
+                'numlines': 1,
+                'change': 'equal',
+                'collapsable': False,
+                'meta': meta,
+            }
+            for i in range(2)
+        ]
+
+        new_chunks = deserialize_chunks(serialize_chunks(chunks))
+
+        self.assertEqual(new_chunks, chunks)
+        self.assertIs(new_chunks[0]['meta'], new_chunks[1]['meta'])
+
+    def test_deserialize_with_list(self):
+        """Testing deserialize_chunks with an already-deserialized list"""
+        self.assertIs(deserialize_chunks(self.chunks), self.chunks)
+
+    def test_deserialize_with_unsupported_version(self):
+        """Testing deserialize_chunks with an unsupported format version"""
+        data = serialize_chunks(self.chunks)
+
+        with self.assertRaises(ChunkFormatError):
+            deserialize_chunks(data[:4] + b'\xff' + data[5:])
+
+    def test_deserialize_with_corrupt_data(self):
+        """Testing deserialize_chunks with corrupt data"""
+        data = serialize_chunks(self.chunks)
+
+        with self.assertRaises(ChunkFormatError):
+            deserialize_chunks(data[:20])
+
+
+class CachedChunksTests(SpyAgency, TestCase):
+    """Unit tests for caching chunks in RawDiffChunkGenerator.get_chunks."""
+
+    def setUp(self):
+        super(CachedChunksTests, self).setUp()
+
+        cache.clear()
+
+    def test_get_chunks_with_cache(self):
+        """Testing RawDiffChunkGenerator.get_chunks stores and loads
+        serialized chunks
+        """
+        generator = RawDiffChunkGenerator(b'a\nb\n', b'a\nc\n', 'a', 'a')
+        self.spy_on(generator.get_chunks_uncached)
+
+        chunks = list(generator.get_chunks('test-chunks'))
+
+        self.assertEqual(list(generator.get_chunks('test-chunks')), chunks)
+        self.assertEqual(len(generator.get_chunks_uncached.calls), 1)
+
+        # The cached data should be in the serialized format.
+        self.assertEqual(
+            cache_memoize('test-chunks', lambda: None, large_data=True,
+                          compress_large_data=False)[:4],
+            b'RBDC')
+
+    def test_get_chunks_with_unsupported_cache_data(self):
+        """Testing RawDiffChunkGenerator.get_chunks regenerates chunks with
+        unsupported cached data
+        """
+        cache_memoize('test-chunks', lambda: b'RBDC\xffZ', large_data=True,
+                      compress_large_data=False)
+
+        generator = RawDiffChunkGenerator(b'a\nb\n', b'a\nc\n', 'a', 'a')
+        chunks = list(generator.get_chunks('test-chunks'))
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[1]['change'], 'replace')
+        self.assertEqual(list(generator.get_chunks('test-chunks')), chunks)
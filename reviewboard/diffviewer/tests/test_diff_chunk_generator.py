@@ -1,5 +1,7 @@
 from __future__ import unicode_literals
 
+from django.utils import translation
+
 from reviewboard.diffviewer.chunk_generator import DiffChunkGenerator
 from reviewboard.scmtools.core import PRE_CREATION
 from reviewboard.testing import TestCase
@@ -83,3 +85,17 @@ class DiffChunkGeneratorTests(TestCase):
         self.assertEqual(len(list(interdiff_generator.get_chunks())), 1)
 
         self.assertEqual(line_counts, self.filediff.get_line_counts())
+
+    def test_make_cache_key_language_independent(self):
+        """Testing DiffChunkGenerator.make_cache_key is independent of the
+        active language
+        """
+        with translation.override('en'):
+            en_key = self.generator.make_cache_key()
+
+        with translation.override('fr'):
+            fr_key = self.generator.make_cache_key()
+
+        self.assertEqual(en_key, fr_key)
+        self.assertEqual(en_key,
+                         'diff-sidebyside-hl-%s' % self.filediff.pk)
@@ -2,8 +2,12 @@ from __future__ import unicode_literals
 
 import os
 
+from kgb import SpyAgency
+
+from reviewboard.diffviewer.differ import DiffCompatVersion
 from reviewboard.diffviewer.myersdiff import MyersDiffer
-from reviewboard.diffviewer.opcode_generator import get_diff_opcode_generator
+from reviewboard.diffviewer.opcode_generator import (DiffOpcodeGenerator,
+                                                     get_diff_opcode_generator)
 from reviewboard.testing import TestCase
 
 
@@ -146,7 +150,7 @@ class IndentationTests(TestCase):
             (False, 3, 8))
 
 
-class MoveDetectionTests(TestCase):
+class MoveDetectionTests(SpyAgency, TestCase):
     """Unit tests for DiffOpcodeGenerator move detection."""
 
     def test_move_detection(self):
@@ -568,6 +572,110 @@ class MoveDetectionTests(TestCase):
             }]
         )
 
+    def test_move_detection_with_common_lines(self):
+        """Testing DiffOpcodeGenerator move detection with lines matching
+        more removed lines than MOVE_MAX_CANDIDATES finds the same moves as
+        without the limit
+        """
+        self.spy_on(DiffOpcodeGenerator._get_common_line_move_candidates)
+
+        old, new = self._make_common_lines_diff()
+        limited_moves = self._get_moves(
+            old, new, DiffCompatVersion.MYERS_FAST_MOVE_LIMIT)
+
+        self.assertTrue(
+            DiffOpcodeGenerator._get_common_line_move_candidates.called)
+
+        unlimited_moves = self._get_moves(old, new,
+                                          DiffCompatVersion.MYERS_FAST)
+
+        self.assertEqual(limited_moves, unlimited_moves)
+        self.assertEqual(
+            limited_moves,
+            (
+                {
+                    121: 41, 122: 42, 123: 43,
+                    125: 201, 126: 202, 127: 203, 128: 204, 129: 205,
+                    130: 206, 131: 207,
+                    133: 361, 134: 362,
+                },
+                {
+                    41: 121, 42: 122, 43: 123,
+                    201: 125, 202: 126, 203: 127, 204: 128, 205: 129,
+                    206: 130, 207: 131,
+                    361: 133, 362: 134,
+                },
+            ))
+
+    def test_move_detection_with_common_lines_and_old_compat_version(self):
+        """Testing DiffOpcodeGenerator move detection with lines matching
+        more removed lines than MOVE_MAX_CANDIDATES doesn't limit moves for
+        older diff compatibility versions
+        """
+        self.spy_on(DiffOpcodeGenerator._get_common_line_move_candidates)
+
+        old, new = self._make_common_lines_diff()
+        self._get_moves(old, new, DiffCompatVersion.MYERS_FAST)
+
+        self.assertFalse(
+            DiffOpcodeGenerator._get_common_line_move_candidates.called)
+
+    def _make_common_lines_diff(self):
+        """Return files for a diff with a line common to many removed lines.
+
+        120 functions are removed, each ending in the same line, and four of
+        them are moved to the end of the file.
+
+        Returns:
+            tuple:
+            A 2-tuple of the lists of original and modified lines.
+        """
+        old = []
+
+        for i in range(150):
+            old += [
+                'def function_number_%d(value):' % i,
+                '    result = compute_value(value, %d)' % i,
+                '    return result',
+                '',
+            ]
+
+        new = old[480:]
+
+        for i in (10, 50, 51, 90):
+            new += old[i * 4:(i + 1) * 4]
+
+        return old, new
+
+    def _get_moves(self, a, b, compat_version):
+        """Return the moved lines found in a diff.
+
+        Args:
+            a (list of unicode):
+                The original lines.
+
+            b (list of unicode):
+                The modified lines.
+
+            compat_version (int):
+                The diff compatibility version to use.
+
+        Returns:
+            tuple:
+            A 2-tuple of dictionaries mapping moved-from lines and moved-to
+            lines.
+        """
+        differ = MyersDiffer(a, b, compat_version=compat_version)
+        i_moves = {}
+        r_moves = {}
+
+        for opcodes in get_diff_opcode_generator(differ):
+            meta = opcodes[-1]
+            i_moves.update(meta.get('moved-from', {}))
+            r_moves.update(meta.get('moved-to', {}))
+
+        return i_moves, r_moves
+
     def _test_move_detection(self, a, b, expected_i_moves, expected_r_moves):
         differ = MyersDiffer(a, b)
         opcode_generator = get_diff_opcode_generator(differ)
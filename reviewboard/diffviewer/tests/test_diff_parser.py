@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
-from reviewboard.diffviewer.parser import DiffParser
+from reviewboard.diffviewer.diffutils import split_line_endings
+from reviewboard.diffviewer.parser import DiffLines, DiffParser
 from reviewboard.testing import TestCase
 
 
@@ -48,3 +49,95 @@ class DiffParserTest(TestCase):
         self.assertEqual(len(files), 1)
         self.assertEqual(files[0].insert_count, 3)
         self.assertEqual(files[0].delete_count, 4)
+
+    def test_line_endings(self):
+        """Testing DiffParser with CRLF and CR line endings"""
+        diff = (
+            b'--- README  123\r\n'
+            b'+++ README  (new)\r\n'
+            b'@@ -1,2 +1,2 @@\r\r\n'
+            b'-Line 1\r'
+            b'+Line 2\r\n'
+            b' Line 3')
+        files = DiffParser(diff).parse()
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].insert_count, 1)
+        self.assertEqual(files[0].delete_count, 1)
+        self.assertEqual(
+            files[0].data,
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@@ -1,2 +1,2 @@\n'
+            b'-Line 1\n'
+            b'+Line 2\n'
+            b' Line 3\n')
+
+    def test_preamble(self):
+        """Testing DiffParser with a preamble before the first file"""
+        diff = (
+            b'This is a preamble.\n'
+            b'\n'
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@@ -1,1 +1,1 @@\n'
+            b'-blah\n'
+            b'+blah!\n'
+            b'--- AUTHORS  123\n'
+            b'+++ AUTHORS  (new)\n'
+            b'@@ -1,1 +1,1 @@\n'
+            b'-me\n'
+            b'+you\n')
+        files = DiffParser(diff).parse()
+
+        self.assertEqual(len(files), 2)
+        self.assertEqual(
+            files[0].data,
+            b'This is a preamble.\n'
+            b'\n'
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@@ -1,1 +1,1 @@\n'
+            b'-blah\n'
+            b'+blah!\n')
+        self.assertEqual(
+            files[1].data,
+            b'--- AUTHORS  123\n'
+            b'+++ AUTHORS  (new)\n'
+            b'@@ -1,1 +1,1 @@\n'
+            b'-me\n'
+            b'+you\n')
+
+
+class DiffLinesTests(TestCase):
+    """Unit tests for DiffLines."""
+
+    def test_lines(self):
+        """Testing DiffLines matches split_line_endings"""
+        data = b'line 1\nline 2\r\nline 3\r\r\nline 4\r\n\nline 6\x0c\rline 7'
+        lines = DiffLines(data)
+
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(list(lines), split_line_endings(data))
+        self.assertEqual(lines[2], b'line 3')
+        self.assertEqual(lines[-1], b'line 7')
+        self.assertEqual(lines[1:3], [b'line 2', b'line 3'])
+
+    def test_lines_with_trailing_newline(self):
+        """Testing DiffLines with a trailing newline"""
+        lines = DiffLines(b'line 1\nline 2\n')
+
+        self.assertEqual(list(lines), [b'line 1', b'line 2'])
+
+    def test_lines_with_empty_data(self):
+        """Testing DiffLines with empty data"""
+        self.assertEqual(len(DiffLines(b'')), 0)
+
+    def test_get_data_ranges(self):
+        """Testing DiffLines.get_data_ranges"""
+        lines = DiffLines(b'line 1\nline 2\r\nline 3\rline 4\nline 5')
+
+        self.assertEqual(lines.get_data_ranges(0, 2),
+                         [(0, 13), (14, 15)])
+        self.assertEqual(lines.get_data_ranges(2, 5),
+                         [(15, 21), None, (22, 35), None])
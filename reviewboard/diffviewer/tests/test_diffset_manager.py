@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 from kgb import SpyAgency
 
+from reviewboard.diffviewer.managers import DiffSetManager
 from reviewboard.diffviewer.models import DiffSet, FileDiff
 from reviewboard.testing import TestCase
 
@@ -68,6 +69,39 @@ class DiffSetManagerTests(SpyAgency, TestCase):
         self.assertEqual(filediff.source_file, 'trunk/README')
         self.assertEqual(filediff.dest_file, 'trunk/README')
 
+    def test_create_from_data_with_many_files(self):
+        """Testing DiffSetManager.create_from_data stores FileDiffs in
+        batches
+        """
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_file_exists,
+                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(FileDiff.objects.bulk_create)
+
+        old_batch_size = DiffSetManager.FILEDIFF_BATCH_SIZE
+        DiffSetManager.FILEDIFF_BATCH_SIZE = 2
+
+        try:
+            diffset = DiffSet.objects.create_from_data(
+                repository=repository,
+                diff_file_name='diff',
+                diff_file_contents=b''.join(
+                    self.DEFAULT_GIT_FILEDIFF_DATA.replace(b'README',
+                                                           b'README%d' % i)
+                    for i in range(5)),
+                basedir='/')
+        finally:
+            DiffSetManager.FILEDIFF_BATCH_SIZE = old_batch_size
+
+        self.assertEqual(len(FileDiff.objects.bulk_create.calls), 3)
+        self.assertEqual(
+            [
+                filediff.source_file
+                for filediff in diffset.files.order_by('pk')
+            ],
+            ['/README0', '/README1', '/README2', '/README3', '/README4'])
+
     def test_create_from_data_with_validate_only_true(self):
         """Testing DiffSetManager.create_from_data with validate_only=True"""
         repository = self.create_repository(tool_name='Test')
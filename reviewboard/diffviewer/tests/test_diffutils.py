@@ -1,21 +1,32 @@
 from __future__ import unicode_literals
 
+import multiprocessing
+from multiprocessing.pool import ApplyResult
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils.six.moves import zip_longest
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
+from kgb import SpyAgency
 
 from reviewboard.diffviewer.diffutils import (
     get_diff_files,
     get_displayed_diff_line_ranges,
+    get_file_from_filediff,
     get_file_chunks_in_range,
     get_last_header_before_line,
     get_last_line_number_in_diff,
     get_line_changed_regions,
     get_matched_interdiff_files,
     patch,
+    populate_diff_chunks,
+    populate_files_from_filediffs,
     _get_last_header_in_chunks_before_line)
+from reviewboard.diffviewer.chunk_generator import DiffChunkGenerator
 from reviewboard.diffviewer.models import FileDiff
 from reviewboard.scmtools.core import PRE_CREATION
+from reviewboard.scmtools.models import Repository
 from reviewboard.testing import TestCase
 
 
@@ -1850,6 +1861,160 @@ class DiffExpansionHeaderTests(TestCase):
                          lines[header['left']['line'] - 1][2])
 
 
+class PopulateDiffChunksTests(SpyAgency, TestCase):
+    """Unit tests for populate_diff_chunks."""
+
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(PopulateDiffChunksTests, self).setUp()
+
+        repository = self.create_repository(tool_name='Test')
+        self.diffset = self.create_diffset(repository=repository)
+
+        for i in range(3):
+            self.create_filediff(
+                diffset=self.diffset,
+                source_file='/README%s' % i,
+                dest_file='/README%s' % i,
+                diff=(b'--- README\n'
+                      b'+++ README\n'
+                      b'@@ -1,1 +1,2 @@\n'
+                      b' Hello, world!\n'
+                      b'+Line %d\n' % i))
+
+    def test_with_max_workers(self):
+        """Testing populate_diff_chunks with max_workers generates the same
+        chunks as generating sequentially
+        """
+        files = get_diff_files(self.diffset)
+        populate_diff_chunks(files, max_workers=1)
+
+        cache.clear()
+        self.spy_on(DiffChunkGenerator.start_generating_chunks)
+
+        concurrent_files = get_diff_files(self.diffset)
+        populate_diff_chunks(concurrent_files, max_workers=3)
+
+        self.assertEqual(len(DiffChunkGenerator.start_generating_chunks.calls),
+                         3)
+        self.assertEqual(
+            [f['filediff'].source_file for f in concurrent_files],
+            ['/README0', '/README1', '/README2'])
+
+        for f, concurrent_f in zip(files, concurrent_files):
+            self.assertEqual(f['chunks'], concurrent_f['chunks'])
+            self.assertEqual(f['num_changes'], concurrent_f['num_changes'])
+            self.assertTrue(concurrent_f['chunks_loaded'])
+
+    def test_prefetches_files(self):
+        """Testing populate_diff_chunks fetches the files for all uncached
+        chunks together
+        """
+        self.spy_on(Repository.get_files)
+        self.spy_on(Repository._get_file_uncached)
+
+        files = get_diff_files(self.diffset)
+        populate_diff_chunks(files, max_workers=1)
+
+        self.assertEqual(len(Repository.get_files.calls), 1)
+        self.assertFalse(Repository._get_file_uncached.called)
+
+        for f in files:
+            self.assertTrue(f['chunks_loaded'])
+
+    def test_with_max_workers_and_cached(self):
+        """Testing populate_diff_chunks with max_workers and cached chunks"""
+        populate_diff_chunks(get_diff_files(self.diffset), max_workers=1)
+
+        self.spy_on(DiffChunkGenerator.start_generating_chunks)
+        populate_diff_chunks(get_diff_files(self.diffset), max_workers=3)
+
+        self.assertFalse(DiffChunkGenerator.start_generating_chunks.called)
+
+    def test_with_max_workers_reuses_process_pool(self):
+        """Testing populate_diff_chunks with max_workers reuses the same
+        process pool across calls
+        """
+        self.spy_on(DiffChunkGenerator.start_generating_chunks)
+        populate_diff_chunks(get_diff_files(self.diffset), max_workers=2)
+
+        cache.clear()
+        populate_diff_chunks(get_diff_files(self.diffset), max_workers=2)
+
+        calls = DiffChunkGenerator.start_generating_chunks.calls
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(len(set(id(call.args[0]) for call in calls)), 1)
+
+    def test_with_max_workers_and_timeout(self):
+        """Testing populate_diff_chunks with max_workers generates chunks in
+        this process when a worker process doesn't respond
+        """
+        files = get_diff_files(self.diffset)
+        populate_diff_chunks(files, max_workers=1)
+
+        cache.clear()
+
+        def _get(_self, timeout=None):
+            raise multiprocessing.TimeoutError()
+
+        self.spy_on(ApplyResult.get, call_fake=_get)
+
+        concurrent_files = get_diff_files(self.diffset)
+        populate_diff_chunks(concurrent_files, max_workers=3)
+
+        self.assertEqual(len(ApplyResult.get.calls), 3)
+
+        for f, concurrent_f in zip(files, concurrent_files):
+            self.assertEqual(f['chunks'], concurrent_f['chunks'])
+
+
+class PopulateFilesFromFileDiffsTests(SpyAgency, TestCase):
+    """Unit tests for populate_files_from_filediffs."""
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def test_populate(self):
+        """Testing populate_files_from_filediffs populates the chunks for
+        all files together
+        """
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        filediffs = [
+            self.create_filediff(
+                diffset=diffset,
+                source_file='/README%s' % i,
+                dest_file='/README%s' % i,
+                diff=(b'--- README\n'
+                      b'+++ README\n'
+                      b'@@ -1,1 +1,2 @@\n'
+                      b' Hello, world!\n'
+                      b'+Line %d\n' % i))
+            for i in range(2)
+        ]
+
+        self.spy_on(populate_diff_chunks)
+        self.spy_on(Repository.get_files)
+
+        context = {
+            'user': User.objects.get(username='doc'),
+        }
+        populate_files_from_filediffs(
+            context,
+            [(filediff, None) for filediff in filediffs + filediffs])
+
+        self.assertEqual(len(populate_diff_chunks.calls), 1)
+        self.assertEqual(len(Repository.get_files.calls), 1)
+
+        for filediff in filediffs:
+            f = get_file_from_filediff(context, filediff, None)
+            self.assertEqual(f['filediff'], filediff)
+            self.assertTrue(f['chunks_loaded'])
+
+        # The files are cached in the context now.
+        self.assertEqual(len(populate_diff_chunks.calls), 1)
+
+
 class PatchTests(TestCase):
     """Unit tests for patch."""
 
@@ -1,6 +1,10 @@
 from __future__ import unicode_literals
 
-from reviewboard.diffviewer.myersdiff import MyersDiffer
+import random
+import re
+
+from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
+from reviewboard.diffviewer.myersdiff import FastMyersDiffer, MyersDiffer
 from reviewboard.testing import TestCase
 
 
@@ -39,3 +43,88 @@ class MyersDifferTest(TestCase):
     def _test_diff(self, a, b, expected):
         opcodes = list(MyersDiffer(a, b).get_opcodes())
         self.assertEqual(opcodes, expected)
+
+
+class FastMyersDifferTests(MyersDifferTest):
+    """Unit tests for FastMyersDiffer."""
+
+    def test_get_differ(self):
+        """Testing get_differ with DiffCompatVersion.MYERS_FAST"""
+        self.assertIsInstance(get_differ([], []), FastMyersDiffer)
+        self.assertIsInstance(
+            get_differ([], [], compat_version=DiffCompatVersion.MYERS_FAST),
+            FastMyersDiffer)
+        self.assertIsInstance(
+            get_differ([], [],
+                       compat_version=DiffCompatVersion.MYERS_SMS_COST_BAIL),
+            MyersDiffer)
+        self.assertNotIsInstance(
+            get_differ([], [],
+                       compat_version=DiffCompatVersion.MYERS_SMS_COST_BAIL),
+            FastMyersDiffer)
+
+    def test_matches_myers_differ(self):
+        """Testing FastMyersDiffer generates the same opcodes as MyersDiffer
+        """
+        for seed, change_ratio in ((0, 0.02), (1, 0.2), (2, 0.5)):
+            old, new = self._make_files(seed, 1500, change_ratio)
+
+            self._test_matches(old, new, ignore_space=False)
+            self._test_matches(old, new, ignore_space=True)
+
+    def test_matches_myers_differ_with_unrelated_files(self):
+        """Testing FastMyersDiffer generates the same opcodes as MyersDiffer
+        with unrelated files
+        """
+        old = self._make_files(0, 2000, 0)[0]
+        new = self._make_files(1, 2000, 0)[0]
+
+        self._test_matches(old, new, ignore_space=False)
+
+    def _make_files(self, seed, num_lines, change_ratio):
+        rng = random.Random(seed)
+        words = ['def', 'return', 'if', 'else', 'foo', 'bar', 'x', '=', '+']
+
+        def make_line():
+            return '%s%s' % (' ' * rng.randint(0, 8),
+                             ' '.join(rng.choice(words)
+                                      for i in range(rng.randint(0, 4))))
+
+        old = [make_line() for i in range(num_lines)]
+        new = list(old)
+
+        for i in range(int(num_lines * change_ratio)):
+            op = rng.random()
+            i = rng.randrange(len(new))
+
+            if op < 0.4:
+                new[i] = make_line()
+            elif op < 0.7:
+                new.insert(i, make_line())
+            else:
+                del new[i]
+
+        return old, new
+
+    def _test_matches(self, old, new, ignore_space):
+        differs = [
+            MyersDiffer(old, new, ignore_space=ignore_space,
+                        compat_version=DiffCompatVersion.MYERS_SMS_COST_BAIL),
+            FastMyersDiffer(old, new, ignore_space=ignore_space,
+                            compat_version=DiffCompatVersion.MYERS_FAST),
+        ]
+
+        for differ in differs:
+            differ.add_interesting_line_regex('header', re.compile(r'^def'))
+
+        self.assertEqual(list(differs[1].get_opcodes()),
+                         list(differs[0].get_opcodes()))
+
+        for is_modified_file in (False, True):
+            self.assertEqual(
+                differs[1].get_interesting_lines('header', is_modified_file),
+                differs[0].get_interesting_lines('header', is_modified_file))
+
+    def _test_diff(self, a, b, expected):
+        opcodes = list(FastMyersDiffer(a, b).get_opcodes())
+        self.assertEqual(opcodes, expected)
@@ -0,0 +1,364 @@
+from __future__ import unicode_literals
+
+from kgb import SpyAgency
+
+from reviewboard.diffviewer import diffutils
+from reviewboard.diffviewer.errors import PatchError
+from reviewboard.diffviewer.patcher import (UnsupportedPatchError,
+                                            apply_patch,
+                                            parse_hunks)
+from reviewboard.testing import TestCase
+
+
+class ApplyPatchTests(TestCase):
+    """Unit tests for reviewboard.diffviewer.patcher.apply_patch."""
+
+    orig_file = b''.join(
+        b'line %d\n' % i
+        for i in range(1, 21)
+    )
+
+    def test_with_single_hunk(self):
+        """Testing apply_patch with a single hunk"""
+        diff = (
+            b'--- foo.txt\n'
+            b'+++ foo.txt\n'
+            b'@@ -4,7 +4,7 @@\n'
+            b' line 4\n'
+            b' line 5\n'
+            b' line 6\n'
+            b'-line 7\n'
+            b'+line seven\n'
+            b' line 8\n'
+            b' line 9\n'
+            b' line 10\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, self.orig_file, 'foo.txt'),
+            self.orig_file.replace(b'line 7\n', b'line seven\n'))
+
+    def test_with_offset(self):
+        """Testing apply_patch with hunks at an offset"""
+        orig_file = b'new line 1\nnew line 2\n' + self.orig_file
+        diff = (
+            b'@@ -4,7 +4,6 @@\n'
+            b' line 4\n'
+            b' line 5\n'
+            b' line 6\n'
+            b'-line 7\n'
+            b' line 8\n'
+            b' line 9\n'
+            b' line 10\n'
+            b'@@ -15,3 +14,4 @@\n'
+            b' line 15\n'
+            b'+line 15.5\n'
+            b' line 16\n'
+            b' line 17\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, orig_file, 'foo.txt'),
+            orig_file
+            .replace(b'line 7\n', b'')
+            .replace(b'line 16\n', b'line 15.5\nline 16\n'))
+
+    def test_with_fuzz(self):
+        """Testing apply_patch with mismatched context lines"""
+        diff = (
+            b'@@ -4,7 +4,7 @@\n'
+            b' line four\n'
+            b' line 5\n'
+            b' line 6\n'
+            b'-line 7\n'
+            b'+line seven\n'
+            b' line 8\n'
+            b' line 9\n'
+            b' line ten\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, self.orig_file, 'foo.txt'),
+            self.orig_file.replace(b'line 7\n', b'line seven\n'))
+
+    def test_with_insert_only_hunk(self):
+        """Testing apply_patch with a hunk without context"""
+        diff = (
+            b'@@ -0,0 +1,2 @@\n'
+            b'+line 0\n'
+            b'+line 0.5\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, self.orig_file, 'foo.txt'),
+            b'line 0\nline 0.5\n' + self.orig_file)
+
+    def test_with_no_newline_markers(self):
+        """Testing apply_patch with "No newline at end of file" markers"""
+        diff = (
+            b'@@ -1,2 +1,2 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+            b'\\ No newline at end of file\n'
+            b'+line two\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, b'line 1\nline 2', 'foo.txt'),
+            b'line 1\nline two\n')
+
+    def test_with_no_newline_marker_before_eof(self):
+        """Testing apply_patch with a "No newline at end of file" marker on a
+        line that would be placed before the end of the file
+        """
+        diff = (
+            b'@@ -1,2 +1,3 @@\n'
+            b' x\n'
+            b' y\n'
+            b'+b\n'
+            b'\\ No newline at end of file\n'
+        )
+
+        with self.assertRaises(UnsupportedPatchError):
+            apply_patch(diff, b'x\ny\nz\n', 'foo.txt')
+
+    def test_with_no_newline_marker_at_eof(self):
+        """Testing apply_patch with a "No newline at end of file" marker on an
+        added line at the end of the file
+        """
+        diff = (
+            b'@@ -1,2 +1,3 @@\n'
+            b' x\n'
+            b' y\n'
+            b'+b\n'
+            b'\\ No newline at end of file\n'
+        )
+
+        self.assertEqual(apply_patch(diff, b'x\ny\n', 'foo.txt'),
+                         b'x\ny\nb')
+
+    def test_with_hunk_at_start_of_file(self):
+        """Testing apply_patch with a hunk made against the start of the file
+        only applying there
+        """
+        diff = (
+            b'@@ -1,3 +1,4 @@\n'
+            b'+line 0\n'
+            b' line 1\n'
+            b' line 2\n'
+            b' line 3\n'
+        )
+
+        with self.assertRaises(PatchError):
+            apply_patch(diff, b'new line 1\nnew line 2\n' + self.orig_file,
+                        'foo.txt')
+
+    def test_with_hunk_at_end_of_file(self):
+        """Testing apply_patch with a hunk made against the end of the file
+        and lines added after it
+        """
+        diff = (
+            b'@@ -18,3 +18,3 @@\n'
+            b' line 18\n'
+            b' line 19\n'
+            b'-line 20\n'
+            b'+line twenty\n'
+        )
+
+        # Like patch, this only applies once the leading context is fuzzed
+        # down to the size of the trailing context.
+        self.assertEqual(
+            apply_patch(diff, self.orig_file + b'line 21\n', 'foo.txt'),
+            self.orig_file.replace(b'line 20\n', b'line twenty\n') +
+            b'line 21\n')
+
+    def test_with_fuzz_and_uneven_context(self):
+        """Testing apply_patch with fuzz only ignoring context from the end of
+        a hunk with more context
+        """
+        diff = (
+            b'@@ -5,5 +5,5 @@\n'
+            b' line 5\n'
+            b'-line 6\n'
+            b'+line six\n'
+            b' line 7\n'
+            b' line 8\n'
+            b' line 9\n'
+        )
+        orig_file = (
+            self.orig_file
+            .replace(b'line 5\n', b'line five\n')
+            .replace(b'line 9\n', b'line nine\n')
+        )
+
+        with self.assertRaises(PatchError):
+            apply_patch(diff, orig_file, 'foo.txt')
+
+    def test_with_fuzz_and_uneven_context_at_offset(self):
+        """Testing apply_patch with fuzz and uneven context applying at the
+        same position as patch
+        """
+        diff = (
+            b'@@ -3,5 +3,5 @@\n'
+            b' a\n'
+            b'-b\n'
+            b'+B\n'
+            b' c\n'
+            b' d\n'
+            b' e\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, b'q\nr\nX\nb\nc\nd\ne\na\nb\nc\nd\nZ\n',
+                        'foo.txt'),
+            b'q\nr\nX\nb\nc\nd\ne\na\nB\nc\nd\nZ\n')
+
+    def test_with_reversed_diff(self):
+        """Testing apply_patch with a diff that has already been applied"""
+        diff = (
+            b'@@ -1,3 +1,3 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+            b'+line two\n'
+            b' line 3\n'
+        )
+
+        with self.assertRaises(UnsupportedPatchError):
+            apply_patch(diff,
+                        self.orig_file.replace(b'line 2\n', b'line two\n'),
+                        'foo.txt')
+
+    def test_with_content_between_hunks(self):
+        """Testing apply_patch with content between hunks"""
+        diff = (
+            b'@@ -1,3 +1,3 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+            b'+line two\n'
+            b' line 3\n'
+            b'Some other text\n'
+            b'@@ -10,2 +10,2 @@\n'
+            b' line 10\n'
+            b'-line 11\n'
+            b'+line eleven\n'
+        )
+
+        with self.assertRaises(UnsupportedPatchError):
+            apply_patch(diff, self.orig_file, 'foo.txt')
+
+    def test_with_rejects(self):
+        """Testing apply_patch with a hunk that does not apply"""
+        diff = (
+            b'--- foo.txt\n'
+            b'+++ foo.txt\n'
+            b'@@ -1,3 +1,3 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+            b'+line two\n'
+            b' line 3\n'
+            b'@@ -10,3 +10,2 @@\n'
+            b' line 10\n'
+            b'-line 11 (modified)\n'
+            b' line 12\n'
+        )
+
+        with self.assertRaises(PatchError) as cm:
+            apply_patch(diff, self.orig_file, 'src/foo.txt')
+
+        e = cm.exception
+        self.assertEqual(e.filename, 'src/foo.txt')
+        self.assertEqual(
+            e.error_output,
+            'patching file foo.txt\n'
+            'Hunk #2 FAILED at 10.\n'
+            '1 out of 2 hunks FAILED -- saving rejects to file foo.txt.rej')
+        self.assertEqual(e.new_file,
+                         self.orig_file.replace(b'line 2\n', b'line two\n'))
+        self.assertEqual(
+            e.rejects,
+            b'--- foo.txt\n'
+            b'+++ foo.txt\n'
+            b'@@ -10,3 +10,2 @@\n'
+            b' line 10\n'
+            b'-line 11 (modified)\n'
+            b' line 12\n')
+
+    def test_with_context_diff(self):
+        """Testing apply_patch with a context diff"""
+        diff = (
+            b'*** foo.txt\n'
+            b'--- foo.txt\n'
+            b'***************\n'
+            b'*** 1 ****\n'
+            b'! line 1\n'
+            b'--- 1 ----\n'
+            b'! line one\n'
+        )
+
+        with self.assertRaises(UnsupportedPatchError):
+            apply_patch(diff, self.orig_file, 'foo.txt')
+
+    def test_parse_hunks_with_truncated_hunk(self):
+        """Testing parse_hunks with a truncated hunk"""
+        diff = (
+            b'@@ -1,3 +1,3 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+        )
+
+        with self.assertRaises(UnsupportedPatchError):
+            parse_hunks(diff)
+
+
+class PatchFallbackTests(SpyAgency, TestCase):
+    """Unit tests for the patch binary fallback in diffutils.patch."""
+
+    def test_without_rejects(self):
+        """Testing patch does not run patch binary when applied in-process"""
+        self.spy_on(diffutils._patch_with_subprocess)
+
+        diff = (
+            b'@@ -1,2 +1,2 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+            b'+line two\n'
+        )
+
+        self.assertEqual(diffutils.patch(diff, b'line 1\nline 2\n', 'foo'),
+                         b'line 1\nline two\n')
+        self.assertFalse(diffutils._patch_with_subprocess.called)
+
+    def test_with_rejects(self):
+        """Testing patch falls back on patch binary when hunks are rejected"""
+        self.spy_on(diffutils._patch_with_subprocess)
+
+        diff = (
+            b'@@ -1,2 +1,2 @@\n'
+            b' line 1\n'
+            b'-line 2 (modified)\n'
+            b'+line two\n'
+        )
+
+        with self.assertRaises(PatchError) as cm:
+            diffutils.patch(diff, b'line 1\nline 2\n', 'foo')
+
+        self.assertTrue(diffutils._patch_with_subprocess.called)
+        self.assertIn('1 out of 1 hunk FAILED', cm.exception.error_output)
+
+    def test_with_unsupported_patch(self):
+        """Testing patch falls back on patch binary when the diff can't be
+        applied in-process
+        """
+        self.spy_on(diffutils._patch_with_subprocess)
+
+        diff = (
+            b'@@ -1,2 +1,3 @@\n'
+            b' x\n'
+            b' y\n'
+            b'+b\n'
+            b'\\ No newline at end of file\n'
+        )
+
+        self.assertEqual(diffutils.patch(diff, b'x\ny\nz\n', 'foo'),
+                         b'x\ny\nb\nz\n')
+        self.assertTrue(diffutils._patch_with_subprocess.called)
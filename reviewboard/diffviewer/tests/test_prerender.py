@@ -0,0 +1,193 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.utils.six.moves import range
+from djblets.siteconfig.models import SiteConfiguration
+from kgb import SpyAgency
+
+from reviewboard.diffviewer.chunk_generator import DiffChunkGenerator
+from reviewboard.diffviewer.diffutils import (get_diff_files,
+                                              populate_diff_chunks)
+from reviewboard.diffviewer.prerender import (DiffPrerenderQueue,
+                                              prerender_diffset,
+                                              _prerender_diff_files)
+from reviewboard.testing import TestCase
+
+
+class DiffPrerenderQueueTests(TestCase):
+    """Unit tests for reviewboard.diffviewer.prerender.DiffPrerenderQueue."""
+
+    def test_add(self):
+        """Testing DiffPrerenderQueue.add runs jobs"""
+        queue = DiffPrerenderQueue(2)
+        results = []
+
+        for i in range(5):
+            self.assertTrue(queue.add('job-%s' % i, results.append, i))
+
+        self.assertTrue(queue.wait(5))
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+
+    def test_add_with_pending_job(self):
+        """Testing DiffPrerenderQueue.add with a job with the same key
+        already pending
+        """
+        queue = DiffPrerenderQueue(1)
+        event = threading.Event()
+        results = []
+
+        self.assertTrue(queue.add('job-1', event.wait, 5))
+        self.assertTrue(queue.add('job-2', results.append, 1))
+        self.assertFalse(queue.add('job-1', results.append, 2))
+        self.assertFalse(queue.add('job-2', results.append, 3))
+
+        event.set()
+
+        self.assertTrue(queue.wait(5))
+        self.assertEqual(results, [1])
+        self.assertFalse(queue.is_pending('job-1'))
+
+    def test_claim(self):
+        """Testing DiffPrerenderQueue.claim"""
+        queue = DiffPrerenderQueue(1)
+        started = threading.Event()
+        event = threading.Event()
+        results = []
+
+        def _job():
+            started.set()
+            event.wait(5)
+
+        queue.add('job-1', _job)
+        queue.add('job-2', results.append, 1)
+        started.wait(5)
+
+        # job-1 is running, and can't be claimed.
+        self.assertFalse(queue.claim('job-1'))
+        self.assertTrue(queue.claim('job-2'))
+        self.assertFalse(queue.claim('job-3'))
+
+        event.set()
+
+        self.assertTrue(queue.wait(5))
+        self.assertEqual(results, [])
+
+    def test_max_workers(self):
+        """Testing DiffPrerenderQueue limits the number of concurrent jobs"""
+        queue = DiffPrerenderQueue(2)
+        lock = threading.Lock()
+        state = {
+            'running': 0,
+            'max_running': 0,
+        }
+
+        def _job():
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'],
+                                           state['running'])
+
+            time.sleep(0.05)
+
+            with lock:
+                state['running'] -= 1
+
+        for i in range(6):
+            queue.add('job-%s' % i, _job)
+
+        self.assertTrue(queue.wait(5))
+        self.assertEqual(state['max_running'], 2)
+
+
+class PrerenderDiffsetTests(SpyAgency, TestCase):
+    """Unit tests for pre-rendering diffs."""
+
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(PrerenderDiffsetTests, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+
+        repository = self.create_repository(tool_name='Test')
+        self.diffset = self.create_diffset(repository=repository)
+
+        for i in range(3):
+            self.create_filediff(
+                diffset=self.diffset,
+                source_file='/README%s' % i,
+                dest_file='/README%s' % i,
+                diff=(b'--- README\n'
+                      b'+++ README\n'
+                      b'@@ -1,1 +1,2 @@\n'
+                      b' Hello, world!\n'
+                      b'+Line %d\n' % i))
+
+    def tearDown(self):
+        super(PrerenderDiffsetTests, self).tearDown()
+
+        self.siteconfig.set('diffviewer_prerender_workers', 0)
+        self.siteconfig.save()
+
+    def _enable_prerendering(self):
+        self.siteconfig.set('diffviewer_prerender_workers', 2)
+        self.siteconfig.save()
+
+    def test_prerender_diffset(self):
+        """Testing prerender_diffset queues the diff"""
+        jobs = []
+
+        self._enable_prerendering()
+        self.spy_on(DiffPrerenderQueue.add,
+                    call_fake=lambda self, *args: jobs.append(args))
+
+        self.assertTrue(prerender_diffset(self.diffset))
+        self.assertEqual(jobs, [
+            ('diffset-%s' % self.diffset.pk, _prerender_diff_files,
+             self.diffset.pk, None),
+        ])
+
+    def test_prerender_diffset_when_disabled(self):
+        """Testing prerender_diffset when pre-rendering is disabled"""
+        self.spy_on(DiffPrerenderQueue.add, call_original=False)
+
+        self.assertFalse(prerender_diffset(self.diffset))
+        self.assertFalse(DiffPrerenderQueue.add.called)
+
+    def test_prerender_diff_files(self):
+        """Testing pre-rendering a diff caches the chunks for each file"""
+        _prerender_diff_files(self.diffset.pk, None)
+
+        files = get_diff_files(self.diffset)
+
+        for f in files:
+            generator = DiffChunkGenerator(None, f['filediff'])
+            self.assertTrue(generator.has_cached_chunks())
+
+        # Rendering the diff now doesn't generate anything.
+        self.spy_on(DiffChunkGenerator.get_chunks_uncached)
+        populate_diff_chunks(files)
+
+        self.assertFalse(DiffChunkGenerator.get_chunks_uncached.called)
+
+    def test_populate_diff_chunks_claims_jobs(self):
+        """Testing populate_diff_chunks removes queued jobs for the files
+        being rendered
+        """
+        claimed_keys = []
+
+        self._enable_prerendering()
+        self.spy_on(DiffPrerenderQueue.claim,
+                    call_fake=lambda self, key: claimed_keys.append(key))
+
+        files = get_diff_files(self.diffset)
+        populate_diff_chunks(files)
+
+        self.assertEqual(
+            claimed_keys,
+            [
+                DiffChunkGenerator(None, f['filediff']).make_cache_key()
+                for f in files
+            ])
@@ -1,6 +1,14 @@
 from __future__ import unicode_literals
 
-from reviewboard.diffviewer.chunk_generator import RawDiffChunkGenerator
+from django.utils.six.moves import range
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard.diffviewer.chunk_generator import (
+    RawDiffChunkGenerator,
+    find_highlighting_sync_line,
+    get_chunk_lines,
+    get_highlighted_chunk)
+from reviewboard.diffviewer.diffutils import get_chunks_in_range
 from reviewboard.testing import TestCase
 
 
@@ -297,3 +305,133 @@ class RawDiffChunkGeneratorTests(TestCase):
              '|&lt;&mdash;&mdash;&mdash;&mdash;&mdash;&mdash;'
              '</span>        </span> foo', ''))
 
+
+class RawDiffChunkGeneratorPartialHighlightingTests(TestCase):
+    """Unit tests for partial syntax highlighting in RawDiffChunkGenerator."""
+
+    old = b''.join(
+        b'def func%d(a):\n'
+        b'    """Return a value.\n'
+        b'\n'
+        b'    This is a docstring.\n'
+        b'    """\n'
+        b'    return a + %d\n'
+        b'\n'
+        b'\n'
+        % (i, i)
+        for i in range(50)
+    )
+
+    new = old.replace(b'return a + 20\n', b'return a - 20\n')
+
+    def setUp(self):
+        super(RawDiffChunkGeneratorPartialHighlightingTests, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+        self.siteconfig.set('diffviewer_partial_highlighting_threshold', 1)
+        self.siteconfig.save()
+
+    def tearDown(self):
+        super(RawDiffChunkGeneratorPartialHighlightingTests, self).tearDown()
+
+        self.siteconfig.set('diffviewer_partial_highlighting_threshold', 0)
+        self.siteconfig.save()
+
+    def _get_chunks(self, partial_threshold):
+        self.siteconfig.set('diffviewer_partial_highlighting_threshold',
+                            partial_threshold)
+        self.siteconfig.save()
+
+        generator = RawDiffChunkGenerator(self.old, self.new,
+                                          'foo.py', 'foo.py')
+
+        return list(generator.get_chunks_uncached())
+
+    def test_get_chunks(self):
+        """Testing RawDiffChunkGenerator.get_chunks with partial highlighting
+        """
+        full_chunks = self._get_chunks(0)
+        chunks = self._get_chunks(1)
+
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual([chunk['change'] for chunk in chunks],
+                         [chunk['change'] for chunk in full_chunks])
+
+        for chunk, full_chunk in zip(chunks, full_chunks):
+            if chunk['collapsable']:
+                # Collapsed lines are left as plain text.
+                self.assertIn('pending_highlighting', chunk['meta'])
+                self.assertNotEqual(chunk['lines'], full_chunk['lines'])
+
+                for line in chunk['lines']:
+                    self.assertNotIn('<span', line[2])
+                    self.assertNotIn('<span', line[5])
+            else:
+                self.assertNotIn('pending_highlighting', chunk['meta'])
+                self.assertEqual(chunk['lines'], full_chunk['lines'])
+
+            # Highlighting the collapsed lines gives the same result as
+            # highlighting the whole file.
+            self.assertEqual(get_highlighted_chunk(chunk)['lines'],
+                             full_chunk['lines'])
+
+    def test_get_chunks_under_threshold(self):
+        """Testing RawDiffChunkGenerator.get_chunks with partial highlighting
+        and a file under the threshold
+        """
+        full_chunks = self._get_chunks(0)
+        chunks = self._get_chunks(10000)
+
+        for chunk in chunks:
+            self.assertNotIn('pending_highlighting', chunk['meta'])
+
+        self.assertEqual([chunk['lines'] for chunk in chunks],
+                         [chunk['lines'] for chunk in full_chunks])
+
+    def test_get_chunk_lines(self):
+        """Testing get_chunk_lines with a range of lines"""
+        full_chunk = self._get_chunks(0)[0]
+        chunk = self._get_chunks(1)[0]
+        lines = list(chunk['lines'])
+
+        self.assertEqual(get_chunk_lines(chunk, 10, 20),
+                         full_chunk['lines'][10:20])
+
+        # The chunk itself is left alone.
+        self.assertEqual(chunk['lines'], lines)
+        self.assertIn('pending_highlighting', chunk['meta'])
+
+    def test_get_chunks_in_range(self):
+        """Testing get_chunks_in_range with partial highlighting"""
+        full_chunks = self._get_chunks(0)
+        chunks = self._get_chunks(1)
+
+        new_chunks = list(get_chunks_in_range(chunks, 150, 20))
+
+        self.assertEqual(
+            [chunk['lines'] for chunk in new_chunks],
+            [
+                chunk['lines']
+                for chunk in get_chunks_in_range(full_chunks, 150, 20)
+            ])
+
+        for chunk in new_chunks:
+            self.assertNotIn('pending_highlighting', chunk['meta'])
+
+    def test_find_highlighting_sync_line(self):
+        """Testing find_highlighting_sync_line"""
+        lines = self.old.decode('utf-8').splitlines()
+
+        # The closest unindented line after a blank line.
+        self.assertEqual(find_highlighting_sync_line(lines, 20, 100), 16)
+        self.assertEqual(find_highlighting_sync_line(lines, 16, 100), 16)
+
+        # The start of the file, if within range.
+        self.assertEqual(find_highlighting_sync_line(lines, 5, 100), 0)
+
+        # The least indented line after a blank line, if no unindented line
+        # is in range.
+        self.assertEqual(find_highlighting_sync_line(lines, 21, 3), 19)
+
+        # The furthest line, if nothing is found.
+        self.assertEqual(find_highlighting_sync_line(lines, 21, 1), 20)
@@ -1,12 +1,17 @@
 from __future__ import unicode_literals
 
 import bz2
+import zlib
 
+from kgb import SpyAgency
+
+from reviewboard.diffviewer import compression
+from reviewboard.diffviewer.compression import get_available_compressions
 from reviewboard.diffviewer.models import RawFileDiffData
 from reviewboard.testing import TestCase
 
 
-class RawFileDiffDataManagerTests(TestCase):
+class RawFileDiffDataManagerTests(SpyAgency, TestCase):
     """Unit tests for RawFileDiffDataManager."""
 
     small_diff = (
@@ -48,10 +53,121 @@ class RawFileDiffDataManagerTests(TestCase):
 
     def test_process_diff_data_large_diff_compressed(self):
         """Testing RawFileDiffDataManager.process_diff_data with large diff
-        results in bzip2-compressed storage
+        results in compressed storage using the configured method
         """
         data, compression = \
             RawFileDiffData.objects.process_diff_data(self.large_diff)
 
+        self.assertEqual(data, zlib.compress(self.large_diff, 6))
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_process_diff_data_with_bzip2(self):
+        """Testing RawFileDiffDataManager.process_diff_data with
+        compression='bzip2'
+        """
+        data, compression = RawFileDiffData.objects.process_diff_data(
+            self.large_diff, compression='bzip2')
+
         self.assertEqual(data, bz2.compress(self.large_diff, 9))
         self.assertEqual(compression, RawFileDiffData.COMPRESSION_BZIP2)
+
+    def test_process_diff_data_with_unknown_compression(self):
+        """Testing RawFileDiffDataManager.process_diff_data with an unknown
+        compression method
+        """
+        with self.assertRaises(ValueError):
+            RawFileDiffData.objects.process_diff_data(self.large_diff,
+                                                      compression='foo')
+
+    def test_content_with_compression(self):
+        """Testing RawFileDiffData.content with each available compression
+        method
+        """
+        for compression in get_available_compressions():
+            data, code = RawFileDiffData.objects.process_diff_data(
+                self.large_diff, compression=compression)
+            raw_diff_data = RawFileDiffData(binary=data, compression=code)
+
+            self.assertEqual(raw_diff_data.content, self.large_diff)
+
+    def test_recompress_all(self):
+        """Testing RawFileDiffDataManager.recompress_all"""
+        raw_diff_data = RawFileDiffData.objects.create(
+            binary_hash='a' * 40,
+            binary=bz2.compress(self.large_diff, 9),
+            compression=RawFileDiffData.COMPRESSION_BZIP2)
+        small_raw_diff_data = RawFileDiffData.objects.create(
+            binary_hash='b' * 40,
+            binary=self.small_diff,
+            compression=None)
+
+        info = RawFileDiffData.objects.recompress_all(compression='zlib-9')
+
+        self.assertEqual(info['diffs_recompressed'], 1)
+        self.assertEqual(info['old_diff_size'],
+                         len(bz2.compress(self.large_diff, 9)))
+        self.assertEqual(info['new_diff_size'],
+                         len(zlib.compress(self.large_diff, 9)))
+
+        raw_diff_data = RawFileDiffData.objects.get(pk=raw_diff_data.pk)
+        self.assertEqual(raw_diff_data.compression,
+                         RawFileDiffData.COMPRESSION_ZLIB)
+        self.assertEqual(raw_diff_data.content, self.large_diff)
+
+        small_raw_diff_data = \
+            RawFileDiffData.objects.get(pk=small_raw_diff_data.pk)
+        self.assertIsNone(small_raw_diff_data.compression)
+        self.assertEqual(small_raw_diff_data.content, self.small_diff)
+
+    def test_recompress_all_with_unavailable_compression(self):
+        """Testing RawFileDiffDataManager.recompress_all with a compression
+        method that isn't installed
+        """
+        raw_diff_data = RawFileDiffData.objects.create(
+            binary_hash='a' * 40,
+            binary=bz2.compress(self.large_diff, 9),
+            compression=RawFileDiffData.COMPRESSION_BZIP2)
+
+        self.spy_on(compression.get_available_compressions,
+                    call_fake=lambda: ['bzip2', 'zlib-1', 'zlib-6', 'zlib-9'])
+
+        info = RawFileDiffData.objects.recompress_all(compression='lz4')
+
+        self.assertEqual(info['diffs_recompressed'], 0)
+        self.assertEqual(info['old_diff_size'], 0)
+        self.assertEqual(info['new_diff_size'], 0)
+
+        raw_diff_data = RawFileDiffData.objects.get(pk=raw_diff_data.pk)
+        self.assertEqual(raw_diff_data.compression,
+                         RawFileDiffData.COMPRESSION_BZIP2)
+
+    def test_recompress_all_with_concurrent_change(self):
+        """Testing RawFileDiffDataManager.recompress_all doesn't count diffs
+        changed by something else while processing
+        """
+        raw_diff_data = RawFileDiffData.objects.create(
+            binary_hash='a' * 40,
+            binary=bz2.compress(self.large_diff, 9),
+            compression=RawFileDiffData.COMPRESSION_BZIP2)
+
+        def _process_diff_data(*args, **kwargs):
+            # Simulate another process re-compressing the diff first.
+            RawFileDiffData.objects.filter(pk=raw_diff_data.pk).update(
+                binary=zlib.compress(self.large_diff, 6),
+                compression=RawFileDiffData.COMPRESSION_ZLIB)
+
+            return (zlib.compress(self.large_diff, 9),
+                    RawFileDiffData.COMPRESSION_ZLIB)
+
+        self.spy_on(RawFileDiffData.objects.process_diff_data,
+                    call_fake=_process_diff_data)
+
+        info = RawFileDiffData.objects.recompress_all(compression='zlib-9')
+
+        self.assertEqual(info['diffs_recompressed'], 0)
+        self.assertEqual(info['old_diff_size'], 0)
+        self.assertEqual(info['new_diff_size'], 0)
+
+        raw_diff_data = RawFileDiffData.objects.get(pk=raw_diff_data.pk)
+        self.assertEqual(raw_diff_data.binary,
+                         zlib.compress(self.large_diff, 6))
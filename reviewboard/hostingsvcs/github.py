@@ -117,6 +117,7 @@ class GitHubAPIPaginator(APIPaginator):
     """
     start_query_param = 'page'
     per_page_query_param = 'per_page'
+    start_is_page_number = True
 
     LINK_RE = re.compile(r'\<(?P<url>[^>]+)\>; rel="(?P<rel>[^"]+)",? *')
 
@@ -136,6 +137,7 @@ class GitHubAPIPaginator(APIPaginator):
             'headers': headers,
             'prev_url': links.get('prev'),
             'next_url': links.get('next'),
+            'last_url': links.get('last'),
         }
 
 
@@ -150,23 +152,8 @@ class GitHubClient(HostingServiceClient):
     # HTTP method overrides
     #
 
-    def http_delete(self, url, *args, **kwargs):
-        data, headers = super(GitHubClient, self).http_delete(
-            url, *args, **kwargs)
+    def process_http_response_headers(self, headers):
         self._check_rate_limits(headers)
-        return data, headers
-
-    def http_get(self, url, *args, **kwargs):
-        data, headers = super(GitHubClient, self).http_get(
-            url, *args, **kwargs)
-        self._check_rate_limits(headers)
-        return data, headers
-
-    def http_post(self, url, *args, **kwargs):
-        data, headers = super(GitHubClient, self).http_post(
-            url, *args, **kwargs)
-        self._check_rate_limits(headers)
-        return data, headers
 
     #
     # API wrappers around HTTP/JSON methods
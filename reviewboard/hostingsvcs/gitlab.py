@@ -21,6 +21,7 @@ from reviewboard.hostingsvcs.errors import (AuthorizationError,
 from reviewboard.hostingsvcs.forms import (HostingServiceAuthForm,
                                            HostingServiceForm)
 from reviewboard.hostingsvcs.service import HostingService
+from reviewboard.hostingsvcs.utils.paginator import APIPaginator
 from reviewboard.scmtools.crypto_utils import (decrypt_password,
                                                encrypt_password)
 from reviewboard.scmtools.errors import FileNotFoundError
@@ -153,6 +154,40 @@ class GitLabGroupForm(HostingServiceForm):
         widget=forms.TextInput(attrs={'size': '60'}))
 
 
+class GitLabAPIPaginator(APIPaginator):
+    """Paginates over GitLab API list resources.
+
+    The ``client`` for this paginator is the :py:class:`GitLab` hosting
+    service, which is used to make authenticated requests.
+    """
+    start_query_param = 'page'
+    per_page_query_param = 'per_page'
+    start_is_page_number = True
+
+    # Pagination links (in GitLab 6.8.0+) take the form:
+    # '<http://gitlab/api/v3/projects?page=2&per_page=100>; rel="next"'
+    LINK_RE = re.compile(r'\<(?P<url>[^>]+)\>; rel="(?P<rel>[^"]+)",? *')
+
+    def fetch_url(self, url):
+        """Fetches the page data from a URL."""
+        data, headers = self.client._api_get(url)
+
+        # Find all the links in the Link header and key off by the link
+        # name ('prev', 'next', etc.).
+        links = dict(
+            (m.group('rel'), m.group('url'))
+            for m in self.LINK_RE.finditer(headers.get('link', ''))
+        )
+
+        return {
+            'data': data,
+            'headers': headers,
+            'prev_url': links.get('prev'),
+            'next_url': links.get('next'),
+            'last_url': links.get('last'),
+        }
+
+
 class GitLab(HostingService):
     """Hosting service support for GitLab.
 
@@ -171,10 +206,6 @@ class GitLab(HostingService):
     supports_repositories = True
     supported_scmtools = ['Git']
 
-    # Pagination links (in GitLab 6.8.0+) take the form:
-    # '<http://gitlab/api/v3/projects?page=2&per_page=100>; rel="next"'
-    LINK_HEADER_RE = re.compile(r'\<(?P<url>[^\>]+)\>; rel="next"')
-
     auth_form = GitLabAuthForm
 
     plans = [
@@ -645,24 +676,11 @@ class GitLab(HostingService):
         """Makes a request to a GitLab list API and returns the full list.
 
         If the server provides a "next" link in the headers (GitLab 6.8.0+),
-        this will follow that link and fetch all the results. Otherwise, this
-        will provide only the first page of results.
+        this will follow that link and fetch all the results. If it also
+        provides a "last" link, the remaining pages are fetched concurrently.
+        Otherwise, this will provide only the first page of results.
         """
-        all_data = []
-
-        while url:
-            data, headers = self._api_get(url)
-
-            all_data += data
-
-            url = None
-            for link in headers.get('link', '').split(', '):
-                m = self.LINK_HEADER_RE.match(link)
-                if m:
-                    url = m.group('url')
-                    break
-
-        return all_data
+        return list(GitLabAPIPaginator(self, url).iter_items())
 
     def _is_email(self, email):
         """Returns True if given string is valid e-mail address"""
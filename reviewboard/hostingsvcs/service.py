@@ -7,20 +7,23 @@ import json
 import logging
 import mimetools
 import re
+from multiprocessing.pool import ThreadPool
 
 from django.conf.urls import include, url
+from django.db import connection
 from django.dispatch import receiver
 from django.utils import six
 from django.utils.six.moves.urllib.parse import urlparse
+from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.request import (Request as BaseURLRequest,
-                                                   HTTPBasicAuthHandler,
-                                                   urlopen)
+                                                   HTTPBasicAuthHandler)
 from django.utils.translation import ugettext_lazy as _
 from djblets.registries.errors import ItemLookupError
 from djblets.registries.registry import (ALREADY_REGISTERED, LOAD_ENTRY_POINT,
                                          NOT_REGISTERED)
 
 import reviewboard.hostingsvcs.urls as hostingsvcs_urls
+from reviewboard.hostingsvcs.transport import get_http_transport
 from reviewboard.registries.registry import EntryPointRegistry
 from reviewboard.signals import initializing
 
@@ -294,10 +297,42 @@ class HostingServiceClient(object):
         if username is not None and password is not None:
             request.add_basic_auth(username, password)
 
-        response = urlopen(request)
+        try:
+            response = self.get_http_transport().open(request)
+        except HTTPError as e:
+            self.process_http_response_headers(e.info())
+            raise
+
+        self.process_http_response_headers(response.headers)
 
         return response.read(), response.headers
 
+    def get_http_transport(self):
+        """Return the transport used to send HTTP requests.
+
+        By default, this is the shared transport, which keeps connections
+        open for reuse and makes GET requests conditional. Subclasses can
+        override this to use a different transport.
+
+        Returns:
+            reviewboard.hostingsvcs.transport.HTTPTransport:
+            The transport to use.
+        """
+        return get_http_transport()
+
+    def process_http_response_headers(self, headers):
+        """Process the headers of a response from the hosting service.
+
+        This is called for every response, including error responses and
+        responses served from the conditional request cache. Subclasses can
+        override this to check things like rate limits.
+
+        Args:
+            headers (mimetools.Message):
+                The headers of the response.
+        """
+        pass
+
     #
     # JSON utility methods
     #
@@ -544,6 +579,9 @@ class HostingService(object):
     repository_fields = {}
     bug_tracker_field = None
 
+    #: The maximum number of files to fetch at once in :py:meth:`get_files`.
+    max_concurrent_file_fetches = 4
+
     def __init__(self, account):
         """Initialize the hosting service.
 
@@ -755,6 +793,75 @@ class HostingService(object):
 
         return repository.get_scmtool().get_file(path, revision, **kwargs)
 
+    def get_files(self, repository, files, **kwargs):
+        """Return the contents of several files.
+
+        If the hosting service fetches files through the repository's
+        SCMTool, this will use :py:meth:`SCMTool.get_files()
+        <reviewboard.scmtools.core.SCMTool.get_files>`. Otherwise, the files
+        are fetched through :py:meth:`get_file` in a pool of threads, up to
+        :py:attr:`max_concurrent_file_fetches` at a time.
+
+        Args:
+            repository (reviewboard.scmtools.models.Repository):
+                The repository to retrieve the files from.
+
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples.
+
+            **kwargs (dict):
+                Additional keyword arguments to pass to the SCMTool.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the file contents (:py:class:`bytes`), or the exception raised
+            when fetching it.
+
+        Raises:
+            NotImplementedError:
+                If this hosting service does not support repositories.
+        """
+        if not self.supports_repositories:
+            raise NotImplementedError
+
+        if (six.get_unbound_function(type(self).get_file) is
+            six.get_unbound_function(HostingService.get_file)):
+            return repository.get_scmtool().get_files(files, **kwargs)
+
+        def _get_file(file_info):
+            path, revision, base_commit_id = file_info
+
+            try:
+                return self.get_file(repository, path, revision,
+                                     base_commit_id=base_commit_id)
+            except Exception as e:
+                return e
+
+        def _get_file_in_thread(file_info):
+            try:
+                return _get_file(file_info)
+            finally:
+                # Close the database connection opened for this thread, if
+                # any.
+                connection.close()
+
+        num_threads = min(self.max_concurrent_file_fetches, len(files))
+
+        if num_threads <= 1:
+            return [
+                _get_file(file_info)
+                for file_info in files
+            ]
+
+        thread_pool = ThreadPool(num_threads)
+
+        try:
+            return thread_pool.map(_get_file_in_thread, files)
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+
     def get_file_exists(self, repository, path, revision, *args, **kwargs):
         """Return whether or not the given path exists in the repository.
 
@@ -4,11 +4,13 @@ from __future__ import unicode_literals
 
 import base64
 
-from django.utils.six.moves.urllib.request import (HTTPBasicAuthHandler,
-                                                   urlopen)
+from django.utils import six
+from django.utils.six.moves.urllib.error import HTTPError
+from django.utils.six.moves.urllib.request import HTTPBasicAuthHandler
 from kgb import SpyAgency
 
 from reviewboard.hostingsvcs.service import HostingServiceClient, URLRequest
+from reviewboard.hostingsvcs.transport import URLOpenTransport
 from reviewboard.testing.testcase import TestCase
 
 
@@ -54,14 +56,65 @@ class HostingServiceClientTests(SpyAgency, TestCase):
 
     def test_http_request_basic_auth(self):
         """Testing HostingServiceClient.http_request with basic auth"""
-        self.spy_on(urlopen, call_fake=lambda *args, **kwargs: FakeResponse())
-
-        client = HostingServiceClient(None)
+        client = self._create_client(
+            lambda *args, **kwargs: FakeResponse())
         client.http_get('http://example.com',
                         username=b'username',
                         password=b'password')
 
-        self.assertTrue(urlopen.spy.called)
-        request = urlopen.spy.calls[0].args[0]
+        self.assertTrue(self.transport.open.spy.called)
+        request = self.transport.open.spy.calls[0].args[0]
 
         _test_basic_auth(self, request)
+
+    def test_http_request_process_headers(self):
+        """Testing HostingServiceClient.http_request processes response
+        headers
+        """
+        client = self._create_client(
+            lambda *args, **kwargs: FakeResponse())
+        self.spy_on(client.process_http_response_headers)
+        client.http_get('http://example.com')
+
+        self.assertTrue(client.process_http_response_headers.called_with({}))
+
+    def test_http_request_process_headers_with_error(self):
+        """Testing HostingServiceClient.http_request processes response
+        headers for HTTP errors
+        """
+        headers = {'X-RateLimit-Remaining': '0'}
+
+        def _open(*args, **kwargs):
+            raise HTTPError('http://example.com', 403, 'Forbidden', headers,
+                            six.BytesIO(b''))
+
+        client = self._create_client(_open)
+        self.spy_on(client.process_http_response_headers)
+
+        with self.assertRaises(HTTPError):
+            client.http_get('http://example.com')
+
+        self.assertTrue(
+            client.process_http_response_headers.called_with(headers))
+
+    def _create_client(self, open_func):
+        """Create a client with a fake HTTP transport.
+
+        Args:
+            open_func (callable):
+                The function to call in place of
+                :py:meth:`~reviewboard.hostingsvcs.transport.HTTPTransport.
+                open`.
+
+        Returns:
+            reviewboard.hostingsvcs.service.HostingServiceClient:
+            The new client.
+        """
+        self.transport = URLOpenTransport()
+        self.spy_on(self.transport.open, call_fake=open_func)
+
+        client = HostingServiceClient(None)
+        self.spy_on(client.get_http_transport,
+                    call_fake=lambda *args, **kwargs: self.transport)
+
+        return client
@@ -745,6 +745,54 @@ class GitHubTests(ServiceTests):
         self.assertEqual(repo.path, 'myrepo_path2')
         self.assertEqual(repo.mirror_path, 'myrepo_mirror2')
 
+    def test_get_remote_repositories_iter_items(self):
+        """Testing GitHub.get_remote_repositories with iterating through
+        all pages
+        """
+        base_url = 'https://api.github.com/user/repos?access_token=123'
+
+        def _http_get(service, url, *args, **kwargs):
+            if url == base_url:
+                page = 1
+            else:
+                page = int(url[len(base_url) + len('&page='):])
+
+            links = ['<%s&page=3>; rel="last"' % base_url]
+
+            if page < 3:
+                links.append('<%s&page=%s>; rel="next"' % (base_url, page + 1))
+
+            return json.dumps([{
+                'id': page,
+                'owner': {
+                    'login': 'myuser',
+                },
+                'name': 'myrepo%s' % page,
+                'clone_url': 'myrepo_path%s' % page,
+                'mirror_url': 'myrepo_mirror%s' % page,
+                'private': 'true',
+            }]), {
+                'Link': ', '.join(links),
+            }
+
+        account = self._get_hosting_account()
+        account.data['authorization'] = {
+            'token': '123',
+        }
+
+        service = account.service
+        self.spy_on(service.client.http_get, call_fake=_http_get)
+
+        paginator = service.get_remote_repositories('myuser')
+
+        self.assertEqual(
+            paginator.paginator.get_remaining_page_urls(),
+            ['%s&page=2' % base_url, '%s&page=3' % base_url])
+        self.assertEqual(
+            [repo.id for repo in paginator.iter_items()],
+            ['myuser/myrepo1', 'myuser/myrepo2', 'myuser/myrepo3'])
+        self.assertEqual(len(service.client.http_get.calls), 3)
+
     def test_get_remote_repositories_with_other_user(self, **kwargs):
         """Testing GitHub.get_remote_repositories with requesting
         user's repositories
@@ -112,6 +112,56 @@ class GitLabTests(ServiceTests):
             expected_error='A group with this name was not found, or your '
                            'user may not have access to it.')
 
+    def test_check_repository_personal_with_multiple_pages(self):
+        """Testing GitLab check_repository with personal repository on a
+        later page of results"""
+        projects_url = 'https://example.com/api/v3/projects'
+        page_urls = [
+            '%s?per_page=100' % projects_url,
+            '%s?page=2&per_page=100' % projects_url,
+            '%s?page=3&per_page=100' % projects_url,
+        ]
+        repo_names = ['otherrepo1', 'otherrepo2', 'myrepo']
+
+        def _http_get(service, url, *args, **kwargs):
+            if url in page_urls:
+                i = page_urls.index(url)
+                links = ['<%s>; rel="last"' % page_urls[-1]]
+
+                if i + 1 < len(page_urls):
+                    links.insert(0, '<%s>; rel="next"' % page_urls[i + 1])
+
+                payload = [
+                    {
+                        'id': i + 1,
+                        'path': repo_names[i],
+                        'namespace': {
+                            'path': 'myuser',
+                        },
+                    },
+                ]
+
+                return json.dumps(payload), {
+                    'link': ', '.join(links),
+                }
+            elif url == '%s/3' % projects_url:
+                # We don't care about the contents. Just that it exists.
+                return json.dumps({}), {}
+            else:
+                self.fail('Unexpected URL %s' % url)
+
+        account = self._get_hosting_account(use_url=True)
+        service = account.service
+        self.spy_on(service.client.http_get, call_fake=_http_get)
+        account.data['private_token'] = encrypt_password('abc123')
+
+        service.check_repository(plan='personal',
+                                 gitlab_personal_repo_name='myrepo')
+
+        self.assertEqual(
+            sorted(call.args[0] for call in service.client.http_get.calls),
+            sorted(page_urls + ['%s/3' % projects_url]))
+
     def test_authorization(self):
         """Testing that GitLab account authorization sends expected data"""
         http_post_data = {}
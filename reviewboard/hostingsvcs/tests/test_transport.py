@@ -0,0 +1,173 @@
+"""Test cases for the hosting service HTTP transports."""
+
+from __future__ import unicode_literals
+
+import threading
+
+from django.core.cache import cache
+from django.utils.six.moves import BaseHTTPServer
+from django.utils.six.moves.urllib.error import HTTPError
+from django.utils.six.moves.urllib.request import Request
+
+from reviewboard.hostingsvcs.transport import (PooledHTTPTransport,
+                                               get_http_transport,
+                                               set_http_transport)
+from reviewboard.testing.testcase import TestCase
+
+
+class PooledHTTPTransportTests(TestCase):
+    """Tests for PooledHTTPTransport."""
+
+    def setUp(self):
+        super(PooledHTTPTransportTests, self).setUp()
+
+        cache.clear()
+
+        requests = []
+        self.requests = requests
+
+        class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                requests.append((self.client_address, self.path,
+                                 self.headers.get('If-None-Match')))
+
+                if self.path == '/redirect/':
+                    self._send(302, b'', [('Location', '/file/')])
+                elif self.path == '/missing/':
+                    self._send(404, b'Not found')
+                elif self.headers.get('If-None-Match') == '"abc123"':
+                    self._send(304, None, [
+                        ('ETag', '"abc123"'),
+                        ('X-RateLimit-Remaining', '4999'),
+                    ])
+                else:
+                    self._send(200, b'contents', [
+                        ('ETag', '"abc123"'),
+                        ('X-RateLimit-Remaining', '5000'),
+                    ])
+
+            def _send(self, code, body, headers=[]):
+                self.send_response(code)
+
+                for name, value in headers:
+                    self.send_header(name, value)
+
+                if body is not None:
+                    self.send_header('Content-Length', '%d' % len(body))
+
+                self.end_headers()
+
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, *args, **kwargs):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                RequestHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        self.url = 'http://127.0.0.1:%s' % self.server.server_port
+
+        self.transport = PooledHTTPTransport()
+        self.transport._proxies = {}
+
+    def tearDown(self):
+        super(PooledHTTPTransportTests, self).tearDown()
+
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_open_reuses_connections(self):
+        """Testing PooledHTTPTransport.open reuses connections to a host"""
+        self.transport.use_conditional_requests = False
+
+        response1 = self.transport.open(Request(self.url + '/file/'), 5)
+        response2 = self.transport.open(Request(self.url + '/file/'), 5)
+
+        self.assertEqual(response1.read(), b'contents')
+        self.assertEqual(response2.read(), b'contents')
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[0][0], self.requests[1][0])
+        self.assertIsNone(self.requests[1][2])
+
+    def test_open_with_not_modified(self):
+        """Testing PooledHTTPTransport.open with a conditional request and
+        an unmodified response
+        """
+        response1 = self.transport.open(Request(self.url + '/file/'), 5)
+        self.assertEqual(response1.read(), b'contents')
+
+        response2 = self.transport.open(Request(self.url + '/file/'), 5)
+        self.assertEqual(response2.getcode(), 200)
+        self.assertEqual(response2.read(), b'contents')
+        self.assertEqual(response2.info()['X-RateLimit-Remaining'], '4999')
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertIsNone(self.requests[0][2])
+        self.assertEqual(self.requests[1][2], '"abc123"')
+
+    def test_open_with_different_headers(self):
+        """Testing PooledHTTPTransport.open doesn't use stored responses for
+        requests with different headers
+        """
+        self.transport.open(Request(self.url + '/file/'), 5).read()
+        self.transport.open(
+            Request(self.url + '/file/', headers={'Authorization': 'x'}),
+            5).read()
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertIsNone(self.requests[1][2])
+
+    def test_open_follows_redirects(self):
+        """Testing PooledHTTPTransport.open follows redirects"""
+        self.transport.use_conditional_requests = False
+
+        response = self.transport.open(Request(self.url + '/redirect/'), 5)
+
+        self.assertEqual(response.read(), b'contents')
+        self.assertEqual(response.geturl(), self.url + '/file/')
+        self.assertEqual([request[1] for request in self.requests],
+                         ['/redirect/', '/file/'])
+
+    def test_open_with_http_error(self):
+        """Testing PooledHTTPTransport.open with an HTTP error"""
+        with self.assertRaises(HTTPError) as cm:
+            self.transport.open(Request(self.url + '/missing/'), 5)
+
+        self.assertEqual(cm.exception.code, 404)
+        self.assertEqual(cm.exception.read(), b'Not found')
+
+        # The connection is still usable after an error.
+        self.transport.open(Request(self.url + '/file/'), 5)
+        self.assertEqual(self.requests[0][0], self.requests[1][0])
+
+
+class HTTPTransportRegistryTests(TestCase):
+    """Tests for get_http_transport and set_http_transport."""
+
+    def tearDown(self):
+        super(HTTPTransportRegistryTests, self).tearDown()
+
+        set_http_transport(None)
+
+    def test_set_http_transport(self):
+        """Testing set_http_transport"""
+        transport = PooledHTTPTransport()
+        set_http_transport(transport)
+
+        self.assertIs(get_http_transport(), transport)
+
+    def test_get_http_transport_default(self):
+        """Testing get_http_transport with the default transport"""
+        set_http_transport(None)
+
+        transport = get_http_transport()
+        self.assertIsInstance(transport, PooledHTTPTransport)
+        self.assertIs(get_http_transport(), transport)
@@ -0,0 +1,434 @@
+"""HTTP transports for talking to hosting services and repositories.
+
+Requests made by :py:class:`~reviewboard.hostingsvcs.service.
+HostingServiceClient` and :py:meth:`SCMClient.get_file_http()
+<reviewboard.scmtools.core.SCMClient.get_file_http>` go through an
+:py:class:`HTTPTransport`. The default transport,
+:py:class:`PooledHTTPTransport`, keeps connections open for reuse for each
+host (see :py:mod:`reviewboard.http_pool`), rather than setting up a new TCP
+connection and TLS session for every blob, commit, or API lookup.
+
+Transports also make GET requests conditional. The ``ETag`` and
+``Last-Modified`` validators of responses are stored in the cache along with
+the response. Later requests for the same URL send them back, and if the
+server responds with ``304 Not Modified``, the stored response is used. Most
+hosting services don't count these against API rate limits.
+
+A different transport can be used by calling :py:func:`set_http_transport`.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import socket
+import threading
+
+from django.core.cache import cache
+from django.utils import six
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.error import HTTPError, URLError
+from django.utils.six.moves.urllib.parse import urljoin, urlsplit
+from django.utils.six.moves.urllib.request import (getproxies, proxy_bypass,
+                                                   urlopen)
+from django.utils.six.moves.urllib.response import addinfourl
+from djblets.cache.backend import make_cache_key
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard import get_package_version
+from reviewboard.http_pool import (HTTPConnectionPool,
+                                   MAX_IDLE_CONNECTIONS_PER_HOST)
+
+#: The maximum number of redirects followed for a request.
+MAX_REDIRECTS = 10
+
+#: The maximum size of a response body stored for conditional requests.
+#:
+#: Larger responses are always fetched in full. This keeps entries within
+#: the item size limits of memcached.
+MAX_CACHED_RESPONSE_SIZE = 512 * 1024
+
+#: The number of seconds to keep responses for conditional requests.
+CACHED_RESPONSE_EXPIRATION = 7 * 24 * 60 * 60
+
+#: The HTTP status codes for redirects that are followed.
+REDIRECT_CODES = (301, 302, 303, 307)
+
+
+class HTTPTransport(object):
+    """Base class for sending HTTP requests.
+
+    Subclasses must implement :py:meth:`send`. This class adds support for
+    conditional GET requests on top of that.
+
+    Attributes:
+        use_conditional_requests (bool):
+            Whether to make GET requests conditional on the validators of
+            previously-stored responses.
+    """
+
+    def __init__(self, use_conditional_requests=True):
+        """Initialize the transport.
+
+        Args:
+            use_conditional_requests (bool, optional):
+                Whether to make GET requests conditional on the validators
+                of previously-stored responses.
+        """
+        self.use_conditional_requests = use_conditional_requests
+
+    def open(self, request, timeout=None):
+        """Send a request and return the response.
+
+        Args:
+            request (urllib2.Request):
+                The request to send.
+
+            timeout (float, optional):
+                The number of seconds to wait for the server when connecting
+                or reading the response. If not provided, the
+                ``hosting_service_http_timeout`` setting is used.
+
+        Returns:
+            urllib.addinfourl:
+            The response, as returned by :py:func:`urllib2.urlopen`.
+
+        Raises:
+            urllib2.HTTPError:
+                The server responded with an error.
+
+            urllib2.URLError:
+                There was an error communicating with the server.
+        """
+        if timeout is None:
+            siteconfig = SiteConfiguration.objects.get_current()
+            timeout = siteconfig.get('hosting_service_http_timeout')
+
+        if (not self.use_conditional_requests or
+            request.get_method() != 'GET'):
+            return self.send(request, timeout)
+
+        cache_key = self._make_cache_key(request)
+        cached = cache.get(cache_key)
+
+        if cached is not None:
+            etag, last_modified, header_lines, body = cached
+
+            if etag:
+                request.add_unredirected_header('If-None-Match', etag)
+
+            if last_modified:
+                request.add_unredirected_header('If-Modified-Since',
+                                                last_modified)
+
+        try:
+            response = self.send(request, timeout)
+        except HTTPError as e:
+            if e.code != 304 or cached is None:
+                raise
+
+            # Use the stored response, with any headers (such as rate limit
+            # information) updated from the new response.
+            headers = http_client.HTTPMessage(
+                six.BytesIO(b''.join(header_lines)))
+
+            for name, value in e.info().items():
+                headers[name] = value
+
+            return addinfourl(six.BytesIO(body), headers,
+                              request.get_full_url(), 200)
+
+        headers = response.info()
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+
+        if etag or last_modified:
+            body = response.read()
+
+            if len(body) <= MAX_CACHED_RESPONSE_SIZE:
+                cache.set(cache_key,
+                          (etag, last_modified, list(headers.headers), body),
+                          CACHED_RESPONSE_EXPIRATION)
+
+            response = addinfourl(six.BytesIO(body), headers,
+                                  response.geturl(), response.getcode())
+
+        return response
+
+    def send(self, request, timeout):
+        """Send a request and return the response.
+
+        Args:
+            request (urllib2.Request):
+                The request to send.
+
+            timeout (float):
+                The number of seconds to wait for the server when connecting
+                or reading the response.
+
+        Returns:
+            urllib.addinfourl:
+            The response.
+
+        Raises:
+            urllib2.HTTPError:
+                The server responded with an error, or with
+                ``304 Not Modified``.
+
+            urllib2.URLError:
+                There was an error communicating with the server.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Close any connections held by the transport."""
+        pass
+
+    def _make_cache_key(self, request):
+        """Return the key for storing a response to a request.
+
+        The key covers the URL and all request headers, so that responses
+        for different credentials or content types are stored separately.
+
+        Args:
+            request (urllib2.Request):
+                The request.
+
+        Returns:
+            unicode:
+            The cache key.
+        """
+        key_data = [request.get_full_url()]
+        key_data += [
+            '%s: %s' % (name.lower(), value)
+            for name, value in sorted(request.header_items())
+            if name.lower() not in ('if-none-match', 'if-modified-since')
+        ]
+        digest = hashlib.sha256(
+            '\n'.join(key_data).encode('utf-8')).hexdigest()
+
+        return make_cache_key('hostingsvcs-http:%s' % digest)
+
+
+class URLOpenTransport(HTTPTransport):
+    """A transport that sends each request with :py:func:`urllib2.urlopen`.
+
+    This opens a new connection for every request.
+    """
+
+    def send(self, request, timeout):
+        """Send a request and return the response.
+
+        Args:
+            request (urllib2.Request):
+                The request to send.
+
+            timeout (float):
+                The number of seconds to wait for the server when connecting
+                or reading the response.
+
+        Returns:
+            urllib.addinfourl:
+            The response.
+
+        Raises:
+            urllib2.HTTPError:
+                The server responded with an error.
+
+            urllib2.URLError:
+                There was an error communicating with the server.
+        """
+        return urlopen(request, timeout=timeout)
+
+
+class PooledHTTPTransport(HTTPTransport):
+    """A transport that keeps connections open for reuse for each host.
+
+    Connections are managed by a
+    :py:class:`~reviewboard.http_pool.HTTPConnectionPool`. This is safe to use
+    from multiple threads.
+
+    Requests for URLs that need to go through a proxy, or that aren't HTTP
+    or HTTPS URLs, are sent with :py:func:`urllib2.urlopen` instead.
+    """
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_CONNECTIONS_PER_HOST,
+                 **kwargs):
+        """Initialize the transport.
+
+        Args:
+            max_idle_per_host (int, optional):
+                The maximum number of idle connections to keep open for each
+                host.
+
+            **kwargs (dict):
+                Keyword arguments to pass to the parent class.
+        """
+        super(PooledHTTPTransport, self).__init__(**kwargs)
+
+        self.connection_pool = HTTPConnectionPool(max_idle_per_host)
+        self.user_agent = 'ReviewBoard/%s' % get_package_version()
+
+        self._proxies = getproxies()
+
+    def send(self, request, timeout):
+        """Send a request and return the response.
+
+        Redirects are followed the same way as :py:func:`urllib2.urlopen`.
+
+        Args:
+            request (urllib2.Request):
+                The request to send.
+
+            timeout (float):
+                The number of seconds to wait for the server when connecting
+                or reading the response.
+
+        Returns:
+            urllib.addinfourl:
+            The response.
+
+        Raises:
+            urllib2.HTTPError:
+                The server responded with an error.
+
+            urllib2.URLError:
+                There was an error communicating with the server.
+        """
+        url = request.get_full_url()
+        url_parts = urlsplit(url)
+
+        if (url_parts.scheme not in ('http', 'https') or
+            (url_parts.scheme in self._proxies and
+             not proxy_bypass(url_parts.hostname))):
+            return urlopen(request, timeout=timeout)
+
+        method = request.get_method()
+        body = request.get_data()
+        headers = dict(request.header_items())
+        unredirected_headers = set(request.unredirected_hdrs)
+
+        if not request.has_header('User-agent'):
+            headers['User-agent'] = self.user_agent
+
+        if body is not None and not request.has_header('Content-type'):
+            headers['Content-type'] = 'application/x-www-form-urlencoded'
+
+        for i in range(MAX_REDIRECTS + 1):
+            response, data = self._request(url, method, body, headers,
+                                           timeout)
+            location = response.getheader('Location')
+
+            if (response.status not in REDIRECT_CODES or
+                not location or
+                i == MAX_REDIRECTS or
+                not (method in ('GET', 'HEAD') or
+                     (method == 'POST' and response.status != 307))):
+                break
+
+            # Follow the redirect, as urllib2 would. POST requests become
+            # GET requests without a body.
+            url = urljoin(url, location)
+            method = 'GET' if method == 'POST' else method
+            body = None
+            headers = dict(
+                (name, value)
+                for name, value in six.iteritems(headers)
+                if (name not in unredirected_headers and
+                    name.lower() not in ('content-length', 'content-type'))
+            )
+
+            if urlsplit(url).scheme not in ('http', 'https'):
+                raise HTTPError(url, response.status, response.reason,
+                                response.msg, six.BytesIO(data))
+
+        if 200 <= response.status < 300:
+            return addinfourl(six.BytesIO(data), response.msg, url,
+                              response.status)
+
+        raise HTTPError(url, response.status, response.reason, response.msg,
+                        six.BytesIO(data))
+
+    def close(self):
+        """Close all idle connections."""
+        self.connection_pool.close()
+
+    def _request(self, url, method, body, headers, timeout):
+        """Send a single request over a pooled connection.
+
+        Args:
+            url (unicode):
+                The URL to send the request to.
+
+            method (unicode):
+                The HTTP method.
+
+            body (bytes):
+                The body of the request, if any.
+
+            headers (dict):
+                The headers for the request.
+
+            timeout (float):
+                The number of seconds to wait for the server when connecting
+                or reading the response.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the
+            :py:class:`~django.utils.six.moves.http_client.HTTPResponse` and
+            the body of the response.
+
+        Raises:
+            urllib2.URLError:
+                There was an error communicating with the server.
+        """
+        try:
+            return self.connection_pool.request(method, url, body, headers,
+                                                timeout)
+        except (IOError, socket.error, http_client.HTTPException) as e:
+            raise URLError(e)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_http_transport():
+    """Return the transport used for hosting service requests.
+
+    Returns:
+        HTTPTransport:
+        The transport.
+    """
+    global _transport
+
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = PooledHTTPTransport()
+
+    return _transport
+
+
+def set_http_transport(transport):
+    """Set the transport used for hosting service requests.
+
+    The previous transport's connections will be closed.
+
+    Args:
+        transport (HTTPTransport):
+            The new transport, or ``None`` to go back to the default.
+    """
+    global _transport
+
+    with _transport_lock:
+        old_transport = _transport
+        _transport = transport
+
+    if old_transport is not None and old_transport is not transport:
+        try:
+            old_transport.close()
+        except Exception as e:
+            logging.exception('Error closing HTTP transport %r: %s',
+                              old_transport, e)
@@ -1,5 +1,9 @@
 from __future__ import unicode_literals
 
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
 from django.utils import six
 from django.utils.six.moves.urllib.parse import (parse_qs, urlencode,
                                                  urlsplit, urlunsplit)
@@ -63,6 +67,37 @@ class BasePaginator(object):
         """
         raise NotImplementedError
 
+    def iter_pages(self):
+        """Iterate through the data of each page.
+
+        This starts with the current page and fetches each following page
+        in turn, leaving the paginator on the last page.
+
+        Subclasses can override this to fetch pages more efficiently.
+
+        Yields:
+            object:
+            The data for each page.
+        """
+        yield self.page_data
+
+        while self.has_next:
+            yield self.next()
+
+    def iter_items(self):
+        """Iterate through the items on all pages.
+
+        This starts with the current page. Items are yielded as soon as
+        their page has been fetched.
+
+        Yields:
+            object:
+            Each item.
+        """
+        for page_data in self.iter_pages():
+            for item in page_data or []:
+                yield item
+
 
 class APIPaginator(BasePaginator):
     """Handles pagination for API requests to a hosting service.
@@ -88,12 +123,27 @@ class APIPaginator(BasePaginator):
     #: of results per page.
     per_page_query_param = None
 
+    #: Whether ``start_query_param`` specifies a page number.
+    #:
+    #: If set, and the number of pages is known from a ``last_url`` or a
+    #: ``total_count``, :py:meth:`iter_pages` will fetch upcoming pages
+    #: concurrently.
+    start_is_page_number = False
+
+    #: The page number of the first page, when not specified in the URL.
+    first_page_number = 1
+
+    #: The maximum number of pages fetched concurrently by
+    #: :py:meth:`iter_pages`.
+    max_prefetch_pages = 4
+
     def __init__(self, client, url, query_params={}, *args, **kwargs):
         super(APIPaginator, self).__init__(*args, **kwargs)
 
         self.client = client
         self.prev_url = None
         self.next_url = None
+        self.last_url = None
         self.page_headers = None
 
         # Augment the URL with the provided query parameters.
@@ -156,15 +206,121 @@ class APIPaginator(BasePaginator):
                         on each page.
         * prev_url    - The optional URL to the previous page.
         * next_url    - The optional URL to the next page.
+        * last_url    - The optional URL to the last page.
         """
         raise NotImplementedError
 
+    def get_remaining_page_urls(self):
+        """Return the URLs of all pages after the current page.
+
+        By default, this works out the URLs when ``start_query_param`` is a
+        page number (see :py:attr:`start_is_page_number`) and the number of
+        pages is known from ``last_url``, or from ``total_count`` and
+        ``per_page``. Subclasses can override this for other schemes.
+
+        Returns:
+            list of unicode:
+            The URLs of the remaining pages, or ``None`` if they can't be
+            determined ahead of time.
+        """
+        if not self.start_is_page_number or not self.start_query_param:
+            return None
+
+        if not self.has_next:
+            return []
+
+        page_num = self._get_page_number(self.url)
+
+        if self.last_url:
+            last_page_num = self._get_page_number(self.last_url)
+        elif self.total_count is not None and self.per_page:
+            num_pages = (self.total_count + self.per_page - 1) // self.per_page
+            last_page_num = self.first_page_number + num_pages - 1
+        else:
+            last_page_num = None
+
+        if page_num is None or last_page_num is None:
+            return None
+
+        return [
+            self._add_query_params(self.url, {
+                self.start_query_param: i,
+            })
+            for i in range(page_num + 1, last_page_num + 1)
+        ]
+
+    def iter_pages(self):
+        """Iterate through the data of each page.
+
+        This starts with the current page. If the URLs of the remaining
+        pages can be determined (see :py:meth:`get_remaining_page_urls`),
+        up to :py:attr:`max_prefetch_pages` pages will be fetched
+        concurrently, and yielded in order as they arrive. Otherwise, pages
+        are fetched one at a time by following ``next_url``.
+
+        The paginator is left on the last page fetched.
+
+        Yields:
+            object:
+            The data for each page.
+        """
+        page_urls = self.get_remaining_page_urls()
+
+        if (not page_urls or len(page_urls) < 2 or
+            self.max_prefetch_pages < 2):
+            for page_data in super(APIPaginator, self).iter_pages():
+                yield page_data
+
+            return
+
+        yield self.page_data
+
+        def _fetch_url_in_thread(url):
+            try:
+                return self.fetch_url(url)
+            finally:
+                # Close the database connection opened for this thread, if
+                # any.
+                connection.close()
+
+        page_urls = deque(page_urls)
+        pending = deque()
+        thread_pool = ThreadPool(min(self.max_prefetch_pages,
+                                     len(page_urls)))
+
+        try:
+            while page_urls or pending:
+                while page_urls and len(pending) < self.max_prefetch_pages:
+                    url = page_urls.popleft()
+                    pending.append((url, thread_pool.apply_async(
+                        _fetch_url_in_thread, (url,))))
+
+                url, result = pending.popleft()
+                self.url = url
+
+                yield self._load_page_info(result.get())
+        finally:
+            thread_pool.terminate()
+            thread_pool.join()
+
     def _fetch_page(self):
         """Fetches a page and extracts the information from it."""
-        page_info = self.fetch_url(self.url)
+        return self._load_page_info(self.fetch_url(self.url))
+
+    def _load_page_info(self, page_info):
+        """Extracts the information from a fetched page.
 
+        Args:
+            page_info (dict):
+                The page information returned by :py:meth:`fetch_url`.
+
+        Returns:
+            object:
+            The data for the page.
+        """
         self.prev_url = page_info.get('prev_url')
         self.next_url = page_info.get('next_url')
+        self.last_url = page_info.get('last_url')
         self.per_page = page_info.get('per_page', self.per_page)
         self.page_data = page_info.get('data')
         self.page_headers = page_info.get('headers')
@@ -172,6 +328,27 @@ class APIPaginator(BasePaginator):
 
         return self.page_data
 
+    def _get_page_number(self, url):
+        """Return the page number specified in a URL.
+
+        Args:
+            url (unicode):
+                The URL of a page.
+
+        Returns:
+            int:
+            The page number, or ``None`` if it could not be determined.
+        """
+        values = parse_qs(urlsplit(url)[3]).get(self.start_query_param)
+
+        if not values:
+            return self.first_page_number
+
+        try:
+            return int(values[0])
+        except ValueError:
+            return None
+
     def _add_query_params(self, url, new_query_params):
         """Adds query parameters onto the given URL."""
         scheme, netloc, path, query_string, fragment = urlsplit(url)
@@ -244,6 +421,19 @@ class ProxyPaginator(BasePaginator):
         """
         return self._process_page(self.paginator.next())
 
+    def iter_pages(self):
+        """Iterate through the normalized data of each page.
+
+        This uses the proxied paginator's :py:meth:`iter_pages`, so pages
+        may be fetched concurrently.
+
+        Yields:
+            object:
+            The normalized data for each page.
+        """
+        for page_data in self.paginator.iter_pages():
+            yield self._process_page(page_data)
+
     def normalize_page_data(self, data):
         """Normalizes a page of data.
 
@@ -19,6 +19,33 @@ class DummyAPIPaginator(APIPaginator):
         }
 
 
+class PageNumberAPIPaginator(APIPaginator):
+    start_query_param = 'page'
+    start_is_page_number = True
+
+    def __init__(self, *args, **kwargs):
+        self.fetched_pages = []
+
+        super(PageNumberAPIPaginator, self).__init__(*args, **kwargs)
+
+    def fetch_url(self, url):
+        page = int(parse_qs(urlsplit(url)[3]).get('page', ['1'])[0])
+        self.fetched_pages.append(page)
+
+        if page < 4:
+            next_url = 'http://example.com/?page=%s' % (page + 1)
+        else:
+            next_url = None
+
+        return {
+            'data': [page * 10 + 1, page * 10 + 2],
+            'headers': {},
+            'per_page': 2,
+            'total_count': 8,
+            'next_url': next_url,
+        }
+
+
 class APIPaginatorTests(TestCase):
     """Tests for APIPaginator."""
     def test_construct_initial_load(self):
@@ -120,6 +147,62 @@ class APIPaginatorTests(TestCase):
         self.assertRaises(InvalidPageError, paginator.next)
         self.assertEqual(paginator.url, url)
 
+    def test_iter_items(self):
+        """Testing APIPaginator.iter_items without known page URLs"""
+        class NextURLAPIPaginator(PageNumberAPIPaginator):
+            start_is_page_number = False
+
+        paginator = NextURLAPIPaginator(None, 'http://example.com/')
+
+        self.assertEqual(list(paginator.iter_items()),
+                         [11, 12, 21, 22, 31, 32, 41, 42])
+        self.assertEqual(paginator.fetched_pages, [1, 2, 3, 4])
+        self.assertEqual(paginator.page_data, [41, 42])
+
+    def test_iter_items_with_total_count(self):
+        """Testing APIPaginator.iter_items with total_count fetches pages
+        concurrently
+        """
+        paginator = PageNumberAPIPaginator(None, 'http://example.com/')
+        paginator.max_prefetch_pages = 2
+
+        self.assertEqual(paginator.get_remaining_page_urls(),
+                         ['http://example.com/?page=2',
+                          'http://example.com/?page=3',
+                          'http://example.com/?page=4'])
+        self.assertEqual(list(paginator.iter_items()),
+                         [11, 12, 21, 22, 31, 32, 41, 42])
+        self.assertEqual(sorted(paginator.fetched_pages), [1, 2, 3, 4])
+        self.assertEqual(paginator.url, 'http://example.com/?page=4')
+        self.assertEqual(paginator.page_data, [41, 42])
+        self.assertFalse(paginator.has_next)
+
+    def test_iter_items_with_last_url(self):
+        """Testing APIPaginator.iter_items with last_url fetches pages
+        concurrently
+        """
+        class LastURLAPIPaginator(PageNumberAPIPaginator):
+            def fetch_url(self, url):
+                page_info = \
+                    super(LastURLAPIPaginator, self).fetch_url(url)
+                page_info['total_count'] = None
+                page_info['last_url'] = 'http://example.com/?page=3'
+
+                return page_info
+
+        paginator = LastURLAPIPaginator(None, 'http://example.com/?page=2')
+
+        self.assertEqual(paginator.get_remaining_page_urls(),
+                         ['http://example.com/?page=3'])
+
+    def test_iter_items_with_start(self):
+        """Testing APIPaginator.iter_items starting after the first page"""
+        paginator = PageNumberAPIPaginator(None, 'http://example.com/',
+                                           start=3)
+
+        self.assertEqual(list(paginator.iter_items()), [31, 32, 41, 42])
+        self.assertEqual(sorted(paginator.fetched_pages), [3, 4])
+
 
 class ProxyPaginatorTests(TestCase):
     """Tests for ProxyPaginator."""
@@ -208,3 +291,13 @@ class ProxyPaginatorTests(TestCase):
         data = proxy.next()
 
         self.assertEqual(data, [3, 2, 1])
+
+    def test_iter_items(self):
+        """Testing ProxyPaginator.iter_items"""
+        proxy = ProxyPaginator(
+            PageNumberAPIPaginator(None, 'http://example.com/'),
+            normalize_page_data_func=lambda data: [-item for item in data])
+
+        self.assertEqual(list(proxy.iter_items()),
+                         [-11, -12, -21, -22, -31, -32, -41, -42])
+        self.assertEqual(proxy.page_data, [-41, -42])
@@ -0,0 +1,270 @@
+"""A pool of HTTP connections, kept open for reuse for each host.
+
+This is used for requests to hosting services (see
+:py:mod:`reviewboard.hostingsvcs.transport`) and for WebHooks (see
+:py:mod:`reviewboard.notifications.webhook_delivery`), so that a series of
+requests to the same host doesn't have to set up a new TCP connection and
+TLS session for each one.
+"""
+
+from __future__ import unicode_literals
+
+import select
+import threading
+
+from django.utils import six
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.parse import urlsplit
+
+
+#: The default maximum number of idle connections kept open for each host.
+MAX_IDLE_CONNECTIONS_PER_HOST = 4
+
+
+class HTTPConnectionPool(object):
+    """A pool of HTTP connections, kept open for reuse for each host.
+
+    This is safe to use from multiple threads. Each connection is only used
+    by one thread at a time.
+    """
+
+    #: HTTP methods that can be sent again if the response is lost.
+    #:
+    #: Requests with other methods may have been acted on by the server, and
+    #: are never sent a second time.
+    IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_CONNECTIONS_PER_HOST):
+        """Initialize the pool.
+
+        Args:
+            max_idle_per_host (int, optional):
+                The maximum number of idle connections to keep open for each
+                host.
+        """
+        self.max_idle_per_host = max_idle_per_host
+
+        self._lock = threading.Lock()
+        self._idle_connections = {}
+
+    def request(self, method, url, body, headers, timeout):
+        """Send a request over a pooled connection and read the response.
+
+        If an idle connection turns out to have been closed by the server,
+        the request is sent again over a new connection. This only happens
+        if the request couldn't be sent, or if it's a GET or HEAD request.
+
+        Args:
+            method (unicode):
+                The HTTP method.
+
+            url (unicode):
+                The URL to send the request to.
+
+            body (bytes):
+                The body of the request, if any.
+
+            headers (dict):
+                The headers for the request.
+
+            timeout (float):
+                The number of seconds to wait for the server when connecting
+                or reading the response.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the
+            :py:class:`~django.utils.six.moves.http_client.HTTPResponse` and
+            the body of the response.
+
+        Raises:
+            IOError:
+                The request could not be sent, or the response could not be
+                read.
+
+            ValueError:
+                The URL is not an HTTP or HTTPS URL.
+
+            django.utils.six.moves.http_client.HTTPException:
+                The response was invalid.
+        """
+        url_parts = urlsplit(url)
+
+        if url_parts.scheme not in ('http', 'https'):
+            raise ValueError('Unsupported URL scheme "%s"'
+                             % url_parts.scheme)
+
+        key = (url_parts.scheme, url_parts.hostname, url_parts.port)
+        can_resend = method in self.IDEMPOTENT_METHODS
+        method = method.encode('utf-8')
+        path = url_parts.path or '/'
+
+        if url_parts.query:
+            path = '%s?%s' % (path, url_parts.query)
+
+        path = path.encode('utf-8')
+
+        conn, is_reused = self._get_connection(key, timeout)
+        request_sent = False
+
+        try:
+            try:
+                conn.request(method, path, body, headers)
+                request_sent = True
+                response, data = self._read_response(conn)
+            except (IOError, http_client.HTTPException):
+                if not is_reused or (request_sent and not can_resend):
+                    raise
+
+                # The server may have closed the connection while it was
+                # idle. Try once more with a new one.
+                conn.close()
+                conn = self._make_connection(key, timeout)
+                conn.request(method, path, body, headers)
+                response, data = self._read_response(conn)
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release_connection(key, conn)
+
+        return response, data
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+
+        for connections in six.itervalues(idle_connections):
+            for conn in connections:
+                conn.close()
+
+    def _read_response(self, conn):
+        """Read the response to a request sent over a connection.
+
+        Args:
+            conn (django.utils.six.moves.http_client.HTTPConnection):
+                The connection.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the
+            :py:class:`~django.utils.six.moves.http_client.HTTPResponse` and
+            the body of the response.
+        """
+        response = conn.getresponse()
+
+        # The response must be read in full before the connection can be
+        # reused.
+        return response, response.read()
+
+    def _get_connection(self, key, timeout):
+        """Return a connection for a host.
+
+        Idle connections that the server has closed are discarded.
+
+        Args:
+            key (tuple):
+                The scheme, host, and port of the connection.
+
+            timeout (float):
+                The timeout for the connection.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the connection and whether it's an existing
+            connection being reused.
+        """
+        while True:
+            with self._lock:
+                connections = self._idle_connections.get(key)
+
+                if connections:
+                    conn = connections.pop()
+                else:
+                    conn = None
+
+            if conn is None:
+                return self._make_connection(key, timeout), False
+
+            if not self._is_connection_dropped(conn):
+                break
+
+            conn.close()
+
+        conn.timeout = timeout
+
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+        return conn, True
+
+    def _is_connection_dropped(self, conn):
+        """Return whether an idle connection has been closed by the server.
+
+        An idle connection has nothing to read. If its socket is readable,
+        the server has closed it (or sent something unexpected), and it
+        can't be used for another request.
+
+        Args:
+            conn (django.utils.six.moves.http_client.HTTPConnection):
+                The connection.
+
+        Returns:
+            bool:
+            Whether the connection can no longer be used.
+        """
+        if conn.sock is None:
+            return False
+
+        try:
+            return bool(select.select([conn.sock], [], [], 0)[0])
+        except (ValueError, select.error):
+            return False
+
+    def _make_connection(self, key, timeout):
+        """Create a new connection for a host.
+
+        Args:
+            key (tuple):
+                The scheme, host, and port of the connection.
+
+            timeout (float):
+                The timeout for the connection.
+
+        Returns:
+            django.utils.six.moves.http_client.HTTPConnection:
+            The new connection.
+        """
+        scheme, host, port = key
+
+        if scheme == 'https':
+            conn_cls = http_client.HTTPSConnection
+        else:
+            conn_cls = http_client.HTTPConnection
+
+        return conn_cls(host, port, timeout=timeout)
+
+    def _release_connection(self, key, conn):
+        """Return a connection to the pool after use.
+
+        Args:
+            key (tuple):
+                The scheme, host, and port of the connection.
+
+            conn (django.utils.six.moves.http_client.HTTPConnection):
+                The connection.
+        """
+        with self._lock:
+            connections = self._idle_connections.setdefault(key, [])
+
+            if len(connections) < self.max_idle_per_host:
+                connections.append(conn)
+                conn = None
+
+        if conn is not None:
+            conn.close()
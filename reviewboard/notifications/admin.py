@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
 
 from reviewboard.notifications.forms import WebHookTargetForm
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 
 
 class WebHookTargetAdmin(admin.ModelAdmin):
@@ -40,4 +40,17 @@ class WebHookTargetAdmin(admin.ModelAdmin):
     )
 
 
+class WebHookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'webhook_target', 'event', 'succeeded',
+                    'attempts', 'status_code', 'duration')
+    list_filter = ('succeeded', 'event')
+    raw_id_fields = ('webhook_target',)
+    readonly_fields = ('webhook_target', 'event', 'timestamp', 'succeeded',
+                       'attempts', 'status_code', 'error', 'duration')
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(WebHookTarget, WebHookTargetAdmin)
+admin.site.register(WebHookDelivery, WebHookDeliveryAdmin)
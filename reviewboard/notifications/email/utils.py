@@ -6,12 +6,14 @@ import logging
 
 from django.contrib.auth.models import User
 from django.db.models import Q
+from django.utils import six
 from djblets.mail.utils import (build_email_address,
                                 build_email_address_for_user)
 
 from reviewboard.accounts.models import ReviewRequestVisit
 from reviewboard.changedescs.models import ChangeDescription
 from reviewboard.reviews.models import Group
+from reviewboard.site.models import LocalSite
 
 
 def build_recipients(user, review_request, extra_recipients=None,
@@ -58,17 +60,7 @@ def build_recipients(user, review_request, extra_recipients=None,
     local_site = review_request.local_site_id
     submitter = review_request.submitter
 
-    target_people = review_request.target_people.filter(is_active=True).extra(
-        select={
-            'visibility': """
-                SELECT accounts_reviewrequestvisit.visibility
-                  FROM accounts_reviewrequestvisit
-                 WHERE accounts_reviewrequestvisit.review_request_id =
-                       reviews_reviewrequest_target_people.reviewrequest_id
-                   AND accounts_reviewrequestvisit.user_id =
-                       reviews_reviewrequest_target_people.user_id
-            """
-        })
+    target_people = review_request.target_people.filter(is_active=True)
 
     starred_users = User.objects.filter(
         is_active=True,
@@ -150,7 +142,7 @@ def build_recipients(user, review_request, extra_recipients=None,
             recipients.update(
                 recipient
                 for recipient in filtered_users.select_related('profile')
-                if recipient.should_send_email()
+                if _user_wants_email(recipient)
             )
 
     if limit_recipients_to is not None:
@@ -158,13 +150,13 @@ def build_recipients(user, review_request, extra_recipients=None,
     else:
         _filter_recipients(extra_recipients)
 
-        target_people = target_people.filter(is_active=True)
+        muted_user_ids = _get_muted_user_ids(review_request.pk)
 
         to_field.update(
             recipient
             for recipient in target_people.select_related('profile')
-            if (recipient.should_send_email() and
-                recipient.visibility != ReviewRequestVisit.MUTED)
+            if (_user_wants_email(recipient) and
+                recipient.pk not in muted_user_ids)
         )
 
         recipients.update(to_field)
@@ -191,57 +183,64 @@ def get_email_addresses_for_group(group, review_request_id=None):
             The review group to build the e-mail addresses for.
 
         review_request_id (int, optional):
-
+            The ID of the review request the e-mail is for. If provided,
+            members who have muted the review request will be excluded.
 
     Returns:
         list of unicode:
         A list of properly formatted e-mail addresses for all users in the
         review group.
     """
-    addresses = []
+    return get_email_addresses_for_groups([group], review_request_id)
 
-    if group.mailing_list:
-        if ',' not in group.mailing_list:
-            # The mailing list field has only one e-mail address in it,
-            # so we can just use that and the group's display name.
-            addresses = [build_email_address(full_name=group.display_name,
-                                             email=group.mailing_list)]
-        else:
-            # The mailing list field has multiple e-mail addresses in it.
-            # We don't know which one should have the group's display name
-            # attached to it, so just return their custom list as-is.
-            addresses = group.mailing_list.split(',')
-
-    if not (group.mailing_list and group.email_list_only):
-        users_q = Q(is_active=True)
-
-        local_site = group.local_site
-
-        if local_site:
-            users_q = users_q & (Q(local_site=local_site) |
-                                 Q(local_site_admins=local_site))
-
-        users = group.users.filter(users_q).select_related('profile')
-
-        if review_request_id:
-            users = users.extra(select={
-                'visibility': """
-                    SELECT accounts_reviewrequestvisit.visibility
-                      FROM accounts_reviewrequestvisit
-                     WHERE accounts_reviewrequestvisit.review_request_id =
-                           %s
-                       AND accounts_reviewrequestvisit.user_id =
-                           reviews_group_users.user_id
-                """ % review_request_id
-            })
-
-        addresses.extend([
-            build_email_address_for_user(u)
-            for u in users
-            if (u.should_send_email() and
-                (not review_request_id or
-                 u.visibility != ReviewRequestVisit.MUTED))
-        ])
+
+def get_email_addresses_for_groups(groups, review_request_id=None):
+    """Build a list of e-mail addresses for several groups.
+
+    This resolves the members of all the groups at once, using the same
+    number of queries no matter how many groups or members there are.
+
+    Args:
+        groups (list of reviewboard.reviews.models.Group):
+            The review groups to build the e-mail addresses for.
+
+        review_request_id (int, optional):
+            The ID of the review request the e-mail is for. If provided,
+            members who have muted the review request will be excluded.
+
+    Returns:
+        list of unicode:
+        A list of properly formatted e-mail addresses for all users in the
+        review groups. The mailing list addresses for each group come first,
+        followed by the addresses of the members.
+    """
+    addresses = []
+    member_groups = []
+
+    for group in groups:
+        if group.mailing_list:
+            if ',' not in group.mailing_list:
+                # The mailing list field has only one e-mail address in it,
+                # so we can just use that and the group's display name.
+                addresses.append(build_email_address(
+                    full_name=group.display_name,
+                    email=group.mailing_list))
+            else:
+                # The mailing list field has multiple e-mail addresses in it.
+                # We don't know which one should have the group's display
+                # name attached to it, so just return their custom list
+                # as-is.
+                addresses.extend(group.mailing_list.split(','))
+
+        if (group.pk is not None and
+            not (group.mailing_list and group.email_list_only)):
+            member_groups.append(group)
+
+    if member_groups:
+        addresses.extend(
+            build_email_address_for_user(user)
+            for user in _get_group_members(member_groups, review_request_id)
+        )
 
     return addresses
 
@@ -254,10 +253,16 @@ def recipients_to_addresses(recipients, review_request_id=None):
             A list of :py:class:`Users <django.contrib.auth.models.User>` and
             :py:class:`Groups <reviewboard.reviews.models.Group>`.
 
+        review_request_id (int, optional):
+            The ID of the review request the e-mail is for. If provided,
+            group members who have muted the review request will be
+            excluded.
+
     Returns:
         set: The e-mail addresses for all recipients.
     """
     addresses = set()
+    groups = []
 
     for recipient in recipients:
         assert isinstance(recipient, User) or isinstance(recipient, Group)
@@ -265,12 +270,128 @@ def recipients_to_addresses(recipients, review_request_id=None):
         if isinstance(recipient, User):
             addresses.add(build_email_address_for_user(recipient))
         else:
-            addresses.update(get_email_addresses_for_group(recipient,
-                                                           review_request_id))
+            groups.append(recipient)
+
+    if groups:
+        addresses.update(get_email_addresses_for_groups(groups,
+                                                        review_request_id))
 
     return addresses
 
 
+def _get_group_members(groups, review_request_id=None):
+    """Return the members of groups who should receive e-mail.
+
+    Members must be active, must be members of the group's Local Site (if
+    any), must want to receive e-mail, and must not have muted the review
+    request.
+
+    Args:
+        groups (list of reviewboard.reviews.models.Group):
+            The saved review groups to return members for.
+
+        review_request_id (int, optional):
+            The ID of the review request the e-mail is for.
+
+    Returns:
+        list of django.contrib.auth.models.User:
+        The members who should receive e-mail, ordered by username.
+    """
+    group_local_site_ids = dict(
+        (group.pk, group.local_site_id)
+        for group in groups
+    )
+    local_site_ids = set(six.itervalues(group_local_site_ids))
+    local_site_ids.discard(None)
+
+    memberships = Group.users.through.objects.filter(
+        group__in=list(six.iterkeys(group_local_site_ids)))
+    member_ids_q = memberships.values('user_id')
+
+    users = list(
+        User.objects
+        .filter(is_active=True, pk__in=member_ids_q)
+        .select_related('profile')
+        .order_by('username')
+    )
+
+    if local_site_ids:
+        # A user is only a recipient through a group on a Local Site if
+        # they're a member or admin of that Local Site.
+        site_memberships = set()
+
+        for through in (LocalSite.users.through, LocalSite.admins.through):
+            site_memberships.update(
+                through.objects
+                .filter(localsite__in=local_site_ids,
+                        user__in=member_ids_q)
+                .values_list('localsite_id', 'user_id'))
+
+        allowed_user_ids = set(
+            user_id
+            for group_id, user_id in memberships.values_list('group_id',
+                                                             'user_id')
+            if (group_local_site_ids[group_id] is None or
+                (group_local_site_ids[group_id], user_id) in site_memberships)
+        )
+
+        users = [
+            user
+            for user in users
+            if user.pk in allowed_user_ids
+        ]
+
+    if review_request_id:
+        muted_user_ids = _get_muted_user_ids(review_request_id)
+    else:
+        muted_user_ids = set()
+
+    return [
+        user
+        for user in users
+        if _user_wants_email(user) and user.pk not in muted_user_ids
+    ]
+
+
+def _get_muted_user_ids(review_request_id):
+    """Return the IDs of the users who have muted a review request.
+
+    Args:
+        review_request_id (int):
+            The ID of the review request.
+
+    Returns:
+        set of int:
+        The IDs of the users who have muted the review request.
+    """
+    return set(
+        ReviewRequestVisit.objects
+        .filter(review_request=review_request_id,
+                visibility=ReviewRequestVisit.MUTED)
+        .values_list('user_id', flat=True))
+
+
+def _user_wants_email(user):
+    """Return whether a user wants to receive e-mail.
+
+    Unlike :py:meth:`User.should_send_email`, this won't create a profile
+    for users that don't have one, so it won't perform any queries for users
+    fetched with ``select_related('profile')``.
+
+    Args:
+        user (django.contrib.auth.models.User):
+            The user, fetched along with their profile.
+
+    Returns:
+        bool:
+        Whether the user wants to receive e-mail.
+    """
+    profile = getattr(user, '_profile_set_cache', None)
+
+    # Users without a profile get the default settings.
+    return profile is None or profile.should_send_email
+
+
 def send_email(email_builder, **kwargs):
     """Attempt to send an e-mail, logging any exceptions that occur.
 
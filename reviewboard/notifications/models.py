@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import JSONField
@@ -174,3 +175,57 @@ class WebHookTarget(models.Model):
         db_table = 'notifications_webhooktarget'
         verbose_name = _('Webhook')
         verbose_name_plural = _('Webhooks')
+
+
+@python_2_unicode_compatible
+class WebHookDelivery(models.Model):
+    """A record of the delivery of an event to a webhook target.
+
+    One of these is stored for each event sent to a target, once it has
+    either been delivered or has failed on every attempt. Only the most
+    recent deliveries for each target are kept.
+    """
+
+    webhook_target = models.ForeignKey(
+        WebHookTarget,
+        related_name='deliveries')
+
+    event = models.CharField(_('event'), max_length=64)
+
+    timestamp = models.DateTimeField(
+        _('timestamp'),
+        default=timezone.now,
+        db_index=True)
+
+    succeeded = models.BooleanField(_('succeeded'), default=False)
+
+    attempts = models.PositiveIntegerField(
+        _('attempts'),
+        default=1,
+        help_text=_('The number of requests made to deliver the event.'))
+
+    status_code = models.PositiveIntegerField(
+        _('status code'),
+        blank=True,
+        null=True,
+        help_text=_('The HTTP status code from the last request, if the '
+                    'server responded.'))
+
+    error = models.TextField(
+        _('error'),
+        blank=True,
+        help_text=_('The error from the last request, if it failed.'))
+
+    duration = models.FloatField(
+        _('duration'),
+        default=0,
+        help_text=_('The total number of seconds spent on all requests.'))
+
+    def __str__(self):
+        return '%s: %s' % (self.event, self.webhook_target_id)
+
+    class Meta:
+        db_table = 'notifications_webhookdelivery'
+        ordering = ['-timestamp']
+        verbose_name = _('Webhook delivery')
+        verbose_name_plural = _('Webhook deliveries')
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -11,7 +12,7 @@ from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from django.utils import six
 from django.utils.datastructures import MultiValueDict
-from django.utils.six.moves.urllib.request import OpenerDirector
+from django.utils.six.moves import BaseHTTPServer
 from djblets.mail.testing import DmarcDnsTestsMixin
 from djblets.mail.utils import (build_email_address,
                                 build_email_address_for_user)
@@ -30,7 +31,11 @@ from reviewboard.notifications.email.utils import (
     recipients_to_addresses,
     send_email)
 from reviewboard.notifications.email.views import BasePreviewEmailView
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
+from reviewboard.notifications.webhook_delivery import (
+    WebHookConnectionPool,
+    WebHookDeliveryJob,
+    WebHookDispatchQueue)
 from reviewboard.notifications.webhooks import (FakeHTTPRequest,
                                                 dispatch_webhook_event,
                                                 render_custom_content)
@@ -1535,7 +1540,28 @@ class WebAPITokenEmailTests(EmailTestHelper, TestCase):
         self.assertIn('One of your API tokens has been deleted', html_body)
 
 
-class WebHookPayloadTests(SpyAgency, TestCase):
+class WebHookTestMixin(object):
+    """Mixin for tests that send WebHook requests.
+
+    This sends requests without the dispatch queue, so that they're sent
+    before the code being tested returns.
+    """
+
+    def setUp(self):
+        super(WebHookTestMixin, self).setUp()
+
+        self.siteconfig = SiteConfiguration.objects.get_current()
+        self.siteconfig.set('webhooks_dispatch_workers', 0)
+        self.siteconfig.save()
+
+    def tearDown(self):
+        super(WebHookTestMixin, self).tearDown()
+
+        self.siteconfig.set('webhooks_dispatch_workers', 4)
+        self.siteconfig.save()
+
+
+class WebHookPayloadTests(WebHookTestMixin, SpyAgency, TestCase):
     """Tests for payload rendering."""
 
     ENDPOINT_URL = 'http://example.com/endpoint/'
@@ -1543,7 +1569,8 @@ class WebHookPayloadTests(SpyAgency, TestCase):
     @add_fixtures(['test_scmtools', 'test_users'])
     def test_diffset_rendered(self):
         """Testing JSON-serializability of DiffSets in WebHook payloads"""
-        self.spy_on(OpenerDirector.open, call_original=False)
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: 200)
         WebHookTarget.objects.create(url=self.ENDPOINT_URL,
                                      events='review_request_published')
 
@@ -1551,11 +1578,11 @@ class WebHookPayloadTests(SpyAgency, TestCase):
         self.create_diffset(review_request)
         review_request.publish(review_request.submitter)
 
-        self.assertTrue(OpenerDirector.open.spy.called)
+        self.assertTrue(WebHookConnectionPool.post.spy.called)
 
         self.create_diffset(review_request, draft=True)
         review_request.publish(review_request.submitter)
-        self.assertEqual(len(OpenerDirector.open.spy.calls), 2)
+        self.assertEqual(len(WebHookConnectionPool.post.spy.calls), 2)
 
 
 class WebHookCustomContentTests(TestCase):
@@ -1615,7 +1642,7 @@ class WebHookCustomContentTests(TestCase):
         self.assertEqual(s, ';')
 
 
-class WebHookDispatchTests(SpyAgency, TestCase):
+class WebHookDispatchTests(WebHookTestMixin, SpyAgency, TestCase):
     """Unit tests for dispatching webhooks."""
 
     ENDPOINT_URL = 'http://example.com/endpoint/'
@@ -1792,13 +1819,13 @@ class WebHookDispatchTests(SpyAgency, TestCase):
                                 custom_content=r'{% invalid_block_tag %}')
 
         self.spy_on(logging.exception)
-        self.spy_on(OpenerDirector.open,
-                    call_fake=lambda *args, **kwargs: None)
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: 200)
 
         dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event',
                                None)
 
-        self.assertFalse(OpenerDirector.open.spy.called)
+        self.assertFalse(WebHookConnectionPool.post.spy.called)
         self.assertTrue(logging.exception.spy.called)
         self.assertIsInstance(logging.exception.spy.last_call.args[1],
                               TemplateSyntaxError)
@@ -1812,67 +1839,127 @@ class WebHookDispatchTests(SpyAgency, TestCase):
                                 encoding=WebHookTarget.ENCODING_JSON)
 
         self.spy_on(logging.exception)
-        self.spy_on(OpenerDirector.open,
-                    call_fake=lambda *args, **kwargs: None)
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: 200)
 
         dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event', {
             'unencodable': Unencodable(),
         })
 
-        self.assertFalse(OpenerDirector.open.spy.called)
+        self.assertFalse(WebHookConnectionPool.post.spy.called)
         self.assertTrue(logging.exception.spy.called)
         self.assertIsInstance(logging.exception.spy.last_call.args[1],
                               TypeError)
 
     def test_dispatch_cannot_open(self):
         """Testing dispatch_webhook_event with an unresolvable URL"""
-        def _urlopen(opener, *args, **kwargs):
+        def _post(pool, *args, **kwargs):
             raise IOError('')
 
         handler = WebHookTarget(events='my-event', url=self.ENDPOINT_URL,
                                 encoding=WebHookTarget.ENCODING_JSON)
 
         self.spy_on(logging.exception)
-        self.spy_on(OpenerDirector.open, call_fake=_urlopen)
+        self.spy_on(WebHookConnectionPool.post, call_fake=_post)
 
         dispatch_webhook_event(FakeHTTPRequest(None), [handler, handler],
                                'my-event',
                                None)
 
-        self.assertEqual(len(OpenerDirector.open.spy.calls), 2)
+        self.assertEqual(len(WebHookConnectionPool.post.spy.calls), 2)
         self.assertTrue(len(logging.exception.spy.calls), 2)
         self.assertIsInstance(logging.exception.spy.calls[0].args[2], IOError)
         self.assertIsInstance(logging.exception.spy.calls[1].args[2], IOError)
 
+    def test_dispatch_records_delivery(self):
+        """Testing dispatch_webhook_event records the delivery"""
+        handler = WebHookTarget.objects.create(
+            events='my-event',
+            url=self.ENDPOINT_URL,
+            encoding=WebHookTarget.ENCODING_JSON)
+
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: 200)
+
+        dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event',
+                               {})
+
+        delivery = WebHookDelivery.objects.get()
+        self.assertEqual(delivery.webhook_target, handler)
+        self.assertEqual(delivery.event, 'my-event')
+        self.assertTrue(delivery.succeeded)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.status_code, 200)
+        self.assertEqual(delivery.error, '')
+
+    def test_dispatch_records_failed_delivery(self):
+        """Testing dispatch_webhook_event records a failed delivery"""
+        handler = WebHookTarget.objects.create(
+            events='my-event',
+            url=self.ENDPOINT_URL,
+            encoding=WebHookTarget.ENCODING_JSON)
+
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: 404)
+
+        dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event',
+                               {})
+
+        delivery = WebHookDelivery.objects.get()
+        self.assertFalse(delivery.succeeded)
+        self.assertEqual(delivery.status_code, 404)
+        self.assertEqual(delivery.error, 'HTTP 404')
+
+    def test_dispatch_with_dispatch_workers(self):
+        """Testing dispatch_webhook_event with dispatch workers queues the
+        request
+        """
+        self.siteconfig.set('webhooks_dispatch_workers', 2)
+        self.siteconfig.save()
+
+        handler = WebHookTarget(events='my-event', url=self.ENDPOINT_URL,
+                                encoding=WebHookTarget.ENCODING_JSON)
+
+        self.spy_on(WebHookDispatchQueue.add, call_original=False)
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: 200)
+
+        dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event',
+                               {})
+
+        self.assertTrue(WebHookDispatchQueue.add.spy.called)
+        self.assertFalse(WebHookConnectionPool.post.spy.called)
+
+        job = WebHookDispatchQueue.add.spy.last_call.args[0]
+        self.assertEqual(job.url, self.ENDPOINT_URL)
+        self.assertEqual(job.event, 'my-event')
 
     def _test_dispatch(self, handler, event, payload, expected_content_type,
                        expected_data, expected_sig_header=None):
-        def _urlopen(opener, request):
-            self.assertEqual(request.get_full_url(), self.ENDPOINT_URL)
-            self.assertEqual(request.headers['X-reviewboard-event'], event)
-            self.assertEqual(request.headers['Content-type'],
-                             expected_content_type)
-            self.assertEqual(request.data, expected_data)
-            self.assertEqual(request.headers['Content-length'],
-                             len(expected_data))
+        def _post(pool, url, body, headers, timeout):
+            self.assertEqual(url, self.ENDPOINT_URL)
+            self.assertEqual(headers[b'X-ReviewBoard-Event'], event)
+            self.assertEqual(headers[b'Content-Type'], expected_content_type)
+            self.assertEqual(body, expected_data)
+            self.assertEqual(headers[b'Content-Length'], len(expected_data))
 
             if expected_sig_header:
-                self.assertIn('X-hub-signature', request.headers)
-                self.assertEqual(request.headers['X-hub-signature'],
+                self.assertIn(b'X-Hub-Signature', headers)
+                self.assertEqual(headers[b'X-Hub-Signature'],
                                  expected_sig_header)
             else:
-                self.assertNotIn('X-hub-signature', request.headers)
+                self.assertNotIn(b'X-Hub-Signature', headers)
 
             # Check that all sent data are binary strings.
-            self.assertIsInstance(request.get_full_url(), six.binary_type)
-
-            for h in request.headers:
+            for h in headers:
                 self.assertIsInstance(h, six.binary_type)
-                self.assertNotIsInstance(request.headers[h], six.text_type)
+                self.assertNotIsInstance(headers[h], six.text_type)
+
+            self.assertIsInstance(body, six.binary_type)
 
-            self.assertIsInstance(request.data, six.binary_type)
+            return 200
 
-        self.spy_on(OpenerDirector.open, call_fake=_urlopen)
+        self.spy_on(WebHookConnectionPool.post, call_fake=_post)
 
         # We need to ensure that logging.exception is not called
         # in order to avoid silent swallowing of test assertion failures
@@ -1886,6 +1973,180 @@ class WebHookDispatchTests(SpyAgency, TestCase):
         if logging.exception.spy.called:
             raise logging.exception.spy.calls[0].args[2]
 
+        self.assertTrue(WebHookConnectionPool.post.spy.called)
+
+
+class WebHookDispatchQueueTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.notifications.webhook_delivery."""
+
+    ENDPOINT_URL = 'http://example.com/endpoint/'
+
+    def setUp(self):
+        super(WebHookDispatchQueueTests, self).setUp()
+
+        self.recorded = []
+        self.spy_on(
+            WebHookDeliveryJob.record,
+            call_fake=lambda job, succeeded: self.recorded.append(
+                (job, succeeded)))
+
+    def _create_job(self):
+        return WebHookDeliveryJob(webhook_target_id=None,
+                                  event='my-event',
+                                  url=self.ENDPOINT_URL,
+                                  body=b'{}',
+                                  headers={})
+
+    def _run_jobs(self, status_codes, max_retries=2):
+        status_codes = list(status_codes)
+
+        self.spy_on(WebHookConnectionPool.post,
+                    call_fake=lambda *args, **kwargs: status_codes.pop(0))
+
+        queue = WebHookDispatchQueue(max_workers=2, timeout=5,
+                                     max_retries=max_retries,
+                                     retry_delay=0.01)
+        job = self._create_job()
+        queue.add(job)
+
+        self.assertTrue(queue.wait(5))
+        self.assertEqual(len(self.recorded), 1)
+        self.assertIs(self.recorded[0][0], job)
+
+        return job, self.recorded[0][1]
+
+    def test_delivers(self):
+        """Testing WebHookDispatchQueue delivers requests"""
+        job, succeeded = self._run_jobs([200])
+
+        self.assertTrue(succeeded)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.status_code, 200)
+
+    def test_retries_server_errors(self):
+        """Testing WebHookDispatchQueue retries requests that fail with server
+        errors
+        """
+        job, succeeded = self._run_jobs([503, 500, 200])
+
+        self.assertTrue(succeeded)
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(job.status_code, 200)
+
+    def test_retries_connection_errors(self):
+        """Testing WebHookDispatchQueue retries requests that fail to
+        connect
+        """
+        attempts = []
+
+        def _post(*args, **kwargs):
+            attempts.append(True)
+
+            if len(attempts) == 1:
+                raise IOError('Connection refused')
+
+            return 200
+
+        self.spy_on(WebHookConnectionPool.post, call_fake=_post)
+
+        queue = WebHookDispatchQueue(max_workers=1, timeout=5, max_retries=2,
+                                     retry_delay=0.01)
+        job = self._create_job()
+        queue.add(job)
+
+        self.assertTrue(queue.wait(5))
+        self.assertEqual(self.recorded, [(job, True)])
+        self.assertEqual(job.attempts, 2)
+
+    def test_stops_after_max_retries(self):
+        """Testing WebHookDispatchQueue stops retrying after max_retries"""
+        job, succeeded = self._run_jobs([500, 500, 500])
+
+        self.assertFalse(succeeded)
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(job.error, 'HTTP 500')
+
+    def test_no_retry_client_errors(self):
+        """Testing WebHookDispatchQueue does not retry requests that fail with
+        client errors
+        """
+        job, succeeded = self._run_jobs([404])
+
+        self.assertFalse(succeeded)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.status_code, 404)
+
+
+class WebHookConnectionPoolTests(TestCase):
+    """Unit tests for reviewboard.notifications.webhook_delivery.
+    WebHookConnectionPool.
+    """
+
+    def setUp(self):
+        super(WebHookConnectionPoolTests, self).setUp()
+
+        requests = []
+        self.requests = requests
+
+        class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                requests.append((self.client_address, self.path,
+                                 self.headers.get('Authorization'),
+                                 self.rfile.read(length)))
+
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args, **kwargs):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                RequestHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        self.url = 'http://127.0.0.1:%s/endpoint/' % self.server.server_port
+
+    def tearDown(self):
+        super(WebHookConnectionPoolTests, self).tearDown()
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_post_reuses_connections(self):
+        """Testing WebHookConnectionPool.post reuses connections to a host"""
+        pool = WebHookConnectionPool()
+
+        try:
+            self.assertEqual(pool.post(self.url, b'1', {}, 5), 200)
+            self.assertEqual(pool.post(self.url, b'2', {}, 5), 200)
+        finally:
+            pool.close()
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[0][0], self.requests[1][0])
+        self.assertEqual(self.requests[0][3], b'1')
+        self.assertEqual(self.requests[1][3], b'2')
+
+    def test_post_with_credentials(self):
+        """Testing WebHookConnectionPool.post with credentials in the URL"""
+        pool = WebHookConnectionPool()
+        url = self.url.replace('http://', 'http://user:pass@')
+
+        try:
+            self.assertEqual(pool.post(url + '?a=b', b'{}', {}, 5), 200)
+        finally:
+            pool.close()
+
+        self.assertEqual(self.requests[0][1], '/endpoint/?a=b')
+        self.assertEqual(self.requests[0][2], 'Basic dXNlcjpwYXNz')
+
 
 class WebHookTargetManagerTests(TestCase):
     """Unit tests for WebHookTargetManager."""
@@ -2607,6 +2868,113 @@ class EmailUtilsTests(TestCase):
         self.assertEqual(len(addresses), 1)
         self.assertEqual(addresses, set([build_email_address_for_user(user1)]))
 
+    def test_recipients_to_addresses_with_many_groups_num_queries(self):
+        """Testing generating addresses from recipients that are many groups
+        uses a constant number of queries
+        """
+        groups = []
+        expected_addresses = set()
+
+        for i in range(20):
+            group = self.create_review_group('group%d' % i)
+            groups.append(group)
+
+            for j in range(3):
+                user = User.objects.create(username='user%d-%d' % (i, j),
+                                           email='user%d-%d@example.com'
+                                                 % (i, j))
+                group.users.add(user)
+                expected_addresses.add(build_email_address_for_user(user))
+
+        with self.assertNumQueries(1):
+            addresses = recipients_to_addresses(groups)
+
+        self.assertEqual(addresses, expected_addresses)
+
+    @add_fixtures(['test_users'])
+    def test_recipients_to_addresses_with_groups_muted_num_queries(self):
+        """Testing generating addresses from recipients that are groups for a
+        review request excludes members who muted it in a constant number of
+        queries
+        """
+        review_request = self.create_review_request()
+        group1 = self.create_review_group('group1')
+        group2 = self.create_review_group('group2')
+
+        user1 = User.objects.create(username='user1', first_name='User',
+                                    last_name='One')
+        user2 = User.objects.create(username='user2', first_name='User',
+                                    last_name='Two')
+        user3 = User.objects.create(username='user3', first_name='User',
+                                    last_name='Three')
+
+        group1.users = [user1, user2]
+        group2.users = [user2, user3]
+
+        self.create_visit(review_request, ReviewRequestVisit.MUTED, user2)
+
+        with self.assertNumQueries(2):
+            addresses = recipients_to_addresses([group1, group2],
+                                                review_request.pk)
+
+        self.assertEqual(addresses, set([
+            build_email_address_for_user(user1),
+            build_email_address_for_user(user3),
+        ]))
+
+    def test_recipients_to_addresses_with_groups_local_site_num_queries(self):
+        """Testing generating addresses from recipients that are groups in
+        local sites uses a constant number of queries
+        """
+        local_site1 = LocalSite.objects.create(name='local-site1')
+        local_site2 = LocalSite.objects.create(name='local-site2')
+
+        group1 = self.create_review_group('group1', local_site=local_site1)
+        group2 = self.create_review_group('group2', local_site=local_site2)
+        group3 = self.create_review_group('group3')
+
+        user1 = User.objects.create(username='user1', first_name='User',
+                                    last_name='One')
+        user2 = User.objects.create(username='user2', first_name='User',
+                                    last_name='Two')
+        user3 = User.objects.create(username='user3', first_name='User',
+                                    last_name='Three')
+        user4 = User.objects.create(username='user4', first_name='User',
+                                    last_name='Four')
+
+        local_site1.users = [user1]
+        local_site2.admins = [user2]
+
+        group1.users = [user1, user3]
+        group2.users = [user2]
+        group3.users = [user4]
+
+        with self.assertNumQueries(4):
+            addresses = recipients_to_addresses([group1, group2, group3])
+
+        self.assertEqual(addresses, set([
+            build_email_address_for_user(user1),
+            build_email_address_for_user(user2),
+            build_email_address_for_user(user4),
+        ]))
+
+    def test_recipients_to_addresses_with_groups_no_email_pref(self):
+        """Testing generating addresses from recipients that are groups
+        excludes members who don't want e-mail
+        """
+        group = self.create_review_group('group1')
+
+        user1 = User.objects.create(username='user1', first_name='User',
+                                    last_name='One')
+        user2 = User.objects.create(username='user2', first_name='User',
+                                    last_name='Two')
+        Profile.objects.create(user=user2, should_send_email=False)
+
+        group.users = [user1, user2]
+
+        addresses = recipients_to_addresses([group])
+        self.assertEqual(addresses, set([build_email_address_for_user(user1)]))
+
     @add_fixtures(['test_users'])
     def test_build_recipients_user_receive_email(self):
         """Testing building recipients for a review request where the user
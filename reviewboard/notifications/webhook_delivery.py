@@ -0,0 +1,486 @@
+"""Delivery of WebHook requests.
+
+WebHook requests are sent by a small pool of worker threads in the current
+process, so that publishing a review request or review never has to wait on
+the WebHook endpoints. The number of threads is configured through the
+``webhooks_dispatch_workers`` setting. If this is 0, requests are sent
+during the publishing request instead, as they were in older versions.
+
+Connections are kept open between requests to the same host and reused.
+Requests that fail due to connection errors or server errors are retried,
+waiting twice as long before each attempt, up to the ``webhooks_max_retries``
+setting. The final result of each delivery is recorded as a
+:py:class:`~reviewboard.notifications.models.WebHookDelivery`.
+
+Queued requests and pending retries are only kept in memory. If the server
+process exits or is restarted before they're sent, they're lost, and no
+delivery is recorded for them.
+"""
+
+from __future__ import unicode_literals
+
+import base64
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from django.db import connection
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.parse import unquote, urlsplit
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard.http_pool import HTTPConnectionPool
+
+
+#: The number of seconds to wait before the first retry of a failed request.
+#:
+#: This doubles after each attempt.
+RETRY_DELAY_SECS = 5
+
+#: The maximum number of idle connections kept open for each host.
+MAX_IDLE_CONNECTIONS_PER_HOST = 2
+
+#: The maximum number of deliveries recorded for each WebHook target.
+#:
+#: Older records are removed as new ones are added.
+MAX_DELIVERIES_PER_TARGET = 100
+
+
+class WebHookConnectionPool(HTTPConnectionPool):
+    """A pool of HTTP connections for sending WebHook requests."""
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_CONNECTIONS_PER_HOST):
+        """Initialize the pool.
+
+        Args:
+            max_idle_per_host (int, optional):
+                The maximum number of idle connections to keep open for each
+                host.
+        """
+        super(WebHookConnectionPool, self).__init__(max_idle_per_host)
+
+    def post(self, url, body, headers, timeout):
+        """Send a POST request.
+
+        If the URL contains a username and password, they will be sent using
+        HTTP Basic authentication.
+
+        Args:
+            url (unicode):
+                The URL to send the request to.
+
+            body (bytes):
+                The body of the request.
+
+            headers (dict):
+                The headers for the request.
+
+            timeout (float):
+                The number of seconds to wait for the server when connecting
+                or reading the response.
+
+        Returns:
+            int:
+            The HTTP status code of the response.
+
+        Raises:
+            IOError:
+                The request could not be sent, or the response could not be
+                read.
+
+            ValueError:
+                The URL is not an HTTP or HTTPS URL.
+
+            django.utils.six.moves.http_client.HTTPException:
+                The response was invalid.
+        """
+        url_parts = urlsplit(url)
+        headers = dict(headers)
+
+        if url_parts.username or url_parts.password:
+            credentials = '%s:%s' % (unquote(url_parts.username or ''),
+                                     unquote(url_parts.password or ''))
+            headers[b'Authorization'] = \
+                b'Basic ' + base64.b64encode(credentials.encode('utf-8'))
+
+        response = self.request('POST', url, body, headers, timeout)[0]
+
+        return response.status
+
+
+class WebHookDeliveryJob(object):
+    """A WebHook request to deliver to a target.
+
+    Attributes:
+        attempts (int):
+            The number of attempts made to deliver the request.
+
+        duration (float):
+            The total number of seconds spent on all attempts.
+
+        error (unicode):
+            The error from the last attempt, if any.
+
+        status_code (int):
+            The HTTP status code from the last attempt, if a response was
+            received.
+    """
+
+    def __init__(self, webhook_target_id, event, url, body, headers):
+        """Initialize the job.
+
+        Args:
+            webhook_target_id (int):
+                The ID of the WebHook target, or ``None`` if it's not saved.
+
+            event (unicode):
+                The name of the event.
+
+            url (unicode):
+                The URL to send the request to.
+
+            body (bytes):
+                The body of the request.
+
+            headers (dict):
+                The headers for the request.
+        """
+        self.webhook_target_id = webhook_target_id
+        self.event = event
+        self.url = url
+        self.body = body
+        self.headers = headers
+
+        self.attempts = 0
+        self.duration = 0
+        self.error = ''
+        self.status_code = None
+
+    def attempt(self, connection_pool, timeout):
+        """Make an attempt to deliver the request.
+
+        Args:
+            connection_pool (WebHookConnectionPool):
+                The pool of connections to send the request with.
+
+            timeout (float):
+                The number of seconds to wait for the server.
+
+        Returns:
+            tuple:
+            A 2-tuple containing:
+
+            1. Whether the request was delivered (:py:class:`bool`).
+            2. Whether a failed request can be retried (:py:class:`bool`).
+        """
+        self.attempts += 1
+        self.error = ''
+        self.status_code = None
+
+        logging.info('Dispatching webhook for event %s to %s',
+                     self.event, self.url)
+
+        start_time = time.time()
+
+        try:
+            self.status_code = connection_pool.post(self.url, self.body,
+                                                    self.headers, timeout)
+        except (IOError, http_client.HTTPException) as e:
+            logging.exception('Could not dispatch WebHook to %s: %s',
+                              self.url, e)
+            self.error = '%s' % e or e.__class__.__name__
+
+            return False, True
+        except Exception as e:
+            logging.exception('Could not dispatch WebHook to %s: %s',
+                              self.url, e)
+            self.error = '%s' % e or e.__class__.__name__
+
+            return False, False
+        finally:
+            self.duration += time.time() - start_time
+
+        if 200 <= self.status_code < 300:
+            return True, False
+
+        self.error = 'HTTP %s' % self.status_code
+        logging.warning('WebHook to %s for event %s failed with HTTP %s',
+                        self.url, self.event, self.status_code)
+
+        # Server errors and rate limiting are likely to be temporary. Other
+        # errors won't be fixed by trying again.
+        return False, (self.status_code >= 500 or self.status_code == 429)
+
+    def record(self, succeeded):
+        """Record the result of the delivery.
+
+        Args:
+            succeeded (bool):
+                Whether the request was delivered.
+        """
+        from reviewboard.notifications.models import WebHookDelivery
+
+        if self.webhook_target_id is None:
+            return
+
+        try:
+            WebHookDelivery.objects.create(
+                webhook_target_id=self.webhook_target_id,
+                event=self.event,
+                succeeded=succeeded,
+                attempts=self.attempts,
+                status_code=self.status_code,
+                error=self.error,
+                duration=self.duration)
+
+            old_pks = list(
+                WebHookDelivery.objects
+                .filter(webhook_target=self.webhook_target_id)
+                .order_by('-pk')
+                .values_list('pk', flat=True)[MAX_DELIVERIES_PER_TARGET:])
+
+            if old_pks:
+                WebHookDelivery.objects.filter(pk__in=old_pks).delete()
+        except Exception as e:
+            logging.exception('Could not record WebHook delivery to %s: %s',
+                              self.url, e)
+
+
+class WebHookDispatchQueue(object):
+    """A queue of WebHook requests, sent by a pool of worker threads.
+
+    Worker threads are started as needed, up to :py:attr:`max_workers`, and
+    exit once they've been idle for :py:attr:`IDLE_TIMEOUT_SECS`.
+
+    Attributes:
+        connection_pool (WebHookConnectionPool):
+            The connections used by the worker threads.
+
+        max_retries (int):
+            The maximum number of times a failed request will be retried.
+
+        max_workers (int):
+            The maximum number of worker threads.
+
+        retry_delay (float):
+            The number of seconds to wait before the first retry of a failed
+            request. This doubles after each attempt.
+
+        timeout (float):
+            The number of seconds to wait for a server to respond.
+    """
+
+    #: The number of seconds a worker thread will wait for a new job.
+    IDLE_TIMEOUT_SECS = 30
+
+    def __init__(self, max_workers, timeout, max_retries,
+                 retry_delay=RETRY_DELAY_SECS):
+        """Initialize the queue.
+
+        Args:
+            max_workers (int):
+                The maximum number of worker threads.
+
+            timeout (float):
+                The number of seconds to wait for a server to respond.
+
+            max_retries (int):
+                The maximum number of times a failed request will be retried.
+
+            retry_delay (float, optional):
+                The number of seconds to wait before the first retry of a
+                failed request.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.connection_pool = WebHookConnectionPool()
+
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._num_workers = 0
+        self._num_idle_workers = 0
+        self._num_running = 0
+
+    def add(self, job, delay=0):
+        """Add a job to the queue.
+
+        Args:
+            job (WebHookDeliveryJob):
+                The job to add.
+
+            delay (float, optional):
+                The number of seconds to wait before running the job.
+        """
+        with self._cond:
+            heapq.heappush(self._heap,
+                           (time.time() + delay, next(self._counter), job))
+
+            if (len(self._heap) > self._num_idle_workers and
+                self._num_workers < self.max_workers):
+                self._num_workers += 1
+
+                thread = threading.Thread(target=self._run_worker,
+                                          name='WebHookDispatchWorker')
+                thread.daemon = True
+                thread.start()
+            else:
+                self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait for all queued and running jobs to finish.
+
+        This includes any retries of failed jobs.
+
+        Args:
+            timeout (float, optional):
+                The maximum number of seconds to wait.
+
+        Returns:
+            bool:
+            ``True`` if all jobs finished, or ``False`` if the timeout was
+            reached.
+        """
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        with self._cond:
+            while self._heap or self._num_running:
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    remaining = end_time - time.time()
+
+                    if remaining <= 0:
+                        return False
+
+                    self._cond.wait(remaining)
+
+            return True
+
+    def _run_job(self, job):
+        """Run a job, scheduling a retry if it fails.
+
+        Args:
+            job (WebHookDeliveryJob):
+                The job to run.
+        """
+        succeeded, can_retry = job.attempt(self.connection_pool, self.timeout)
+
+        if not succeeded and can_retry and job.attempts <= self.max_retries:
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            logging.info('Retrying WebHook to %s for event %s in %s seconds',
+                         job.url, job.event, delay)
+            self.add(job, delay)
+        else:
+            job.record(succeeded)
+
+    def _run_worker(self):
+        """Run jobs from the queue until idle."""
+        while True:
+            with self._cond:
+                end_time = time.time() + self.IDLE_TIMEOUT_SECS
+                self._num_idle_workers += 1
+                job = None
+
+                while self._num_workers <= self.max_workers:
+                    now = time.time()
+
+                    if self._heap:
+                        if self._heap[0][0] <= now:
+                            job = heapq.heappop(self._heap)[2]
+                            break
+
+                        # Wait for the next retry to be due.
+                        remaining = self._heap[0][0] - now
+                    else:
+                        remaining = end_time - now
+
+                        if remaining <= 0:
+                            break
+
+                    self._cond.wait(remaining)
+
+                self._num_idle_workers -= 1
+
+                if job is None:
+                    self._num_workers -= 1
+                    return
+
+                self._num_running += 1
+
+            try:
+                self._run_job(job)
+            except Exception as e:
+                logging.exception('Unexpected error dispatching WebHook to '
+                                  '%s: %s',
+                                  job.url, e)
+            finally:
+                # Each worker thread has its own database connection, which
+                # would otherwise be left open.
+                connection.close()
+
+                with self._cond:
+                    self._num_running -= 1
+                    self._cond.notify_all()
+
+
+_dispatch_queue = None
+_dispatch_queue_lock = threading.Lock()
+_inline_connection_pool = WebHookConnectionPool()
+
+
+def get_webhook_dispatch_queue():
+    """Return the queue used for sending WebHook requests.
+
+    Returns:
+        WebHookDispatchQueue:
+        The queue, or ``None`` if requests are sent without a queue.
+    """
+    global _dispatch_queue
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    max_workers = siteconfig.get('webhooks_dispatch_workers')
+
+    if not max_workers:
+        return None
+
+    timeout = siteconfig.get('webhooks_timeout')
+    max_retries = siteconfig.get('webhooks_max_retries')
+
+    with _dispatch_queue_lock:
+        if _dispatch_queue is None:
+            _dispatch_queue = WebHookDispatchQueue(max_workers, timeout,
+                                                   max_retries)
+        else:
+            _dispatch_queue.max_workers = max_workers
+            _dispatch_queue.timeout = timeout
+            _dispatch_queue.max_retries = max_retries
+
+        return _dispatch_queue
+
+
+def deliver_webhook(job):
+    """Deliver a WebHook request.
+
+    If there's a dispatch queue, the request is queued and this returns
+    immediately. Otherwise, a single attempt is made to send the request
+    before returning.
+
+    Args:
+        job (WebHookDeliveryJob):
+            The request to deliver.
+    """
+    queue = get_webhook_dispatch_queue()
+
+    if queue is None:
+        siteconfig = SiteConfiguration.objects.get_current()
+        succeeded = job.attempt(_inline_connection_pool,
+                                siteconfig.get('webhooks_timeout'))[0]
+        job.record(succeeded)
+    else:
+        queue.add(job)
@@ -6,13 +6,7 @@ import logging
 
 from django.contrib.sites.models import Site
 from django.http.request import HttpRequest
-from django.utils.six.moves.urllib.parse import (urlencode, urlsplit,
-                                                 urlunsplit)
-from django.utils.six.moves.urllib.request import (
-    HTTPBasicAuthHandler,
-    HTTPPasswordMgrWithDefaultRealm,
-    Request,
-    build_opener)
+from django.utils.six.moves.urllib.parse import urlencode
 from django.template import Context, Template
 from django.template.base import Lexer, Parser
 from djblets.siteconfig.models import SiteConfiguration
@@ -21,6 +15,8 @@ from djblets.webapi.encoders import (JSONEncoderAdapter, ResourceAPIEncoder,
 
 from reviewboard import get_package_version
 from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.webhook_delivery import (WebHookDeliveryJob,
+                                                        deliver_webhook)
 from reviewboard.reviews.models import Review, ReviewRequest
 from reviewboard.reviews.signals import (review_request_closed,
                                          review_request_published,
@@ -111,7 +107,12 @@ def render_custom_content(body, context_data={}):
 
 
 def dispatch_webhook_event(request, webhook_targets, event, payload):
-    """Dispatch the given event and payload to the given WebHook targets."""
+    """Dispatch the given event and payload to the given WebHook targets.
+
+    The payload is encoded for each target right away, but the requests
+    are sent in the background, if enabled (see
+    :py:mod:`reviewboard.notifications.webhook_delivery`).
+    """
     encoder = ResourceAPIEncoder()
     bodies = {}
 
@@ -174,30 +175,12 @@ def dispatch_webhook_event(request, webhook_targets, event, payload):
             headers[b'X-Hub-Signature'] = \
                 ('sha1=%s' % signer.hexdigest()).encode('utf-8')
 
-        logging.info('Dispatching webhook for event %s to %s',
-                     event, webhook_target.url)
-        try:
-            url = webhook_target.url
-            url_parts = urlsplit(url)
-
-            if url_parts.username or url_parts.password:
-                netloc = url_parts.netloc.split('@', 1)[1]
-                url = urlunsplit(
-                    (url_parts.scheme, netloc, url_parts.path,
-                     url_parts.params, url_parts.query))
-
-                password_mgr = HTTPPasswordMgrWithDefaultRealm()
-                password_mgr.add_password(
-                    None, url, url_parts.username, url_parts.password)
-                handler = HTTPBasicAuthHandler(password_mgr)
-                opener = build_opener(handler)
-            else:
-                opener = build_opener()
-
-            opener.open(Request(url.encode('utf-8'), body, headers))
-        except Exception as e:
-            logging.exception('Could not dispatch WebHook to %s: %s',
-                              webhook_target.url, e)
+        deliver_webhook(WebHookDeliveryJob(
+            webhook_target_id=webhook_target.pk,
+            event=event,
+            url=webhook_target.url,
+            body=body,
+            headers=headers))
 
 
 def _serialize_review(review, request):
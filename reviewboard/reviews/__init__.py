@@ -0,0 +1,45 @@
+from __future__ import unicode_literals
+
+from reviewboard.signals import initializing
+
+
+def _on_review_request_published(review_request, changedesc=None,
+                                 **kwargs):
+    """Pre-render a new diff when a review request is published.
+
+    The latest diff (and the interdiff against the previous one) will be
+    queued to be rendered in the background, if the diff changed.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request that was published.
+
+        changedesc (reviewboard.changedescs.models.ChangeDescription,
+                    optional):
+            The change description for the publish, if any.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.diffviewer.prerender import (get_prerender_queue,
+                                                  prerender_diffset_history)
+
+    if (get_prerender_queue() is not None and
+        review_request.diffset_history_id is not None and
+        (changedesc is None or 'diff' in changedesc.fields_changed)):
+        prerender_diffset_history(review_request.diffset_history)
+
+
+def _connect_signals(**kwargs):
+    """Connect signal handlers for review requests."""
+    from reviewboard.reviews.inbox import connect_signals as \
+        connect_inbox_signals
+    from reviewboard.reviews.models import ReviewRequest
+    from reviewboard.reviews.signals import review_request_published
+
+    review_request_published.connect(_on_review_request_published,
+                                     sender=ReviewRequest)
+    connect_inbox_signals()
+
+
+initializing.connect(_connect_signals)
@@ -0,0 +1,126 @@
+"""Batched updates to review request counters.
+
+Publishing, closing, or reopening a review request updates a number of
+counters: the incoming request counts for each target group, and the
+incoming, outgoing, and starred request counts on the
+:py:class:`~reviewboard.accounts.models.LocalSiteProfile` of every user
+affected. Publishing an update to a review request first removes the review
+request from all of these counts and then adds it back, which would mean
+updating the same rows twice, most of them for no net change.
+
+Inside :py:func:`batch_counter_updates`, changes to counters are collected
+in memory instead. When the outermost batch finishes, changes that cancel
+out are dropped, and the rest are applied with as few ``UPDATE`` statements
+as possible: one for each distinct set of changes, rather than one per
+counter per step.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.utils import six
+
+
+#: The maximum number of rows updated by a single statement.
+#:
+#: This keeps the number of query parameters within database limits.
+MAX_UPDATE_BATCH_SIZE = 500
+
+
+_local = threading.local()
+
+
+class CounterUpdates(object):
+    """A collection of pending changes to counters.
+
+    Changes are stored per object and per counter, so that changes to the
+    same counter on the same object are combined.
+    """
+
+    def __init__(self):
+        """Initialize the collection."""
+        self._deltas = defaultdict(lambda: defaultdict(int))
+
+    def add(self, model, field_name, pks, delta):
+        """Add a change to a counter on several objects.
+
+        Args:
+            model (type):
+                The model class owning the counter.
+
+            field_name (unicode):
+                The attribute name of the counter field.
+
+            pks (list of int):
+                The primary keys of the objects to change.
+
+            delta (int):
+                The amount to add to the counter on each object.
+        """
+        if delta:
+            for pk in pks:
+                self._deltas[(model, pk)][field_name] += delta
+
+    def apply(self):
+        """Apply all pending changes to the database.
+
+        Objects with the same set of changes are updated together.
+        """
+        # Group the objects of each model by their combined changes.
+        updates = defaultdict(list)
+
+        for (model, pk), deltas in six.iteritems(self._deltas):
+            key = frozenset(
+                (field_name, delta)
+                for field_name, delta in six.iteritems(deltas)
+                if delta != 0
+            )
+
+            if key:
+                updates[(model, key)].append(pk)
+
+        self._deltas.clear()
+
+        for (model, key), pks in six.iteritems(updates):
+            values = dict(
+                (field_name, F(field_name) + delta)
+                for field_name, delta in key
+            )
+            pks.sort()
+
+            for i in range(0, len(pks), MAX_UPDATE_BATCH_SIZE):
+                model.objects.filter(
+                    pk__in=pks[i:i + MAX_UPDATE_BATCH_SIZE]).update(**values)
+
+
+@contextmanager
+def batch_counter_updates():
+    """Collect changes to counters, applying them together at the end.
+
+    Batches can be nested. Changes are applied when the outermost batch
+    finishes. If it finishes due to an exception, the changes are discarded.
+
+    Yields:
+        CounterUpdates:
+        The collection of changes for the batch.
+    """
+    updates = getattr(_local, 'counter_updates', None)
+
+    if updates is not None:
+        # Add to the batch that's already in progress.
+        yield updates
+        return
+
+    updates = CounterUpdates()
+    _local.counter_updates = updates
+
+    try:
+        yield updates
+    finally:
+        _local.counter_updates = None
+
+    updates.apply()
@@ -0,0 +1,856 @@
+"""Maintenance of the dashboard inbox.
+
+When the ``dashboard_inbox_enabled`` setting is on, the incoming views of
+the dashboard read from :py:class:`~reviewboard.reviews.models.InboxEntry`
+rows instead of working out which review requests are assigned to a user
+on every load. Those rows are kept up to date here, from the signals sent
+when review requests are published, closed, or reopened, when reviewers
+or stars change, when group membership or repository and group access
+change, and when groups or repositories are deleted.
+
+Updates are computed from the current state of the database. Each update
+recomputes the entries for a set of review requests (optionally limited to
+some users), using a fixed number of queries for each batch of review
+requests.
+
+After turning on the setting, existing review requests need to be added by
+running the ``rebuildinbox`` management command.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.utils import six
+from djblets.siteconfig.models import SiteConfiguration
+
+
+#: The number of review requests to update at once.
+UPDATE_BATCH_SIZE = 100
+
+
+_local = threading.local()
+
+
+def is_inbox_enabled():
+    """Return whether the dashboard inbox is enabled.
+
+    Returns:
+        bool:
+        Whether the dashboard inbox is enabled.
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    return siteconfig.get('dashboard_inbox_enabled')
+
+
+def update_inbox_entries(review_request_ids, user_ids=None):
+    """Recompute the inbox entries for review requests.
+
+    Args:
+        review_request_ids (list of int):
+            The IDs of the review requests to update entries for.
+
+        user_ids (set of int, optional):
+            The IDs of the users to update entries for. If not provided,
+            entries for all users are updated.
+    """
+    review_request_ids = sorted(set(review_request_ids))
+
+    if user_ids is not None:
+        user_ids = set(user_ids)
+
+        if not user_ids:
+            return
+
+    for i in range(0, len(review_request_ids), UPDATE_BATCH_SIZE):
+        _update_inbox_entries_batch(
+            review_request_ids[i:i + UPDATE_BATCH_SIZE],
+            user_ids)
+
+
+def rebuild_inbox():
+    """Recompute the inbox entries for all review requests."""
+    from reviewboard.reviews.models import ReviewRequest
+
+    update_inbox_entries(
+        ReviewRequest.objects.values_list('pk', flat=True))
+
+
+@contextmanager
+def batch_inbox_updates():
+    """Collect inbox updates, applying them together at the end.
+
+    Publishing a review request changes its reviewers one field at a time
+    before sending the publish signal. Inside a batch, the updates for each
+    of those changes are combined and applied once.
+
+    Batches can be nested. Updates are applied when the outermost batch
+    finishes, even if it finishes due to an exception, since some of the
+    changes may have been saved.
+    """
+    if getattr(_local, 'pending_updates', None) is not None:
+        # Add to the batch that's already in progress.
+        yield
+        return
+
+    _local.pending_updates = {}
+
+    try:
+        yield
+    finally:
+        pending_updates = _local.pending_updates
+        _local.pending_updates = None
+
+        try:
+            _apply_updates(pending_updates)
+        except Exception as e:
+            logging.exception('Unable to update the dashboard inbox: %s', e)
+
+
+def queue_inbox_update(review_request_ids, user_ids=None):
+    """Queue an update to the inbox entries for review requests.
+
+    If a batch is in progress, the update will be combined with others in
+    the batch. Otherwise, it's applied immediately.
+
+    Args:
+        review_request_ids (list of int):
+            The IDs of the review requests to update entries for.
+
+        user_ids (set of int, optional):
+            The IDs of the users to update entries for. If not provided,
+            entries for all users are updated.
+    """
+    pending_updates = getattr(_local, 'pending_updates', None)
+
+    if pending_updates is None:
+        with batch_inbox_updates():
+            queue_inbox_update(review_request_ids, user_ids)
+
+        return
+
+    for review_request_id in review_request_ids:
+        if user_ids is None:
+            pending_updates[review_request_id] = None
+        elif review_request_id not in pending_updates:
+            pending_updates[review_request_id] = set(user_ids)
+        elif pending_updates[review_request_id] is not None:
+            pending_updates[review_request_id].update(user_ids)
+
+
+def _apply_updates(pending_updates):
+    """Apply a batch of queued inbox updates.
+
+    Args:
+        pending_updates (dict):
+            A mapping of review request IDs to the set of user IDs to update,
+            or ``None`` to update all users.
+    """
+    full_update_ids = [
+        review_request_id
+        for review_request_id, user_ids in six.iteritems(pending_updates)
+        if user_ids is None
+    ]
+
+    if full_update_ids:
+        update_inbox_entries(full_update_ids)
+
+    for review_request_id, user_ids in six.iteritems(pending_updates):
+        if user_ids is not None:
+            update_inbox_entries([review_request_id], user_ids)
+
+
+def _update_inbox_entries_batch(review_request_ids, user_ids):
+    """Recompute the inbox entries for a batch of review requests.
+
+    Args:
+        review_request_ids (list of int):
+            The IDs of the review requests to update entries for.
+
+        user_ids (set of int):
+            The IDs of the users to update entries for, or ``None`` for all
+            users.
+    """
+    from reviewboard.accounts.models import Profile
+    from reviewboard.reviews.models import Group, InboxEntry, ReviewRequest
+    from reviewboard.scmtools.models import Repository
+
+    def _filter_users(queryset, field_name='user'):
+        if user_ids is not None:
+            queryset = queryset.filter(**{'%s__in' % field_name: user_ids})
+
+        return queryset
+
+    review_requests = list(
+        ReviewRequest.objects
+        .filter(pk__in=review_request_ids)
+        .values_list('pk', 'submitter_id', 'repository_id'))
+
+    # Find everyone the review requests are in an inbox for.
+    people = defaultdict(set)
+    target_groups = defaultdict(set)
+    starred = defaultdict(set)
+
+    for review_request_id, user_id in _filter_users(
+            ReviewRequest.target_people.through.objects
+            .filter(reviewrequest__in=review_request_ids)
+            .values_list('reviewrequest', 'user')):
+        people[review_request_id].add(user_id)
+
+    for review_request_id, group_id in (
+            ReviewRequest.target_groups.through.objects
+            .filter(reviewrequest__in=review_request_ids)
+            .values_list('reviewrequest', 'group')):
+        target_groups[review_request_id].add(group_id)
+
+    for review_request_id, user_id in _filter_users(
+            Profile.starred_review_requests.through.objects
+            .filter(reviewrequest__in=review_request_ids)
+            .values_list('reviewrequest', 'profile__user'),
+            'profile__user'):
+        starred[review_request_id].add(user_id)
+
+    # Gather what's needed to check access to the repositories and groups.
+    repository_ids = set(
+        repository_id
+        for review_request_id, submitter_id, repository_id in review_requests
+        if repository_id is not None
+    )
+    public_repository_ids = set(
+        Repository.objects
+        .filter(pk__in=repository_ids, public=True)
+        .values_list('pk', flat=True))
+    repository_users = defaultdict(set)
+    repository_groups = defaultdict(set)
+
+    for repository_id, user_id in _filter_users(
+            Repository.users.through.objects
+            .filter(repository__in=repository_ids)
+            .values_list('repository', 'user')):
+        repository_users[repository_id].add(user_id)
+
+    for repository_id, group_id in (
+            Repository.review_groups.through.objects
+            .filter(repository__in=repository_ids)
+            .values_list('repository', 'group')):
+        repository_groups[repository_id].add(group_id)
+
+    group_ids = set()
+
+    for ids in six.itervalues(target_groups):
+        group_ids.update(ids)
+
+    for ids in six.itervalues(repository_groups):
+        group_ids.update(ids)
+
+    invite_only_group_ids = set(
+        Group.objects
+        .filter(pk__in=group_ids, invite_only=True)
+        .values_list('pk', flat=True))
+    group_members = defaultdict(set)
+
+    for group_id, user_id in _filter_users(
+            Group.users.through.objects
+            .filter(group__in=group_ids)
+            .values_list('group', 'user')):
+        group_members[group_id].add(user_id)
+
+    # Work out the entries that should exist.
+    new_entries = {}
+
+    for review_request_id, submitter_id, repository_id in review_requests:
+        direct_user_ids = people[review_request_id]
+        review_request_group_ids = target_groups[review_request_id]
+        group_user_ids = set()
+
+        for group_id in review_request_group_ids:
+            group_user_ids.update(group_members[group_id])
+
+        if (repository_id is None or
+            repository_id in public_repository_ids):
+            repository_user_ids = None
+        else:
+            repository_user_ids = set(repository_users[repository_id])
+
+            for group_id in repository_groups[repository_id]:
+                repository_user_ids.update(group_members[group_id])
+
+        if (not review_request_group_ids or
+            review_request_group_ids - invite_only_group_ids):
+            group_access_user_ids = None
+        else:
+            group_access_user_ids = direct_user_ids | group_user_ids
+
+        for reason, reason_user_ids in (
+                (InboxEntry.REASON_DIRECT, direct_user_ids),
+                (InboxEntry.REASON_GROUP, group_user_ids),
+                (InboxEntry.REASON_STARRED, starred[review_request_id])):
+            for user_id in reason_user_ids:
+                # This must be kept in sync with the filter_private checks
+                # in ReviewRequestManager._query.
+                is_accessible = (
+                    user_id == submitter_id or
+                    ((repository_user_ids is None or
+                      user_id in repository_user_ids) and
+                     (group_access_user_ids is None or
+                      user_id in group_access_user_ids)))
+
+                new_entries[(user_id, review_request_id, reason)] = \
+                    is_accessible
+
+    # Compare against the existing entries, and update as needed.
+    stale_entry_ids = []
+    accessible_entry_ids = []
+    inaccessible_entry_ids = []
+
+    for entry_id, user_id, review_request_id, reason, is_accessible in \
+            _filter_users(
+                InboxEntry.objects
+                .filter(review_request__in=review_request_ids)
+                .values_list('pk', 'user', 'review_request', 'reason',
+                             'is_accessible')):
+        key = (user_id, review_request_id, reason)
+
+        if key not in new_entries:
+            stale_entry_ids.append(entry_id)
+        else:
+            new_is_accessible = new_entries.pop(key)
+
+            if new_is_accessible != is_accessible:
+                if new_is_accessible:
+                    accessible_entry_ids.append(entry_id)
+                else:
+                    inaccessible_entry_ids.append(entry_id)
+
+    if stale_entry_ids:
+        InboxEntry.objects.filter(pk__in=stale_entry_ids).delete()
+
+    if accessible_entry_ids:
+        InboxEntry.objects.filter(pk__in=accessible_entry_ids).update(
+            is_accessible=True)
+
+    if inaccessible_entry_ids:
+        InboxEntry.objects.filter(pk__in=inaccessible_entry_ids).update(
+            is_accessible=False)
+
+    if new_entries:
+        try:
+            with transaction.atomic():
+                InboxEntry.objects.bulk_create(
+                    InboxEntry(user_id=user_id,
+                               review_request_id=review_request_id,
+                               reason=reason,
+                               is_accessible=is_accessible)
+                    for (user_id, review_request_id, reason), is_accessible
+                    in six.iteritems(new_entries)
+                )
+        except IntegrityError:
+            # Another update added some of these at the same time. Add the
+            # rest one at a time.
+            for (user_id, review_request_id, reason), is_accessible in \
+                    six.iteritems(new_entries):
+                InboxEntry.objects.get_or_create(
+                    user_id=user_id,
+                    review_request_id=review_request_id,
+                    reason=reason,
+                    defaults={
+                        'is_accessible': is_accessible,
+                    })
+
+
+def _get_m2m_change(field, instance, action, reverse, pk_set):
+    """Return the objects affected by a change to a many-to-many relation.
+
+    The objects removed by a ``clear()`` aren't included in the
+    ``post_clear`` signal, so they're looked up on ``pre_clear`` and stored
+    on the instance until then.
+
+    Args:
+        field (django.db.models.ManyToManyField):
+            The field for the relation.
+
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+    Returns:
+        tuple:
+        A 2-tuple containing the IDs of the changed objects on the field's
+        model and the IDs of the changed related objects. This will be
+        ``None`` if there's nothing to update yet.
+    """
+    attr = '_inbox_cleared_%s_%s' % (field.model._meta.model_name,
+                                     field.name)
+
+    if action == 'pre_clear':
+        if reverse:
+            lookup_field = field.m2m_reverse_field_name()
+            other_field = field.m2m_field_name()
+        else:
+            lookup_field = field.m2m_field_name()
+            other_field = field.m2m_reverse_field_name()
+
+        setattr(instance, attr, set(
+            field.rel.through.objects
+            .filter(**{lookup_field: instance.pk})
+            .values_list(other_field, flat=True)))
+
+        return None
+    elif action == 'post_clear':
+        pk_set = getattr(instance, attr, None)
+
+        if pk_set is not None:
+            delattr(instance, attr)
+    elif action not in ('post_add', 'post_remove'):
+        return None
+
+    if not pk_set:
+        return None
+    elif reverse:
+        return pk_set, [instance.pk]
+    else:
+        return [instance.pk], pk_set
+
+
+def _get_group_member_ids(group_ids):
+    """Return the IDs of all members of groups.
+
+    Args:
+        group_ids (list of int):
+            The IDs of the groups.
+
+    Returns:
+        set of int:
+        The IDs of the members.
+    """
+    from reviewboard.reviews.models import Group
+
+    return set(
+        Group.users.through.objects
+        .filter(group__in=group_ids)
+        .values_list('user', flat=True))
+
+
+def _get_inbox_review_request_ids(user_ids, repository_ids=None):
+    """Return the IDs of review requests in users' inboxes.
+
+    Args:
+        user_ids (set of int):
+            The IDs of the users.
+
+        repository_ids (list of int, optional):
+            The IDs of repositories to limit the review requests to.
+
+    Returns:
+        set of int:
+        The IDs of the review requests.
+    """
+    from reviewboard.reviews.models import InboxEntry
+
+    queryset = InboxEntry.objects.filter(user__in=user_ids)
+
+    if repository_ids is not None:
+        queryset = queryset.filter(
+            review_request__repository__in=repository_ids)
+
+    return set(queryset.values_list('review_request', flat=True))
+
+
+def _on_review_request_changed(sender, review_request, **kwargs):
+    """Update the inbox when a review request is published or closed.
+
+    Args:
+        sender (type):
+            The sender of the signal.
+
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request that changed.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    if is_inbox_enabled():
+        queue_inbox_update([review_request.pk])
+
+
+def _on_target_people_changed(instance, action, reverse, pk_set, **kwargs):
+    """Update the inbox when the people reviewing a review request change.
+
+    Args:
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import ReviewRequest
+
+    if is_inbox_enabled():
+        change = _get_m2m_change(
+            ReviewRequest._meta.get_field('target_people'),
+            instance, action, reverse, pk_set)
+
+        if change:
+            review_request_ids, user_ids = change
+            queue_inbox_update(review_request_ids, user_ids)
+
+
+def _on_target_groups_changed(instance, action, reverse, pk_set, **kwargs):
+    """Update the inbox when the groups reviewing a review request change.
+
+    Args:
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import ReviewRequest
+
+    if is_inbox_enabled():
+        change = _get_m2m_change(
+            ReviewRequest._meta.get_field('target_groups'),
+            instance, action, reverse, pk_set)
+
+        if change:
+            review_request_ids, group_ids = change
+            queue_inbox_update(review_request_ids,
+                               _get_group_member_ids(group_ids))
+
+
+def _on_starred_review_requests_changed(instance, action, reverse, pk_set,
+                                        **kwargs):
+    """Update the inbox when users star or unstar review requests.
+
+    Args:
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.accounts.models import Profile
+
+    if is_inbox_enabled():
+        change = _get_m2m_change(
+            Profile._meta.get_field('starred_review_requests'),
+            instance, action, reverse, pk_set)
+
+        if change:
+            profile_ids, review_request_ids = change
+            queue_inbox_update(
+                review_request_ids,
+                Profile.objects.filter(pk__in=profile_ids)
+                .values_list('user', flat=True))
+
+
+def _on_group_users_changed(instance, action, reverse, pk_set, **kwargs):
+    """Update the inbox when the members of a group change.
+
+    Args:
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import Group, ReviewRequest
+
+    if is_inbox_enabled():
+        change = _get_m2m_change(Group._meta.get_field('users'),
+                                 instance, action, reverse, pk_set)
+
+        if change:
+            group_ids, user_ids = change
+
+            # Membership affects both the review requests assigned to the
+            # group and access to repositories through the group.
+            review_request_ids = set(
+                ReviewRequest.target_groups.through.objects
+                .filter(group__in=group_ids)
+                .values_list('reviewrequest', flat=True))
+            review_request_ids.update(
+                _get_inbox_review_request_ids(user_ids))
+
+            queue_inbox_update(review_request_ids, user_ids)
+
+
+def _on_repository_users_changed(instance, action, reverse, pk_set,
+                                 **kwargs):
+    """Update the inbox when the users with access to a repository change.
+
+    Args:
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.scmtools.models import Repository
+
+    if is_inbox_enabled():
+        change = _get_m2m_change(Repository._meta.get_field('users'),
+                                 instance, action, reverse, pk_set)
+
+        if change:
+            repository_ids, user_ids = change
+            queue_inbox_update(
+                _get_inbox_review_request_ids(user_ids, repository_ids),
+                user_ids)
+
+
+def _on_repository_groups_changed(instance, action, reverse, pk_set,
+                                  **kwargs):
+    """Update the inbox when the groups with access to a repository change.
+
+    Args:
+        instance (django.db.models.Model):
+            The instance sent with the signal.
+
+        action (unicode):
+            The action sent with the signal.
+
+        reverse (bool):
+            Whether the relation was changed from the reverse side.
+
+        pk_set (set of int):
+            The primary keys of the related objects sent with the signal.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.scmtools.models import Repository
+
+    if is_inbox_enabled():
+        change = _get_m2m_change(Repository._meta.get_field('review_groups'),
+                                 instance, action, reverse, pk_set)
+
+        if change:
+            repository_ids, group_ids = change
+            user_ids = _get_group_member_ids(group_ids)
+            queue_inbox_update(
+                _get_inbox_review_request_ids(user_ids, repository_ids),
+                user_ids)
+
+
+def _on_group_saved(instance, created, update_fields=None, **kwargs):
+    """Update the inbox when a group may have become invite-only.
+
+    Args:
+        instance (reviewboard.reviews.models.Group):
+            The group that was saved.
+
+        created (bool):
+            Whether the group was just created.
+
+        update_fields (frozenset, optional):
+            The fields that were saved, if limited.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import ReviewRequest
+
+    if (not created and
+        (update_fields is None or 'invite_only' in update_fields) and
+        is_inbox_enabled()):
+        queue_inbox_update(
+            ReviewRequest.target_groups.through.objects
+            .filter(group=instance.pk)
+            .values_list('reviewrequest', flat=True))
+
+
+def _on_repository_saved(instance, created, update_fields=None, **kwargs):
+    """Update the inbox when a repository may have become private.
+
+    Args:
+        instance (reviewboard.scmtools.models.Repository):
+            The repository that was saved.
+
+        created (bool):
+            Whether the repository was just created.
+
+        update_fields (frozenset, optional):
+            The fields that were saved, if limited.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import InboxEntry
+
+    if (not created and
+        (update_fields is None or 'public' in update_fields) and
+        is_inbox_enabled()):
+        queue_inbox_update(set(
+            InboxEntry.objects
+            .filter(review_request__repository=instance.pk)
+            .values_list('review_request', flat=True)))
+
+
+def _on_group_deleting(instance, **kwargs):
+    """Record the inbox updates needed once a group is deleted.
+
+    Deleting a group removes it from review requests and repositories
+    without sending :py:data:`~django.db.models.signals.m2m_changed`, so the
+    affected review requests are looked up before it's deleted, and updated
+    afterward.
+
+    Args:
+        instance (reviewboard.reviews.models.Group):
+            The group being deleted.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import ReviewRequest
+
+    if is_inbox_enabled():
+        # Members may also have had access to repositories through the group.
+        user_ids = _get_group_member_ids([instance.pk])
+
+        instance._pending_inbox_updates = [
+            (set(ReviewRequest.target_groups.through.objects
+                 .filter(group=instance.pk)
+                 .values_list('reviewrequest', flat=True)),
+             None),
+            (_get_inbox_review_request_ids(user_ids), user_ids),
+        ]
+
+
+def _on_repository_deleting(instance, **kwargs):
+    """Record the inbox updates needed once a repository is deleted.
+
+    Args:
+        instance (reviewboard.scmtools.models.Repository):
+            The repository being deleted.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    from reviewboard.reviews.models import InboxEntry
+
+    if is_inbox_enabled():
+        instance._pending_inbox_updates = [
+            (set(InboxEntry.objects
+                 .filter(review_request__repository=instance.pk)
+                 .values_list('review_request', flat=True)),
+             None),
+        ]
+
+
+def _on_deleted(instance, **kwargs):
+    """Update the inbox after a group or repository is deleted.
+
+    This applies the updates recorded by :py:func:`_on_group_deleting` or
+    :py:func:`_on_repository_deleting`.
+
+    Args:
+        instance (django.db.models.Model):
+            The group or repository that was deleted.
+
+        **kwargs (dict):
+            Additional keyword arguments from the signal.
+    """
+    pending_updates = getattr(instance, '_pending_inbox_updates', None)
+
+    if pending_updates:
+        del instance._pending_inbox_updates
+
+        with batch_inbox_updates():
+            for review_request_ids, user_ids in pending_updates:
+                queue_inbox_update(review_request_ids, user_ids)
+
+
+def connect_signals():
+    """Connect the signal handlers that maintain the dashboard inbox."""
+    from reviewboard.accounts.models import Profile
+    from reviewboard.reviews.models import Group, ReviewRequest
+    from reviewboard.reviews.signals import (review_request_closed,
+                                             review_request_published,
+                                             review_request_reopened)
+    from reviewboard.scmtools.models import Repository
+
+    for signal in (review_request_closed,
+                   review_request_published,
+                   review_request_reopened):
+        signal.connect(_on_review_request_changed, sender=ReviewRequest)
+
+    for through, handler in (
+            (ReviewRequest.target_people.through, _on_target_people_changed),
+            (ReviewRequest.target_groups.through, _on_target_groups_changed),
+            (Profile.starred_review_requests.through,
+             _on_starred_review_requests_changed),
+            (Group.users.through, _on_group_users_changed),
+            (Repository.users.through, _on_repository_users_changed),
+            (Repository.review_groups.through,
+             _on_repository_groups_changed)):
+        m2m_changed.connect(handler, sender=through)
+
+    post_save.connect(_on_group_saved, sender=Group)
+    post_save.connect(_on_repository_saved, sender=Repository)
+
+    pre_delete.connect(_on_group_deleting, sender=Group)
+    pre_delete.connect(_on_repository_deleting, sender=Repository)
+
+    for sender in (Group, Repository):
+        post_delete.connect(_on_deleted, sender=sender)
@@ -0,0 +1,13 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import NoArgsCommand
+
+from reviewboard.reviews.inbox import rebuild_inbox
+
+
+class Command(NoArgsCommand):
+    help = ('Rebuilds the dashboard inbox of every user. This is needed '
+            'after enabling dashboard inboxes.')
+
+    def handle_noargs(self, **options):
+        rebuild_inbox()
@@ -0,0 +1,21 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import NoArgsCommand
+from django.utils import six
+
+from reviewboard.accounts.admin import reconcile_review_counts
+
+
+class Command(NoArgsCommand):
+    help = ('Recomputes all review request-related counters, fixing and '
+            'reporting any that are incorrect.')
+
+    def handle_noargs(self, **options):
+        fixed = reconcile_review_counts()
+
+        if not fixed:
+            self.stdout.write('All counters are correct.\n')
+            return
+
+        for key, count in sorted(six.iteritems(fixed)):
+            self.stdout.write('Fixed %s on %d object(s)\n' % (key, count))
@@ -323,6 +323,57 @@ class ReviewRequestManager(ConcurrencyManager):
             extra_query=self.get_from_user_query(user_or_username),
             *args, **kwargs)
 
+    def inbox(self, user, reasons=None, status='P', local_site=None,
+              accessible_only=False):
+        """Return the review requests in a user's dashboard inbox.
+
+        This looks up the review requests using the
+        :py:class:`~reviewboard.reviews.models.InboxEntry` rows maintained
+        for the user, which must be enabled through the
+        ``dashboard_inbox_enabled`` setting.
+
+        Args:
+            user (django.contrib.auth.models.User):
+                The user owning the inbox.
+
+            reasons (list of unicode, optional):
+                The reasons for review requests being in the inbox to
+                include. If not provided, all are included.
+
+            status (unicode, optional):
+                The status of review requests to include, or ``None`` for
+                all statuses.
+
+            local_site (reviewboard.site.models.LocalSite, optional):
+                The LocalSite to include review requests from.
+
+            accessible_only (bool, optional):
+                Whether to only include review requests the user can access.
+
+        Returns:
+            ReviewRequestQuerySet:
+            The review requests in the inbox.
+        """
+        from reviewboard.reviews.models import InboxEntry
+
+        entries = InboxEntry.objects.filter(user=user)
+
+        if reasons:
+            entries = entries.filter(reason__in=reasons)
+
+        if accessible_only and not user.is_superuser:
+            entries = entries.filter(is_accessible=True)
+
+        query = (Q(pk__in=entries.values('review_request')) &
+                 (Q(public=True) | Q(submitter=user)) &
+                 Q(submitter__is_active=True) &
+                 Q(local_site=local_site))
+
+        if status:
+            query = query & Q(status=status)
+
+        return self.filter(query)
+
     def _query(self, user=None, status='P', with_counts=False,
                extra_query=None, local_site=None, filter_private=False,
                show_inactive=False, show_all_unpublished=False,
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import hashlib
 import warnings
 
 import pymdownx.emoji
@@ -10,6 +11,8 @@ from djblets import markdown as djblets_markdown
 from djblets.siteconfig.models import SiteConfiguration
 from markdown import markdown
 
+from reviewboard.cache.local import local_cache_memoize
+
 
 # Keyword arguments used when calling a Markdown renderer function.
 #
@@ -223,11 +226,17 @@ def render_markdown(text):
 
     The Markdown text will be sanitized to prevent injecting custom HTML.
     It will also enable a few plugins for code highlighting and sane lists.
+
+    The rendered HTML is kept in the in-process cache (see
+    :py:mod:`reviewboard.cache.local`), keyed by a hash of the text, since
+    the same text is often rendered many times.
     """
     if isinstance(text, bytes):
         text = text.decode('utf-8')
 
-    return markdown(text, **MARKDOWN_KWARGS)
+    return local_cache_memoize(
+        'markdown-html:%s' % hashlib.sha1(text.encode('utf-8')).hexdigest(),
+        lambda: markdown(text, **MARKDOWN_KWARGS))
 
 
 def render_markdown_from_file(f):
@@ -7,6 +7,7 @@ from reviewboard.reviews.models.file_attachment_comment import \
     FileAttachmentComment
 from reviewboard.reviews.models.general_comment import GeneralComment
 from reviewboard.reviews.models.group import Group
+from reviewboard.reviews.models.inbox_entry import InboxEntry
 from reviewboard.reviews.models.review import Review
 from reviewboard.reviews.models.review_request import ReviewRequest
 from reviewboard.reviews.models.review_request_draft import ReviewRequestDraft
@@ -22,6 +23,7 @@ __all__ = [
     'FileAttachmentComment',
     'GeneralComment',
     'Group',
+    'InboxEntry',
     'Review',
     'ReviewRequest',
     'ReviewRequestDraft',
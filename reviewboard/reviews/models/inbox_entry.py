@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext_lazy as _
+
+from reviewboard.reviews.models.review_request import ReviewRequest
+
+
+@python_2_unicode_compatible
+class InboxEntry(models.Model):
+    """A review request in a user's dashboard inbox.
+
+    This is a denormalized record of why a review request shows up in a
+    user's incoming dashboard views, letting the dashboard look up a user's
+    review requests directly instead of computing them from the review
+    request's reviewers, the user's groups, and the user's starred review
+    requests on every load.
+
+    A review request can be in a user's inbox for several reasons, with one
+    entry for each.
+
+    Entries are only maintained while the ``dashboard_inbox_enabled`` setting
+    is on. See :py:mod:`reviewboard.reviews.inbox`.
+    """
+
+    #: The user was listed directly as a reviewer.
+    REASON_DIRECT = 'D'
+
+    #: A group the user belongs to was listed as a reviewer.
+    REASON_GROUP = 'G'
+
+    #: The user starred the review request.
+    REASON_STARRED = 'S'
+
+    REASON_CHOICES = (
+        (REASON_DIRECT, _('Direct')),
+        (REASON_GROUP, _('Group')),
+        (REASON_STARRED, _('Starred')),
+    )
+
+    user = models.ForeignKey(User, related_name='inbox_entries')
+    review_request = models.ForeignKey(ReviewRequest,
+                                       related_name='inbox_entries')
+    reason = models.CharField(max_length=1, choices=REASON_CHOICES)
+
+    #: Whether the user can access the review request.
+    #:
+    #: This caches the repository and review group access checks. It doesn't
+    #: account for superusers, who can access everything.
+    is_accessible = models.BooleanField(default=True)
+
+    def __str__(self):
+        return '%s: %s (%s)' % (self.user, self.review_request_id,
+                                self.get_reason_display())
+
+    class Meta:
+        app_label = 'reviews'
+        db_table = 'reviews_inboxentry'
+        unique_together = ('user', 'review_request', 'reason')
+        verbose_name = _('Inbox Entry')
+        verbose_name_plural = _('Inbox Entries')
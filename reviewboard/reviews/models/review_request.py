@@ -18,9 +18,11 @@ from reviewboard.attachments.models import (FileAttachment,
                                             FileAttachmentHistory)
 from reviewboard.changedescs.models import ChangeDescription
 from reviewboard.diffviewer.models import DiffSet, DiffSetHistory
+from reviewboard.reviews.counters import batch_counter_updates
 from reviewboard.reviews.errors import (PermissionError,
                                         PublishError)
 from reviewboard.reviews.fields import get_review_request_field
+from reviewboard.reviews.inbox import batch_inbox_updates
 from reviewboard.reviews.managers import ReviewRequestManager
 from reviewboard.reviews.models.base_comment import BaseComment
 from reviewboard.reviews.models.base_review_request_details import \
@@ -714,29 +716,25 @@ class ReviewRequest(BaseReviewRequestDetails):
         super(ReviewRequest, self).save(**kwargs)
 
     def delete(self, **kwargs):
-        from reviewboard.accounts.models import Profile, LocalSiteProfile
-
-        profile, profile_is_new = \
-            Profile.objects.get_or_create(user=self.submitter)
-
-        if profile_is_new:
-            profile.save()
+        from reviewboard.accounts.models import LocalSiteProfile
 
-        local_site = self.local_site
-        site_profile, site_profile_is_new = \
-            LocalSiteProfile.objects.get_or_create(user=self.submitter,
-                                                   profile=profile,
-                                                   local_site=local_site)
+        with batch_counter_updates() as counter_updates:
+            site_profile = self._get_submitter_site_profile()[0]
+            site_profile_ids = [site_profile.pk]
 
-        site_profile.decrement_total_outgoing_request_count()
+            counter_updates.add(LocalSiteProfile,
+                                'total_outgoing_request_count',
+                                site_profile_ids, -1)
 
-        if self.status == self.PENDING_REVIEW:
-            site_profile.decrement_pending_outgoing_request_count()
+            if self.status == self.PENDING_REVIEW:
+                counter_updates.add(LocalSiteProfile,
+                                    'pending_outgoing_request_count',
+                                    site_profile_ids, -1)
 
-            if self.public:
-                self._decrement_reviewer_counts()
+                if self.public:
+                    self._decrement_reviewer_counts()
 
-        super(ReviewRequest, self).delete(**kwargs)
+            super(ReviewRequest, self).delete(**kwargs)
 
     def can_publish(self):
         return not self.public or get_object_or_none(self.draft) is not None
@@ -937,38 +935,41 @@ class ReviewRequest(BaseReviewRequestDetails):
         # and groups will be updated with new values.
         # Decrement should not happen while publishing
         # a new request or a discarded request
-        if self.public:
-            self._decrement_reviewer_counts()
-
-        if draft is not None:
-            # This will in turn save the review request, so we'll be done.
-            try:
-                changes = draft.publish(self, send_notification=False,
-                                        user=user)
-            except Exception:
-                # The draft failed to publish, for one reason or another.
-                # Check if we need to re-increment those counters we
-                # previously decremented.
+        #
+        # The counter changes are applied together once the review request
+        # is saved, so reviewers who are still on the review request won't
+        # have their counters changed at all.
+        #
+        # Updates to the dashboard inbox are likewise applied once, after
+        # all the reviewers have been changed.
+        with batch_inbox_updates():
+            with batch_counter_updates():
                 if self.public:
-                    self._increment_reviewer_counts()
-
-                raise
-
-            draft.delete()
-        else:
-            changes = None
+                    self._decrement_reviewer_counts()
+
+                if draft is not None:
+                    # This will in turn save the review request, so we'll be
+                    # done. If this fails, the counter changes will be
+                    # discarded.
+                    changes = draft.publish(self, send_notification=False,
+                                            user=user)
+                    draft.delete()
+                else:
+                    changes = None
 
-        if not self.public and self.changedescs.count() == 0:
-            # This is a brand new review request that we're publishing
-            # for the first time. Set the creation timestamp to now.
-            self.time_added = timezone.now()
+                if not self.public and self.changedescs.count() == 0:
+                    # This is a brand new review request that we're
+                    # publishing for the first time. Set the creation
+                    # timestamp to now.
+                    self.time_added = timezone.now()
 
-        self.public = True
-        self.save(update_counts=True, old_submitter=old_submitter)
+                self.public = True
+                self.save(update_counts=True, old_submitter=old_submitter)
 
-        review_request_published.send(sender=self.__class__, user=user,
-                                      review_request=self, trivial=trivial,
-                                      changedesc=changes)
+            review_request_published.send(sender=self.__class__, user=user,
+                                          review_request=self,
+                                          trivial=trivial,
+                                          changedesc=changes)
 
     def determine_user_for_changedesc(self, changedesc):
         """Determine the user associated with the change description.
@@ -1003,11 +1004,16 @@ class ReviewRequest(BaseReviewRequestDetails):
 
         return self.submitter
 
-    def _update_counts(self, old_submitter):
-        from reviewboard.accounts.models import Profile, LocalSiteProfile
+    def _get_submitter_site_profile(self):
+        """Return the submitter's LocalSiteProfile, creating it if needed.
 
-        submitter_changed = (old_submitter is not None and
-                             old_submitter != self.submitter)
+        Returns:
+            tuple:
+            A 2-tuple containing the
+            :py:class:`~reviewboard.accounts.models.LocalSiteProfile` and
+            whether it was just created.
+        """
+        from reviewboard.accounts.models import Profile, LocalSiteProfile
 
         profile, profile_is_new = \
             Profile.objects.get_or_create(user=self.submitter)
@@ -1015,99 +1021,158 @@ class ReviewRequest(BaseReviewRequestDetails):
         if profile_is_new:
             profile.save()
 
-        local_site = self.local_site
         site_profile, site_profile_is_new = \
             LocalSiteProfile.objects.get_or_create(
                 user=self.submitter,
                 profile=profile,
-                local_site=local_site)
+                local_site=self.local_site)
 
         if site_profile_is_new:
             site_profile.save()
 
+        return site_profile, site_profile_is_new
+
+    def _update_counts(self, old_submitter):
+        with batch_counter_updates() as counter_updates:
+            self._queue_count_updates(counter_updates, old_submitter)
+
+    def _queue_count_updates(self, counter_updates, old_submitter):
+        """Queue updates to counters for a change in state.
+
+        Args:
+            counter_updates (reviewboard.reviews.counters.CounterUpdates):
+                The batch of counter updates to add to.
+
+            old_submitter (django.contrib.auth.models.User):
+                The previous submitter of the review request, if the
+                submitter may have changed.
+        """
+        from reviewboard.accounts.models import LocalSiteProfile
+
+        submitter_changed = (old_submitter is not None and
+                             old_submitter != self.submitter)
+
+        site_profile, site_profile_is_new = self._get_submitter_site_profile()
+        site_profile_ids = [site_profile.pk]
+
         if self.id is None:
             # This hasn't been created yet. Bump up the outgoing request
             # count for the user.
-            site_profile.increment_total_outgoing_request_count()
+            counter_updates.add(LocalSiteProfile,
+                                'total_outgoing_request_count',
+                                site_profile_ids, 1)
             old_status = None
             old_public = False
         else:
             # We need to see if the status has changed, so that means
             # finding out what's in the database.
-            r = ReviewRequest.objects.get(pk=self.id)
-            old_status = r.status
-            old_public = r.public
+            old_status, old_public = (
+                ReviewRequest.objects
+                .filter(pk=self.id)
+                .values_list('status', 'public')
+                .get()
+            )
 
             if submitter_changed:
                 if not site_profile_is_new:
-                    site_profile.increment_total_outgoing_request_count()
+                    counter_updates.add(LocalSiteProfile,
+                                        'total_outgoing_request_count',
+                                        site_profile_ids, 1)
 
                     if self.status == self.PENDING_REVIEW:
-                        site_profile.increment_pending_outgoing_request_count()
-
-                try:
-                    old_profile = LocalSiteProfile.objects.get(
-                        user=old_submitter, local_site=local_site)
-                    old_profile.decrement_total_outgoing_request_count()
-
-                    if old_status == self.PENDING_REVIEW:
-                        old_profile.decrement_pending_outgoing_request_count()
-                except LocalSiteProfile.DoesNotExist:
-                    pass
+                        counter_updates.add(LocalSiteProfile,
+                                            'pending_outgoing_request_count',
+                                            site_profile_ids, 1)
+
+                old_site_profile_ids = list(
+                    LocalSiteProfile.objects
+                    .filter(user=old_submitter, local_site=self.local_site)
+                    .values_list('pk', flat=True))
+                counter_updates.add(LocalSiteProfile,
+                                    'total_outgoing_request_count',
+                                    old_site_profile_ids, -1)
+
+                if old_status == self.PENDING_REVIEW:
+                    counter_updates.add(LocalSiteProfile,
+                                        'pending_outgoing_request_count',
+                                        old_site_profile_ids, -1)
 
         if self.status == self.PENDING_REVIEW:
             if old_status != self.status and not submitter_changed:
-                site_profile.increment_pending_outgoing_request_count()
+                counter_updates.add(LocalSiteProfile,
+                                    'pending_outgoing_request_count',
+                                    site_profile_ids, 1)
 
             if self.public and self.id is not None:
                 self._increment_reviewer_counts()
         elif old_status == self.PENDING_REVIEW:
             if old_status != self.status and not submitter_changed:
-                site_profile.decrement_pending_outgoing_request_count()
+                counter_updates.add(LocalSiteProfile,
+                                    'pending_outgoing_request_count',
+                                    site_profile_ids, -1)
 
             if old_public:
                 self._decrement_reviewer_counts()
 
     def _increment_reviewer_counts(self):
-        from reviewboard.accounts.models import LocalSiteProfile
-
-        groups = self.target_groups.all()
-        people = self.target_people.all()
-
-        Group.incoming_request_count.increment(groups)
-        LocalSiteProfile.direct_incoming_request_count.increment(
-            LocalSiteProfile.objects.filter(user__in=people,
-                                            local_site=self.local_site))
-        LocalSiteProfile.total_incoming_request_count.increment(
-            LocalSiteProfile.objects.filter(
-                Q(local_site=self.local_site) &
-                Q(Q(user__review_groups__in=groups) |
-                  Q(user__in=people))))
-        LocalSiteProfile.starred_public_request_count.increment(
-            LocalSiteProfile.objects.filter(
-                profile__starred_review_requests=self,
-                local_site=self.local_site))
+        self._update_reviewer_counts(1)
 
     def _decrement_reviewer_counts(self):
+        self._update_reviewer_counts(-1)
+
+    def _update_reviewer_counts(self, delta):
+        """Update the incoming and starred counts for reviewers.
+
+        This looks up the groups and users affected right away, and queues
+        the changes in the current batch of counter updates.
+
+        Args:
+            delta (int):
+                The amount to add to each counter.
+        """
         from reviewboard.accounts.models import LocalSiteProfile
 
-        groups = self.target_groups.all()
-        people = self.target_people.all()
-
-        Group.incoming_request_count.decrement(groups)
-        LocalSiteProfile.direct_incoming_request_count.decrement(
-            LocalSiteProfile.objects.filter(
-                user__in=people,
-                local_site=self.local_site))
-        LocalSiteProfile.total_incoming_request_count.decrement(
-            LocalSiteProfile.objects.filter(
-                Q(local_site=self.local_site) &
-                Q(Q(user__review_groups__in=groups) |
-                  Q(user__in=people))))
-        LocalSiteProfile.starred_public_request_count.decrement(
-            LocalSiteProfile.objects.filter(
-                profile__starred_review_requests=self,
-                local_site=self.local_site))
+        with batch_counter_updates() as counter_updates:
+            group_ids = list(self.target_groups.values_list('pk', flat=True))
+            people_ids = set(self.target_people.values_list('pk', flat=True))
+
+            counter_updates.add(Group, 'incoming_request_count', group_ids,
+                                delta)
+
+            if group_ids or people_ids:
+                reviewers_q = Q(user__in=people_ids)
+
+                if group_ids:
+                    reviewers_q |= Q(user__review_groups__in=group_ids)
+
+                direct_ids = []
+                total_ids = []
+
+                for site_profile_id, user_id in (
+                        LocalSiteProfile.objects
+                        .filter(Q(local_site=self.local_site) & reviewers_q)
+                        .values_list('pk', 'user_id')
+                        .distinct()):
+                    total_ids.append(site_profile_id)
+
+                    if user_id in people_ids:
+                        direct_ids.append(site_profile_id)
+
+                counter_updates.add(LocalSiteProfile,
+                                    'direct_incoming_request_count',
+                                    direct_ids, delta)
+                counter_updates.add(LocalSiteProfile,
+                                    'total_incoming_request_count',
+                                    total_ids, delta)
+
+            counter_updates.add(
+                LocalSiteProfile,
+                'starred_public_request_count',
+                LocalSiteProfile.objects
+                .filter(profile__starred_review_requests=self,
+                        local_site=self.local_site)
+                .values_list('pk', flat=True),
+                delta)
 
     def _calculate_approval(self):
         """Calculates the approval information for the review request."""
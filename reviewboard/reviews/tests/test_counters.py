@@ -1,9 +1,15 @@
 from __future__ import unicode_literals
 
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.six.moves import cStringIO as StringIO
 from kgb import SpyAgency
 
+from reviewboard.accounts.admin import reconcile_review_counts
 from reviewboard.accounts.models import Profile, LocalSiteProfile
+from reviewboard.reviews.counters import batch_counter_updates
 from reviewboard.reviews.errors import NotModifiedError
 from reviewboard.reviews.models import (Group, ReviewRequest,
                                         ReviewRequestDraft)
@@ -550,6 +556,76 @@ class ReviewRequestCounterTests(SpyAgency, TestCase):
         self._check_counters_on_profile(site_profile, total_outgoing=1,
                                         pending_outgoing=1)
 
+    def test_republish_without_reviewer_changes(self):
+        """Testing counters when republishing without changing reviewers
+        doesn't update the reviewers' counters
+        """
+        draft = ReviewRequestDraft.create(self.review_request)
+        draft.target_groups.add(self.group)
+        draft.target_people.add(self.user)
+        self.review_request.publish(self.user)
+
+        draft = ReviewRequestDraft.create(self.review_request)
+        draft.summary = 'New summary'
+        draft.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.review_request.publish(self.user)
+
+        for query in ctx.captured_queries:
+            sql = query['sql']
+
+            if sql.startswith('UPDATE'):
+                self.assertNotIn(LocalSiteProfile._meta.db_table, sql)
+                self.assertNotIn(Group._meta.db_table, sql)
+
+        self._check_counters(total_outgoing=1,
+                             pending_outgoing=1,
+                             direct_incoming=1,
+                             total_incoming=1,
+                             starred_public=1,
+                             group_incoming=1)
+
+    def test_reconcile_review_counts(self):
+        """Testing reconcile_review_counts fixes drifted counters"""
+        draft = ReviewRequestDraft.create(self.review_request)
+        draft.target_groups.add(self.group)
+        self.review_request.publish(self.user)
+
+        LocalSiteProfile.objects.filter(pk=self.site_profile.pk).update(
+            total_incoming_request_count=5)
+        Group.objects.filter(pk=self.group.pk).update(
+            incoming_request_count=3)
+
+        self.assertEqual(
+            reconcile_review_counts(),
+            {
+                'LocalSiteProfile.total_incoming_request_count': 1,
+                'Group.incoming_request_count': 1,
+            })
+        self._check_counters(total_outgoing=1,
+                             pending_outgoing=1,
+                             total_incoming=1,
+                             starred_public=1,
+                             group_incoming=1)
+
+        # Everything is now correct.
+        self.assertEqual(reconcile_review_counts(), {})
+
+    def test_reconcilereviewcounts_command(self):
+        """Testing the reconcilereviewcounts management command"""
+        LocalSiteProfile.objects.filter(pk=self.site_profile.pk).update(
+            pending_outgoing_request_count=4)
+
+        stdout = StringIO()
+        call_command('reconcilereviewcounts', stdout=stdout)
+
+        self.assertEqual(
+            stdout.getvalue(),
+            'Fixed LocalSiteProfile.pending_outgoing_request_count on '
+            '1 object(s)\n')
+        self._check_counters(total_outgoing=1, pending_outgoing=1)
+
     def _check_counters(self, total_outgoing=0, pending_outgoing=0,
                         direct_incoming=0, total_incoming=0,
                         starred_public=0, group_incoming=0,
@@ -648,3 +724,94 @@ class ReviewRequestCounterTests(SpyAgency, TestCase):
 
     def _raise_publish_error(self, *args, **kwargs):
         raise NotModifiedError()
+
+
+class BatchCounterUpdatesTests(TestCase):
+    """Unit tests for reviewboard.reviews.counters.batch_counter_updates."""
+
+    def setUp(self):
+        super(BatchCounterUpdatesTests, self).setUp()
+
+        self.group1 = Group.objects.create(name='group1',
+                                           incoming_request_count=1)
+        self.group2 = Group.objects.create(name='group2',
+                                           incoming_request_count=1)
+
+    def test_applies_on_exit(self):
+        """Testing batch_counter_updates applies changes on exit"""
+        with batch_counter_updates() as updates:
+            updates.add(Group, 'incoming_request_count',
+                        [self.group1.pk, self.group2.pk], 2)
+
+            with self.assertNumQueries(0):
+                updates.add(Group, 'incoming_request_count',
+                            [self.group1.pk], -1)
+
+        self._check_counts(2, 3)
+
+    def test_coalesces_updates(self):
+        """Testing batch_counter_updates combines objects with the same
+        changes into one update, and skips changes that cancel out
+        """
+        group3 = Group.objects.create(name='group3',
+                                      incoming_request_count=1)
+
+        with self.assertNumQueries(1):
+            with batch_counter_updates() as updates:
+                updates.add(Group, 'incoming_request_count',
+                            [self.group1.pk, self.group2.pk, group3.pk], -1)
+                updates.add(Group, 'incoming_request_count',
+                            [self.group1.pk, self.group2.pk, group3.pk], 1)
+                updates.add(Group, 'incoming_request_count',
+                            [self.group1.pk, self.group2.pk], 1)
+
+        self._check_counts(2, 2)
+        self.assertEqual(
+            Group.objects.get(pk=group3.pk).incoming_request_count, 1)
+
+    def test_nested(self):
+        """Testing batch_counter_updates with nested batches applies changes
+        when the outermost batch exits
+        """
+        with batch_counter_updates() as updates:
+            with batch_counter_updates() as inner_updates:
+                self.assertIs(inner_updates, updates)
+                inner_updates.add(Group, 'incoming_request_count',
+                                  [self.group1.pk], 1)
+
+            self._check_counts(1, 1)
+
+        self._check_counts(2, 1)
+
+    def test_discards_on_exception(self):
+        """Testing batch_counter_updates discards changes on exception"""
+        with self.assertRaises(ValueError):
+            with batch_counter_updates() as updates:
+                updates.add(Group, 'incoming_request_count',
+                            [self.group1.pk], 1)
+                raise ValueError
+
+        self._check_counts(1, 1)
+
+        # A new batch starts fresh.
+        with batch_counter_updates() as updates:
+            updates.add(Group, 'incoming_request_count', [self.group2.pk], 1)
+
+        self._check_counts(1, 2)
+
+    def _check_counts(self, group1_count, group2_count):
+        """Check the incoming request counts on the groups.
+
+        Args:
+            group1_count (int):
+                The expected count on the first group.
+
+            group2_count (int):
+                The expected count on the second group.
+        """
+        self.assertEqual(
+            Group.objects.get(pk=self.group1.pk).incoming_request_count,
+            group1_count)
+        self.assertEqual(
+            Group.objects.get(pk=self.group2.pk).incoming_request_count,
+            group2_count)
@@ -0,0 +1,326 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from djblets.siteconfig.models import SiteConfiguration
+from djblets.testing.decorators import add_fixtures
+from kgb import SpyAgency
+
+from reviewboard.accounts.models import Profile
+from reviewboard.reviews import inbox
+from reviewboard.reviews.inbox import (batch_inbox_updates, queue_inbox_update,
+                                       rebuild_inbox)
+from reviewboard.reviews.models import (InboxEntry, ReviewRequest,
+                                        ReviewRequestDraft)
+from reviewboard.testing import TestCase
+
+
+class InboxTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.reviews.inbox."""
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(InboxTests, self).setUp()
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('dashboard_inbox_enabled', True)
+        siteconfig.save()
+
+        self.user = User.objects.get(username='grumpy')
+        self.group = self.create_review_group()
+        self.group.users.add(User.objects.get(username='dopey'))
+
+    def tearDown(self):
+        super(InboxTests, self).tearDown()
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('dashboard_inbox_enabled', False)
+        siteconfig.save()
+
+    def test_publish(self):
+        """Testing dashboard inbox entries after publishing a review request"""
+        review_request = self._create_review_request()
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    def test_publish_removes_reviewers(self):
+        """Testing dashboard inbox entries after publishing a review request
+        with reviewers removed
+        """
+        review_request = self._create_review_request()
+
+        draft = ReviewRequestDraft.create(review_request)
+        draft.target_people.clear()
+        review_request.publish(review_request.submitter)
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    def test_publish_updates_once(self):
+        """Testing dashboard inbox updates are combined when publishing"""
+        review_request = self._create_review_request()
+
+        draft = ReviewRequestDraft.create(review_request)
+        draft.target_people.clear()
+        draft.target_groups.clear()
+
+        self.spy_on(inbox._update_inbox_entries_batch)
+        review_request.publish(review_request.submitter)
+
+        self.assertEqual(len(inbox._update_inbox_entries_batch.calls), 1)
+        self.assertEqual(self._get_entries(review_request), set())
+
+    def test_disabled(self):
+        """Testing dashboard inbox entries aren't added when disabled"""
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('dashboard_inbox_enabled', False)
+        siteconfig.save()
+
+        review_request = self._create_review_request()
+
+        self.assertEqual(self._get_entries(review_request), set())
+
+    def test_star(self):
+        """Testing dashboard inbox entries after starring and unstarring"""
+        review_request = self._create_review_request()
+        profile = Profile.objects.get_or_create(user=self.user)[0]
+
+        profile.star_review_request(review_request)
+        self.assertIn(('grumpy', InboxEntry.REASON_STARRED, True),
+                      self._get_entries(review_request))
+
+        profile.unstar_review_request(review_request)
+        self.assertNotIn(('grumpy', InboxEntry.REASON_STARRED, True),
+                         self._get_entries(review_request))
+
+    def test_group_membership(self):
+        """Testing dashboard inbox entries after group membership changes"""
+        review_request = self._create_review_request()
+
+        self.group.users.add(self.user)
+        self.assertIn(('grumpy', InboxEntry.REASON_GROUP, True),
+                      self._get_entries(review_request))
+
+        self.user.review_groups.clear()
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    def test_invite_only_group(self):
+        """Testing dashboard inbox entries with invite-only groups"""
+        review_request = self._create_review_request()
+        profile = Profile.objects.get_or_create(
+            user=User.objects.get(username='doc'))[0]
+        profile.star_review_request(review_request)
+
+        self.group.invite_only = True
+        self.group.save()
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+                ('doc', InboxEntry.REASON_STARRED, True),
+            ]))
+
+        # Users other than the submitter only have access through the group.
+        review_request.submitter = User.objects.get(username='admin')
+        review_request.save()
+        inbox.update_inbox_entries([review_request.pk])
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+                ('doc', InboxEntry.REASON_STARRED, False),
+            ]))
+
+        self.group.users.add(profile.user)
+        self.assertIn(('doc', InboxEntry.REASON_STARRED, True),
+                      self._get_entries(review_request))
+
+    def test_private_repository(self):
+        """Testing dashboard inbox entries with private repositories"""
+        repository = self.create_repository(public=False)
+        review_request = self._create_review_request(repository=repository)
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, False),
+                ('dopey', InboxEntry.REASON_GROUP, False),
+            ]))
+
+        repository.users.add(self.user)
+        repository.review_groups.add(self.group)
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+        repository.public = True
+        repository.save()
+        repository.users.clear()
+        repository.review_groups.clear()
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    def test_delete_group(self):
+        """Testing dashboard inbox entries after deleting a group"""
+        review_request = self._create_review_request()
+
+        self.group.delete()
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+            ]))
+
+    def test_delete_group_with_repository_access(self):
+        """Testing dashboard inbox entries after deleting a group that gave
+        access to a private repository
+        """
+        repository = self.create_repository(public=False)
+        repository.review_groups.add(self.group)
+
+        access_group = self.create_review_group(name='access-group')
+        access_group.users.add(self.user)
+        repository.review_groups.add(access_group)
+
+        review_request = self._create_review_request(repository=repository)
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+        access_group.delete()
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, False),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    def test_batch_inbox_updates(self):
+        """Testing batch_inbox_updates combines updates"""
+        review_request = self._create_review_request()
+        InboxEntry.objects.all().delete()
+
+        self.spy_on(inbox._update_inbox_entries_batch)
+
+        with batch_inbox_updates():
+            queue_inbox_update([review_request.pk], [self.user.pk])
+            queue_inbox_update([review_request.pk])
+            queue_inbox_update([review_request.pk], [self.user.pk])
+
+            self.assertEqual(self._get_entries(review_request), set())
+
+        self.assertEqual(len(inbox._update_inbox_entries_batch.calls), 1)
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    def test_rebuild_inbox(self):
+        """Testing rebuild_inbox"""
+        review_request = self._create_review_request()
+        InboxEntry.objects.all().delete()
+        InboxEntry.objects.create(user=User.objects.get(username='doc'),
+                                  review_request=review_request,
+                                  reason=InboxEntry.REASON_DIRECT)
+
+        rebuild_inbox()
+
+        self.assertEqual(
+            self._get_entries(review_request),
+            set([
+                ('grumpy', InboxEntry.REASON_DIRECT, True),
+                ('dopey', InboxEntry.REASON_GROUP, True),
+            ]))
+
+    @add_fixtures(['test_site'])
+    def test_inbox_query(self):
+        """Testing ReviewRequestManager.inbox"""
+        review_request1 = self._create_review_request()
+        review_request2 = self._create_review_request()
+        self._create_review_request(with_local_site=True)
+        review_request2.close(ReviewRequest.SUBMITTED)
+
+        self.assertEqual(list(ReviewRequest.objects.inbox(self.user)),
+                         [review_request1])
+        self.assertEqual(
+            list(ReviewRequest.objects.inbox(self.user, status=None)
+                 .order_by('pk')),
+            [review_request1, review_request2])
+        self.assertEqual(
+            list(ReviewRequest.objects.inbox(
+                self.user, reasons=[InboxEntry.REASON_GROUP])),
+            [])
+
+    def _create_review_request(self, **kwargs):
+        """Create a published review request with reviewers.
+
+        The review request is assigned to "grumpy" and to the test group.
+
+        Args:
+            **kwargs (dict):
+                Keyword arguments to pass to
+                :py:meth:`~reviewboard.testing.testcase.TestCase.
+                create_review_request`.
+
+        Returns:
+            reviewboard.reviews.models.ReviewRequest:
+            The new review request.
+        """
+        review_request = self.create_review_request(**kwargs)
+
+        draft = ReviewRequestDraft.create(review_request)
+        draft.target_people.add(self.user)
+        draft.target_groups.add(self.group)
+        review_request.publish(review_request.submitter)
+
+        return review_request
+
+    def _get_entries(self, review_request):
+        """Return the inbox entries for a review request.
+
+        Args:
+            review_request (reviewboard.reviews.models.ReviewRequest):
+                The review request.
+
+        Returns:
+            set of tuple:
+            A set of (username, reason, is_accessible) tuples.
+        """
+        return set(
+            InboxEntry.objects
+            .filter(review_request=review_request)
+            .values_list('user__username', 'reason', 'is_accessible'))
@@ -6,7 +6,9 @@ from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
+from kgb import SpyAgency
 
+from reviewboard.diffviewer.diffutils import populate_diff_chunks
 from reviewboard.extensions.tests import TestService
 from reviewboard.hostingsvcs.service import (register_hosting_service,
                                              unregister_hosting_service)
@@ -1192,7 +1194,7 @@ class ViewTests(TestCase):
         return None
 
 
-class CommentDiffFragmentsViewTests(TestCase):
+class CommentDiffFragmentsViewTests(SpyAgency, TestCase):
     """Unit tests for the comment_diff_fragments view."""
 
     fixtures = ['test_users', 'test_scmtools']
@@ -1448,6 +1450,71 @@ class CommentDiffFragmentsViewTests(TestCase):
             % (review_request1.pk, comment.pk))
         self.assertEqual(response.status_code, 404)
 
+    def test_get_with_comments_on_multiple_files(self):
+        """Testing comment_diff_fragments populates the chunks for all
+        commented files together
+        """
+        user = User.objects.create(username='reviewer')
+
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        filediff1 = self.create_filediff(diffset, source_file='/README1',
+                                         dest_file='/README1')
+        filediff2 = self.create_filediff(diffset, source_file='/README2',
+                                         dest_file='/README2')
+
+        review = self.create_review(review_request, user=user)
+        comment1 = self.create_diff_comment(review, filediff1)
+        comment2 = self.create_diff_comment(review, filediff2)
+        comment3 = self.create_diff_comment(review, filediff1)
+        review.publish()
+
+        self.spy_on(populate_diff_chunks)
+
+        response = self.client.get(
+            '/r/%d/fragments/diff-comments/%d,%d,%d/'
+            % (review_request.pk, comment1.pk, comment2.pk, comment3.pk))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['comment_entries']), 3)
+
+        files = populate_diff_chunks.calls[0].args[0]
+        self.assertEqual(
+            sorted(f['filediff'].pk for f in files),
+            [filediff1.pk, filediff2.pk])
+
+
+class DiffViewerViewTests(SpyAgency, TestCase):
+    """Unit tests for the diff viewer view."""
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def test_get_does_not_populate_chunks(self):
+        """Testing the diff viewer leaves generating chunks to the file
+        fragments
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(
+            diffset,
+            source_file='/newfile',
+            dest_file='/newfile',
+            source_revision='PRE-CREATION',
+            dest_detail='',
+            diff=(
+                b'--- /dev/null\n'
+                b'+++ b/newfile\n'
+                b'@@ -0,0 +1 @@\n'
+                b'+This is a new file!\n'
+            ))
+
+        self.spy_on(populate_diff_chunks)
+
+        response = self.client.get('/r/%d/diff/1/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(populate_diff_chunks.called)
+
 
 class DownloadFileTests(TestCase):
     """Tests for the download_*_file views."""
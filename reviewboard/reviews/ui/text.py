@@ -11,6 +11,7 @@ from pygments.lexers import (ClassNotFound, guess_lexer_for_filename,
                              TextLexer)
 
 from reviewboard.attachments.models import FileAttachment
+from reviewboard.cache.memoize import cache_memoize_once
 from reviewboard.diffviewer.chunk_generator import (NoWrapperHtmlFormatter,
                                                     RawDiffChunkGenerator)
 from reviewboard.diffviewer.diffutils import get_chunks_in_range
@@ -108,8 +109,9 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
 
         This will fetch the file and then cache it for future renders.
         """
-        return cache_memoize('text-attachment-%d-string' % self.obj.pk,
-                             self._get_text_uncached)
+        return cache_memoize_once('text-attachment-%d-string' % self.obj.pk,
+                                  self._get_text_uncached,
+                                  immutable=True)
 
     def get_text_lines(self):
         """Return the file contents as syntax-highlighted lines.
@@ -118,8 +120,10 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
         UI, and split it into reviewable lines. It will then cache it for
         future renders.
         """
-        return cache_memoize('text-attachment-%d-lines' % self.obj.pk,
-                             lambda: list(self.generate_highlighted_text()))
+        return cache_memoize_once(
+            'text-attachment-%d-lines' % self.obj.pk,
+            lambda: list(self.generate_highlighted_text()),
+            immutable=True)
 
     def get_rendered_lines(self):
         """Returns the file contents as a render, based on the raw text.
@@ -129,9 +133,10 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
         specialized form, cache it as a list of lines, and return it.
         """
         if self.can_render_text:
-            return cache_memoize(
+            return cache_memoize_once(
                 'text-attachment-%d-rendered' % self.obj.pk,
-                lambda: list(self.generate_render()))
+                lambda: list(self.generate_render()),
+                immutable=True)
         else:
             return []
 
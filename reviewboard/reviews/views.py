@@ -43,7 +43,8 @@ from reviewboard.diffviewer.diffutils import (convert_to_unicode,
                                               get_last_header_before_line,
                                               get_last_line_number_in_diff,
                                               get_original_file,
-                                              get_patched_file)
+                                              get_patched_file,
+                                              populate_files_from_filediffs)
 from reviewboard.diffviewer.models import DiffSet
 from reviewboard.diffviewer.views import (DiffFragmentView,
                                           DiffViewerView,
@@ -282,6 +283,21 @@ def build_diff_comment_fragments(
     if lines_of_context is None:
         lines_of_context = [0, 0]
 
+    # Generate the chunks for all the commented files together. If any of
+    # them fail, the error will be raised again and shown for the comments
+    # on that file below.
+    try:
+        populate_files_from_filediffs(
+            context,
+            [
+                (comment.filediff, comment.interfilediff)
+                for comment in comments
+            ])
+    except Exception as e:
+        logging.debug('Unable to populate the files for diff comment '
+                      'fragments: %s',
+                      e, request=context.get('request'))
+
     for comment in comments:
         try:
             max_line = get_last_line_number_in_diff(context, comment.filediff,
@@ -13,11 +13,11 @@ from django.utils import six
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.parse import urlparse
-from django.utils.six.moves.urllib.request import (Request as URLRequest,
-                                                   urlopen)
+from django.utils.six.moves.urllib.request import Request as URLRequest
 from django.utils.translation import ugettext_lazy as _
 
 import reviewboard.diffviewer.parser as diffparser
+from reviewboard.hostingsvcs.transport import get_http_transport
 from reviewboard.scmtools.errors import (AuthenticationError,
                                          FileNotFoundError,
                                          SCMError)
@@ -542,6 +542,58 @@ class SCMTool(object):
         """
         raise NotImplementedError
 
+    def get_files(self, files, **kwargs):
+        """Return the contents of several files from a repository.
+
+        This is used to fetch many files at once, such as all the files
+        needed to display a diff. By default, each file is fetched in turn
+        through :py:meth:`get_file`.
+
+        Subclasses should override this if they can fetch several files more
+        efficiently than one at a time (for instance, in a single command or
+        network round trip).
+
+        Errors are reported per file, so a missing file won't prevent the
+        other files from being returned.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples, with
+                the same meanings as the arguments to :py:meth:`get_file`.
+
+            **kwargs (dict):
+                Additional keyword arguments. This is not currently used, but
+                is available for future expansion.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is
+            either the file contents (:py:class:`bytes`), or the exception
+            raised when fetching that file (such as
+            :py:class:`~reviewboard.scmtools.errors.FileNotFoundError`).
+        """
+        argspec = inspect.getargspec(self.get_file)
+
+        if argspec.keywords is None:
+            warnings.warn('SCMTool.get_file() must take keyword '
+                          'arguments, signature for %s is deprecated.'
+                          % self.name, DeprecationWarning)
+            get_file = lambda path, revision, base_commit_id: \
+                self.get_file(path, revision)
+        else:
+            get_file = lambda path, revision, base_commit_id: \
+                self.get_file(path, revision, base_commit_id=base_commit_id)
+
+        results = []
+
+        for path, revision, base_commit_id in files:
+            try:
+                results.append(get_file(path, revision, base_commit_id))
+            except Exception as e:
+                results.append(e)
+
+        return results
+
     def file_exists(self, path, revision=HEAD, base_commit_id=None, **kwargs):
         """Return whether a particular file exists in a repository.
 
@@ -834,7 +886,8 @@ class SCMTool(object):
         return patch
 
     @classmethod
-    def popen(cls, command, local_site_name=None, env={}):
+    def popen(cls, command, local_site_name=None, env={}, stdin=None,
+              stderr=subprocess.PIPE):
         """Launch an application and return its output.
 
         This wraps :py:func:`subprocess.Popen` to provide some common
@@ -852,6 +905,15 @@ class SCMTool(object):
                 Extra environment variables to provide. Each key and value
                 must be byte strings.
 
+            stdin (int or file, optional):
+                The standard input for the command, as accepted by
+                :py:class:`subprocess.Popen`. Pass :py:data:`subprocess.PIPE`
+                to write to the command.
+
+            stderr (int or file, optional):
+                The standard error for the command, as accepted by
+                :py:class:`subprocess.Popen`. This defaults to a pipe.
+
         Returns:
             bytes:
             The combined output (stdout and stderr) from the command.
@@ -869,7 +931,8 @@ class SCMTool(object):
 
         return subprocess.Popen(command,
                                 env=new_env,
-                                stderr=subprocess.PIPE,
+                                stdin=stdin,
+                                stderr=stderr,
                                 stdout=subprocess.PIPE,
                                 close_fds=(os.name != 'nt'))
 
@@ -1082,6 +1145,10 @@ class SCMClient(object):
         This is a convenience for looking up the contents of files that are
         referenced in diffs through an HTTP(S) request.
 
+        Requests go through the shared hosting service HTTP transport, which
+        reuses connections and avoids re-downloading files that haven't
+        changed.
+
         Authentication is performed using the username and password provided
         (if any).
 
@@ -1121,7 +1188,7 @@ class SCMClient(object):
                                                           self.password))
                 request.add_header('Authorization', 'Basic %s' % auth_string)
 
-            response = urlopen(request)
+            response = get_http_transport().open(request)
 
             if mime_type is None or response.info().gettype() == mime_type:
                 return response.read()
@@ -4,9 +4,10 @@ import logging
 import os
 import re
 import platform
+import subprocess
+import threading
 
 from django.utils import six
-from django.utils.six.moves import cStringIO as StringIO
 from django.utils.six.moves.urllib.parse import (quote as urlquote,
                                                  urlsplit as urlsplit,
                                                  urlunsplit as urlunsplit)
@@ -20,6 +21,7 @@ from reviewboard.scmtools.errors import (FileNotFoundError,
                                          InvalidRevisionFormatError,
                                          RepositoryNotFoundError,
                                          SCMError)
+from reviewboard.scmtools.persistent_process import PersistentProcess
 from reviewboard.ssh import utils as sshutils
 
 
@@ -94,6 +96,52 @@ class GitTool(SCMTool):
 
         return self.client.get_file(path, revision)
 
+    def get_files(self, files, **kwargs):
+        """Return the contents of several files from the repository.
+
+        For local repositories, all the files are read through a single
+        shared :command:`git cat-file --batch` process in one go.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples.
+
+            **kwargs (dict):
+                Unused keyword arguments.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the file contents or the exception raised when fetching it.
+        """
+        if (self.client.raw_file_url or
+            not self.client.git_dir or
+            (six.get_unbound_function(type(self).get_file) is not
+             six.get_unbound_function(GitTool.get_file))):
+            # Files are fetched over HTTP, or a subclass is providing its own
+            # files. Fetch each file through get_file().
+            return super(GitTool, self).get_files(files, **kwargs)
+
+        results = [None] * len(files)
+        to_fetch = []
+
+        for i, (path, revision, base_commit_id) in enumerate(files):
+            if revision == PRE_CREATION:
+                results[i] = b''
+            else:
+                to_fetch.append((i, path, revision))
+
+        if to_fetch:
+            fetched = self.client.get_files([
+                (path, revision)
+                for i, path, revision in to_fetch
+            ])
+
+            for (i, path, revision), result in zip(to_fetch, fetched):
+                results[i] = result
+
+        return results
+
     def file_exists(self, path, revision=HEAD, **kwargs):
         if revision == PRE_CREATION:
             return False
@@ -220,10 +268,14 @@ class GitDiffParser(DiffParser):
         file in the diff.
         """
         self.files = []
+        num_lines = len(self.lines)
         i = 0
-        preamble = StringIO()
 
-        while i < len(self.lines):
+        # The preamble is made up of the lines from preamble_start up to
+        # the next diff.
+        preamble_start = 0
+
+        while i < num_lines:
             next_i, file_info, new_diff = self._parse_diff(i)
 
             if file_info:
@@ -232,31 +284,22 @@ class GitDiffParser(DiffParser):
 
                 self._ensure_file_has_required_fields(file_info)
 
-                file_info.prepend_data(preamble.getvalue())
-                preamble.close()
-                preamble = StringIO()
+                file_info.prepend_lines(self.lines, preamble_start, i)
+                preamble_start = next_i
 
                 self.files.append(file_info)
             elif new_diff:
                 # We found a diff, but it was empty and has no file entry.
                 # Reset the preamble.
-                preamble.close()
-                preamble = StringIO()
-            else:
-                preamble.write(self.lines[i])
-                preamble.write(b'\n')
+                preamble_start = next_i
 
             i = next_i
 
-        try:
-            if self.files:
-                self.files[-1].finalize()
-            elif preamble.getvalue().strip() != b'':
-                # This is probably not an actual git diff file.
-                raise DiffParserError('This does not appear to be a git diff',
-                                      0)
-        finally:
-            preamble.close()
+        if self.files:
+            self.files[-1].finalize()
+        elif any(line.strip() for line in self.lines[preamble_start:i]):
+            # This is probably not an actual git diff file.
+            raise DiffParserError('This does not appear to be a git diff', 0)
 
         return self.files
 
@@ -284,8 +327,7 @@ class GitDiffParser(DiffParser):
         diff_git_line = self.lines[linenum]
 
         file_info = ParsedDiffFile()
-        file_info.append_data(diff_git_line)
-        file_info.append_data(b'\n')
+        file_info.append_lines(self.lines, linenum, linenum + 1)
         file_info.binary = False
 
         linenum += 1
@@ -353,8 +395,7 @@ class GitDiffParser(DiffParser):
                 break
             elif self._is_binary_patch(linenum):
                 file_info.binary = True
-                file_info.append_data(self.lines[linenum])
-                file_info.append_data(b'\n')
+                file_info.append_lines(self.lines, linenum, linenum + 1)
                 empty_change = False
                 linenum += 1
                 break
@@ -395,10 +436,7 @@ class GitDiffParser(DiffParser):
                 else:
                     file_info.newFile = new_filename
 
-                file_info.append_data(orig_line)
-                file_info.append_data(b'\n')
-                file_info.append_data(new_line)
-                file_info.append_data(b'\n')
+                file_info.append_lines(self.lines, linenum, linenum + 2)
                 linenum += 2
             else:
                 empty_change = False
@@ -505,6 +543,248 @@ class GitDiffParser(DiffParser):
                 setattr(file_info, attr, b'')
 
 
+class GitCatFileProcess(PersistentProcess):
+    """A long-lived git-cat-file(1) process in batch mode.
+
+    Rather than starting a new :command:`git cat-file` for every file fetch
+    or existence check, a single :command:`git cat-file --batch` (or
+    ``--batch-check``) process is kept running for a repository, and object
+    names are written to it and read back in turn. Many objects can be
+    looked up in one conversation with :py:meth:`get_objects`.
+
+    The process is started on first use, restarted if it exits or the pipe
+    breaks, and shut down after being idle for :py:attr:`IDLE_TIMEOUT`
+    seconds (see :py:class:`~reviewboard.scmtools.persistent_process.
+    PersistentProcess`). Access is serialized, so instances can be shared
+    between threads.
+
+    Instances should be retrieved through :py:func:`get_git_cat_file_process`
+    so that they're shared for the repository.
+    """
+
+    #: The maximum number of bytes of object names to write at a time.
+    #:
+    #: All results for one batch of names are read before the next batch is
+    #: written. Keeping batches within the size that a pipe is guaranteed to
+    #: buffer means writing can never block on git waiting for us to read
+    #: results.
+    MAX_BATCH_SIZE = 4096
+
+    def __init__(self, git_dir, batch_option='--batch', local_site_name=None):
+        """Initialize the process.
+
+        Args:
+            git_dir (unicode):
+                The path to the Git repository.
+
+            batch_option (unicode, optional):
+                Either ``--batch`` (to fetch object contents) or
+                ``--batch-check`` (to fetch object types and sizes).
+
+            local_site_name (unicode, optional):
+                The name of the Local Site being used, if any.
+        """
+        assert batch_option in ('--batch', '--batch-check')
+
+        super(GitCatFileProcess, self).__init__(
+            local_site_name=local_site_name)
+
+        self.git_dir = git_dir
+        self.batch_option = batch_option
+
+    def get_objects(self, object_names):
+        """Return information on objects in the repository.
+
+        Args:
+            object_names (list of unicode):
+                The names of the objects to look up, in any form understood
+                by git-cat-file(1) (such as ``<sha1>`` or ``HEAD:<path>``).
+                Names must not contain newlines.
+
+        Returns:
+            list:
+            A list with an entry for each object name, in order. Each entry is
+            ``None`` if the object couldn't be found, or a tuple of the
+            object type (:py:class:`unicode`) and either the contents
+            (:py:class:`bytes`, for ``--batch``) or the size
+            (:py:class:`int`, for ``--batch-check``).
+
+        Raises:
+            reviewboard.scmtools.errors.SCMError:
+                The objects couldn't be read, even after restarting the
+                process.
+        """
+        encoded_names = []
+
+        for object_name in object_names:
+            if isinstance(object_name, six.text_type):
+                object_name = object_name.encode('utf-8')
+
+            assert b'\n' not in object_name
+            encoded_names.append(object_name)
+
+        try:
+            return self._call(self._get_objects, encoded_names)
+        except (IOError, OSError) as e:
+            raise SCMError(
+                _('Unable to read objects from the Git repository: %s') % e)
+
+    def _get_objects(self, process, object_names):
+        """Look up objects using the process.
+
+        Args:
+            process (subprocess.Popen):
+                The running process.
+
+            object_names (list of bytes):
+                The encoded names of the objects to look up.
+
+        Returns:
+            list:
+            The results, as described in :py:meth:`get_objects`.
+
+        Raises:
+            IOError:
+                The process couldn't be written to or read from.
+        """
+        results = []
+        i = 0
+
+        while i < len(object_names):
+            batch = [object_names[i]]
+            batch_size = len(object_names[i]) + 1
+            i += 1
+
+            while (i < len(object_names) and
+                   batch_size + len(object_names[i]) + 1 <=
+                   self.MAX_BATCH_SIZE):
+                batch.append(object_names[i])
+                batch_size += len(object_names[i]) + 1
+                i += 1
+
+            process.stdin.write(b''.join(
+                b'%s\n' % object_name
+                for object_name in batch
+            ))
+            process.stdin.flush()
+
+            for object_name in batch:
+                results.append(self._read_result(process))
+
+        return results
+
+    def _read_result(self, process):
+        """Read the result for an object from the process.
+
+        Args:
+            process (subprocess.Popen):
+                The running process.
+
+        Returns:
+            tuple:
+            The result, as described in :py:meth:`get_objects`.
+
+        Raises:
+            IOError:
+                The process exited before writing the result.
+        """
+        header = process.stdout.readline()
+
+        if not header.endswith(b'\n'):
+            raise IOError('git cat-file exited unexpectedly')
+
+        header = header[:-1]
+
+        if header.endswith((b' missing', b' ambiguous')):
+            return None
+
+        obj_type, size = header.split(b' ')[1:]
+        obj_type = obj_type.decode('utf-8')
+        size = int(size)
+
+        if self.batch_option == '--batch-check':
+            return obj_type, size
+
+        contents = process.stdout.read(size)
+
+        # The contents are followed by a newline.
+        if len(contents) != size or process.stdout.read(1) != b'\n':
+            raise IOError('git cat-file exited unexpectedly')
+
+        return obj_type, contents
+
+    def _get_description(self):
+        """Return a description of the process for log messages.
+
+        Returns:
+            unicode:
+            The description.
+        """
+        return 'git cat-file %s for %s' % (self.batch_option, self.git_dir)
+
+    def _start_process(self, stderr):
+        """Start the process.
+
+        Git reports errors for individual objects on stdout, so anything
+        written to stderr (such as hints for ambiguous names) isn't needed.
+
+        Args:
+            stderr (file):
+                The file to send the error output of the process to.
+
+        Returns:
+            subprocess.Popen:
+            The new process.
+
+        Raises:
+            OSError:
+                The process couldn't be started.
+        """
+        return SCMTool.popen(
+            ['git', '--git-dir=%s' % self.git_dir, 'cat-file',
+             self.batch_option],
+            local_site_name=self.local_site_name,
+            stdin=subprocess.PIPE,
+            stderr=stderr)
+
+
+_git_cat_file_processes = {}
+_git_cat_file_processes_lock = threading.Lock()
+
+
+def get_git_cat_file_process(git_dir, batch_option='--batch',
+                             local_site_name=None):
+    """Return the shared git-cat-file(1) process for a repository.
+
+    Args:
+        git_dir (unicode):
+            The path to the Git repository.
+
+        batch_option (unicode, optional):
+            Either ``--batch`` or ``--batch-check``.
+
+        local_site_name (unicode, optional):
+            The name of the Local Site being used, if any.
+
+    Returns:
+        GitCatFileProcess:
+        The process for the repository.
+    """
+    key = (git_dir, batch_option, local_site_name)
+
+    with _git_cat_file_processes_lock:
+        try:
+            cat_file_process = _git_cat_file_processes[key]
+        except KeyError:
+            cat_file_process = GitCatFileProcess(
+                git_dir,
+                batch_option=batch_option,
+                local_site_name=local_site_name)
+            _git_cat_file_processes[key] = cat_file_process
+
+    return cat_file_process
+
+
 class GitClient(SCMClient):
     FULL_SHA1_LENGTH = 40
 
@@ -592,6 +872,70 @@ class GitClient(SCMClient):
         else:
             return self._cat_file(path, revision, "blob")
 
+    def get_files(self, files):
+        """Return the contents of several files from a local repository.
+
+        The files are looked up together through the shared
+        git-cat-file process for the repository.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the file contents (:py:class:`bytes`), or the exception raised
+            when fetching it.
+        """
+        results = [None] * len(files)
+        batched = []
+
+        for i, (path, revision) in enumerate(files):
+            try:
+                commit = self._resolve_head(revision, path)
+            except SCMError as e:
+                results[i] = e
+                continue
+
+            if '\n' in commit:
+                # This can't be looked up in batch mode.
+                try:
+                    results[i] = self._run_cat_file(commit, 'blob')
+                except SCMError as e:
+                    results[i] = e
+            else:
+                batched.append((i, commit))
+
+        if batched:
+            cat_file_process = get_git_cat_file_process(
+                self.git_dir,
+                local_site_name=self.local_site_name)
+
+            try:
+                objects = cat_file_process.get_objects([
+                    commit
+                    for i, commit in batched
+                ])
+            except SCMError as e:
+                objects = [e] * len(batched)
+
+            for (i, commit), result in zip(batched, objects):
+                if result is None:
+                    result = FileNotFoundError(commit)
+                elif not isinstance(result, SCMError):
+                    obj_type, contents = result
+
+                    if obj_type == 'blob':
+                        result = contents
+                    else:
+                        result = SCMError('fatal: git cat-file %s: bad file'
+                                          % commit)
+
+                results[i] = result
+
+        return results
+
     def get_file_exists(self, path, revision):
         if self.raw_file_url:
             try:
@@ -629,14 +973,69 @@ class GitClient(SCMClient):
         Call git-cat-file(1) to get content or type information for a
         repository object.
 
-        If called with just "commit", gets the content of a blob (or
+        If called with just "blob", gets the content of a blob (or
         raises an exception if the commit is not a blob).
 
         Otherwise, "option" can be used to pass a switch to git-cat-file,
-        e.g. to test or existence or get the type of "commit".
+        e.g. "-t" to test for existence or get the type of "commit".
+
+        Content and type lookups go through a shared, long-lived
+        git-cat-file process for the repository (see
+        :py:func:`get_git_cat_file_process`), rather than a new process
+        for each call.
         """
         commit = self._resolve_head(revision, path)
 
+        if option == 'blob':
+            batch_option = '--batch'
+        elif option == '-t':
+            batch_option = '--batch-check'
+        else:
+            batch_option = None
+
+        if batch_option is None or '\n' in commit:
+            # This can't be looked up in batch mode.
+            return self._run_cat_file(commit, option)
+
+        cat_file_process = get_git_cat_file_process(
+            self.git_dir,
+            batch_option=batch_option,
+            local_site_name=self.local_site_name)
+        result = cat_file_process.get_objects([commit])[0]
+
+        if result is None:
+            raise FileNotFoundError(commit)
+
+        obj_type, contents = result
+
+        if option == '-t':
+            return obj_type.encode('utf-8')
+        elif obj_type != 'blob':
+            raise SCMError('fatal: git cat-file %s: bad file' % commit)
+
+        return contents
+
+    def _run_cat_file(self, commit, option):
+        """Run a new git-cat-file(1) process for a repository object.
+
+        Args:
+            commit (unicode):
+                The name of the object.
+
+            option (unicode):
+                The object type or switch to pass to git-cat-file.
+
+        Returns:
+            bytes:
+            The output from git-cat-file.
+
+        Raises:
+            reviewboard.scmtools.errors.FileNotFoundError:
+                The object could not be found.
+
+            reviewboard.scmtools.errors.SCMError:
+                There was an error running git-cat-file.
+        """
         p = self._run_git(['--git-dir=%s' % self.git_dir, 'cat-file',
                            option, commit])
         contents = p.stdout.read()
@@ -2,6 +2,9 @@ from __future__ import unicode_literals
 
 import json
 import logging
+import struct
+import subprocess
+import threading
 from datetime import datetime
 
 from django.utils import six
@@ -14,6 +17,7 @@ from reviewboard.scmtools.core import (Branch, Commit, FileNotFoundError, HEAD,
                                        UNKNOWN)
 from reviewboard.scmtools.errors import SCMError
 from reviewboard.scmtools.git import GitDiffParser
+from reviewboard.scmtools.persistent_process import PersistentProcess
 
 
 class HgTool(SCMTool):
@@ -431,9 +435,278 @@ class HgWebClient(SCMClient):
         raise SCMError('Cannot load changeset %s from hgweb' % revision)
 
 
+class HgCommandServer(PersistentProcess):
+    """A long-lived Mercurial command server for a local repository.
+
+    Starting :command:`hg` means starting a Python interpreter and loading
+    Mercurial and any extensions, which can take longer than the command
+    itself. Instead, a single :command:`hg serve --cmdserver pipe` process
+    is kept running for a repository, and commands are sent to it in turn
+    with :py:meth:`run_command`.
+
+    The server is started on first use, restarted if it exits or the pipe
+    breaks, and shut down after being idle for :py:attr:`IDLE_TIMEOUT`
+    seconds. Access is serialized, so instances can be shared between
+    threads.
+
+    If the server can't be started, or doesn't support running commands,
+    :py:meth:`run_command` raises :py:exc:`HgCommandServerUnavailable`,
+    and callers should run :command:`hg` directly instead.
+
+    Instances should be retrieved through :py:func:`get_hg_command_server`
+    so that they're shared for the repository.
+    """
+
+    def __init__(self, hg_args, local_site_name=None):
+        """Initialize the command server.
+
+        Args:
+            hg_args (list of unicode):
+                The global arguments for :command:`hg`, such as the
+                repository path and configuration.
+
+            local_site_name (unicode, optional):
+                The name of the Local Site being used, if any.
+        """
+        super(HgCommandServer, self).__init__(local_site_name=local_site_name)
+
+        self.hg_args = list(hg_args)
+        self.available = True
+
+    def run_command(self, args):
+        """Run a Mercurial command through the server.
+
+        Args:
+            args (list of unicode):
+                The arguments for the command, as they'd be passed to
+                :command:`hg`.
+
+        Returns:
+            tuple:
+            A 3-tuple containing the exit code (:py:class:`int`), the
+            output (:py:class:`bytes`), and the error output
+            (:py:class:`bytes`) of the command.
+
+        Raises:
+            HgCommandServerUnavailable:
+                The server couldn't be started, or the command couldn't be
+                run through it, even after restarting the server.
+        """
+        encoded_args = [
+            arg.encode('utf-8') if isinstance(arg, six.text_type) else arg
+            for arg in args
+        ]
+
+        try:
+            return self._call(self._run_command, encoded_args)
+        except (IOError, OSError) as e:
+            raise HgCommandServerUnavailable(six.text_type(e))
+
+    def _run_command(self, process, args):
+        """Send a command to the server and read the result.
+
+        Args:
+            process (subprocess.Popen):
+                The running server.
+
+            args (list of bytes):
+                The encoded arguments for the command.
+
+        Returns:
+            tuple:
+            The result, as described in :py:meth:`run_command`.
+
+        Raises:
+            IOError:
+                The server couldn't be written to or read from.
+        """
+        data = b'\0'.join(args)
+
+        process.stdin.write(b'runcommand\n')
+        process.stdin.write(struct.pack(b'>I', len(data)))
+        process.stdin.write(data)
+        process.stdin.flush()
+
+        output = []
+        errors = []
+
+        while True:
+            channel, data = self._read_message(process)
+
+            if channel == b'o':
+                output.append(data)
+            elif channel == b'e':
+                errors.append(data)
+            elif channel == b'r':
+                return (struct.unpack(b'>i', data)[0],
+                        b''.join(output),
+                        b''.join(errors))
+            elif channel in (b'I', b'L'):
+                # The command is asking for input. There's nobody to
+                # provide it, so send an empty response.
+                process.stdin.write(struct.pack(b'>I', 0))
+                process.stdin.flush()
+            elif channel.isupper():
+                # Required channels must be handled. The state of the
+                # server is unknown, so it'll need to be restarted.
+                raise IOError('Unexpected hg command server channel %r'
+                              % channel)
+
+    def _read_message(self, process):
+        """Read a message from the server.
+
+        Args:
+            process (subprocess.Popen):
+                The running server.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the channel (:py:class:`bytes`) and the
+            data for the message (:py:class:`bytes`). For input channels,
+            the data is the requested length instead.
+
+        Raises:
+            IOError:
+                The server exited before writing the message.
+        """
+        header = process.stdout.read(5)
+
+        if len(header) != 5:
+            raise IOError('hg command server exited unexpectedly')
+
+        channel, length = struct.unpack(b'>cI', header)
+
+        if channel in (b'I', b'L'):
+            return channel, length
+
+        data = process.stdout.read(length)
+
+        if len(data) != length:
+            raise IOError('hg command server exited unexpectedly')
+
+        return channel, data
+
+    def _get_description(self):
+        """Return a description of the server for log messages.
+
+        Returns:
+            unicode:
+            The description.
+        """
+        return 'hg command server for %r' % self.hg_args
+
+    def _can_restart(self):
+        """Return whether the server should be restarted after a failure.
+
+        Returns:
+            bool:
+            Whether the server is still believed to be available.
+        """
+        return self.available
+
+    def _start_process(self, stderr):
+        """Start the server.
+
+        Errors for commands are sent over the error channel, so anything
+        written to stderr isn't needed.
+
+        Args:
+            stderr (file):
+                The file to send the error output of the server to.
+
+        Returns:
+            subprocess.Popen:
+            The new server.
+
+        Raises:
+            OSError:
+                The server couldn't be started.
+        """
+        try:
+            return SCMTool.popen(
+                ['hg'] + self.hg_args + ['serve', '--cmdserver', 'pipe'],
+                local_site_name=self.local_site_name,
+                stdin=subprocess.PIPE,
+                stderr=stderr)
+        except OSError:
+            self.available = False
+            raise
+
+    def _init_process(self, process):
+        """Check that a newly-started server can run commands.
+
+        Args:
+            process (subprocess.Popen):
+                The new server.
+
+        Raises:
+            IOError:
+                The server didn't start up properly, or doesn't support
+                running commands.
+        """
+        try:
+            channel, hello = self._read_message(process)
+        except IOError:
+            # This version of Mercurial may not have a command server.
+            self.available = False
+            raise
+
+        capabilities = []
+
+        for line in hello.splitlines():
+            if line.startswith(b'capabilities:'):
+                capabilities = line.split(b':', 1)[1].split()
+
+        if channel != b'o' or b'runcommand' not in capabilities:
+            self.available = False
+
+            raise IOError('hg command server does not support runcommand')
+
+
+class HgCommandServerUnavailable(Exception):
+    """A Mercurial command server couldn't be used to run a command."""
+
+
+_hg_command_servers = {}
+_hg_command_servers_lock = threading.Lock()
+
+
+def get_hg_command_server(hg_args, local_site_name=None):
+    """Return the shared Mercurial command server for a repository.
+
+    Args:
+        hg_args (list of unicode):
+            The global arguments for :command:`hg`, such as the repository
+            path and configuration.
+
+        local_site_name (unicode, optional):
+            The name of the Local Site being used, if any.
+
+    Returns:
+        HgCommandServer:
+        The command server for the repository.
+    """
+    key = (tuple(hg_args), local_site_name)
+
+    with _hg_command_servers_lock:
+        try:
+            command_server = _hg_command_servers[key]
+        except KeyError:
+            command_server = HgCommandServer(hg_args,
+                                             local_site_name=local_site_name)
+            _hg_command_servers[key] = command_server
+
+    return command_server
+
+
 class HgClient(SCMClient):
     COMMITS_PAGE_LIMIT = '31'
 
+    #: Whether to run commands through a shared Mercurial command server.
+    #:
+    #: If the server isn't available, commands are run directly.
+    use_command_server = True
+
     def __init__(self, path, local_site):
         super(HgClient, self).__init__(path)
         self.default_args = None
@@ -455,9 +728,8 @@ class HgClient(SCMClient):
             rev = ""
 
         if path:
-            p = self._run_hg(['cat', '--rev', rev, path])
-            contents = p.stdout.read()
-            failure = p.wait()
+            failure, contents, errors = self._run_hg_command(
+                ['cat', '--rev', rev, path])
 
             if not failure:
                 return contents
@@ -471,17 +743,18 @@ class HgClient(SCMClient):
             list of reviewboard.scmtools.core.Branch:
             The list of the branches.
         """
-        p = self._run_hg(['branches', '--template', 'json'])
+        failure, output, errors = self._run_hg_command(
+            ['branches', '--template', 'json'])
 
-        if p.wait() != 0:
-            raise SCMError('Cannot load branches: %s' % p.stderr.read())
+        if failure:
+            raise SCMError('Cannot load branches: %s' % errors)
 
         results = [
             Branch(
                 id=data['branch'],
                 commit=data['node'],
                 default=(data['branch'] == 'default'))
-            for data in json.load(p.stdout)
+            for data in json.loads(output)
             if not data['closed']
         ]
 
@@ -503,14 +776,14 @@ class HgClient(SCMClient):
             The list of commit objects.
         """
         cmd = ['log'] + revset + ['--template', 'json']
-        p = self._run_hg(cmd)
+        failure, output, errors = self._run_hg_command(cmd)
 
-        if p.wait() != 0:
-            raise SCMError('Cannot load commits: %s' % p.stderr.read())
+        if failure:
+            raise SCMError('Cannot load commits: %s' % errors)
 
         results = []
 
-        for data in json.load(p.stdout):
+        for data in json.loads(output):
             p = data['parents'][0]
             results.append(Commit(
                 id=data['node'],
@@ -567,13 +840,13 @@ class HgClient(SCMClient):
         if changesets:
             commit = changesets[0]
             cmd = ['diff', '-c', revision]
-            p = self._run_hg(cmd)
+            failure, output, errors = self._run_hg_command(cmd)
 
-            if p.wait() != 0:
-                e = p.stderr.read()
-                raise SCMError('Cannot load patch %s: %s' % (revision, e))
+            if failure:
+                raise SCMError('Cannot load patch %s: %s'
+                               % (revision, errors))
 
-            commit.diff = p.stdout.read()
+            commit.diff = output
             return commit
 
         raise SCMError('Cannot load changeset %s' % revision)
@@ -625,3 +898,44 @@ class HgClient(SCMClient):
         return SCMTool.popen(
             ['hg'] + self.default_args + args,
             local_site_name=self.local_site_name)
+
+    def _run_hg_command(self, args):
+        """Run a Mercurial command and return its results.
+
+        The command is run through the repository's shared
+        :py:class:`HgCommandServer` if possible, avoiding the cost of
+        starting :command:`hg`. Otherwise, it's run directly.
+
+        Args:
+            args (list of unicode):
+                The arguments for the command.
+
+        Returns:
+            tuple:
+            A 3-tuple containing the exit code (:py:class:`int`), the
+            output (:py:class:`bytes`), and the error output
+            (:py:class:`bytes`) of the command.
+        """
+        if not self.default_args:
+            self._calculate_default_args()
+
+        if self.use_command_server:
+            command_server = get_hg_command_server(
+                self.default_args,
+                local_site_name=self.local_site_name)
+
+            if command_server.available:
+                try:
+                    # Options given when starting the server don't apply to
+                    # the commands it runs, so this has to be passed again.
+                    return command_server.run_command(
+                        ['--noninteractive'] + args)
+                except HgCommandServerUnavailable as e:
+                    logging.warning('Unable to use the hg command server '
+                                    'for %s: %s. Running hg directly.',
+                                    self.path, e)
+
+        p = self._run_hg(args)
+        output, errors = p.communicate()
+
+        return p.returncode, output, errors
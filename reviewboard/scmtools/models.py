@@ -21,6 +21,8 @@ from djblets.cache.backend import cache_memoize, make_cache_key
 from djblets.db.fields import JSONField
 from djblets.log import log_timed
 
+from reviewboard.cache.memoize import (cache_memoize_many_once,
+                                       cache_memoize_once)
 from reviewboard.hostingsvcs.models import HostingServiceAccount
 from reviewboard.hostingsvcs.service import get_hosting_service
 from reviewboard.scmtools.crypto_utils import (decrypt_password,
@@ -183,6 +185,11 @@ class Repository(models.Model):
     COMMITS_CACHE_PERIOD_SHORT = 60 * 5  # 5 minutes
     COMMITS_CACHE_PERIOD_LONG = 60 * 60 * 24  # 1 day
 
+    # Fetched files never change, so they're stored in the cache again
+    # (rather than fetched again) once they've been there this long, in
+    # order to keep them from expiring.
+    FILE_CACHE_REFRESH_PERIOD = 60 * 60 * 24 * 7  # 1 week
+
     def _set_password(self, value):
         """Sets the password for the repository.
 
@@ -388,6 +395,9 @@ class Repository(models.Model):
         This will attempt to retrieve the file from the repository. If the
         repository is backed by a hosting service, it will go through that.
         Otherwise, it will attempt to directly access the repository.
+
+        If the file is already being fetched by another thread or process,
+        this will wait for that rather than fetching it again.
         """
         # We wrap the result of get_file in a list and then return the first
         # element after getting the result from the cache. This prevents the
@@ -397,12 +407,78 @@ class Repository(models.Model):
         #
         # Basically, this fixes the massive regressions introduced by the
         # Django unicode changes.
-        return cache_memoize(
+        return cache_memoize_once(
             self._make_file_cache_key(path, revision, base_commit_id),
             lambda: [self._get_file_uncached(path, revision, base_commit_id,
                                              request)],
+            refresh_after=self.FILE_CACHE_REFRESH_PERIOD,
+            immutable=True,
             large_data=True)[0]
 
+    def get_files(self, files, request=None):
+        """Return several files from the repository.
+
+        This works like :py:meth:`get_file`, but handles many files at once.
+        The cache is checked for all the files at once, and any files not in
+        the cache (and not already being fetched elsewhere) are fetched
+        together from the hosting service or SCMTool (see
+        :py:meth:`SCMTool.get_files()
+        <reviewboard.scmtools.core.SCMTool.get_files>`), which may be able to
+        do so more efficiently than fetching one file at a time.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples, with
+                the same meanings as the arguments to :py:meth:`get_file`.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is
+            either the file contents (:py:class:`bytes`), or the exception
+            raised when fetching that file.
+        """
+        keys = []
+        files_by_key = {}
+
+        for path, revision, base_commit_id in files:
+            key = self._make_file_cache_key(path, revision, base_commit_id)
+            keys.append(key)
+            files_by_key[key] = (path, revision, base_commit_id)
+
+        def _get_file(key):
+            path, revision, base_commit_id = files_by_key[key]
+
+            # See get_file for why this is wrapped in a list.
+            return [self._get_file_uncached(path, revision, base_commit_id,
+                                            request)]
+
+        def _get_files(keys):
+            return [
+                data if isinstance(data, Exception) else [data]
+                for data in self._get_files_uncached(
+                    [
+                        files_by_key[key]
+                        for key in keys
+                    ],
+                    request)
+            ]
+
+        results = cache_memoize_many_once(
+            keys,
+            _get_file,
+            _get_files,
+            refresh_after=self.FILE_CACHE_REFRESH_PERIOD,
+            immutable=True,
+            large_data=True)
+
+        return [
+            result if isinstance(result, Exception) else result[0]
+            for result in results
+        ]
+
     def get_file_exists(self, path, revision, base_commit_id=None,
                         request=None):
         """Returns whether or not a file exists in the repository.
@@ -607,6 +683,43 @@ class Repository(models.Model):
 
         return data
 
+    def _get_files_uncached(self, files, request):
+        """Internal function for fetching several uncached files.
+
+        This is called by get_files for the files that aren't already in the
+        cache.
+        """
+        for path, revision, base_commit_id in files:
+            fetching_file.send(sender=self,
+                               path=path,
+                               revision=revision,
+                               base_commit_id=base_commit_id,
+                               request=request)
+
+        log_timer = log_timed('Fetching %d files from %s'
+                              % (len(files), self),
+                              request=request)
+
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            results = hosting_service.get_files(self, files)
+        else:
+            results = self.get_scmtool().get_files(files)
+
+        log_timer.done()
+
+        for (path, revision, base_commit_id), data in zip(files, results):
+            if not isinstance(data, Exception):
+                fetched_file.send(sender=self,
+                                  path=path,
+                                  revision=revision,
+                                  base_commit_id=base_commit_id,
+                                  request=request,
+                                  data=data)
+
+        return results
+
     def _get_file_exists_uncached(self, path, revision, base_commit_id,
                                   request):
         """Internal function for checking that a file exists.
@@ -2,6 +2,7 @@
 
 from __future__ import unicode_literals
 
+import hashlib
 import logging
 import os
 import random
@@ -11,6 +12,7 @@ import signal
 import socket
 import subprocess
 import tempfile
+import threading
 import time
 from contextlib import contextmanager
 
@@ -29,6 +31,7 @@ from reviewboard.scmtools.errors import (SCMError, EmptyChangeSetError,
                                          InvalidRevisionFormatError,
                                          RepositoryNotFoundError,
                                          UnverifiedCertificateError)
+from reviewboard.scmtools.persistent_process import register_idle_resource
 
 
 class STunnelProxy(object):
@@ -209,6 +212,260 @@ class STunnelProxy(object):
                     pass
 
 
+class PerforceConnection(object):
+    """A connection to a Perforce server that can be pooled for reuse.
+
+    Attributes:
+        key (tuple):
+            The key identifying the server and credentials.
+
+        p4 (P4.P4):
+            The connected P4 instance.
+
+        proxy (STunnelProxy):
+            The stunnel proxy used for the connection, if any.
+
+        last_used (float):
+            The time the connection was last returned to the pool.
+
+        ticket_check_time (float):
+            The time the login ticket was last checked, or 0 if it needs to
+            be checked before the next use.
+    """
+
+    def __init__(self, key, p4, proxy=None):
+        """Initialize the connection.
+
+        Args:
+            key (tuple):
+                The key identifying the server and credentials.
+
+            p4 (P4.P4):
+                The connected P4 instance.
+
+            proxy (STunnelProxy, optional):
+                The stunnel proxy used for the connection, if any.
+        """
+        self.key = key
+        self.p4 = p4
+        self.proxy = proxy
+        self.last_used = time.time()
+        self.ticket_check_time = 0
+
+    def is_connected(self):
+        """Return whether the connection is still open.
+
+        Returns:
+            bool:
+            ``True`` if the connection can still be used.
+        """
+        try:
+            return bool(self.p4.connected())
+        except Exception:
+            return False
+
+    def close(self):
+        """Disconnect from the server and shut down any proxy."""
+        try:
+            if self.is_connected():
+                self.p4.disconnect()
+        except Exception as e:
+            logging.warning('Error disconnecting from Perforce server: %s', e)
+        finally:
+            if self.proxy:
+                try:
+                    self.proxy.shutdown()
+                except Exception:
+                    pass
+
+                self.proxy = None
+
+
+class PerforceConnectionPool(object):
+    """A pool of open connections to Perforce servers.
+
+    Connecting to a Perforce server can involve logging in and starting an
+    stunnel proxy, which adds up quickly when fetching many files. The pool
+    keeps connections open after use, keyed by the server and credentials,
+    so that later operations can skip all that.
+
+    Connections are checked before being reused, and are closed after
+    being idle for :py:attr:`IDLE_TIMEOUT` seconds by the shared idle
+    resource thread. At most :py:attr:`MAX_IDLE_CONNECTIONS` idle
+    connections are kept, with the least recently used ones closed first.
+
+    This is safe to use from multiple threads. Each connection is only
+    handed out to one thread at a time.
+    """
+
+    #: The maximum number of idle connections to keep open.
+    MAX_IDLE_CONNECTIONS = 8
+
+    #: The number of seconds an idle connection is kept open.
+    IDLE_TIMEOUT = 5 * 60
+
+    def __init__(self):
+        """Initialize the pool."""
+        self._idle_connections = []
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, open_func):
+        """Return a connection for a server and set of credentials.
+
+        An idle connection will be reused if possible. Otherwise, a new
+        one will be opened.
+
+        Args:
+            key (tuple):
+                The key identifying the server and credentials.
+
+            open_func (callable):
+                A function that opens a new connection, returning a tuple of
+                the connected ``P4.P4`` instance and the
+                :py:class:`STunnelProxy`, if any.
+
+        Returns:
+            PerforceConnection:
+            The connection. This must be passed to :py:meth:`release` once
+            it's no longer in use.
+        """
+        conn = None
+
+        with self._lock:
+            self._check_pid()
+            expired = self._remove_expired()
+
+            for i in range(len(self._idle_connections) - 1, -1, -1):
+                if self._idle_connections[i].key == key:
+                    conn = self._idle_connections.pop(i)
+                    break
+
+        for expired_conn in expired:
+            expired_conn.close()
+
+        if conn is not None and not conn.is_connected():
+            conn.close()
+            conn = None
+
+        if conn is None:
+            p4, proxy = open_func()
+            conn = PerforceConnection(key, p4, proxy)
+
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool after use.
+
+        Connections that are no longer open are closed instead.
+
+        Args:
+            conn (PerforceConnection):
+                The connection returned from :py:meth:`acquire`.
+        """
+        if not conn.is_connected():
+            conn.close()
+            return
+
+        conn.last_used = time.time()
+        evicted = []
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # This was opened by a process this one was forked from.
+                return
+
+            self._idle_connections.append(conn)
+
+            while len(self._idle_connections) > self.MAX_IDLE_CONNECTIONS:
+                evicted.append(self._idle_connections.pop(0))
+
+        register_idle_resource(self)
+
+        for evicted_conn in evicted:
+            evicted_conn.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            self._check_pid()
+            idle_connections = self._idle_connections
+            self._idle_connections = []
+
+        for conn in idle_connections:
+            conn.close()
+
+    def close_if_idle(self):
+        """Close connections that have been idle for too long."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+
+            expired = self._remove_expired()
+
+        for conn in expired:
+            conn.close()
+
+    def _check_pid(self):
+        """Forget connections inherited from a parent process.
+
+        Those connections belong to the process that opened them, so they're
+        dropped without being closed.
+
+        This must be called with the lock held.
+        """
+        pid = os.getpid()
+
+        if self._pid != pid:
+            self._pid = pid
+            self._idle_connections = []
+
+    def _remove_expired(self):
+        """Remove and return idle connections that have expired.
+
+        This must be called with the lock held.
+
+        Returns:
+            list of PerforceConnection:
+            The expired connections, which must be closed by the caller.
+        """
+        cutoff = time.time() - self.IDLE_TIMEOUT
+        expired = [
+            conn
+            for conn in self._idle_connections
+            if conn.last_used <= cutoff
+        ]
+
+        if expired:
+            self._idle_connections = [
+                conn
+                for conn in self._idle_connections
+                if conn.last_used > cutoff
+            ]
+
+        return expired
+
+
+_perforce_connection_pool = None
+_perforce_connection_pool_lock = threading.Lock()
+
+
+def get_perforce_connection_pool():
+    """Return the shared pool of Perforce connections.
+
+    Returns:
+        PerforceConnectionPool:
+        The connection pool.
+    """
+    global _perforce_connection_pool
+
+    with _perforce_connection_pool_lock:
+        if _perforce_connection_pool is None:
+            _perforce_connection_pool = PerforceConnectionPool()
+
+    return _perforce_connection_pool
+
+
 class PerforceClient(object):
     """Client for talking to a Perforce server.
 
@@ -224,6 +481,15 @@ class PerforceClient(object):
     #: We default this to 1 hour.
     TICKET_RENEWAL_SECS = 1 * 60 * 60
 
+    #: The number of seconds between ticket checks on pooled connections.
+    #:
+    #: This must be well under :py:attr:`TICKET_RENEWAL_SECS`, so that
+    #: tickets are renewed before they expire.
+    TICKET_CHECK_INTERVAL_SECS = 5 * 60
+
+    #: Whether to reuse connections from the shared connection pool.
+    use_connection_pool = True
+
     def __init__(self, path, username, password, encoding='', host=None,
                  client_name=None, local_site_name=None,
                  use_ticket_auth=False):
@@ -345,7 +611,7 @@ class PerforceClient(object):
         This is a context manager used to set up, open, and then close a
         connection to the Perforce server. Generally, :py:meth:`run_worker`
         should be used instead, as this will convert certain P4 exceptions to
-        Review Board exceptions.
+        Review Board exceptions, and will reuse pooled connections.
 
         Context:
             The context for the connection. Once the context ends, the
@@ -359,13 +625,85 @@ class PerforceClient(object):
                 with client.connect():
                     ...
         """
-        self.p4.user = self.username.encode('utf-8')
+        proxy = self._setup_p4(self.p4)
+
+        try:
+            with self.p4.connect():
+                if self.use_ticket_auth:
+                    # The ticket may not exist, may have expired, or may be
+                    # close to expiring. Check for those conditions and
+                    # possibly request/extend a ticket.
+                    self.check_refresh_ticket()
+
+                yield
+        finally:
+            if proxy:
+                try:
+                    proxy.shutdown()
+                except:
+                    pass
+
+    @contextmanager
+    def connect_pooled(self):
+        """Use a pooled connection to the Perforce server.
+
+        This works like :py:meth:`connect`, but takes a connection from the
+        shared :py:class:`PerforceConnectionPool` (opening one if needed),
+        and returns it to the pool afterward instead of disconnecting.
+
+        While in the context, :py:attr:`p4` is the pooled connection's P4
+        instance.
+
+        Context:
+            The context for the connection. Once the context ends, the
+            connection is returned to the pool.
+
+            No variables are passed to the context.
+        """
+        pool = get_perforce_connection_pool()
+        conn = pool.acquire(self._get_connection_key(),
+                            self._open_connection)
+        p4 = self.p4
+        self.p4 = conn.p4
+
+        try:
+            if (self.use_ticket_auth and
+                (time.time() - conn.ticket_check_time >=
+                 self.TICKET_CHECK_INTERVAL_SECS)):
+                self.check_refresh_ticket()
+                conn.ticket_check_time = time.time()
+
+            yield
+        except Exception:
+            # The error may be due to a revoked or expired ticket. Make sure
+            # it's checked the next time the connection is used.
+            conn.ticket_check_time = 0
+            raise
+        finally:
+            self.p4 = p4
+            pool.release(conn)
+
+    def _setup_p4(self, p4):
+        """Configure a P4 instance for this client, before connecting.
+
+        If the client uses stunnel, this will start the proxy.
+
+        Args:
+            p4 (P4.P4):
+                The P4 instance to configure.
+
+        Returns:
+            STunnelProxy:
+            The started stunnel proxy, if any. The caller is responsible for
+            shutting it down.
+        """
+        p4.user = self.username.encode('utf-8')
 
         if self.encoding:
-            self.p4.charset = self.encoding.encode('utf-8')
+            p4.charset = self.encoding.encode('utf-8')
 
         # Exceptions will only be raised for errors, not warnings.
-        self.p4.exception_level = 1
+        p4.exception_level = 1
 
         if self.use_stunnel:
             # Spin up an stunnel client and then redirect through that
@@ -376,13 +714,13 @@ class PerforceClient(object):
             proxy = None
             p4_port = self.p4port
 
-        self.p4.port = p4_port.encode('utf-8')
+        p4.port = p4_port.encode('utf-8')
 
         if self.p4host:
-            self.p4.host = self.p4host.encode('utf-8')
+            p4.host = self.p4host.encode('utf-8')
 
         if self.client_name:
-            self.p4.client = self.client_name.encode('utf-8')
+            p4.client = self.client_name.encode('utf-8')
 
         if self.use_ticket_auth:
             # The repository is configured for ticket-based authentication.
@@ -407,40 +745,75 @@ class PerforceClient(object):
                     tickets_dir = None
 
             if tickets_dir:
-                self.p4.ticket_file = \
+                p4.ticket_file = \
                     os.path.join(tickets_dir, 'p4tickets').encode('utf-8')
         else:
             # The repository does not use ticket-based authentication. We'll
             # need to set the password that's provided.
-            self.p4.password = self.password.encode('utf-8')
+            p4.password = self.password.encode('utf-8')
 
-        try:
-            with self.p4.connect():
-                if self.use_ticket_auth:
-                    # The ticket may not exist, may have expired, or may be
-                    # close to expiring. Check for those conditions and
-                    # possibly request/extend a ticket.
-                    self.check_refresh_ticket()
+        return proxy
 
-                yield
-        finally:
+    def _open_connection(self):
+        """Open a new connection for the connection pool.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the connected ``P4.P4`` instance and the
+            :py:class:`STunnelProxy`, if any.
+        """
+        import P4
+
+        p4 = P4.P4()
+        proxy = self._setup_p4(p4)
+
+        try:
+            p4.connect()
+        except Exception:
             if proxy:
                 try:
                     proxy.shutdown()
                 except:
                     pass
 
+            raise
+
+        return p4, proxy
+
+    def _get_connection_key(self):
+        """Return the key identifying this client's pooled connections.
+
+        Connections are only shared between clients with the same server,
+        credentials, and settings.
+
+        Returns:
+            tuple:
+            The key for the connection pool.
+        """
+        return (
+            self.p4port,
+            self.use_stunnel,
+            self.username,
+            hashlib.sha256(self.password.encode('utf-8')).hexdigest(),
+            self.encoding,
+            self.p4host,
+            self.client_name,
+            self.local_site_name,
+            self.use_ticket_auth,
+        )
+
     @contextmanager
     def run_worker(self):
         """Run a Perforce command from within a Perforce connection context.
 
-        This will set up a Perforce connection for an operation, disconnecting
-        when the context is finished, and raising a suitable exception if
-        anything goes wrong.
+        This will set up a Perforce connection for an operation, and raise
+        a suitable exception if anything goes wrong. The connection comes
+        from the shared connection pool (see :py:meth:`connect_pooled`),
+        unless :py:attr:`use_connection_pool` is ``False``.
 
         Context:
             The context for the connection. Once the context ends, the
-            connection will close.
+            connection will be returned to the pool or closed.
 
             No variables are passed to the context.
 
@@ -470,8 +843,13 @@ class PerforceClient(object):
         """
         from P4 import P4Exception
 
+        if self.use_connection_pool:
+            connect = self.connect_pooled
+        else:
+            connect = self.connect
+
         try:
-            with self.connect():
+            with connect():
                 yield
         except P4Exception as e:
             error = six.text_type(e)
@@ -560,6 +938,88 @@ class PerforceClient(object):
 
         return b''
 
+    def get_files(self, files):
+        """Return the contents of several files at specified revisions.
+
+        All the files are fetched with a single :command:`p4 print`. Any
+        files that can't be matched up with the results are fetched
+        individually through :py:meth:`get_file`.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples, with the same meanings
+                as the arguments to :py:meth:`get_file`.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the file contents (:py:class:`bytes`), or the exception raised
+            when fetching it.
+        """
+        results = [None] * len(files)
+        depot_paths = []
+
+        for i, (path, revision) in enumerate(files):
+            if revision == PRE_CREATION:
+                results[i] = b''
+            elif revision == HEAD:
+                depot_paths.append((i, path, None, path))
+            else:
+                revision = six.text_type(revision)
+                depot_paths.append((i, path, revision,
+                                    '%s#%s' % (path, revision)))
+
+        if not depot_paths:
+            return results
+
+        with self.run_worker():
+            res = self.p4.run_print('-q', *[
+                depot_path
+                for i, path, revision, depot_path in depot_paths
+            ])
+
+        # The results contain a dictionary of information on each file,
+        # followed by the contents of the file. Files that couldn't be
+        # printed are left out.
+        contents_by_rev = {}
+        contents_by_path = {}
+        file_info = None
+        file_contents = []
+
+        for item in res + [{}]:
+            if not isinstance(item, dict):
+                file_contents.append(item)
+                continue
+
+            if file_info:
+                if file_contents:
+                    data = file_contents[0][:0].join(file_contents)
+                else:
+                    data = b''
+
+                contents_by_rev[(file_info.get('depotFile'),
+                                 file_info.get('rev'))] = data
+                contents_by_path[file_info.get('depotFile')] = data
+
+            file_info = item
+            file_contents = []
+
+        for i, path, revision, depot_path in depot_paths:
+            if revision is None:
+                data = contents_by_path.get(path)
+            else:
+                data = contents_by_rev.get((path, revision))
+
+            if data is None:
+                try:
+                    data = self.get_file(path, revision or HEAD)
+                except Exception as e:
+                    data = e
+
+            results[i] = data
+
+        return results
+
     def get_file_stat(self, path, revision):
         """Return status information about a file in the repository.
 
@@ -768,6 +1228,38 @@ class PerforceTool(SCMTool):
         """
         return self.client.get_file(path, revision)
 
+    def get_files(self, files, **kwargs):
+        """Return the contents of several files in the repository.
+
+        The files are all fetched in a single :command:`p4 print`.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples.
+
+            **kwargs (dict):
+                Unused keyword arguments.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the file contents or the exception raised when fetching it.
+        """
+        if (six.get_unbound_function(type(self).get_file) is not
+            six.get_unbound_function(PerforceTool.get_file)):
+            # A subclass is providing its own files.
+            return super(PerforceTool, self).get_files(files, **kwargs)
+
+        try:
+            return self.client.get_files([
+                (path, revision)
+                for path, revision, base_commit_id in files
+            ])
+        except SCMError:
+            # The batch couldn't be fetched as a whole. Fetch each file
+            # individually, so that errors are reported for the right files.
+            return super(PerforceTool, self).get_files(files, **kwargs)
+
     def file_exists(self, path, revision=HEAD, **kwargs):
         """Return whether a particular file exists in a repository.
 
@@ -0,0 +1,291 @@
+"""Long-lived helper processes and idle resources for SCMTools.
+
+Some SCMTools keep helper processes (such as :command:`git cat-file --batch`
+or Mercurial's command server) or server connections open between
+operations, rather than paying the cost of starting them up each time.
+:py:class:`PersistentProcess` handles the common parts of running such a
+process, and :py:func:`register_idle_resource` shuts down processes and
+connections once they've gone unused for a while.
+
+Idle resources are checked by a single background thread in each process,
+every :py:data:`IDLE_CHECK_INTERVAL_SECS` seconds.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import os
+import threading
+import time
+import weakref
+
+
+#: The number of seconds between checks for idle resources.
+IDLE_CHECK_INTERVAL_SECS = 10
+
+
+_idle_resources = weakref.WeakSet()
+_idle_resources_lock = threading.Lock()
+_idle_reaper_pid = None
+
+
+def register_idle_resource(resource):
+    """Register a resource to be shut down when idle.
+
+    The resource's ``close_if_idle()`` method will be called periodically
+    from a background thread, for as long as the resource exists. It's
+    responsible for checking how long it's been idle, and for not blocking
+    while it's in use.
+
+    Registering a resource more than once has no effect, other than
+    starting the background thread if this process was forked after the
+    resource was first registered.
+
+    Args:
+        resource (object):
+            The resource to register.
+    """
+    global _idle_reaper_pid
+
+    pid = os.getpid()
+
+    with _idle_resources_lock:
+        _idle_resources.add(resource)
+
+        if _idle_reaper_pid != pid:
+            # Threads don't survive a fork, so each process needs its own.
+            _idle_reaper_pid = pid
+
+            thread = threading.Thread(target=_run_idle_reaper,
+                                      name='SCMToolIdleReaper')
+            thread.daemon = True
+            thread.start()
+
+
+def _run_idle_reaper():
+    """Periodically shut down idle resources."""
+    while True:
+        time.sleep(IDLE_CHECK_INTERVAL_SECS)
+
+        with _idle_resources_lock:
+            resources = list(_idle_resources)
+
+        for resource in resources:
+            try:
+                resource.close_if_idle()
+            except Exception as e:
+                logging.exception('Unable to close idle resource %r: %s',
+                                  resource, e)
+
+        # Don't keep the resources alive until the next check.
+        resources = None
+
+
+class PersistentProcess(object):
+    """A long-lived helper process, shared between threads.
+
+    The process is started on first use, restarted if it exits or
+    communicating with it fails, and shut down after being idle for
+    :py:attr:`IDLE_TIMEOUT` seconds. Access is serialized, so instances can
+    be shared between threads. A process forked from the one that started
+    the helper process will start its own.
+
+    Subclasses must implement :py:meth:`_start_process`, and communicate
+    with the process through :py:meth:`_call`.
+    """
+
+    #: The number of seconds the process can be idle before it's shut down.
+    IDLE_TIMEOUT = 60
+
+    def __init__(self, local_site_name=None):
+        """Initialize the process.
+
+        Args:
+            local_site_name (unicode, optional):
+                The name of the Local Site being used, if any.
+        """
+        self.local_site_name = local_site_name
+
+        self._process = None
+        self._pid = None
+        self._devnull = None
+        self._lock = threading.Lock()
+        self._last_used = 0
+
+    def close(self):
+        """Shut down the process, if it's running.
+
+        A new process will be started if the instance is used again.
+        """
+        with self._lock:
+            self._stop_process()
+
+    def close_if_idle(self):
+        """Shut down the process if it's been idle for too long.
+
+        If the process is in use, this does nothing.
+        """
+        if self._lock.acquire(False):
+            try:
+                if (self._process is not None and
+                    self.IDLE_TIMEOUT is not None and
+                    time.time() - self._last_used >= self.IDLE_TIMEOUT):
+                    self._stop_process()
+            finally:
+                self._lock.release()
+
+    def _call(self, func, *args):
+        """Call a function that communicates with the process.
+
+        If the function fails, the process may have crashed or been killed,
+        so a new one is started and the function is called once more.
+
+        Args:
+            func (callable):
+                The function to call. This takes the running
+                :py:class:`subprocess.Popen` and ``args``.
+
+            *args (tuple):
+                Additional arguments for the function.
+
+        Returns:
+            object:
+            The result of the function.
+
+        Raises:
+            IOError:
+                The process couldn't be written to or read from.
+
+            OSError:
+                The process couldn't be started.
+        """
+        with self._lock:
+            try:
+                try:
+                    return func(self._get_process(), *args)
+                except (IOError, OSError) as e:
+                    if not self._can_restart():
+                        raise
+
+                    logging.warning('%s failed (%s). Restarting it.',
+                                    self._get_description(), e)
+                    self._stop_process()
+
+                    try:
+                        return func(self._get_process(), *args)
+                    except (IOError, OSError):
+                        self._stop_process()
+                        raise
+            finally:
+                self._last_used = time.time()
+
+    def _get_description(self):
+        """Return a description of the process for log messages.
+
+        Returns:
+            unicode:
+            The description.
+        """
+        return type(self).__name__
+
+    def _can_restart(self):
+        """Return whether the process should be restarted after a failure.
+
+        Returns:
+            bool:
+            Whether to restart the process.
+        """
+        return True
+
+    def _start_process(self, stderr):
+        """Start the process.
+
+        This must be implemented by subclasses.
+
+        Args:
+            stderr (file):
+                The file to send the error output of the process to.
+
+        Returns:
+            subprocess.Popen:
+            The new process.
+
+        Raises:
+            OSError:
+                The process couldn't be started.
+        """
+        raise NotImplementedError
+
+    def _init_process(self, process):
+        """Prepare a newly-started process for use.
+
+        Subclasses can override this to check that the process started up
+        properly. If this raises an exception, the process is stopped.
+
+        Args:
+            process (subprocess.Popen):
+                The new process.
+
+        Raises:
+            IOError:
+                The process didn't start up properly.
+        """
+        pass
+
+    def _get_process(self):
+        """Return the running process, starting it if needed.
+
+        Returns:
+            subprocess.Popen:
+            The running process.
+
+        Raises:
+            IOError:
+                The process didn't start up properly.
+
+            OSError:
+                The process couldn't be started.
+        """
+        if self._pid != os.getpid():
+            # This is a new process that was forked from the one that
+            # started the helper process. Leave it to that process.
+            self._process = None
+
+        if self._process is not None and self._process.poll() is not None:
+            # The process exited since it was last used.
+            self._process = None
+
+        if self._process is None:
+            # Anything written to stderr is discarded, since nothing would
+            # read it while the process is running.
+            self._stop_process()
+            self._devnull = open(os.devnull, 'wb')
+            self._process = self._start_process(self._devnull)
+            self._pid = os.getpid()
+
+            try:
+                self._init_process(self._process)
+            except Exception:
+                self._stop_process()
+                raise
+
+            register_idle_resource(self)
+
+        return self._process
+
+    def _stop_process(self):
+        """Stop the running process, if any."""
+        process = self._process
+        self._process = None
+
+        if process is not None and self._pid == os.getpid():
+            try:
+                # Closing stdin tells the process to exit.
+                process.stdin.close()
+                process.wait()
+            except (IOError, OSError):
+                pass
+
+        if self._devnull is not None:
+            self._devnull.close()
+            self._devnull = None
@@ -157,6 +157,36 @@ class SVNTool(SCMTool):
     def get_file(self, path, revision=HEAD, **kwargs):
         return self.client.get_file(path, revision)
 
+    def get_files(self, files, **kwargs):
+        """Return the contents of several files from the repository.
+
+        The svn:keywords properties needed to collapse keywords in the
+        files are looked up a directory at a time, rather than once per
+        file.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples.
+
+            **kwargs (dict):
+                Unused keyword arguments.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the file contents or the exception raised when fetching it.
+        """
+        if (six.get_unbound_function(type(self).get_file) is not
+            six.get_unbound_function(SVNTool.get_file)):
+            # A subclass is providing its own files. Fetch each file through
+            # get_file().
+            return super(SVNTool, self).get_files(files, **kwargs)
+
+        return self.client.get_files([
+            (path, revision)
+            for path, revision, base_commit_id in files
+        ])
+
     def get_keywords(self, path, revision=HEAD):
         return self.client.get_keywords(path, revision)
 
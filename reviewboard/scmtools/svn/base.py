@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import logging
+import posixpath
 import re
 
+from django.core.cache import cache
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.six.moves.urllib.parse import unquote
+from djblets.cache.backend import make_cache_key
+
 from reviewboard.scmtools.core import HEAD
 
 
@@ -37,9 +45,20 @@ class Client(object):
         'url': URL_KEYWORDS,
     }
 
+    #: The maximum number of compiled keyword collapsing expressions to keep.
+    MAX_KEYWORD_REGEXES = 100
+
+    # Compiled keyword collapsing expressions, keyed by svn:keywords value.
+    _keyword_regexes = {}
+
     def __init__(self, config_dir, repopath, username=None, password=None):
         self.repopath = repopath
 
+        # svn:keywords values looked up by this client, keyed by
+        # (path, revision). Values for HEAD are only remembered here, for
+        # the lifetime of this client.
+        self._keywords_cache = {}
+
     def set_ssl_server_trust_prompt(self, cb):
         raise NotImplementedError
 
@@ -47,6 +66,25 @@ class Client(object):
         """Returns the contents of a given file at the given revision."""
         raise NotImplementedError
 
+    def get_files(self, files):
+        """Returns the contents of several files at the given revisions.
+
+        ``files`` is a list of ``(path, revision)`` tuples. The result is
+        a list with an entry for each file, in order, containing either the
+        file's contents or the exception raised when fetching it.
+
+        By default, each file is fetched in turn through :py:meth:`get_file`.
+        """
+        results = []
+
+        for path, revision in files:
+            try:
+                results.append(self.get_file(path, revision))
+            except Exception as e:
+                results.append(e)
+
+        return results
+
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
         raise NotImplementedError
@@ -103,20 +141,159 @@ class Client(object):
         isn't good for us as we need to diff against the collapsed version.
         This function makes that transformation.
         """
-        def repl(m):
-            if m.group(2):
-                return b'$%s::%s$' % (m.group(1), b' ' * len(m.group(3)))
+        if b'$' not in data:
+            # There can't be any expanded keywords, so don't bother
+            # scanning the file.
+            return data
+
+        regex = self._get_keyword_regex(keyword_str)
 
-            return b'$%s$' % m.group(1)
+        if regex is None:
+            return data
+
+        return regex.sub(self._collapse_keyword, data)
+
+    def _get_keyword_regex(self, keyword_str):
+        """Returns a compiled regex for collapsing the given keywords.
+
+        The regexes are shared by all clients, since files in a repository
+        tend to use only a handful of different svn:keywords values.
+
+        If none of the keywords are known, this returns None.
+        """
+        try:
+            return self._keyword_regexes[keyword_str]
+        except KeyError:
+            pass
 
         # Get any aliased keywords
         keywords = [re.escape(keyword).encode('utf-8')
                     for name in re.split(r'\W+', keyword_str)
                     for keyword in self.keywords.get(name.lower(), [])]
 
-        regex = re.compile(r"\$(%s):(:?)([^\$\n\r]*)\$" % '|'.join(keywords),
-                           re.IGNORECASE)
-        return regex.sub(repl, data)
+        if keywords:
+            regex = re.compile(
+                r"\$(%s):(:?)([^\$\n\r]*)\$" % '|'.join(keywords),
+                re.IGNORECASE)
+        else:
+            regex = None
+
+        if len(self._keyword_regexes) >= self.MAX_KEYWORD_REGEXES:
+            self._keyword_regexes.clear()
+
+        self._keyword_regexes[keyword_str] = regex
+
+        return regex
+
+    def _collapse_keyword(self, m):
+        """Returns the collapsed form of a matched keyword."""
+        if m.group(2):
+            return b'$%s::%s$' % (m.group(1), b' ' * len(m.group(3)))
+
+        return b'$%s$' % m.group(1)
+
+    def _get_cached_keywords(self, path, revision):
+        """Returns the cached svn:keywords value for a path.
+
+        ``path`` is a normalized path, and ``revision`` is the revision
+        as a string, or None for HEAD.
+
+        Keywords for a specific revision never change, so they're stored
+        in the cache and shared between clients and processes.
+
+        This returns None if the keywords aren't cached, and an empty
+        string if the path is known not to have any keywords.
+        """
+        path = force_text(path)
+        key = (path, revision)
+
+        try:
+            return self._keywords_cache[key]
+        except KeyError:
+            pass
+
+        if revision is None:
+            return None
+
+        keywords = cache.get(self._make_keywords_cache_key(path, revision))
+
+        if keywords is not None:
+            self._keywords_cache[key] = keywords
+
+        return keywords
+
+    def _cache_keywords(self, path, revision, keywords):
+        """Caches the svn:keywords value for a path.
+
+        See :py:meth:`_get_cached_keywords` for the arguments. ``keywords``
+        may be None if the path has no keywords.
+        """
+        path = force_text(path)
+        keywords = keywords or ''
+
+        self._keywords_cache[(path, revision)] = keywords
+
+        if revision is not None:
+            cache.set(self._make_keywords_cache_key(path, revision), keywords)
+
+    def _make_keywords_cache_key(self, path, revision):
+        """Returns the cache key for a path's svn:keywords value."""
+        return make_cache_key('svn-keywords:%s:%s' % (revision, path))
+
+    def _prefetch_keywords(self, files):
+        """Looks up svn:keywords for many files at once.
+
+        ``files`` is a list of ``(path, revision)`` tuples, in the form
+        expected by :py:meth:`_get_cached_keywords`.
+
+        Files without cached keywords are grouped by their parent
+        directory and revision, and each group is looked up with a single
+        call to :py:meth:`_get_dir_keywords`. The results are cached, so
+        that fetching each file doesn't need its own lookup. Directories
+        with only one such file are skipped, since looking up the file
+        itself costs the same.
+        """
+        dirs = {}
+
+        for path, revision in files:
+            if self._get_cached_keywords(path, revision) is None:
+                dirs.setdefault((posixpath.dirname(path), revision),
+                                set()).add(path)
+
+        for (dir_path, revision), paths in six.iteritems(dirs):
+            if len(paths) < 2:
+                continue
+
+            try:
+                dir_keywords = self._get_dir_keywords(dir_path, revision)
+            except Exception as e:
+                # The files will be looked up individually instead.
+                logging.debug('SVN: Unable to look up svn:keywords for '
+                              '%s at revision %s: %s',
+                              dir_path, revision, e)
+                continue
+
+            # The backend may escape the paths differently than we did, so
+            # compare them unescaped.
+            dir_keywords = dict(
+                (unquote(keywords_path), keywords)
+                for keywords_path, keywords in six.iteritems(dir_keywords)
+            )
+
+            for path in paths:
+                self._cache_keywords(path, revision,
+                                     dir_keywords.get(unquote(path)))
+
+    def _get_dir_keywords(self, path, revision):
+        """Returns the svn:keywords values for the files in a directory.
+
+        ``revision`` is the revision as a string, or None for HEAD.
+
+        The result is a dictionary mapping the paths of any files directly
+        in the directory that have keywords set to their svn:keywords
+        values.
+        """
+        raise NotImplementedError
 
     @property
     def repository_info(self):
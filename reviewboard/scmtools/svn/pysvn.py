@@ -52,20 +52,7 @@ class Client(base.Client):
             raise FileNotFoundError(path, revision)
 
         try:
-            normpath = self.normalize_path(path)
-
-            # SVN expects to have URLs escaped. Take care to only
-            # escape the path part of the URL.
-            if self.client.is_url(normpath):
-                pathtuple = urlsplit(normpath)
-                path = pathtuple[2]
-                if isinstance(path, six.text_type):
-                    path = path.encode('utf-8', 'ignore')
-                normpath = urlunsplit((pathtuple[0],
-                                       pathtuple[1],
-                                       quote(path),
-                                       '', ''))
-
+            normpath = self._normalize_url(path)
             normrev = self._normalize_revision(revision)
             return cb(normpath, normrev)
 
@@ -82,16 +69,33 @@ class Client(base.Client):
             else:
                 raise SVNTool.normalize_error(e)
 
+    def _normalize_url(self, path):
+        normpath = self.normalize_path(path)
+
+        # SVN expects to have URLs escaped. Take care to only
+        # escape the path part of the URL.
+        if self.client.is_url(normpath):
+            pathtuple = urlsplit(normpath)
+            path = pathtuple[2]
+            if isinstance(path, six.text_type):
+                path = path.encode('utf-8', 'ignore')
+            normpath = urlunsplit((pathtuple[0],
+                                   pathtuple[1],
+                                   quote(path),
+                                   '', ''))
+
+        return normpath
+
     def _get_file_data(self, normpath, normrev):
         data = self.client.cat(normpath, normrev)
 
         # Find out if this file has any keyword expansion set.
         # If it does, collapse these keywords. This is because SVN
         # will return the file expanded to us, which would break patching.
-        keywords = self.client.propget("svn:keywords", normpath, normrev,
-                                       recurse=True)
-        if normpath in keywords:
-            data = self.collapse_keywords(data, keywords[normpath])
+        keywords = self._get_file_keywords(normpath, normrev)
+
+        if keywords:
+            data = self.collapse_keywords(data, keywords)
 
         return data
 
@@ -99,10 +103,51 @@ class Client(base.Client):
         """Returns the contents of a given file at the given revision."""
         return self._do_on_path(self._get_file_data, path, revision)
 
+    def get_files(self, files):
+        """Returns the contents of several files at the given revisions.
+
+        The svn:keywords properties for the files are looked up with one
+        call per directory, rather than one call per file.
+        """
+        prefetch = []
+
+        for path, revision in files:
+            if path and revision != PRE_CREATION:
+                if revision == HEAD:
+                    revision = None
+                else:
+                    revision = six.text_type(revision)
+
+                prefetch.append((self._normalize_url(path), revision))
+
+        self._prefetch_keywords(prefetch)
+
+        return super(Client, self).get_files(files)
+
     def _get_file_keywords(self, normpath, normrev):
-        keywords = self.client.propget("svn:keywords", normpath, normrev,
-                                       recurse=True)
-        return keywords.get(normpath)
+        if normrev.kind == opt_revision_kind.number:
+            revision = six.text_type(normrev.number)
+        else:
+            revision = None
+
+        keywords = self._get_cached_keywords(normpath, revision)
+
+        if keywords is None:
+            keywords = self.client.propget("svn:keywords", normpath, normrev,
+                                           recurse=True).get(normpath)
+            self._cache_keywords(normpath, revision, keywords)
+
+        return keywords or None
+
+    def _get_dir_keywords(self, path, revision):
+        if revision is None:
+            normrev = self._normalize_revision(HEAD)
+        else:
+            normrev = self._normalize_revision(revision)
+
+        return self.client.propget("svn:keywords", path, normrev,
+                                   peg_revision=normrev,
+                                   depth=pysvn.depth.files)
 
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
@@ -83,11 +83,66 @@ class Client(base.Client):
             contents = self.collapse_keywords(contents, keywords)
         return contents
 
+    def get_files(self, files):
+        """Returns the contents of several files at the given revisions.
+
+        The svn:keywords properties for the files are looked up with one
+        call per directory, rather than one call per file.
+        """
+        if api_version()[:2] >= (1, 5):
+            prefetch = []
+
+            for path, revision in files:
+                if path and revision != PRE_CREATION:
+                    try:
+                        keywords_revision = \
+                            self._get_keywords_revision(revision)
+                    except ValueError:
+                        # This will fail when fetching the file.
+                        continue
+
+                    prefetch.append((B(self.normalize_path(path)),
+                                     keywords_revision))
+
+            self._prefetch_keywords(prefetch)
+
+        return super(Client, self).get_files(files)
+
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
         revnum = self._normalize_revision(revision, negatives_allowed=False)
         path = self.normalize_path(path)
-        return self.client.propget(SVN_KEYWORDS, path, None, revnum).get(path)
+        keywords_revision = self._get_keywords_revision(revision)
+        keywords = self._get_cached_keywords(path, keywords_revision)
+
+        if keywords is None:
+            keywords = self.client.propget(SVN_KEYWORDS, path, None,
+                                           revnum).get(path)
+            self._cache_keywords(path, keywords_revision, keywords)
+
+        return keywords or None
+
+    def _get_keywords_revision(self, revision):
+        if revision == HEAD:
+            return None
+
+        return six.text_type(self._normalize_revision(revision))
+
+    def _get_dir_keywords(self, path, revision):
+        if revision is None:
+            revnum = B('HEAD')
+        else:
+            revnum = int(revision)
+
+        depth = 1  # Only the files directly in this path.
+        result = {}
+
+        for prop_path, props in self.client.proplist(path, revnum, revnum,
+                                                     depth):
+            if SVN_KEYWORDS in props:
+                result[prop_path] = props[SVN_KEYWORDS]
+
+        return result
 
     def _normalize_revision(self, revision, negatives_allowed=True):
         if revision is None:
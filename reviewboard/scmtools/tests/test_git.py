@@ -8,9 +8,11 @@ from django.utils import six
 from kgb import SpyAgency
 
 from reviewboard.diffviewer.parser import DiffParserError
-from reviewboard.scmtools.core import PRE_CREATION
+from reviewboard.scmtools.core import HEAD, PRE_CREATION
 from reviewboard.scmtools.errors import SCMError, FileNotFoundError
-from reviewboard.scmtools.git import ShortSHA1Error, GitClient
+from reviewboard.scmtools.git import (GitCatFileProcess, GitClient,
+                                     ShortSHA1Error,
+                                     get_git_cat_file_process)
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.tests.testcases import SCMTestCase
 
@@ -803,6 +805,98 @@ class GitTests(SpyAgency, SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('readme', '0000000'))
 
+    def test_get_files(self):
+        """Testing GitTool.get_files"""
+        cat_file_process = get_git_cat_file_process(self.tool.client.git_dir)
+
+        self.spy_on(cat_file_process.get_objects)
+
+        files = self.tool.get_files([
+            ('readme', PRE_CREATION, None),
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+            ('readme', HEAD, None),
+            ('readme', '0000000', None),
+            ('readme', 'a62df6c', None),
+        ])
+
+        self.assertEqual(len(cat_file_process.get_objects.calls), 1)
+        self.assertEqual(len(files), 6)
+        self.assertEqual(files[0], b'')
+        self.assertEqual(files[1], b'Hello\n')
+        self.assertEqual(files[2], b'Hello there\n')
+        self.assertEqual(files[3], b'Hello there\n')
+        self.assertIsInstance(files[4], FileNotFoundError)
+        self.assertIsInstance(files[5], SCMError)
+
+    def test_get_file_reuses_cat_file_process(self):
+        """Testing GitTool.get_file reuses the git cat-file process"""
+        cat_file_process = get_git_cat_file_process(self.tool.client.git_dir)
+        cat_file_process.close()
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        process = cat_file_process._process
+        self.assertIsNotNone(process)
+
+        self.assertEqual(self.tool.get_file('readme', 'd6613f5'),
+                         b'Hello there\n')
+        self.assertIs(cat_file_process._process, process)
+
+    def test_get_file_after_cat_file_process_exits(self):
+        """Testing GitTool.get_file after the git cat-file process exits"""
+        cat_file_process = get_git_cat_file_process(self.tool.client.git_dir)
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+
+        process = cat_file_process._process
+        process.kill()
+        process.wait()
+
+        self.assertEqual(self.tool.get_file('readme', 'd6613f5'),
+                         b'Hello there\n')
+        self.assertIsNot(cat_file_process._process, process)
+
+    def test_cat_file_process_idle_timeout(self):
+        """Testing GitCatFileProcess shuts down after the idle timeout"""
+        cat_file_process = get_git_cat_file_process(self.tool.client.git_dir)
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+
+        process = cat_file_process._process
+
+        # The process was just used, so it shouldn't be shut down yet.
+        cat_file_process.close_if_idle()
+        self.assertIs(cat_file_process._process, process)
+
+        cat_file_process._last_used -= GitCatFileProcess.IDLE_TIMEOUT
+        cat_file_process.close_if_idle()
+
+        self.assertIsNone(cat_file_process._process)
+        self.assertIsNotNone(process.poll())
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+
+    def test_cat_file_process_get_objects(self):
+        """Testing GitCatFileProcess.get_objects"""
+        git_dir = self.tool.client.git_dir
+
+        self.assertEqual(
+            get_git_cat_file_process(git_dir).get_objects(
+                ['e965047', '0000000', 'HEAD:readme']),
+            [
+                ('blob', b'Hello\n'),
+                None,
+                ('blob', b'Hello there\n'),
+            ])
+        self.assertEqual(
+            get_git_cat_file_process(git_dir, '--batch-check').get_objects(
+                ['e965047', 'fffffff', 'a62df6c']),
+            [
+                ('blob', 6),
+                None,
+                ('commit', 238),
+            ])
+
     def test_parse_diff_revision_with_remote_and_short_SHA1_error(self):
         """Testing GitTool.parse_diff_revision with remote files and short
         SHA1 error
@@ -4,16 +4,21 @@ from __future__ import unicode_literals
 import os
 
 import nose
+from kgb import SpyAgency
 
 from reviewboard.scmtools.core import PRE_CREATION, Revision
 from reviewboard.scmtools.errors import SCMError, FileNotFoundError
-from reviewboard.scmtools.hg import HgDiffParser, HgGitDiffParser
+from reviewboard.scmtools.hg import (HgCommandServer,
+                                     HgCommandServerUnavailable,
+                                     HgDiffParser,
+                                     HgGitDiffParser,
+                                     get_hg_command_server)
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.tests.testcases import SCMTestCase
 from reviewboard.testing import online_only
 
 
-class MercurialTests(SCMTestCase):
+class MercurialTests(SpyAgency, SCMTestCase):
     """Unit tests for mercurial."""
 
     fixtures = ['test_scmtools']
@@ -35,6 +40,20 @@ class MercurialTests(SCMTestCase):
     def _first_file_in_diff(self, diff):
         return self.tool.get_parser(diff).parse()[0]
 
+    def _get_command_server(self):
+        """Return the hg command server for the test repository.
+
+        A command must have been run first.
+
+        Returns:
+            reviewboard.scmtools.hg.HgCommandServer:
+            The command server.
+        """
+        client = self.tool.client
+
+        return get_hg_command_server(client.default_args,
+                                     local_site_name=client.local_site_name)
+
     def test_ssh_disallowed(self):
         """Testing HgTool does not allow SSH URLs"""
         with self.assertRaises(SCMError):
@@ -325,6 +344,86 @@ class MercurialTests(SCMTestCase):
             bogus_rev,
             base_commit_id=base_commit_id))
 
+    def test_get_file_reuses_command_server(self):
+        """Testing HgTool.get_file reuses the hg command server"""
+        rev = Revision('661e5dd3c493')
+
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+
+        command_server = self._get_command_server()
+        process = command_server._process
+        self.assertIsNotNone(process)
+
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+        self.assertIs(command_server._process, process)
+
+    def test_get_file_after_command_server_exits(self):
+        """Testing HgTool.get_file after the hg command server exits"""
+        rev = Revision('661e5dd3c493')
+
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+
+        command_server = self._get_command_server()
+        process = command_server._process
+        process.kill()
+        process.wait()
+
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+        self.assertIsNot(command_server._process, process)
+
+    def test_get_file_without_command_server(self):
+        """Testing HgTool.get_file when the hg command server is
+        unavailable
+        """
+        def _run_command(*args, **kwargs):
+            raise HgCommandServerUnavailable('unavailable')
+
+        self.spy_on(HgCommandServer.run_command, call_fake=_run_command)
+
+        self.assertEqual(
+            self.tool.get_file('doc/readme', Revision('661e5dd3c493')),
+            b'Hello\n\ngoodbye\n')
+        self.assertTrue(HgCommandServer.run_command.called)
+
+    def test_command_server_idle_timeout(self):
+        """Testing HgCommandServer shuts down after the idle timeout"""
+        self.assertEqual(len(self.tool.get_commits()), 2)
+
+        command_server = self._get_command_server()
+        process = command_server._process
+
+        # The server was just used, so it shouldn't be shut down yet.
+        command_server.close_if_idle()
+        self.assertIs(command_server._process, process)
+
+        command_server._last_used -= HgCommandServer.IDLE_TIMEOUT
+        command_server.close_if_idle()
+
+        self.assertIsNone(command_server._process)
+        self.assertIsNotNone(process.poll())
+
+        self.assertEqual(len(self.tool.get_commits()), 2)
+
+    def test_command_server_run_command(self):
+        """Testing HgCommandServer.run_command"""
+        self.tool.get_branches()
+        command_server = self._get_command_server()
+
+        exit_code, output, errors = command_server.run_command(
+            ['cat', '--rev', '661e5dd3c493', 'doc/readme'])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(output, b'Hello\n\ngoodbye\n')
+
+        exit_code, output, errors = command_server.run_command(
+            ['cat', '--rev', '661e5dd3c493', 'doc/readme2'])
+        self.assertNotEqual(exit_code, 0)
+        self.assertEqual(output, b'')
+        self.assertNotEqual(errors, b'')
+
     def test_interface(self):
         """Testing basic HgTool API"""
         self.assertTrue(self.tool.diffs_use_absolute_paths)
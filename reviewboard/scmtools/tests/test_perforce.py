@@ -17,10 +17,28 @@ from reviewboard.scmtools.core import PRE_CREATION
 from reviewboard.scmtools.errors import (AuthenticationError,
                                          RepositoryNotFoundError, SCMError)
 from reviewboard.scmtools.models import Repository, Tool
-from reviewboard.scmtools.perforce import STunnelProxy
+from reviewboard.scmtools.perforce import (PerforceConnectionPool,
+                                           STunnelProxy,
+                                           get_perforce_connection_pool)
 from reviewboard.scmtools.tests.testcases import SCMTestCase
 from reviewboard.site.models import LocalSite
-from reviewboard.testing import online_only
+from reviewboard.testing import TestCase, online_only
+
+
+class DummyP4(object):
+    """A stand-in for a connected P4 instance."""
+
+    def __init__(self):
+        self.is_connected = True
+
+    def connected(self):
+        return self.is_connected
+
+    def disconnect(self):
+        self.is_connected = False
+
+    def run_info(self):
+        return [{}]
 
 
 class PerforceTests(SpyAgency, SCMTestCase):
@@ -50,6 +68,7 @@ class PerforceTests(SpyAgency, SCMTestCase):
     def tearDown(self):
         super(PerforceTests, self).tearDown()
 
+        get_perforce_connection_pool().close()
         shutil.rmtree(os.path.join(settings.SITE_DATA_DIR, 'p4'),
                       ignore_errors=True)
 
@@ -135,6 +154,26 @@ class PerforceTests(SpyAgency, SCMTestCase):
         self.assertEqual(md5(file).hexdigest(),
                          '227bdd87b052fcad9369e65c7bf23fd0')
 
+    @online_only
+    def test_get_files(self):
+        """Testing PerforceTool.get_files"""
+        path = '//public/perforce/api/python/P4Client/p4.py'
+
+        self.spy_on(self.tool.client.get_file)
+
+        files = self.tool.get_files([
+            ('//depot/foo', PRE_CREATION, None),
+            (path, '1', None),
+            (path, '1', None),
+        ])
+
+        self.assertEqual(len(files), 3)
+        self.assertEqual(files[0], b'')
+        self.assertEqual(md5(files[1]).hexdigest(),
+                         '227bdd87b052fcad9369e65c7bf23fd0')
+        self.assertEqual(files[2], files[1])
+        self.assertFalse(self.tool.client.get_file.called)
+
     @online_only
     def test_file_exists(self):
         """Testing PerforceTool.file_exists"""
@@ -278,6 +317,59 @@ class PerforceTests(SpyAgency, SCMTestCase):
                              os.path.join(settings.SITE_DATA_DIR, 'p4',
                                           'p4tickets'))
 
+    def test_run_worker_reuses_connections(self):
+        """Testing PerforceClient.run_worker reuses pooled connections"""
+        client = self.tool.client
+        self.spy_on(client._open_connection,
+                    call_fake=lambda *args: (DummyP4(), None))
+
+        self.assertEqual(client.get_info(), [{}])
+        self.assertEqual(client.get_info(), [{}])
+        self.assertEqual(len(client._open_connection.calls), 1)
+
+    def test_run_worker_with_different_credentials(self):
+        """Testing PerforceClient.run_worker doesn't share pooled
+        connections between credentials
+        """
+        repo = Repository(name='Perforce.com',
+                          path='public.perforce.com:1666',
+                          tool=Tool.objects.get(name='Perforce'),
+                          username='samwise',
+                          password='bogus')
+        client1 = self.tool.client
+        client2 = repo.get_scmtool().client
+
+        for client in (client1, client2):
+            self.spy_on(client._open_connection,
+                        call_fake=lambda *args: (DummyP4(), None))
+            client.get_info()
+
+        self.assertEqual(len(client1._open_connection.calls), 1)
+        self.assertEqual(len(client2._open_connection.calls), 1)
+
+    def test_run_worker_with_ticket_auth(self):
+        """Testing PerforceClient.run_worker with ticket-based logins only
+        checks tickets on pooled connections periodically
+        """
+        repo = Repository(name='Perforce.com',
+                          path='public.perforce.com:1666',
+                          tool=Tool.objects.get(name='Perforce'),
+                          username='samwise',
+                          password='bogus')
+        repo.extra_data = {
+            'use_ticket_auth': True,
+        }
+
+        client = repo.get_scmtool().client
+        self.spy_on(client._open_connection,
+                    call_fake=lambda *args: (DummyP4(), None))
+        self.spy_on(client.check_refresh_ticket, call_original=False)
+
+        client.get_info()
+        client.get_info()
+
+        self.assertEqual(len(client.check_refresh_ticket.calls), 1)
+
     @add_fixtures(['test_site'])
     def test_ticket_login_with_local_site(self):
         """Testing Perforce with ticket-based logins with Local Sites"""
@@ -500,6 +592,123 @@ class PerforceTests(SpyAgency, SCMTestCase):
         self.assertEqual(files[0].delete_count, 1)
 
 
+class PerforceConnectionPoolTests(TestCase):
+    """Unit tests for PerforceConnectionPool."""
+
+    def setUp(self):
+        super(PerforceConnectionPoolTests, self).setUp()
+
+        self.pool = PerforceConnectionPool()
+        self.opened = []
+
+    def tearDown(self):
+        super(PerforceConnectionPoolTests, self).tearDown()
+
+        self.pool.close()
+
+    def test_acquire_reuses_connection(self):
+        """Testing PerforceConnectionPool.acquire reuses released
+        connections
+        """
+        conn1 = self.pool.acquire('key', self._open)
+        self.pool.release(conn1)
+        conn2 = self.pool.acquire('key', self._open)
+
+        self.assertIs(conn1, conn2)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_acquire_with_different_key(self):
+        """Testing PerforceConnectionPool.acquire with a different key"""
+        conn1 = self.pool.acquire('key1', self._open)
+        self.pool.release(conn1)
+        conn2 = self.pool.acquire('key2', self._open)
+
+        self.assertIsNot(conn1, conn2)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_acquire_in_use(self):
+        """Testing PerforceConnectionPool.acquire doesn't hand out
+        connections in use
+        """
+        conn1 = self.pool.acquire('key', self._open)
+        conn2 = self.pool.acquire('key', self._open)
+
+        self.assertIsNot(conn1, conn2)
+
+    def test_acquire_with_disconnected(self):
+        """Testing PerforceConnectionPool.acquire with a dropped connection"""
+        conn1 = self.pool.acquire('key', self._open)
+        self.pool.release(conn1)
+        conn1.p4.is_connected = False
+
+        conn2 = self.pool.acquire('key', self._open)
+
+        self.assertIsNot(conn1, conn2)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_acquire_with_expired(self):
+        """Testing PerforceConnectionPool.acquire closes expired connections
+        """
+        conn1 = self.pool.acquire('key', self._open)
+        self.pool.release(conn1)
+        conn1.last_used -= PerforceConnectionPool.IDLE_TIMEOUT + 1
+
+        conn2 = self.pool.acquire('key', self._open)
+
+        self.assertIsNot(conn1, conn2)
+        self.assertFalse(conn1.p4.is_connected)
+
+    def test_release_with_max_idle(self):
+        """Testing PerforceConnectionPool.release closes the least recently
+        used connections past the limit
+        """
+        conns = [
+            self.pool.acquire('key', self._open)
+            for i in range(PerforceConnectionPool.MAX_IDLE_CONNECTIONS + 1)
+        ]
+
+        for conn in conns:
+            self.pool.release(conn)
+
+        self.assertFalse(conns[0].p4.is_connected)
+        self.assertTrue(all(conn.p4.is_connected for conn in conns[1:]))
+
+    def test_close(self):
+        """Testing PerforceConnectionPool.close"""
+        conn = self.pool.acquire('key', self._open)
+        self.pool.release(conn)
+        self.pool.close()
+
+        self.assertFalse(conn.p4.is_connected)
+        self.assertIsNot(self.pool.acquire('key', self._open), conn)
+
+    def test_close_if_idle(self):
+        """Testing PerforceConnectionPool.close_if_idle"""
+        conn1 = self.pool.acquire('key1', self._open)
+        conn2 = self.pool.acquire('key2', self._open)
+        self.pool.release(conn1)
+        self.pool.release(conn2)
+        conn1.last_used -= PerforceConnectionPool.IDLE_TIMEOUT + 1
+
+        self.pool.close_if_idle()
+
+        self.assertFalse(conn1.p4.is_connected)
+        self.assertTrue(conn2.p4.is_connected)
+        self.assertIs(self.pool.acquire('key2', self._open), conn2)
+
+    def _open(self):
+        """Open a dummy connection.
+
+        Returns:
+            tuple:
+            A 2-tuple of the dummy P4 instance and proxy.
+        """
+        p4 = DummyP4()
+        self.opened.append(p4)
+
+        return p4, None
+
+
 class PerforceStunnelTests(SCMTestCase):
     """Unit tests for perforce running through stunnel.
 
@@ -545,6 +754,7 @@ class PerforceStunnelTests(SCMTestCase):
     def tearDown(self):
         super(PerforceStunnelTests, self).tearDown()
 
+        get_perforce_connection_pool().close()
         self.proxy.shutdown()
 
     def test_changeset(self):
@@ -1,10 +1,15 @@
 from __future__ import unicode_literals
 
 import os
+import threading
+import time
 
 from django.core.cache import cache
+from djblets.cache.backend import cache_memoize, make_cache_key
 
+from reviewboard.cache.local import get_local_cache
 from reviewboard.scmtools.core import HEAD
+from reviewboard.scmtools.errors import FileNotFoundError
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.signals import (checked_file_exists,
                                           checking_file_exists,
@@ -29,6 +34,7 @@ class RepositoryTests(TestCase):
 
         self.scmtool_cls = self.repository.get_scmtool().__class__
         self.old_get_file = self.scmtool_cls.get_file
+        self.old_get_files = self.scmtool_cls.get_files
         self.old_file_exists = self.scmtool_cls.file_exists
 
     def tearDown(self):
@@ -37,6 +43,7 @@ class RepositoryTests(TestCase):
         cache.clear()
 
         self.scmtool_cls.get_file = self.old_get_file
+        self.scmtool_cls.get_files = self.old_get_files
         self.scmtool_cls.file_exists = self.old_file_exists
 
     def test_archive(self):
@@ -117,6 +124,174 @@ class RepositoryTests(TestCase):
         self.assertEqual(found_signals[1],
                          ('fetched_file', path, revision, request))
 
+    def test_get_files(self):
+        """Testing Repository.get_files"""
+        files = self.repository.get_files([
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+            ('readme', '0000000', None),
+        ])
+
+        self.assertEqual(len(files), 3)
+        self.assertEqual(files[0], b'Hello\n')
+        self.assertEqual(files[1], b'Hello there\n')
+        self.assertIsInstance(files[2], FileNotFoundError)
+
+    def test_get_files_caching(self):
+        """Testing Repository.get_files caches results and fetches uncached
+        files together
+        """
+        def get_files(self, files, **kwargs):
+            fetched_files.append(files)
+
+            return [
+                ('data for %s' % revision).encode('utf-8')
+                for path, revision, base_commit_id in files
+            ]
+
+        fetched_files = []
+        self.scmtool_cls.get_files = get_files
+
+        files1 = self.repository.get_files([
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+        ])
+        files2 = self.repository.get_files([
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+            ('readme', 'e965047', None),
+            ('readme', 'a62df6c', None),
+        ])
+
+        self.assertEqual(files1, [b'data for e965047', b'data for d6613f5'])
+        self.assertEqual(files2, [b'data for e965047', b'data for d6613f5',
+                                  b'data for e965047', b'data for a62df6c'])
+        self.assertEqual(len(fetched_files), 2)
+        self.assertEqual(len(fetched_files[0]), 2)
+        self.assertEqual(fetched_files[1], [('readme', 'a62df6c', None)])
+
+        # The files should also be available from get_file.
+        self.assertEqual(self.repository.get_file('readme', 'd6613f5'),
+                         b'data for d6613f5')
+        self.assertEqual(len(fetched_files), 2)
+
+    def test_get_files_with_errors(self):
+        """Testing Repository.get_files doesn't cache errors"""
+        def get_files(self, files, **kwargs):
+            num_calls['get_files'] += 1
+
+            return [
+                FileNotFoundError(path, revision)
+                for path, revision, base_commit_id in files
+            ]
+
+        num_calls = {
+            'get_files': 0,
+        }
+
+        self.scmtool_cls.get_files = get_files
+
+        for i in range(2):
+            files = self.repository.get_files([('readme', 'e965047', None)])
+            self.assertEqual(len(files), 1)
+            self.assertIsInstance(files[0], FileNotFoundError)
+
+        self.assertEqual(num_calls['get_files'], 2)
+
+    def test_get_files_from_cache(self):
+        """Testing Repository.get_files loads cached files without looking
+        them up one at a time
+        """
+        def get_files(self, files, **kwargs):
+            fetched_files.append(files)
+
+            return [
+                ('data for %s' % revision).encode('utf-8')
+                for path, revision, base_commit_id in files
+            ]
+
+        def get_file(self, *args, **kwargs):
+            raise AssertionError('get_file should not be called')
+
+        fetched_files = []
+        self.scmtool_cls.get_files = get_files
+
+        self.repository.get_files([
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+        ])
+
+        # Only the main cache should be used for the next lookup.
+        get_local_cache().clear()
+        self.repository.get_file = get_file
+
+        files = self.repository.get_files([
+            ('readme', 'd6613f5', None),
+            ('readme', 'e965047', None),
+        ])
+
+        self.assertEqual(files, [b'data for d6613f5', b'data for e965047'])
+        self.assertEqual(len(fetched_files), 1)
+
+    def test_get_files_with_file_being_fetched(self):
+        """Testing Repository.get_files waits for files being fetched
+        elsewhere rather than fetching them again
+        """
+        def get_files(self, files, **kwargs):
+            fetched_files.append(files)
+
+            return [
+                ('data for %s' % revision).encode('utf-8')
+                for path, revision, base_commit_id in files
+            ]
+
+        def _store():
+            time.sleep(0.2)
+            cache_memoize(key, lambda: [b'other data'], large_data=True)
+
+        fetched_files = []
+        self.scmtool_cls.get_files = get_files
+
+        key = self.repository._make_file_cache_key('readme', 'd6613f5', None)
+        cache.add(make_cache_key('%s-lease' % key), True)
+
+        thread = threading.Thread(target=_store)
+        thread.start()
+
+        files = self.repository.get_files([
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+        ])
+
+        thread.join()
+
+        self.assertEqual(files, [b'data for e965047', b'other data'])
+        self.assertEqual(fetched_files, [[('readme', 'e965047', None)]])
+
+    def test_get_files_signals(self):
+        """Testing Repository.get_files emits signals"""
+        def on_fetching_file(sender, path, revision, request, **kwargs):
+            found_signals.append(('fetching_file', path, revision, request))
+
+        def on_fetched_file(sender, path, revision, request, **kwargs):
+            found_signals.append(('fetched_file', path, revision, request))
+
+        found_signals = []
+
+        fetching_file.connect(on_fetching_file, sender=self.repository)
+        fetched_file.connect(on_fetched_file, sender=self.repository)
+
+        path = 'readme'
+        revision = 'e965047'
+        request = {}
+
+        self.repository.get_files([(path, revision, None)], request=request)
+
+        self.assertEqual(found_signals, [
+            ('fetching_file', path, revision, request),
+            ('fetched_file', path, revision, request),
+        ])
+
     def test_get_file_exists_caching_when_exists(self):
         """Testing Repository.get_file_exists caches result when exists"""
         def file_exists(self, path, revision, **kwargs):
@@ -6,6 +6,7 @@ from hashlib import md5
 
 import nose
 from django.conf import settings
+from django.core.cache import cache
 from kgb import SpyAgency
 
 from reviewboard.diffviewer.diffutils import patch
@@ -108,6 +109,52 @@ class CommonSVNTestCase(SpyAgency, SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('hello', PRE_CREATION))
 
+    def test_get_files(self):
+        """Testing SVN (<backend>) get_files"""
+        cache.clear()
+        self.spy_on(self.tool.client._get_dir_keywords)
+
+        filename = 'trunk/doc/misc-docs/Makefile'
+        results = self.tool.get_files([
+            (filename, Revision('4'), None),
+            ('trunk/doc/misc-docs/Makefile2', Revision('4'), None),
+            (filename, Revision('2'), None),
+            ('hello', PRE_CREATION, None),
+        ])
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(results[0].startswith(b'# $Id$\n# $Rev$\n'))
+        self.assertEqual(results[0],
+                         self.tool.get_file(filename, Revision('4')))
+        self.assertIsInstance(results[1], FileNotFoundError)
+        self.assertEqual(
+            results[2],
+            b'include ../tools/Makefile.base-vars\n'
+            b'NAME = misc-docs\n'
+            b'OUTNAME = svn-misc-docs\n'
+            b'INSTALL_DIR = $(DESTDIR)/usr/share/doc/subversion\n'
+            b'include ../tools/Makefile.base-rules\n')
+        self.assertIsInstance(results[3], FileNotFoundError)
+
+        # Both files at revision 4 had their keywords looked up together.
+        self.assertEqual(len(self.tool.client._get_dir_keywords.calls), 1)
+
+    def test_get_keywords_cached(self):
+        """Testing SVN (<backend>) get_keywords caches keywords for a
+        revision
+        """
+        cache.clear()
+
+        filename = 'trunk/doc/misc-docs/Makefile'
+        keywords = self.tool.get_keywords(filename, Revision('4'))
+        self.assertTrue(keywords)
+
+        tool = self.repository.get_scmtool()
+        self.spy_on(tool.client._cache_keywords)
+
+        self.assertEqual(tool.get_keywords(filename, Revision('4')), keywords)
+        self.assertFalse(tool.client._cache_keywords.called)
+
     def test_revision_parsing(self):
         """Testing SVN (<backend>) revision number parsing"""
         self.assertEqual(
@@ -580,3 +627,17 @@ class SubvertpyTests(CommonSVNTestCase):
         for keyword, data, result in keyword_test_data:
             self.assertEqual(self.tool.client.collapse_keywords(data, keyword),
                              result)
+
+    def test_collapse_keywords_with_fixed_width(self):
+        """Testing SVN keyword collapsing with fixed-width keywords"""
+        self.assertEqual(
+            self.tool.client.collapse_keywords(
+                b'# $Rev:: 12    $\n# $Id: test2.c 3 $\n', 'Revision'),
+            b'# $Rev::       $\n# $Id: test2.c 3 $\n')
+
+    def test_collapse_keywords_with_unknown_keywords(self):
+        """Testing SVN keyword collapsing with unknown keywords"""
+        data = b'/* $Id: test2.c 3 2014-08-04 22:55:09Z david $ */'
+
+        self.assertEqual(self.tool.client.collapse_keywords(data, 'Foo'),
+                         data)
@@ -19,6 +19,7 @@ from oauth2_provider.models import AccessToken
 from reviewboard import scmtools, initialize
 from reviewboard.accounts.models import ReviewRequestVisit
 from reviewboard.attachments.models import FileAttachment
+from reviewboard.cache.local import get_local_cache
 from reviewboard.diffviewer.differ import DiffCompatVersion
 from reviewboard.diffviewer.models import DiffSet, DiffSetHistory, FileDiff
 from reviewboard.notifications.models import WebHookTarget
@@ -79,9 +80,14 @@ class TestCase(FixturesCompilerMixin, DjbletsTestCase):
 
         self._local_sites = {}
 
-        # Clear the cache so that previous tests don't impact this one.
+        # Clear the caches so that previous tests don't impact this one.
         cache.clear()
 
+        local_cache = get_local_cache()
+
+        if local_cache is not None:
+            local_cache.clear()
+
     def shortDescription(self):
         """Returns the description of the current test.
 
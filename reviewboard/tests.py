@@ -3,12 +3,16 @@
 from __future__ import unicode_literals
 
 import os
+import threading
+import time
 
 from django.utils import six
+from django.utils.six.moves import BaseHTTPServer, http_client
 from djblets.staticbundles import (
     PIPELINE_JAVASCRIPT as DJBLETS_PIPELINE_JAVASCRIPT,
     PIPELINE_STYLESHEETS as DJBLETS_PIPELINE_STYLESHEETS)
 
+from reviewboard.http_pool import HTTPConnectionPool
 from reviewboard.staticbundles import PIPELINE_JAVASCRIPT, PIPELINE_STYLESHEETS
 from reviewboard.testing import TestCase
 
@@ -49,3 +53,118 @@ class StaticBundlesTests(TestCase):
         """Testing that all static stylesheet files exist"""
         self._check_file_groups(PIPELINE_STYLESHEETS,
                                 DJBLETS_PIPELINE_STYLESHEETS.keys())
+
+
+class HTTPConnectionPoolTests(TestCase):
+    """Unit tests for reviewboard.http_pool.HTTPConnectionPool."""
+
+    def setUp(self):
+        super(HTTPConnectionPoolTests, self).setUp()
+
+        requests = []
+        self.requests = requests
+
+        class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                self._handle()
+
+            def _handle(self):
+                requests.append((self.client_address, self.command,
+                                 self.path))
+
+                if self.path == '/drop/' and len(requests) == 2:
+                    # Close the connection without responding.
+                    self.close_connection = True
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'OK')
+
+                if self.path == '/close/':
+                    # Close the connection once it's idle, without telling
+                    # the client.
+                    self.close_connection = True
+
+            def log_message(self, *args, **kwargs):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                RequestHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        self.url = 'http://127.0.0.1:%s' % self.server.server_port
+        self.pool = HTTPConnectionPool()
+
+    def tearDown(self):
+        super(HTTPConnectionPoolTests, self).tearDown()
+
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_request_reuses_connections(self):
+        """Testing HTTPConnectionPool.request reuses connections to a host"""
+        response, data = self.pool.request('POST', self.url + '/', b'1', {},
+                                           5)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data, b'OK')
+
+        response, data = self.pool.request('GET', self.url + '/', None, {},
+                                           5)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data, b'OK')
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[0][0], self.requests[1][0])
+
+    def test_request_with_idle_connection_closed(self):
+        """Testing HTTPConnectionPool.request with an idle connection closed
+        by the server
+        """
+        self.pool.request('GET', self.url + '/close/', None, {}, 5)
+
+        # Give the server time to close the connection.
+        time.sleep(0.2)
+
+        response, data = self.pool.request('POST', self.url + '/', b'1', {},
+                                           5)
+        self.assertEqual(response.status, 200)
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertNotEqual(self.requests[0][0], self.requests[1][0])
+
+    def test_request_with_lost_response_and_get(self):
+        """Testing HTTPConnectionPool.request sends a GET request again if
+        the response is lost on a reused connection
+        """
+        self.pool.request('GET', self.url + '/', None, {}, 5)
+
+        response, data = self.pool.request('GET', self.url + '/drop/', None,
+                                           {}, 5)
+        self.assertEqual(response.status, 200)
+
+        self.assertEqual([request[2] for request in self.requests],
+                         ['/', '/drop/', '/drop/'])
+
+    def test_request_with_lost_response_and_post(self):
+        """Testing HTTPConnectionPool.request doesn't send a POST request
+        again if the response is lost on a reused connection
+        """
+        self.pool.request('GET', self.url + '/', None, {}, 5)
+
+        with self.assertRaises((IOError, http_client.HTTPException)):
+            self.pool.request('POST', self.url + '/drop/', b'1', {}, 5)
+
+        self.assertEqual([request[2] for request in self.requests],
+                         ['/', '/drop/'])
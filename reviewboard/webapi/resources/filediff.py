@@ -14,6 +14,7 @@ from djblets.webapi.errors import (DOES_NOT_EXIST, NOT_LOGGED_IN,
 from djblets.webapi.responses import WebAPIResponse
 
 from reviewboard.attachments.models import FileAttachment
+from reviewboard.diffviewer.chunk_generator import get_highlighted_chunk
 from reviewboard.diffviewer.diffutils import (get_diff_files,
                                               populate_diff_chunks)
 from reviewboard.diffviewer.models import FileDiff
@@ -461,7 +462,10 @@ class FileDiffResource(WebAPIResource):
         payload = {
             'diff_data': {
                 'binary': f['binary'],
-                'chunks': f['chunks'],
+                'chunks': [
+                    get_highlighted_chunk(chunk)
+                    for chunk in f['chunks']
+                ],
                 'num_changes': f['num_changes'],
                 'changed_chunk_indexes': f['changed_chunk_indexes'],
                 'new_file': f['newfile'],